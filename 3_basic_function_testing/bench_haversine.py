@@ -0,0 +1,50 @@
+# 3_basic_function_testing/bench_haversine.py
+
+"""
+Benchmark the haversine kernel and composite scoring over a large volunteer pool.
+
+Reports the best-of-N wall time to compute great-circle distances and
+composite scores from one request to every volunteer, single-threaded.
+
+Usage:
+    python 3_basic_function_testing/bench_haversine.py --volunteers 1000000 --repeat 20
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_1", "backend"))
+
+from bench_shards import raw_pool, raw_requests  # noqa: E402
+from geo import haversine_km  # noqa: E402
+from matching_ai import composite_scores, rank_by_score, skill_masks_from_features  # noqa: E402
+
+
+def best_ms(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--volunteers", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    X = raw_pool(args.volunteers)
+    masks = skill_masks_from_features(X)
+    request = raw_requests(1)[0]
+    print(f"{len(X):,} volunteers")
+    print(f"haversine_km      {best_ms(lambda: haversine_km(request[0], request[1], X[:, 0], X[:, 1]), args.repeat):8.1f} ms")
+    print(f"composite_scores  {best_ms(lambda: composite_scores(request, X, masks), args.repeat):8.1f} ms")
+    print(f"rank_by_score k=3 {best_ms(lambda: rank_by_score(request, X, 3, masks), args.repeat):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# 3_basic_function_testing/bench_profiling.py
+
+"""
+Benchmark the overhead of request profiling on /match.
+
+Serves the same /match request repeatedly from the in-process app with
+profiling off, with 1% of requests sampled, and with every request sampled,
+and reports each setting's median per-request latency relative to off.
+
+Usage:
+    python 3_basic_function_testing/bench_profiling.py --volunteers 5000 --requests 2000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_1", "backend"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import load_test  # noqa: E402
+from profiling import PROFILER  # noqa: E402
+
+SETTINGS = [
+    ("off", {"enabled": False}),
+    ("sample 1%", {"enabled": True, "mode": "sample", "sample_rate": 0.01}),
+    ("sample 100%", {"enabled": True, "mode": "sample", "sample_rate": 1.0}),
+]
+
+
+def run(client, path, count):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        client.get(path)
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies), sum(latencies)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--volunteers", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    app, ctx = load_test.build_inprocess_app(volunteers=args.volunteers, requests=1)
+    client = TestClient(app)
+    path = f"/match/{ctx['request_ids'][0]}"
+    run(client, path, 50)  # warm up
+
+    # Interleave the settings over several rounds so drift affects them equally.
+    results = {name: [] for name, _ in SETTINGS}
+    for _ in range(args.rounds):
+        for name, settings in SETTINGS:
+            PROFILER.configure(**settings)
+            results[name].append(run(client, path, args.requests))
+    PROFILER.configure(enabled=False)
+
+    # Medians: totals are dominated by the odd garbage collection or scheduler stall.
+    baseline = statistics.median(median for median, _ in results["off"])
+    print(f"/match over {args.volunteers:,} volunteers, {args.requests:,} requests x {args.rounds} rounds")
+    for name, _ in SETTINGS:
+        median = statistics.median(m for m, _ in results[name])
+        total = min(t for _, t in results[name])
+        print(f"{name:12} median {median * 1000:7.3f} ms ({(median / baseline - 1) * 100:+.2f}%)  total {total:7.2f} s")
+    print(f"{len(PROFILER.profiles)} profiles in the ring buffer")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# 3_basic_function_testing/bench_scheduler.py
+
+"""
+Benchmark the pending request heap at a large backlog.
+
+Reports the mean cost of push, update and pop on an IndexedHeap holding
+--pending requests, and of reading the top of the feed with smallest().
+
+Usage:
+    python 3_basic_function_testing/bench_scheduler.py --pending 100000 --ops 10000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_1", "backend"))
+
+from scheduler import IndexedHeap  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pending", type=int, default=100000)
+    parser.add_argument("--ops", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(1)
+    heap = IndexedHeap()
+    heap.heapify((i, rng.random()) for i in range(args.pending))
+    start = time.perf_counter()
+    for i in range(args.ops):
+        heap.push(args.pending + i, rng.random())
+        heap.update(args.pending + i, rng.random())
+        heap.pop()
+    per_op_us = (time.perf_counter() - start) / (3 * args.ops) * 1e6
+
+    start = time.perf_counter()
+    for _ in range(args.ops):
+        heap.smallest(50)
+    feed_us = (time.perf_counter() - start) / args.ops * 1e6
+    print(f"{len(heap):,} pending requests")
+    print(f"push/update/pop   {per_op_us:8.2f} us per op")
+    print(f"smallest(50)      {feed_us:8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
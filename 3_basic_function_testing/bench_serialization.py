@@ -0,0 +1,93 @@
+# 3_basic_function_testing/bench_serialization.py
+
+"""
+Benchmark response serialization for an aid request listing.
+
+Compares FastAPI's default path (validate ORM rows against the
+response_model, dump to JSON-compatible data, stdlib json) with
+serialization.respond's path (read the schema's fields, orjson), and
+reports body sizes for JSON, MessagePack, gzip and brotli.
+
+Usage:
+    python 3_basic_function_testing/bench_serialization.py --rows 1000 --repeat 50
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_1", "backend"))
+
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import models  # noqa: E402
+import schemas  # noqa: E402
+import serialization  # noqa: E402
+from serialization import MSGPACK, encode, rows_payload  # noqa: E402
+
+
+def load_rows(count):
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    start = datetime(2026, 10, 1)
+    session.add_all([
+        models.AidRequest(requester_id=i % 50 + 1, type=("food", "medical", "shelter")[i % 3],
+                          description=f"Request {i}: supplies needed near the shelter",
+                          latitude=30.0 + i * 1e-4, longitude=-97.0 - i * 1e-4,
+                          urgency=("low", "medium", "high")[i % 3], status="pending",
+                          created_at=start + timedelta(seconds=i * 37))
+        for i in range(count)
+    ])
+    session.commit()
+    return session.query(models.AidRequest).all()
+
+
+def fastapi_default(adapter, rows):
+    # What fastapi.routing.serialize_response and JSONResponse do for a response_model.
+    value = adapter.validate_python(rows, from_attributes=True)
+    content = adapter.dump_python(value, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def best_ms(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    rows = load_rows(args.rows)
+    adapter = TypeAdapter(List[schemas.AidRequest])
+    default_ms = best_ms(lambda: fastapi_default(adapter, rows), args.repeat)
+    fast_ms = best_ms(lambda: encode(rows_payload(schemas.AidRequest, rows)), args.repeat)
+    print(f"{len(rows):,} aid requests")
+    print(f"response_model + json {default_ms:8.2f} ms")
+    print(f"rows_payload + orjson {fast_ms:8.2f} ms  ({default_ms / fast_ms:.1f}x)")
+
+    body = encode(rows_payload(schemas.AidRequest, rows))
+    packed = encode(rows_payload(schemas.AidRequest, rows), MSGPACK)
+    print(f"json     {len(body):9,} bytes")
+    print(f"msgpack  {len(packed):9,} bytes")
+    print(f"gzip     {len(gzip.compress(body, serialization.GZIP_LEVEL)):9,} bytes")
+    if serialization.brotli is not None:
+        print(f"brotli   {len(serialization.brotli.compress(body, quality=serialization.BROTLI_QUALITY)):9,} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# 3_basic_function_testing/bench_shards.py
+
+"""
+Benchmark scatter-gather matching throughput against the number of shard workers.
+
+Starts N shard server processes on this machine, loads a synthetic volunteer
+pool, then drives queries from several client threads and reports
+queries/second for each worker count.
+
+Usage:
+    python 3_basic_function_testing/bench_shards.py --volunteers 2000000 --workers 1,2,4,8
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_1", "backend"))
+
+from shards import ShardRouter, start_local_shard_processes  # noqa: E402
+
+
+def raw_pool(n, n_skills=7, n_cities=400, seed=0):
+    """Unscaled volunteer features: [lat, lon] + multi-hot skills + [availability]."""
+    rng = np.random.default_rng(seed)
+    cities = np.column_stack([rng.uniform(25, 49, n_cities), rng.uniform(-124, -67, n_cities)])
+    coords = cities[rng.integers(0, n_cities, n)] + rng.normal(0, 0.3, (n, 2))
+    skills = np.eye(n_skills)[rng.integers(0, n_skills, n)]
+    skills[rng.random(n) < 0.2, rng.integers(0, n_skills)] = 1
+    available = (rng.random(n) < 0.8).astype(float)[:, None]
+    return np.hstack([coords, skills, available])
+
+
+def raw_requests(n, n_skills=7, seed=1):
+    """Request features: [lat, lon] + one-hot type + [urgency]."""
+    X = raw_pool(n, n_skills, seed=seed)
+    X[:, 2:2 + n_skills] = np.eye(n_skills)[np.random.default_rng(seed).integers(0, n_skills, n)]
+    X[:, -1] = 1
+    return X
+
+
+def measure_throughput(router, queries, clients, k=3):
+    """Queries per second with `clients` threads sharing the router."""
+    chunks = np.array_split(queries, clients)
+    start = time.perf_counter()
+    threads = [threading.Thread(target=lambda c=c: [router.query(q, k) for q in c]) for c in chunks]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return len(queries) / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--volunteers", type=int, default=500000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--clients", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    X = raw_pool(args.volunteers)
+    ids = np.array([str(i) for i in range(len(X))], dtype=object)
+    queries = raw_requests(args.queries)
+    for n_workers in [int(w) for w in args.workers.split(",")]:
+        processes, workers = start_local_shard_processes(n_workers)
+        router = ShardRouter(workers)
+        try:
+            start = time.perf_counter()
+            sizes = router.load(X, ids)
+            load_s = time.perf_counter() - start
+            qps = measure_throughput(router, queries, args.clients)
+            print(f"workers={n_workers:<3} load={load_s:.1f}s  shard sizes {min(sizes):,}-{max(sizes):,}  "
+                  f"throughput={qps:,.0f} queries/s")
+        finally:
+            router.close()
+            for p in processes:
+                p.terminate()
+
+
+if __name__ == "__main__":
+    main()
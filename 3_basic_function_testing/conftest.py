@@ -0,0 +1,9 @@
+# 3_basic_function_testing/conftest.py
+
+import os
+import sys
+
+# In-process tests import backend modules directly (matching_ai, ann_index, ...).
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_1", "backend")
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
@@ -0,0 +1,360 @@
+# 3_basic_function_testing/load_test.py
+
+"""
+Concurrent load-testing harness for the backend API.
+
+By default the FastAPI app is run in-process: Firestore is replaced by the
+local store (FIRESTORE_MODE=local), the SQL routers use an in-memory SQLite
+database, authentication is stubbed per role, and geocoding is answered from a
+fixed table. Requests are driven through httpx's ASGI transport, so the numbers
+measure our code rather than the network.
+
+Arrivals are open-loop when --rate is given: requests are scheduled on a
+Poisson clock regardless of how fast earlier ones complete, and latency is
+measured from the scheduled send time so queueing delay is not hidden.
+Without --rate the harness runs closed-loop with --concurrency workers.
+
+Usage:
+    python 3_basic_function_testing/load_test.py --requests 2000 --concurrency 32 --rate 200 \\
+        --mix match=60,debug-match=5,aid-requests=15,volunteers=10,users=10 --report load_report.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import types
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_1", "backend")
+
+DEFAULT_MIX = "match=60,debug-match=5,aid-requests=15,volunteers=10,users=10"
+
+CITIES = {
+    "Houston, TX": (29.7604, -95.3698),
+    "Austin, TX": (30.2672, -97.7431),
+    "Dallas, TX": (32.7767, -96.7970),
+    "San Antonio, TX": (29.4241, -98.4936),
+    "Fort Worth, TX": (32.7555, -97.3308),
+    "El Paso, TX": (31.7619, -106.4850),
+}
+SKILLS = ['Medical', 'Food Logistics', 'Rescue', 'Shelter Management', 'Transportation', 'Communication', 'General Labor']
+URGENCIES = ['low', 'medium', 'high']
+
+
+class StubGeocoder:
+    """Answers geocoding lookups from CITIES, optionally sleeping to mimic a slow service."""
+
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000.0
+
+    def geocode(self, address, timeout=10):
+        if self.latency:
+            time.sleep(self.latency)
+        coords = CITIES.get(address)
+        if coords is None:
+            return None
+        return types.SimpleNamespace(latitude=coords[0], longitude=coords[1])
+
+
+def parse_mix(spec):
+    """Parse 'name=weight,...' into a list of (name, weight)."""
+    mix = []
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}'. Choose from: {', '.join(SCENARIOS)}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(samples, duration):
+    """Build the report section for a list of (latency_seconds, ok) samples."""
+    latencies = sorted(lat for lat, _ in samples)
+    errors = sum(1 for _, ok in samples if not ok)
+    to_ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "throughput_rps": round(len(samples) / duration, 2) if duration > 0 else 0.0,
+        "latency_ms": {
+            "p50": to_ms(percentile(latencies, 50)),
+            "p95": to_ms(percentile(latencies, 95)),
+            "p99": to_ms(percentile(latencies, 99)),
+            "max": to_ms(latencies[-1] if latencies else None),
+            "mean": to_ms(sum(latencies) / len(latencies) if latencies else None),
+        },
+    }
+
+
+# Scenarios: each returns (method, path, role, json_body) for one request.
+def _match(ctx, rng):
+    return "GET", f"/match/{rng.choice(ctx['request_ids'])}", None, None
+
+def _debug_match(ctx, rng):
+    return "GET", f"/debug-match/{rng.choice(ctx['request_ids'])}", None, None
+
+def _aid_requests(ctx, rng):
+    return "GET", "/aid-requests/", "volunteer", None
+
+def _aid_request_create(ctx, rng):
+    lat, lon = rng.choice(list(CITIES.values()))
+    body = {"type": rng.choice(SKILLS), "description": "load test", "latitude": lat, "longitude": lon}
+    return "POST", "/aid-requests/", "victim", body
+
+def _volunteers(ctx, rng):
+    return "GET", "/volunteers/", "ngo", None
+
+def _users(ctx, rng):
+    return "GET", "/users/me", rng.choice(["victim", "volunteer", "ngo"]), None
+
+
+SCENARIOS = {
+    "match": _match,
+    "debug-match": _debug_match,
+    "aid-requests": _aid_requests,
+    "aid-requests-create": _aid_request_create,
+    "volunteers": _volunteers,
+    "users": _users,
+}
+
+
+def build_inprocess_app(volunteers=500, requests=50, geocode_latency_ms=0.0, seed=0):
+    """
+    Import main.py against local storage and return (app, ctx).
+    ctx carries the seeded Firestore request ids for the match scenarios, the
+    id of each role's user and the SQL session factory.
+    """
+    os.environ["FIRESTORE_MODE"] = "local"
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from fastapi import Request
+
+    import matching_ai
+    import main
+    import models
+    from alerts import subscriber_geohash
+    from auth import get_current_active_user
+    from database import get_db
+    from heatmap import rebuild_heatmap
+    from scheduler import pending_scheduler
+    from search import search_index
+    from shifts import shift_index
+
+    matching_ai.geolocator = StubGeocoder(geocode_latency_ms)
+    rng = random.Random(seed)
+    cities = list(CITIES)
+
+    # Firestore-side data for /match and /debug-match.
+    batch = main.db.batch()
+    for i in range(volunteers):
+        batch.set(main.volunteers_ref.document(f"v{i}"), {
+            "name": f"Volunteer {i}",
+            "skills": rng.choice(SKILLS),
+            "location": rng.choice(cities),
+            "availability": "available" if rng.random() < 0.8 else "unavailable",
+        })
+    request_ids = []
+    for i in range(requests):
+        req_id = str(1000 + i)
+        request_ids.append(req_id)
+        batch.set(main.requests_ref.document(req_id), {
+            "type": rng.choice(SKILLS),
+            "location": rng.choice(cities),
+            "urgency": rng.choice(URGENCIES),
+        })
+    batch.commit()
+
+    # SQL-side data for the app/api routers.
+    # A file database, so each threadpool worker gets its own connection; one shared
+    # in-memory connection breaks when concurrent requests commit at the same time.
+    db_path = os.path.join(tempfile.mkdtemp(prefix="load_test_"), "load.db")
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False, "timeout": 30})
+    models.Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    session = SessionLocal()
+    role_users = {}
+    for role in models.UserRole:
+        user = models.User(email=f"{role.value}@example.com", hashed_password="x",
+                           full_name=f"Load {role.value}", role=role, is_active=True)
+        session.add(user)
+        role_users[role.value] = user
+    session.flush()
+    for i in range(min(volunteers, 200)):
+        lat, lon = CITIES[rng.choice(cities)]
+        session.add(models.VolunteerProfile(
+            user_id=role_users["volunteer"].id, skills=rng.choice(SKILLS), availability=True,
+            current_latitude=lat, current_longitude=lon, current_geohash=subscriber_geohash(lat, lon)))
+    for i in range(requests):
+        lat, lon = CITIES[rng.choice(cities)]
+        session.add(models.AidRequest(
+            requester_id=role_users["victim"].id, type=rng.choice(SKILLS), description="seed",
+            latitude=lat, longitude=lon, urgency=rng.choice(URGENCIES), status="pending"))
+    session.commit()
+    pending_scheduler.rebuild(session)
+    search_index.rebuild(session)
+    shift_index.rebuild(session)
+    rebuild_heatmap(session)
+    user_ids = {role: user.id for role, user in role_users.items()}
+    session.close()
+
+    def get_test_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def get_test_user(request: Request):
+        # X-Load-User picks a specific user (e.g. one of many volunteers); X-Load-Role one per role.
+        user_id = request.headers.get("X-Load-User")
+        role = request.headers.get("X-Load-Role", "admin")
+        db = SessionLocal()
+        try:
+            return db.get(models.User, int(user_id) if user_id else user_ids[role])
+        finally:
+            db.close()
+
+    # One load generator is one caller, so per-caller quotas would shed most of its
+    # traffic. Keep the concurrency limits but let every request queue for a slot.
+    for controller in (main.match_admission, main.debug_match_admission):
+        controller.rate = None
+        controller.queue_size = max(controller.queue_size, 1024)
+        controller.max_wait = max(controller.max_wait, 60.0)
+
+    main.app.dependency_overrides[get_db] = get_test_db
+    main.app.dependency_overrides[get_current_active_user] = get_test_user
+    return main.app, {"request_ids": request_ids, "user_ids": user_ids, "session_factory": SessionLocal}
+
+
+async def run_load(client, ctx, mix, total, concurrency, rate=None, seed=0):
+    """
+    Drive `total` requests through `client` and return (samples_by_scenario, duration).
+    With `rate`, arrivals follow a Poisson process (open loop); otherwise
+    `concurrency` workers send back-to-back (closed loop).
+    """
+    rng = random.Random(seed)
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    plan = [rng.choices(names, weights)[0] for _ in range(total)]
+    samples = {name: [] for name in names}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fire(name, scheduled):
+        method, path, role, body = SCENARIOS[name](ctx, rng)
+        headers = {"X-Load-Role": role} if role else {}
+        async with semaphore:
+            try:
+                response = await client.request(method, path, headers=headers, json=body)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+        samples[name].append((time.perf_counter() - scheduled, ok))
+
+    start = time.perf_counter()
+    if rate:
+        tasks = []
+        next_at = start
+        for name in plan:
+            next_at += rng.expovariate(rate)
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(fire(name, next_at)))
+        await asyncio.gather(*tasks)
+    else:
+        queue = iter(plan)
+
+        async def worker():
+            for name in queue:
+                await fire(name, time.perf_counter())
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - start
+
+
+def build_report(samples, duration, config):
+    all_samples = [s for group in samples.values() for s in group]
+    return {
+        "config": config,
+        "duration_s": round(duration, 3),
+        "overall": summarize(all_samples, duration),
+        "scenarios": {name: summarize(group, duration) for name, group in samples.items() if group},
+    }
+
+
+async def main_async(args):
+    import httpx
+
+    mix = parse_mix(args.mix)
+    config = {
+        "target": args.base_url or "in-process",
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "rate": args.rate,
+        "mix": dict(mix),
+        "volunteers": args.volunteers,
+        "seed": args.seed,
+    }
+    if args.base_url:
+        ctx = {"request_ids": args.request_ids.split(",")}
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)
+    else:
+        app, ctx = build_inprocess_app(args.volunteers, args.seed_requests, args.geocode_latency_ms, args.seed)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=args.timeout)
+    async with client:
+        samples, duration = await run_load(client, ctx, mix, args.requests, args.concurrency, args.rate, args.seed)
+    return build_report(samples, duration, config)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent load test for the disaster relief API.")
+    parser.add_argument("--requests", type=int, default=1000, help="Total requests to send.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Maximum requests in flight.")
+    parser.add_argument("--rate", type=float, default=None, help="Open-loop arrival rate in requests/s.")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Scenario weights (default: {DEFAULT_MIX}).")
+    parser.add_argument("--volunteers", type=int, default=500, help="Seeded volunteers (in-process only).")
+    parser.add_argument("--seed-requests", type=int, default=50, help="Seeded aid requests (in-process only).")
+    parser.add_argument("--geocode-latency-ms", type=float, default=0.0, help="Simulated geocoding latency.")
+    parser.add_argument("--base-url", default=None, help="Run against a live server instead of in-process.")
+    parser.add_argument("--request-ids", default="101,102,103,104", help="Request ids to match against a live server.")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", default="load_report.json", help="Where to write the JSON report.")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+
+    overall = report["overall"]
+    print(f"{overall['requests']} requests in {report['duration_s']}s "
+          f"({overall['throughput_rps']} req/s), error rate {overall['error_rate']:.2%}")
+    print(f"{'scenario':<22}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, stats in report["scenarios"].items():
+        lat = stats["latency_ms"]
+        print(f"{name:<22}{stats['throughput_rps']:>10}{lat['p50']:>10}{lat['p95']:>10}{lat['p99']:>10}{stats['errors']:>8}")
+    print(f"Report written to {args.report}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# 3_basic_function_testing/test_admission.py
+
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+
+from admission import AdmissionController, Rejected, admission_dependency
+from auth import create_access_token
+
+
+def slow_app(controller, service_time=0.05):
+    app = FastAPI()
+    state = {"running": 0, "peak": 0}
+    lock = threading.Lock()
+
+    @app.get("/work", dependencies=[Depends(admission_dependency(controller))])
+    def work():
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(service_time)
+        with lock:
+            state["running"] -= 1
+        return {"ok": True}
+
+    return app, state
+
+
+def bearer(email):
+    return {"Authorization": f"Bearer {create_access_token({'sub': email})}"}
+
+
+async def fire(app, total, headers=None):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://admission") as client:
+        return await asyncio.gather(*[client.get("/work", headers=headers or {}) for _ in range(total)])
+
+
+def test_overload_is_shed_with_retry_after_and_concurrency_capped():
+    controller = AdmissionController("test", concurrency=2, queue_size=4, max_wait=0.5)
+    app, state = slow_app(controller)
+
+    # 10x what the two slots and the queue can hold.
+    responses = asyncio.run(fire(app, 60))
+    statuses = [response.status_code for response in responses]
+
+    assert state["peak"] <= 2
+    assert statuses.count(200) >= 6
+    assert statuses.count(503) > 0
+    assert set(statuses) <= {200, 503}
+    for response in responses:
+        if response.status_code == 503:
+            assert int(response.headers["Retry-After"]) >= 1
+    assert controller._in_flight == 0 and not controller._waiters
+
+
+def test_caller_over_quota_gets_429():
+    controller = AdmissionController("test", concurrency=4, queue_size=4, max_wait=1.0, rate=0.5, burst=2)
+    app, _ = slow_app(controller, service_time=0)
+
+    async def run():
+        first = await fire(app, 3, bearer("a@example.com"))
+        other = await fire(app, 1, bearer("b@example.com"))
+        return first, other
+
+    first, other = asyncio.run(run())
+    assert sorted(response.status_code for response in first) == [200, 200, 429]
+    limited = next(response for response in first if response.status_code == 429)
+    assert int(limited.headers["Retry-After"]) >= 1
+    assert other[0].status_code == 200
+
+
+def test_unverified_tokens_share_the_address_quota_and_bad_timeouts_are_ignored():
+    controller = AdmissionController("test", concurrency=4, queue_size=4, max_wait=1.0, rate=0.5, burst=2)
+    app, _ = slow_app(controller, service_time=0)
+
+    async def run():
+        return [(await fire(app, 1, {"Authorization": f"Bearer forged-{i}", "X-Request-Timeout": timeout}))[0]
+                for i, timeout in enumerate(["abc", "-1", "nan"])]
+
+    assert [response.status_code for response in asyncio.run(run())] == [200, 200, 429]
+
+
+def test_request_is_shed_when_its_deadline_cannot_be_met():
+    controller = AdmissionController("test", concurrency=1, queue_size=8, max_wait=5.0)
+    controller.service_time = 1.0
+
+    async def run():
+        await controller.acquire("a")
+        # Expected wait is a full service time; a 0.1 s budget is refused without queueing.
+        with pytest.raises(Rejected) as refused:
+            await controller.acquire("b", timeout=0.1)
+        assert refused.value.reason == "deadline" and refused.value.status_code == 503
+        assert not controller._waiters
+
+        # A queued waiter is handed the slot on release.
+        waiter = asyncio.ensure_future(controller.acquire("c", timeout=5.0))
+        await asyncio.sleep(0)
+        assert len(controller._waiters) == 1
+        controller.release(0.01)
+        await waiter
+        assert controller._in_flight == 1
+        controller.release(0.01)
+        assert controller._in_flight == 0
+
+    asyncio.run(run())
+
@@ -0,0 +1,127 @@
+# 3_basic_function_testing/test_alerts.py
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import load_test
+import models
+from alerts import alert_feed, fan_out, resolve_recipients, subscriber_geohash
+from geo import points_in_polygon
+from sync import current_version
+
+DALLAS = (32.7767, -96.7970)
+PLANO = (33.0198, -96.6989)
+FORT_WORTH = (32.7555, -97.3308)
+HOUSTON = (29.7604, -95.3698)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def add_volunteer(db, email, location):
+    user = models.User(email=email, hashed_password="x", full_name=email, role=models.UserRole.VOLUNTEER)
+    db.add(user)
+    db.flush()
+    lat, lon = location
+    db.add(models.VolunteerProfile(user_id=user.id, current_latitude=lat, current_longitude=lon,
+                                   current_geohash=subscriber_geohash(lat, lon)))
+    db.commit()
+    return user.id
+
+
+def add_alert(db, dedup_key, **fence):
+    alert = models.Alert(title="Flood", description="Move to higher ground", dedup_key=dedup_key, **fence)
+    db.add(alert)
+    db.commit()
+    return alert
+
+
+def test_points_in_polygon():
+    square = [[0, 0], [0, 10], [10, 10], [10, 0]]
+    inside = points_in_polygon([5, 15, 0.5, 9.9, -1], [5, 5, 9.5, 0.1, 5], square)
+    assert inside.tolist() == [True, False, True, True, False]
+
+
+def test_circle_fence_and_dedup(db):
+    dallas = add_volunteer(db, "dallas@example.com", DALLAS)
+    plano = add_volunteer(db, "plano@example.com", PLANO)
+    fort_worth = add_volunteer(db, "fortworth@example.com", FORT_WORTH)
+    add_volunteer(db, "houston@example.com", HOUSTON)
+
+    # Plano is ~28 km from downtown Dallas, Fort Worth ~45 km.
+    first = add_alert(db, "flood-1", center_latitude=DALLAS[0], center_longitude=DALLAS[1], radius_km=35)
+    assert resolve_recipients(db, first).tolist() == [dallas, plano]
+    assert fan_out(db, first, batch_size=1) == 2
+
+    # Widening the same event reaches only the new recipient.
+    wider = add_alert(db, "flood-1", center_latitude=DALLAS[0], center_longitude=DALLAS[1], radius_km=60)
+    assert fan_out(db, wider) == 1
+    assert [alert.id for _, alert in alert_feed(db, fort_worth)] == [wider.id]
+    assert [alert.id for _, alert in alert_feed(db, dallas)] == [first.id]
+
+
+def test_polygon_fence_and_feed_cursor(db):
+    dallas = add_volunteer(db, "dallas@example.com", DALLAS)
+    add_volunteer(db, "fortworth@example.com", FORT_WORTH)
+    # A box around Dallas and Plano that stops east of Fort Worth.
+    box = [[32.6, -97.0], [33.2, -97.0], [33.2, -96.5], [32.6, -96.5]]
+    alerts = [add_alert(db, f"storm-{i}", polygon=json.dumps(box)) for i in range(3)]
+    for alert in alerts:
+        assert fan_out(db, alert) == 1
+
+    page = alert_feed(db, dallas, after=0, limit=2)
+    assert [alert.id for _, alert in page] == [alerts[0].id, alerts[1].id]
+    rest = alert_feed(db, dallas, after=page[-1][0], limit=2)
+    assert [alert.id for _, alert in rest] == [alerts[2].id]
+    # The feed counts on its own clock row; the sync clock only moved for the profile writes.
+    assert [seq for seq, _ in page + rest] == [1, 2, 3]
+    assert current_version(db) == 2
+
+
+def test_feed_cursor_follows_commit_order_not_ids(db):
+    dallas = add_volunteer(db, "dallas@example.com", DALLAS)
+    first, late = add_alert(db, "storm-1"), add_alert(db, "storm-2")
+    # A fan-out that took a lower id but committed after a reader saw a later delivery.
+    db.add_all([models.AlertDelivery(id=10, user_id=dallas, alert_id=late.id, dedup_key="storm-2", feed_seq=2),
+                models.AlertDelivery(id=11, user_id=dallas, alert_id=first.id, dedup_key="storm-1", feed_seq=1)])
+    db.commit()
+    (cursor, _), = alert_feed(db, dallas, after=0, limit=1)
+    early = add_alert(db, "storm-3")
+    db.add(models.AlertDelivery(id=5, user_id=dallas, alert_id=early.id, dedup_key="storm-3", feed_seq=3))
+    db.commit()
+
+    assert [alert.id for _, alert in alert_feed(db, dallas, after=cursor)] == [late.id, early.id]
+
+
+def test_alert_api():
+    app, _ = load_test.build_inprocess_app(volunteers=5, requests=1)
+    client = TestClient(app)
+    ngo, volunteer = {"X-Load-Role": "ngo"}, {"X-Load-Role": "volunteer"}
+
+    body = {"title": "Tornado warning", "description": "Take shelter", "severity": "emergency",
+            "center_latitude": DALLAS[0], "center_longitude": DALLAS[1], "radius_km": 1000}
+    assert client.post("/alerts/", headers=volunteer, json=body).status_code == 403
+    assert client.post("/alerts/", headers=ngo, json=dict(body, polygon=[[0, 0], [0, 1], [1, 1]])).status_code == 422
+
+    created = client.post("/alerts/", headers=ngo, json=body)
+    assert created.status_code == 202, created.text
+    alert = client.get(f"/alerts/{created.json()['id']}", headers=ngo).json()
+    assert alert["status"] == "delivered"
+    assert alert["dedup_key"] == f"alert-{alert['id']}"
+    # Every seeded profile is in Texas and they all belong to one volunteer user.
+    assert alert["recipient_count"] == 1
+
+    feed = client.get("/alerts/feed", headers=volunteer).json()
+    assert [item["alert"]["id"] for item in feed["alerts"]] == [alert["id"]]
+    again = client.get("/alerts/feed", headers=volunteer, params={"after": feed["next_cursor"]}).json()
+    assert again == {"alerts": [], "next_cursor": feed["next_cursor"]}
@@ -0,0 +1,52 @@
+# 3_basic_function_testing/test_ann_index.py
+
+import numpy as np
+import pytest
+
+import ann_index
+from bench_ann import synthetic_pool
+
+
+@pytest.fixture(scope="module")
+def pool():
+    return synthetic_pool(20000, seed=3)
+
+
+def test_ivf_recall_against_exact(pool):
+    index = ann_index.IVFIndex(pool, nprobe=4)
+    queries = synthetic_pool(50, seed=4)
+    result = ann_index.measure_recall(index, pool, queries, k=3)
+    assert result["engine"] == "ivf"
+    assert result["recall"] >= 0.95
+
+
+def test_exact_engine_has_full_recall(pool):
+    index = ann_index.ExactIndex(pool)
+    result = ann_index.measure_recall(index, pool, pool[:20], k=3)
+    assert result["recall"] == 1.0
+
+
+def test_ivf_returns_sorted_distances_to_original_rows(pool):
+    index = ann_index.IVFIndex(pool, nlist=50, nprobe=50)
+    distances, indices = index.query(pool[123], k=5)
+    assert np.all(np.diff(distances) >= 0)
+    np.testing.assert_allclose(distances, np.linalg.norm(pool[indices] - pool[123], axis=1), rtol=1e-4, atol=1e-5)
+
+
+def test_build_index_falls_back_to_exact_for_small_pools(pool):
+    assert ann_index.build_index(pool[:100], engine="ivf").engine == "exact"
+    with pytest.raises(ValueError):
+        ann_index.build_index(pool, engine="annoy")
+
+
+def test_per_request_ranking_never_trains_ivf(pool, monkeypatch):
+    import matching_ai
+
+    def no_training(*args, **kwargs):
+        raise AssertionError("IVF trained on the per-request path")
+
+    monkeypatch.setattr(ann_index, "MATCH_ENGINE", "ivf")
+    monkeypatch.setattr(ann_index, "MATCH_ANN_MIN_POOL", 1)
+    monkeypatch.setitem(ann_index.ENGINES, "ivf", no_training)
+    _, _, distances, indices = matching_ai.rank_feature_matrix(pool[7], pool[:500], k=3)
+    assert indices.shape == (1, 3) and distances[0][0] == pytest.approx(0, abs=1e-6)
@@ -0,0 +1,107 @@
+# 3_basic_function_testing/test_archive.py
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+import load_test
+import models
+from archive import archive_batch, archive_completed
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def add_requests(db, statuses, age_days):
+    created = datetime.utcnow() - timedelta(days=age_days)
+    rows = [models.AidRequest(requester_id=1, type="food", description="seed", latitude=30.0, longitude=-97.0,
+                              urgency="low", status=status, created_at=created) for status in statuses]
+    db.add_all(rows)
+    db.commit()
+    return [row.id for row in rows]
+
+
+def test_archiver_moves_only_old_completed_requests(db):
+    old_done = add_requests(db, ["completed"] * 7, age_days=30)
+    old_active = add_requests(db, ["pending", "assigned"], age_days=30)
+    recent_done = add_requests(db, ["completed"], age_days=1)
+
+    # Stop after two batches, as if interrupted; a rerun finishes the job.
+    assert archive_completed(db, timedelta(days=7), batch_size=3, max_batches=2) == 6
+    assert archive_completed(db, timedelta(days=7), batch_size=3) == 1
+    assert archive_completed(db, timedelta(days=7), batch_size=3) == 0
+
+    hot = sorted(id_ for (id_,) in db.query(models.AidRequest.id))
+    archived = db.query(models.AidRequestArchive).order_by(models.AidRequestArchive.id).all()
+    assert hot == sorted(old_active + recent_done)
+    assert [row.id for row in archived] == old_done
+    assert all(row.status == "completed" and row.archived_at for row in archived)
+
+    # New requests never reuse an archived id.
+    (new_id,) = add_requests(db, ["pending"], age_days=0)
+    assert new_id > max(old_done + old_active + recent_done)
+
+
+def test_archive_batch_respects_cursor(db):
+    ids = add_requests(db, ["completed"] * 4, age_days=30)
+    assert archive_batch(db, datetime.utcnow(), after=ids[1], batch_size=10) == ids[2:]
+
+
+def test_archive_batch_stamps_sync_values_after_it_commits(db):
+    add_requests(db, ["completed"] * 3, age_days=30)
+    statements = []
+    engine = db.get_bind()
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    def record_commit(conn):
+        statements.append("COMMIT")
+
+    event.listen(engine, "before_cursor_execute", record)
+    event.listen(engine, "commit", record_commit)
+    try:
+        archive_batch(db, datetime.utcnow())
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+        event.remove(engine, "commit", record_commit)
+    # The batch commits before the sync clock is touched, so it never holds the clock lock.
+    moved = next(i for i, s in enumerate(statements) if s.startswith("DELETE") and "aid_requests" in s)
+    clock = next(i for i, s in enumerate(statements) if "sync_clock" in s)
+    assert "COMMIT" in statements[moved:clock]
+    seqs = [row.change_seq for row in db.query(models.AidRequestArchive)]
+    assert None not in seqs and len(set(seqs)) == 3
+
+
+def test_partial_indexes_cover_only_active_rows(db):
+    indexes = dict(db.execute(text(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'aid_requests'"
+    )).all())
+    assert "WHERE status IN ('pending', 'assigned')" in indexes["ix_aid_requests_active"]
+    assert "WHERE status = 'completed'" in indexes["ix_aid_requests_archivable"]
+
+
+def test_archived_requests_stay_readable():
+    app, _ = load_test.build_inprocess_app(volunteers=5, requests=3)
+    client = TestClient(app)
+    request_id = client.get("/aid-requests/next", params={"limit": 1}).json()[0]["id"]
+    assert client.put(f"/aid-requests/{request_id}/status", params={"status": "completed"}).status_code == 200
+
+    import database
+    from main import app as main_app
+    session = next(main_app.dependency_overrides[database.get_db]())
+    assert archive_completed(session, timedelta(0)) == 1
+
+    assert client.get(f"/aid-requests/{request_id}").json()["status"] == "completed"
+    archived = client.get("/aid-requests/archived").json()
+    assert [row["id"] for row in archived] == [request_id]
+    assert client.get("/aid-requests/archived", headers={"X-Load-Role": "volunteer"}).status_code == 403
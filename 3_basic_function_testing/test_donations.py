@@ -0,0 +1,89 @@
+# 3_basic_function_testing/test_donations.py
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import load_test
+import models
+from donations import parse_amount_cents
+from sync import DONATION_LOG_CLOCK, current_version, next_seqs
+
+VOLUNTEER = {"X-Load-Role": "volunteer"}
+
+
+@pytest.fixture(scope="module")
+def client():
+    app, _ = load_test.build_inprocess_app(volunteers=5, requests=1)
+    return TestClient(app)
+
+
+def donation(key, name, type_, detail):
+    return {"idempotency_key": key, "name": name, "type": type_, "detail": detail}
+
+
+def test_parse_amount_cents():
+    assert parse_amount_cents("Money", "$1000") == 100000
+    assert parse_amount_cents("Money", " $1,250.5 ") == 125050
+    assert parse_amount_cents("Money", "a lot") is None
+    assert parse_amount_cents("Resource", "100 cases of water") is None
+
+
+def test_batches_are_idempotent_and_totals_incremental(client):
+    batch = [
+        donation("d1", "Casey", "Money", "$1000"),
+        donation("d2", "Jordan", "Money", "$500"),
+        donation("d3", "Sam", "Resource", "100 cases of water"),
+        donation("d3", "Sam", "Resource", "100 cases of water"),
+    ]
+    assert client.post("/donations/", headers=VOLUNTEER, json=batch).json() == {"accepted": 3, "duplicates": 1}
+    # A retry of the whole batch plus one new donation only records the new one.
+    retry = batch + [donation("d4", "Alex", "Money", "$25.50")]
+    assert client.post("/donations/", headers=VOLUNTEER, json=retry).json() == {"accepted": 1, "duplicates": 4}
+
+    totals = {t["type"]: (t["count"], t["amount_cents"]) for t in client.get("/donations/totals").json()}
+    assert totals == {"Money": (3, 152550), "Resource": (1, 0)}
+
+
+def test_cursor_pages_and_stream(client):
+    client.post("/donations/", headers=VOLUNTEER,
+                json=[donation(f"page-{i}", f"Donor {i}", "Resource", f"{i} blankets") for i in range(7)])
+
+    seen, cursor = [], 0
+    while True:
+        page = client.get("/donations/", params={"after": cursor, "limit": 3}).json()
+        if not page["donations"]:
+            assert page["next_cursor"] == cursor
+            break
+        seen.extend(d["log_seq"] for d in page["donations"])
+        cursor = page["next_cursor"]
+    assert seen == sorted(seen) and len(seen) == len(set(seen))
+
+    with client.stream("GET", "/donations/stream", params={"after": seen[2]}) as response:
+        streamed = [json.loads(line) for line in response.iter_lines() if line]
+    assert [d["log_seq"] for d in streamed] == seen[3:]
+    resources = client.get("/donations/", params={"type": "Resource", "limit": 1000}).json()["donations"]
+    assert all(d["type"] == "Resource" for d in resources)
+
+
+def test_cursor_follows_commit_order_not_ids():
+    app, ctx = load_test.build_inprocess_app(volunteers=1, requests=0)
+    client = TestClient(app)
+    db = ctx["session_factory"]()
+    version = current_version(db)
+    client.post("/donations/", headers=VOLUNTEER, json=[donation("first", "Kim", "Resource", "tents")])
+    # The log counts on its own clock row, not the sync clock.
+    assert current_version(db) == version
+    page = client.get("/donations/").json()
+    first_id, cursor = page["donations"][0]["id"], page["next_cursor"]
+
+    # A batch that took a lower id but committed after the reader's page.
+    db.add(models.Donation(id=first_id - 1, log_seq=next_seqs(db, 1, DONATION_LOG_CLOCK), idempotency_key="late",
+                           name="Lee", type="Resource", detail="cots"))
+    db.commit()
+    db.close()
+
+    page = client.get("/donations/", params={"after": cursor}).json()
+    assert [d["detail"] for d in page["donations"]] == ["cots"]
+    assert page["next_cursor"] > cursor
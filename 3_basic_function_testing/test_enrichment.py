@@ -0,0 +1,108 @@
+# 3_basic_function_testing/test_enrichment.py
+
+import time
+
+import pytest
+from geopy.exc import GeocoderServiceError
+
+import matching_ai
+from enrichment import DocumentEnricher, Geocoder, RateLimiter, backfill, load_checkpoint, needs_enrichment
+from load_test import CITIES
+from local_firestore import LocalFirestoreClient
+
+
+class CountingGeocoder:
+    """CITIES lookups that count calls and can be told to fail."""
+
+    def __init__(self, fail_on=None):
+        self.calls = []
+        self.fail_on = fail_on
+
+    def __call__(self, location):
+        self.calls.append(location)
+        if location == self.fail_on:
+            raise GeocoderServiceError("service unavailable")
+        return CITIES.get(location)
+
+
+def unlimited(geocode):
+    return Geocoder(RateLimiter(rate=1e6, burst=1e6), geocode=geocode)
+
+
+def seed(collection, n):
+    cities = list(CITIES) + ["Nowhere"]
+    for i in range(n):
+        collection.document(f"v{i:03d}").set({"skills": "Medical", "availability": "available",
+                                              "location": cities[i % len(cities)]})
+
+
+def test_features_use_stored_coordinates(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("geocoded on the matching path")
+    monkeypatch.setattr(matching_ai.geolocator, "geocode", fail)
+
+    doc = {"skills": "Medical", "availability": "available", "location": "Austin, TX",
+           "lat": 30.2672, "lon": -97.7431, "geocoded_location": "Austin, TX"}
+    assert list(matching_ai.extract_features_volunteer(doc)[:2]) == [30.2672, -97.7431]
+    # Stored "not found" reads as (0, 0) without geocoding again.
+    missing = dict(doc, location="Nowhere", lat=None, lon=None, geocoded_location="Nowhere")
+    assert list(matching_ai.extract_features_volunteer(missing)[:2]) == [0.0, 0.0]
+    # A relocated document's stale coordinates are not used.
+    assert not needs_enrichment(doc)
+    assert needs_enrichment(dict(doc, location="Dallas, TX"))
+    assert matching_ai.stored_coordinates(dict(doc, location="Dallas, TX")) is None
+
+
+def test_backfill_is_resumable_and_geocodes_each_address_once(tmp_path):
+    client = LocalFirestoreClient()
+    volunteers = client.collection("volunteers")
+    seed(volunteers, 20)
+    checkpoint = str(tmp_path / "checkpoint.json")
+
+    geocode = CountingGeocoder(fail_on="Dallas, TX")
+    with pytest.raises(GeocoderServiceError):
+        backfill(volunteers, client.batch, unlimited(geocode), checkpoint, batch_size=3)
+    # v000 (Houston) and v001 (Austin) were committed before v002 (Dallas) failed.
+    assert load_checkpoint(checkpoint) == {"volunteers": "v001"}
+    assert volunteers.document("v001").get().to_dict()["lat"] == CITIES["Austin, TX"][0]
+    assert needs_enrichment(volunteers.document("v002").get().to_dict())
+
+    geocode = CountingGeocoder()
+    counts = backfill(volunteers, client.batch, unlimited(geocode), checkpoint, batch_size=3)
+    assert counts == {"scanned": 18, "enriched": 16, "not_found": 2}
+    assert sorted(geocode.calls) == sorted(set(CITIES) | {"Nowhere"})
+    assert not any(needs_enrichment(doc.to_dict()) for doc in volunteers.stream())
+    assert volunteers.document("v006").get().to_dict()["geohash"] is None
+    assert backfill(volunteers, client.batch, unlimited(geocode), checkpoint)["scanned"] == 0
+
+
+def test_enricher_handles_new_and_relocated_documents():
+    client = LocalFirestoreClient()
+    volunteers = client.collection("volunteers")
+    volunteers.document("old").set({"location": "Austin, TX"})
+    geocode = CountingGeocoder()
+    enricher = DocumentEnricher([volunteers], unlimited(geocode), reconnect_interval=0.05).start()
+    try:
+        volunteers.document("new").set({"location": "Dallas, TX"})
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and needs_enrichment(volunteers.document("new").get().to_dict()):
+            time.sleep(0.01)
+        assert volunteers.document("new").get().to_dict()["lat"] == CITIES["Dallas, TX"][0]
+
+        volunteers.document("new").update({"location": "El Paso, TX"})
+        while time.monotonic() < deadline and volunteers.document("new").get().to_dict()["geocoded_location"] != "El Paso, TX":
+            time.sleep(0.01)
+        assert volunteers.document("new").get().to_dict()["lon"] == CITIES["El Paso, TX"][1]
+    finally:
+        enricher.stop()
+    # Existing documents are left to the backfill.
+    assert geocode.calls == ["Dallas, TX", "El Paso, TX"]
+    assert needs_enrichment(volunteers.document("old").get().to_dict())
+
+
+def test_rate_limiter_spaces_calls():
+    limiter = RateLimiter(rate=50)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    assert time.monotonic() - start >= 0.09
@@ -0,0 +1,82 @@
+# 3_basic_function_testing/test_etags.py
+
+import pytest
+from fastapi.testclient import TestClient
+
+import load_test
+from etags import etag_matches, list_etag, row_etag
+
+
+@pytest.fixture(scope="module")
+def client():
+    app, _ = load_test.build_inprocess_app(volunteers=5, requests=4)
+    return TestClient(app)
+
+
+def test_etag_matching():
+    etag = row_etag("user", 1, 3)
+    assert etag == '"user-1-3"'
+    assert etag_matches('"user-1-2", "user-1-3"', etag)
+    assert etag_matches('W/"user-1-3"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"user-1-2"', etag)
+    assert not etag_matches(None, etag)
+    assert list_etag("a", ("ngo", 1), [(1, 1), (2, 1)]) != list_etag("a", ("ngo", 1), [(2, 1), (1, 1)])
+
+
+def test_unchanged_row_answers_304_and_update_changes_etag(client):
+    first = client.get("/users/me")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and first.headers["Cache-Control"] == "private, no-cache"
+
+    again = client.get("/users/me", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b"" and again.headers["ETag"] == etag
+
+    request_id = client.get("/aid-requests/next", params={"limit": 1}).json()[0]["id"]
+    detail = client.get(f"/aid-requests/{request_id}")
+    assert client.get(f"/aid-requests/{request_id}",
+                      headers={"If-None-Match": detail.headers["ETag"]}).status_code == 304
+
+    assert client.put(f"/aid-requests/{request_id}/status", params={"status": "assigned"}).status_code == 200
+    changed = client.get(f"/aid-requests/{request_id}", headers={"If-None-Match": detail.headers["ETag"]})
+    assert changed.status_code == 200 and changed.json()["status"] == "assigned"
+    assert changed.headers["ETag"] != detail.headers["ETag"]
+
+
+def test_listing_etag_tracks_page_contents(client):
+    listing = client.get("/aid-requests/", headers={"X-Load-Role": "ngo"})
+    etag = listing.headers["ETag"]
+    assert client.get("/aid-requests/", headers={"X-Load-Role": "ngo", "If-None-Match": etag}).status_code == 304
+
+    # Same rows, different caller's view.
+    assert client.get("/aid-requests/", headers={"X-Load-Role": "admin", "If-None-Match": etag}).status_code == 200
+
+    body = {"type": "food", "description": "new", "latitude": 30.0, "longitude": -97.0, "urgency": "high"}
+    assert client.post("/aid-requests/", json=body, headers={"X-Load-Role": "victim"}).status_code == 200
+    refreshed = client.get("/aid-requests/", headers={"X-Load-Role": "ngo", "If-None-Match": etag})
+    assert refreshed.status_code == 200 and len(refreshed.json()) == len(listing.json()) + 1
+
+
+def test_each_representation_has_its_own_etag(client):
+    ngo = {"X-Load-Role": "ngo"}
+    variants = {
+        "json": {"Accept-Encoding": "identity"},
+        "msgpack": {"Accept": "application/msgpack", "Accept-Encoding": "identity"},
+        "gzip": {"Accept-Encoding": "gzip"},
+        "msgpack-gzip": {"Accept": "application/msgpack", "Accept-Encoding": "gzip"},
+    }
+    etags = {}
+    for name, headers in variants.items():
+        response = client.get("/aid-requests/", headers={**ngo, **headers})
+        assert response.status_code == 200
+        etags[name] = response.headers["ETag"]
+        assert etags[name].endswith(f'-{name}"') or name == "json"
+        again = client.get("/aid-requests/", headers={**ngo, **headers, "If-None-Match": etags[name]})
+        assert again.status_code == 304 and again.headers["ETag"] == etags[name]
+    assert len(set(etags.values())) == len(variants)
+
+    # A MessagePack tag does not validate the JSON body, nor a gzip tag the brotli one.
+    response = client.get("/aid-requests/", headers={**ngo, **variants["json"], "If-None-Match": etags["msgpack"]})
+    assert response.status_code == 200 and response.headers["ETag"] == etags["json"]
+    response = client.get("/aid-requests/", headers={**ngo, "Accept-Encoding": "br", "If-None-Match": etags["gzip"]})
+    assert response.status_code == 200 and response.headers["ETag"] != etags["gzip"]
@@ -0,0 +1,22 @@
+# 3_basic_function_testing/test_geo.py
+
+import numpy as np
+
+from bench_shards import raw_pool
+from geo import geohash_encode, geohash_encode_many, geohash_neighbors, haversine_km
+
+
+def test_geohash_vectorized_matches_scalar_and_neighbors():
+    lats, lons = np.array([29.76, -33.86, 0.0]), np.array([-95.37, 151.2, 0.0])
+    assert list(geohash_encode_many(lats, lons, 5)) == [geohash_encode(a, b, 5) for a, b in zip(lats, lons)]
+    assert geohash_encode(29.76, -95.37, 5) == "9vk1m"
+    assert geohash_neighbors("9vk") == ["9v5", "9v7", "9ve", "9vh", "9vj", "9vm", "9vs", "9vt"]
+
+
+def test_haversine_km_is_chunk_independent():
+    # Houston to Dallas, and a high-latitude pair where degrees of longitude shrink.
+    assert abs(haversine_km(29.7604, -95.3698, [32.7767], [-96.7970])[0] - 361.8) < 0.5
+    assert abs(haversine_km(64.0, 10.0, [64.0], [11.0])[0] - 48.8) < 0.5
+    X = raw_pool(1000)
+    assert np.allclose(haversine_km(30.0, -95.0, X[:, 0], X[:, 1], chunk=7),
+                       haversine_km(30.0, -95.0, X[:, 0], X[:, 1]))
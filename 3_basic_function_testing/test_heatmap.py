@@ -0,0 +1,119 @@
+# 3_basic_function_testing/test_heatmap.py
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import load_test
+import models
+from heatmap import demand_keys, rebuild_heatmap, record_change, read_heatmap, supply_keys, zoom_for
+from sync import current_version
+
+DALLAS = (32.7767, -96.7970)
+HOUSTON = (29.7604, -95.3698)
+TEXAS = dict(lat_min=25.0, lat_max=37.0, lon_min=-107.0, lon_max=-93.0)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def add_request(db, location, type_="medical", urgency="high"):
+    request = models.AidRequest(type=type_, urgency=urgency, status="pending",
+                                latitude=location[0], longitude=location[1])
+    db.add(request)
+    record_change(db, [], demand_keys(request), request)
+    db.commit()
+    return request
+
+
+def cells(heatmap):
+    return {cell["cell"]: (cell["demand"], cell["supply"]) for cell in heatmap["cells"]}
+
+
+def test_counters_follow_writes_and_match_rebuild(db):
+    first = add_request(db, DALLAS)
+    add_request(db, DALLAS, urgency="low")
+    add_request(db, HOUSTON, type_="food")
+    profile = models.VolunteerProfile(skills="medical, Rescue ,unknown", availability=True,
+                                      current_latitude=HOUSTON[0], current_longitude=HOUSTON[1])
+    db.add(profile)
+    record_change(db, [], supply_keys(profile), profile)
+    db.commit()
+
+    heatmap = read_heatmap(db, **TEXAS, precision=3)
+    assert cells(heatmap) == {
+        "9vg": ({"Medical": {"high": 1, "low": 1}}, {}),
+        "9vk": ({"Food Logistics": {"high": 1}}, {"Medical": 1, "Rescue": 1}),
+    }
+
+    # Assigning a request and moving the volunteer shift the counts.
+    before = demand_keys(first)
+    first.status = "assigned"
+    record_change(db, before, demand_keys(first), first)
+    before = supply_keys(profile)
+    profile.current_latitude, profile.current_longitude = DALLAS
+    record_change(db, before, supply_keys(profile), profile)
+    db.commit()
+    incremental = cells(read_heatmap(db, **TEXAS, precision=5))
+
+    rebuild_heatmap(db)
+    assert cells(read_heatmap(db, **TEXAS, precision=5)) == incremental
+    assert cells(read_heatmap(db, **TEXAS, precision=3)) == {
+        "9vg": ({"Medical": {"low": 1}}, {"Medical": 1, "Rescue": 1}),
+        "9vk": ({"Food Logistics": {"high": 1}}, {}),
+    }
+
+
+def test_delta_returns_only_changed_cells(db):
+    dallas = add_request(db, DALLAS)
+    add_request(db, HOUSTON)
+    first = read_heatmap(db, **TEXAS, precision=4)
+    assert first["full"] and len(first["cells"]) == 2
+
+    assert read_heatmap(db, **TEXAS, precision=4, since=first["version"])["cells"] == []
+    before = demand_keys(dallas)
+    dallas.status = "completed"
+    record_change(db, before, demand_keys(dallas), dallas)
+    db.commit()
+    delta = read_heatmap(db, **TEXAS, precision=4, since=first["version"])
+    # The emptied cell is still reported so the client can clear it.
+    assert not delta["full"]
+    assert [(c["cell"], c["demand"]) for c in delta["cells"]] == [("9vg4", {})]
+
+    # Versions are the writes' change_seq values; there is no heatmap clock to contend on.
+    assert delta["version"] == dallas.change_seq == current_version(db)
+
+    # A rebuild invalidates older cursors, and so does a cursor from the future (a restored database).
+    rebuild_heatmap(db)
+    assert read_heatmap(db, **TEXAS, precision=4, since=delta["version"])["full"]
+    assert read_heatmap(db, **TEXAS, precision=4, since=current_version(db) + 1)["full"]
+
+
+def test_zoom_for_viewport_size():
+    assert zoom_for(**TEXAS) == 3
+    assert zoom_for(32.7, 32.9, -96.9, -96.7) == 6
+
+
+def test_heatmap_api():
+    app, _ = load_test.build_inprocess_app(volunteers=20, requests=10)
+    client = TestClient(app)
+    params = {"min_latitude": 25, "max_latitude": 37, "min_longitude": -107, "max_longitude": -93}
+    assert client.get("/heatmap/", params=params, headers={"X-Load-Role": "volunteer"}).status_code == 403
+    assert client.get("/heatmap/", params=dict(params, precision=9)).status_code == 400
+
+    heatmap = client.get("/heatmap/", params=params).json()
+    assert heatmap["precision"] == 3 and heatmap["full"]
+    pending = sum(n for cell in heatmap["cells"] for urgencies in cell["demand"].values() for n in urgencies.values())
+    assert pending == 10
+
+    request_id = client.get("/aid-requests/next", params={"limit": 1}).json()[0]["id"]
+    assert client.put(f"/aid-requests/{request_id}/assign", params={"volunteer_id": 1}).status_code == 200
+    delta = client.get("/heatmap/", params=dict(params, since=heatmap["version"])).json()
+    assert not delta["full"] and len(delta["cells"]) == 1
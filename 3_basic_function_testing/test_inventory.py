@@ -0,0 +1,73 @@
+# 3_basic_function_testing/test_inventory.py
+
+import pytest
+from fastapi.testclient import TestClient
+
+import load_test
+
+NGO = {"X-Load-Role": "ngo"}
+
+
+@pytest.fixture(scope="module")
+def client():
+    app, _ = load_test.build_inprocess_app(volunteers=5, requests=1)
+    return TestClient(app)
+
+
+def create_site(client, name, lat, lon, region=None):
+    response = client.post("/resources/sites", headers=NGO,
+                           json={"name": name, "latitude": lat, "longitude": lon, "region": region})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_movements_update_levels_and_region_totals(client):
+    plano = create_site(client, "Plano Depot", 33.0198, -96.6989, region="North Texas")
+    dallas = create_site(client, "Dallas Depot", 32.7767, -96.7970, region="North Texas")
+    houston = create_site(client, "Houston Depot", 29.7604, -95.3698)
+    assert houston["region"] == houston["geohash"][:3]
+
+    batch = [
+        {"site_id": plano["id"], "item": "Water Bottles", "quantity": 200},
+        {"site_id": dallas["id"], "item": "Water  Bottles", "quantity": 100},
+        {"site_id": dallas["id"], "item": "Blankets", "quantity": 50},
+        {"site_id": houston["id"], "item": "Water Bottles", "quantity": 75},
+        {"site_id": dallas["id"], "item": "Water Bottles", "quantity": -30, "reason": "issued"},
+    ]
+    assert client.post("/resources/movements", headers=NGO, json=batch).json() == {"accepted": 5}
+
+    totals = {(t["region"], t["item"]): t["quantity"] for t in client.get("/resources/regions", headers=NGO).json()}
+    assert totals[("North Texas", "Water Bottles")] == 270
+    assert totals[("North Texas", "Blankets")] == 50
+    assert totals[(houston["region"], "Water Bottles")] == 75
+
+    # Overdrawing rejects the whole batch.
+    overdraw = [{"site_id": plano["id"], "item": "Water Bottles", "quantity": 10},
+                {"site_id": dallas["id"], "item": "Blankets", "quantity": -51}]
+    assert client.post("/resources/movements", headers=NGO, json=overdraw).status_code == 409
+    assert client.post("/resources/movements", headers=NGO,
+                       json=[{"site_id": 9999, "item": "Blankets", "quantity": 1}]).status_code == 404
+    levels = client.get(f"/resources/sites/{plano['id']}/levels", headers=NGO).json()
+    assert levels == [{"site_id": plano["id"], "item": "Water Bottles", "quantity": 200}]
+
+    # Water within 50 km of downtown Dallas: Dallas, then Plano; Houston is too far.
+    nearby = client.get("/resources/nearby", headers=NGO,
+                        params={"latitude": 32.7767, "longitude": -96.7970, "radius_km": 50,
+                                "item": "Water Bottles"}).json()
+    assert [(n["site"]["name"], n["quantity"]) for n in nearby] == [("Dallas Depot", 70), ("Plano Depot", 200)]
+    assert nearby[1]["distance_km"] == pytest.approx(28.5, abs=1.0)
+
+
+def test_only_inventory_managers_record_movements(client):
+    response = client.post("/resources/movements", headers={"X-Load-Role": "volunteer"},
+                           json=[{"site_id": 1, "item": "Blankets", "quantity": 1}])
+    assert response.status_code == 403
+
+
+def test_coordinates_out_of_range_are_rejected(client):
+    response = client.post("/resources/sites", headers=NGO, json={"name": "Nowhere", "latitude": 91, "longitude": 0})
+    assert response.status_code == 422
+    response = client.post("/resources/sites", headers=NGO, json={"name": "Nowhere", "latitude": 0, "longitude": -181})
+    assert response.status_code == 422
+    response = client.get("/resources/nearby", headers=NGO, params={"latitude": 32.7, "longitude": 200})
+    assert response.status_code == 422
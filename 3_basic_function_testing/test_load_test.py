@@ -0,0 +1,47 @@
+# 3_basic_function_testing/test_load_test.py
+
+import asyncio
+
+import httpx
+import pytest
+
+import load_test
+
+
+@pytest.fixture(scope="module")
+def inprocess_app():
+    return load_test.build_inprocess_app(volunteers=20, requests=5)
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert load_test.percentile(values, 50) == 50
+    assert load_test.percentile(values, 95) == 95
+    assert load_test.percentile(values, 99) == 99
+    assert load_test.percentile([], 50) is None
+
+
+def test_parse_mix_rejects_unknown_scenario():
+    assert load_test.parse_mix("match=3,users=1") == [("match", 3.0), ("users", 1.0)]
+    with pytest.raises(ValueError):
+        load_test.parse_mix("match=1,nope=2")
+
+
+@pytest.mark.parametrize("rate", [None, 500.0])
+def test_inprocess_run_reports_every_scenario(inprocess_app, rate):
+    app, ctx = inprocess_app
+    mix = load_test.parse_mix(load_test.DEFAULT_MIX + ",aid-requests-create=5")
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            return await load_test.run_load(client, ctx, mix, total=60, concurrency=4, rate=rate)
+
+    samples, duration = asyncio.run(run())
+    report = load_test.build_report(samples, duration, {"rate": rate})
+
+    assert report["overall"]["requests"] == 60
+    assert report["overall"]["error_rate"] == 0.0
+    for stats in report["scenarios"].values():
+        assert set(stats["latency_ms"]) >= {"p50", "p95", "p99"}
+        assert stats["latency_ms"]["p50"] <= stats["latency_ms"]["p99"]
@@ -0,0 +1,79 @@
+# 3_basic_function_testing/test_metrics.py
+
+import time
+
+from fastapi.testclient import TestClient
+
+import load_test
+import metrics
+from metrics import Histogram, Registry, time_stage
+
+
+def sample(text, prefix):
+    """Value of the first exposition line starting with prefix."""
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"no sample {prefix!r} in /metrics")
+
+
+def test_metrics_endpoint_labels_requests_by_route_template():
+    app, _ = load_test.build_inprocess_app(volunteers=3, requests=2)
+    client = TestClient(app)
+    request_ids = [r["id"] for r in client.get("/aid-requests/").json()]
+    series = 'http_request_duration_seconds_count{method="GET",route="/aid-requests/{request_id}",status="200"}'
+    before = client.get("/metrics").text
+    count = sample(before, series) if series in before else 0
+
+    for request_id in request_ids:
+        assert client.get(f"/aid-requests/{request_id}").status_code == 200
+    client.get("/no-such-path/123")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == metrics.CONTENT_TYPE_LATEST
+    text = response.text
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    # One series per route template, not per concrete path.
+    assert sample(text, series) == count + 2
+    assert f"/aid-requests/{request_ids[0]}" not in text
+    assert 'route="unmatched",status="404"' in text
+    assert sample(text, "http_requests_in_progress ") == 1  # The scrape itself
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = Histogram("demo_seconds", "Demo.", ["stage"], buckets=(0.1, 1.0), registry=registry)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.labels(stage="a").observe(value)
+
+    assert registry.render().splitlines() == [
+        "# HELP demo_seconds Demo.",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{stage="a",le="0.1"} 2',
+        'demo_seconds_bucket{stage="a",le="1"} 3',
+        'demo_seconds_bucket{stage="a",le="+Inf"} 4',
+        'demo_seconds_sum{stage="a"} 3.65',
+        'demo_seconds_count{stage="a"} 4',
+    ]
+
+
+def test_nested_stages_are_recorded_separately():
+    token = metrics._request_stages.set({})
+    try:
+        with time_stage("test_outer"):
+            time.sleep(0.01)
+            with time_stage("test_inner"):
+                time.sleep(0.01)
+            with time_stage("test_inner"):
+                pass
+        stages = metrics.current_stages()
+    finally:
+        metrics._request_stages.reset(token)
+
+    assert set(stages) == {"test_outer", "test_inner"}
+    assert stages["test_outer"] >= stages["test_inner"] >= 0.01
+    text = metrics.render_latest()
+    assert sample(text, 'match_stage_duration_seconds_count{stage="test_inner"}') == 2
+    assert sample(text, 'match_stage_duration_seconds_count{stage="test_outer"}') == 1
+    assert metrics.current_stages() is None
@@ -0,0 +1,129 @@
+# 3_basic_function_testing/test_model_store.py
+
+import numpy as np
+import pytest
+
+import ann_index
+import matching_ai
+import model_store
+from load_test import CITIES, SKILLS, StubGeocoder
+
+
+@pytest.fixture(autouse=True)
+def stub_geocoder(monkeypatch):
+    monkeypatch.setattr(matching_ai, "geolocator", StubGeocoder())
+
+
+def make_volunteers(n, seed=0):
+    rng = np.random.default_rng(seed)
+    cities = list(CITIES)
+    return [{"id": f"v{i}", "skills": SKILLS[rng.integers(len(SKILLS))],
+             "location": cities[rng.integers(len(cities))], "availability": "available"}
+            for i in range(n)]
+
+
+def test_publish_and_hot_swap(tmp_path):
+    store = model_store.ModelStore(str(tmp_path), check_interval=0)
+    assert store.get() is None
+
+    v1 = model_store.publish(model_store.fit_artifacts(make_volunteers(50)), str(tmp_path))
+    assert store.get()["version"] == v1
+    request = {"type": "Medical", "location": "Houston, TX", "urgency": "high"}
+    features = matching_ai.extract_features_request(request, store.current["encoder"])
+    first = model_store.match_with_artifacts(store.current, features)
+    assert first == model_store.match_with_artifacts(store.current, features)
+    assert [c[0] for c in model_store.candidates_with_artifacts(store.current, features)] == [vid for vid, _ in first]
+
+    held = store.current
+    v2 = model_store.publish(model_store.fit_artifacts(make_volunteers(80, seed=1)), str(tmp_path))
+    assert v2 == v1 + 1
+    assert store.get()["version"] == v2
+    # A request holding the old artifacts keeps a consistent view.
+    assert held["version"] == v1
+    assert len(held["volunteer_ids"]) == 50
+
+
+def test_old_versions_are_pruned(tmp_path):
+    artifacts = model_store.fit_artifacts(make_volunteers(10))
+    for _ in range(5):
+        model_store.publish(artifacts, str(tmp_path), keep=2)
+    assert model_store.list_versions(str(tmp_path)) == [4, 5]
+    assert model_store.read_current_version(str(tmp_path)) == 5
+
+
+def test_large_arrays_are_memory_mapped(tmp_path, monkeypatch):
+    monkeypatch.setattr(ann_index, "MATCH_ANN_MIN_POOL", 0)
+    version = model_store.publish(model_store.fit_artifacts(make_volunteers(200), engine="ivf"), str(tmp_path))
+    loaded = model_store.load_artifacts(version, str(tmp_path))
+    assert isinstance(loaded["index"].vectors, np.memmap)
+
+
+def test_sql_matching_ranks_by_composite_score_without_a_scaler(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import load_test
+    import matching
+
+    app, _ = load_test.build_inprocess_app(volunteers=30, requests=5)
+    client = TestClient(app)
+
+    def no_fitting(*args, **kwargs):
+        raise AssertionError("scaler fitted per request")
+
+    monkeypatch.setattr(matching_ai, "StandardScaler", no_fitting)
+    unfitted = client.get("/aid-requests/batch-matches")
+    assert unfitted.status_code == 200
+
+    model_store.publish(model_store.fit_artifacts(make_volunteers(50)), str(tmp_path))
+    monkeypatch.setattr(matching, "model_store", model_store.ModelStore(str(tmp_path), check_interval=0))
+    response = client.get("/aid-requests/batch-matches")
+    assert response.status_code == 200
+    # The published version only supplies the type encoder, so rankings do not change.
+    assert response.json() == unfitted.json()
+    created = client.post("/aid-requests/", headers={"X-Load-Role": "victim"}, json={
+        "type": "Medical", "description": "Insulin", "latitude": 29.76, "longitude": -95.37})
+    assert created.status_code == 200
+
+
+def test_match_reranks_index_candidates_without_reading_their_documents(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import load_test
+    import main
+
+    app, ctx = load_test.build_inprocess_app(volunteers=60, requests=3)
+    client = TestClient(app)
+    volunteers = main.fetch_volunteers("test")
+    model_store.publish(model_store.fit_artifacts(volunteers), str(tmp_path))
+    monkeypatch.setattr(main, "model_store", model_store.ModelStore(str(tmp_path), check_interval=0))
+
+    request_id = ctx["request_ids"][0]
+    request = main.requests_ref.document(request_id).get().to_dict()
+    geocoded, reads = [], []
+    stub = matching_ai.geolocator
+
+    class CountingGeocoder:
+        def geocode(self, address, timeout=10):
+            geocoded.append(address)
+            return stub.geocode(address, timeout)
+
+    def get_all(references):
+        references = list(references)
+        reads.append([ref.id for ref in references])
+        return [ref.get() for ref in references]
+
+    monkeypatch.setattr(matching_ai, "geolocator", CountingGeocoder())
+    monkeypatch.setattr(main.db, "get_all", get_all)
+    response = client.get(f"/match/{request_id}")
+    assert response.status_code == 200
+    matches = response.json()["matched_volunteers"]
+    # Only the request is geocoded, once, and only the three winners are read, together.
+    assert geocoded in ([], [request["location"]])
+    assert reads == [[m["id"] for m in matches]] and len(matches) == 3
+
+    # The same ranking as scoring every volunteer in-process, limited to the index candidates.
+    features = matching_ai.extract_features_request(request)
+    candidates = model_store.candidates_with_artifacts(main.model_store.current, features, matching_ai.MATCH_RERANK_CANDIDATES)
+    by_id = {v["id"]: v for v in volunteers}
+    expected = matching_ai.get_best_matches(features, [by_id[c[0]] for c in candidates], k=3)
+    assert [m["id"] for m in matches] == [m["id"] for m in expected]
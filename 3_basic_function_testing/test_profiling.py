@@ -0,0 +1,86 @@
+# 3_basic_function_testing/test_profiling.py
+
+import asyncio
+import marshal
+import time
+
+import anyio
+import pytest
+from fastapi.testclient import TestClient
+
+import load_test
+from profiling import PROFILER, ProfileMiddleware, Profiler, profiled
+
+
+@pytest.fixture(scope="module")
+def client():
+    app, ctx = load_test.build_inprocess_app(volunteers=200, requests=5)
+    client = TestClient(app)
+    client.ctx = ctx
+    yield client
+    PROFILER.configure(enabled=False)
+
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+@profiled
+def slow_endpoint():
+    busy(0.1)
+
+
+def test_sampler_folds_only_the_profiled_threads_stack():
+    profiler = Profiler(capacity=2, interval=0.001)
+    profiler.configure(enabled=True, sample_rate=1.0)
+
+    async def app(scope, receive, send):
+        await anyio.to_thread.run_sync(slow_endpoint)  # the threadpool hop sync endpoints take
+
+    scope = {"type": "http", "method": "GET", "path": "/slow", "headers": []}
+    asyncio.run(ProfileMiddleware(app, profiler)(scope, None, None))
+
+    [profile] = profiler.profiles
+    folded = profile.folded().splitlines()
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in folded) >= 5
+    # Stacks start at the endpoint: nothing from the threadpool machinery below the wrapper.
+    assert all(line.startswith("test_profiling.slow_endpoint") for line in folded)
+    assert any("test_profiling.busy" in line for line in folded)
+
+
+def test_admin_profiles_one_match_with_cprofile(client):
+    settings = {"enabled": True, "mode": "cprofile", "sample_rate": 1.0, "path": "/match/*", "limit": 1}
+    assert client.put("/admin/profiling", json=settings, headers={"X-Load-Role": "ngo"}).status_code == 403
+    assert client.put("/admin/profiling", json=settings).json()["enabled"] is True
+
+    request_id = client.ctx["request_ids"][0]
+    for _ in range(2):
+        assert client.get(f"/match/{request_id}").status_code == 200
+    assert client.get("/admin/profiling").json()["enabled"] is False  # limit reached
+
+    [summary] = client.get("/admin/profiling/profiles").json()
+    assert summary["route"] == "/match/{request_id}" and summary["status"] == 200
+    assert "volunteer_stream" in summary["stages_ms"]
+
+    detail = client.get(f"/admin/profiling/profiles/{summary['id']}").json()
+    assert "match_volunteers_firebase" in detail["top_functions"][0]["function"]
+    stats = marshal.loads(client.get(f"/admin/profiling/profiles/{summary['id']}/pstats").content)
+    assert any(name == "rank_columns" for _, _, name in stats)
+    assert client.get(f"/admin/profiling/profiles/{summary['id']}/folded").status_code == 404
+
+
+def test_header_selects_requests_for_sampling(client):
+    settings = {"enabled": True, "sample_rate": 0.0, "header_name": "X-Profile", "header_value": "s3cret"}
+    assert client.put("/admin/profiling", json=settings).status_code == 200
+    before = len(PROFILER.profiles)
+
+    client.get("/aid-requests/", headers={"X-Load-Role": "ngo"})
+    client.get("/aid-requests/", headers={"X-Load-Role": "ngo", "X-Profile": "wrong"})
+    assert len(PROFILER.profiles) == before
+
+    client.get("/aid-requests/", headers={"X-Load-Role": "ngo", "X-Profile": "s3cret"})
+    [summary] = client.get("/admin/profiling/profiles").json()[:1]
+    assert summary["mode"] == "sample" and summary["route"] == "/aid-requests/"
+    assert len(PROFILER.profiles) == before + 1
@@ -0,0 +1,81 @@
+# 3_basic_function_testing/test_scheduler.py
+
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+import load_test
+import models
+from scheduler import IndexedHeap, PendingRequestScheduler, URGENCY_HEAD_START
+
+
+def test_indexed_heap_matches_sorted_reference():
+    rng = random.Random(7)
+    heap, reference = IndexedHeap(), {}
+    for step in range(5000):
+        op = rng.random()
+        if op < 0.5 or not reference:
+            item, key = rng.randrange(1000), rng.random()
+            heap.push(item, key)
+            reference[item] = key
+        elif op < 0.7:
+            item = rng.choice(list(reference))
+            assert heap.remove(item)
+            del reference[item]
+        elif op < 0.85:
+            item = rng.choice(list(reference))
+            reference[item] = rng.random()
+            heap.update(item, reference[item])
+        else:
+            item, key = heap.pop()
+            assert key == min(reference.values())
+            del reference[item]
+        assert len(heap) == len(reference)
+    expected = sorted(reference.items(), key=lambda kv: (kv[1], kv[0]))[:25]
+    assert heap.smallest(25) == expected
+
+
+def request(request_id, urgency, minutes_waiting, request_type="food", now=datetime(2026, 1, 1, 12)):
+    return SimpleNamespace(id=request_id, urgency=urgency, type=request_type, status="pending",
+                           created_at=now - timedelta(minutes=minutes_waiting))
+
+
+def test_urgency_first_but_aging_prevents_starvation():
+    scheduler = PendingRequestScheduler()
+    high_wait = URGENCY_HEAD_START["high"] // 60
+    scheduler.add(request(1, "low", 10))
+    scheduler.add(request(2, "high", 0))
+    scheduler.add(request(3, "medium", 5))
+    assert scheduler.next_ids(3) == [2, 3, 1]
+
+    # A low-urgency request that waited longer than the high head start goes first.
+    scheduler.add(request(4, "low", high_wait + 30))
+    assert scheduler.next_ids(1) == [4]
+
+    done = request(2, "high", 0)
+    done.status = "assigned"
+    scheduler.sync(done)
+    assert 2 not in scheduler
+    assert scheduler.pop() == 4
+    assert scheduler.next_ids(10, skip=1) == [1]
+
+
+def test_feed_picks_up_writes_from_other_processes():
+    app, ctx = load_test.build_inprocess_app(volunteers=0, requests=3)
+    client = TestClient(app)
+    feed = [r["id"] for r in client.get("/aid-requests/next").json()]
+    assert len(feed) == 3
+
+    # Another worker (or a script) creates an urgent request and completes one of ours.
+    session = ctx["session_factory"]()
+    urgent = models.AidRequest(requester_id=ctx["user_ids"]["victim"], type="Medical", description="x",
+                               latitude=29.76, longitude=-95.37, urgency="high", status="pending")
+    session.add(urgent)
+    session.get(models.AidRequest, feed[0]).status = "completed"
+    session.commit()
+    urgent_id = urgent.id
+    session.close()
+
+    assert [r["id"] for r in client.get("/aid-requests/next").json()] == [urgent_id] + feed[1:]
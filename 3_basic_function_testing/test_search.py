@@ -0,0 +1,81 @@
+# 3_basic_function_testing/test_search.py
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
+
+import load_test
+import models
+from search import InvertedIndex, _filters, _search_postgresql, analyze
+
+DESCRIPTIONS = [
+    ("medical", "Bleeding out, need a medic", 30.27, -97.74),
+    ("shelter", "House burned down, family of four needs shelter", 30.27, -97.74),
+    ("shelter", "Houses flooded on our street", 29.76, -95.37),
+    ("medical", "Elderly neighbour bleeding from a fall, burns on arm", 29.76, -95.37),
+]
+
+
+@pytest.fixture(scope="module")
+def client():
+    app, _ = load_test.build_inprocess_app(volunteers=5, requests=3)
+    client = TestClient(app)
+    for request_type, description, latitude, longitude in DESCRIPTIONS:
+        response = client.post("/aid-requests/", headers={"X-Load-Role": "victim"}, json={
+            "type": request_type, "description": description, "latitude": latitude, "longitude": longitude})
+        assert response.status_code == 200
+    return client
+
+
+def search(client, **params):
+    response = client.get("/aid-requests/search", params=params, headers={"X-Load-Role": "ngo"})
+    assert response.status_code == 200, response.text
+    return [request["description"] for request in response.json()]
+
+
+def test_analyze_stems_and_drops_stopwords():
+    assert analyze("House burned down; houses BURNING") == ["house", "burn", "down", "house", "burn"]
+    assert analyze("trapped in the flooded basement") == ["trap", "flood", "basement"]
+
+
+def test_index_requires_every_term_and_ranks_with_bm25():
+    index = InvertedIndex()
+    index.built = True
+    index.add(1, "fire fire fire")
+    index.add(2, "fire near the school, water needed")
+    index.add(3, "water")
+    assert [request_id for request_id, _ in index.search("fire")] == [1, 2]
+    assert [request_id for request_id, _ in index.search("fires water")] == [2]
+    index.remove([2])
+    assert index.search("fire water") == [] and len(index) == 2
+
+
+def test_search_endpoint_combines_text_and_filters(client):
+    assert search(client, q="bleeding") == [DESCRIPTIONS[0][1], DESCRIPTIONS[3][1]]
+    # BM25: the shorter description ranks first.
+    assert search(client, q="burn") == [DESCRIPTIONS[3][1], DESCRIPTIONS[1][1]]
+    assert search(client, q="house", type="shelter", min_latitude=29, max_latitude=30,
+                  min_longitude=-96, max_longitude=-95) == [DESCRIPTIONS[2][1]]
+    assert search(client, q="bleeding", status="assigned") == []
+    assert search(client, q="the") == []
+
+    assert client.get("/aid-requests/search", params={"q": "house"},
+                      headers={"X-Load-Role": "volunteer"}).status_code == 403
+    assert client.get("/aid-requests/search", params={"q": "house", "min_latitude": 1},
+                      headers={"X-Load-Role": "ngo"}).status_code == 400
+
+
+def test_postgresql_query_uses_the_indexed_expressions():
+    captured = {}
+
+    class Session:
+        def execute(self, stmt):
+            captured["sql"] = str(stmt.compile(dialect=postgresql.dialect()))
+            raise LookupError
+
+    with pytest.raises(LookupError):
+        _search_postgresql(Session(), "bleeding", _filters(status="pending"), 0, 10)
+    sql = captured["sql"]
+    assert models.SEARCH_VECTOR + " @@ websearch_to_tsquery('english'" in sql
+    # "<%" comes out escaped for the pyformat paramstyle.
+    assert "<%% aid_requests.description" in sql and "aid_requests.status = " in sql
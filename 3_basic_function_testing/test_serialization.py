@@ -0,0 +1,76 @@
+# 3_basic_function_testing/test_serialization.py
+
+import json
+from typing import List
+
+import msgpack
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import load_test
+import models
+import schemas
+from serialization import encode, preferred, rows_payload
+
+
+@pytest.fixture(scope="module")
+def client():
+    app, _ = load_test.build_inprocess_app(volunteers=5, requests=30)
+    return TestClient(app)
+
+
+def test_fast_path_matches_response_model_output():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    users = [models.User(email=f"u{i}@example.com", hashed_password="x", full_name=f"U {i}",
+                         role=models.UserRole.NGO, is_active=True) for i in range(3)]
+    session.add_all(users)
+    session.commit()  # expires the instances: the first read goes through the ORM
+    loaded = session.query(models.User).all()
+
+    adapter = TypeAdapter(List[schemas.User])
+    for rows in (users, loaded):
+        expected = adapter.dump_python(adapter.validate_python(rows, from_attributes=True), mode="json")
+        assert json.loads(encode(rows_payload(schemas.User, rows))) == expected
+
+
+def test_preferred_honours_q_values_and_specificity():
+    offers = ["application/json", "application/msgpack"]
+    assert preferred("*/*", offers) == "application/json"
+    assert preferred("application/msgpack, */*;q=0.8", offers) == "application/msgpack"
+    assert preferred("application/msgpack;q=0.5, application/json", offers) == "application/json"
+    assert preferred("gzip, deflate, br", ["br", "gzip"]) == "br"
+    assert preferred("*, br;q=0", ["br", "gzip"]) == "gzip"
+    assert preferred("identity", ["br", "gzip"]) is None
+    assert preferred(None, ["gzip"]) is None
+
+
+def test_listing_negotiates_msgpack_and_compression(client):
+    headers = {"X-Load-Role": "ngo"}
+    plain = client.get("/aid-requests/", headers={**headers, "Accept-Encoding": "identity"})
+    assert plain.headers["content-type"] == "application/json"
+    assert "content-encoding" not in plain.headers
+
+    packed = client.get("/aid-requests/", headers={**headers, "Accept": "application/msgpack",
+                                                   "Accept-Encoding": "identity"})
+    assert packed.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(packed.content) == plain.json()
+
+    compressed = client.get("/aid-requests/", headers={**headers, "Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["vary"]
+    assert compressed.json() == plain.json()
+
+
+def test_streamed_response_is_compressed_incrementally(client):
+    donations = [{"idempotency_key": f"k{i}", "name": f"Donor {i}", "type": "Money", "detail": "$5"}
+                 for i in range(200)]
+    assert client.post("/donations/", json=donations).status_code == 201
+    streamed = client.get("/donations/stream", headers={"Accept-Encoding": "gzip"})
+    assert streamed.headers["content-encoding"] == "gzip"
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    assert [line["name"] for line in lines] == [d["name"] for d in donations]
@@ -0,0 +1,173 @@
+# 3_basic_function_testing/test_shards.py
+
+import multiprocessing
+import pickle
+import threading
+from multiprocessing.connection import AuthenticationError
+
+import numpy as np
+import pytest
+
+import shards
+from bench_shards import raw_pool, raw_requests
+from matching_ai import rank_by_score, rank_feature_matrix, rerank_candidates
+from shards import (
+    LocalShardWorker, RemoteShardWorker, ShardRouter, StaleGenerationError, serve_shard, start_local_shard_processes,
+)
+
+UNPICKLED = []
+
+
+class Payload:
+    def __reduce__(self):
+        return UNPICKLED.append, ("ran",)
+
+
+def single_pool_ids(X, ids, request, k):
+    _, _, _, indices = rank_feature_matrix(request, X, k)
+    return [ids[i] for i in indices[0]]
+
+
+def test_local_shards_match_single_pool_search():
+    X = raw_pool(3000)
+    ids = np.array([f"v{i}" for i in range(len(X))], dtype=object)
+    router = ShardRouter([LocalShardWorker() for _ in range(4)])
+    sizes = router.load(X, ids)
+    assert sum(sizes) == len(X) and min(sizes) > 0
+    for request in raw_requests(50):
+        assert [vid for vid, _ in router.query(request, k=5)] == single_pool_ids(X, ids, request, 5)
+
+
+def test_request_far_from_everyone_widens_to_all_shards():
+    X = raw_pool(500)
+    ids = np.array([str(i) for i in range(len(X))], dtype=object)
+    router = ShardRouter([LocalShardWorker() for _ in range(3)])
+    router.load(X, ids)
+    request = raw_requests(1)[0]
+    request[:2] = [-45.0, 170.0]  # New Zealand; every volunteer is in the US
+    assert [vid for vid, _ in router.query(request, k=3)] == single_pool_ids(X, ids, request, 3)
+
+
+def test_candidates_carry_the_rows_to_rerank_by_composite_score():
+    X = raw_pool(1000, seed=9)
+    ids = np.array([str(i) for i in range(len(X))], dtype=object)
+    router = ShardRouter([LocalShardWorker() for _ in range(2)])
+    router.load(X, ids)
+    request = raw_requests(1, seed=10)[0]
+    candidates = router.candidates(request, k=12)
+    assert [c[0] for c in candidates] == [vid for vid, _ in router.query(request, k=12)]
+    rows = [int(c[0]) for c in candidates]
+    assert np.allclose([c[1:3] for c in candidates], X[rows, :2], atol=1e-4)
+    assert [c[4] for c in candidates] == list(X[rows, -1] > 0)
+    _, _, top = rank_by_score(request, X[rows], 3)
+    assert [vid for vid, _ in rerank_candidates(request, candidates, 3)] == [str(rows[i]) for i in top]
+
+
+def test_routers_sharing_shards_follow_the_loading_router():
+    X = raw_pool(1500, seed=7)
+    ids = np.array([str(i) for i in range(len(X))], dtype=object)
+    workers = [LocalShardWorker() for _ in range(3)]
+    owner, follower = ShardRouter(workers), ShardRouter(workers)
+    assert follower.sync() is None and not follower.ready
+    owner.load(X, ids)
+    assert follower.sync() == owner.generation
+    request = raw_requests(1, seed=8)[0]
+    assert follower.query(request, k=3) == owner.query(request, k=3)
+
+    # The owner reloads a shifted pool until the follower's generation is evicted;
+    # the follower picks up the owner's generation and scaler instead of mixing them.
+    stale = follower.generation
+    shifted = X.copy()
+    shifted[: len(X) // 2, -1] = 0  # a different scaler
+    for _ in range(shards.VolunteerShard.KEEP_GENERATIONS):
+        owner.load(shifted, ids)
+    with pytest.raises(StaleGenerationError):
+        workers[0].request(("query", stale, np.zeros(X.shape[1], np.float32), 0, 1, None))()
+    assert follower.query(request, k=3) == owner.query(request, k=3)
+    assert follower.generation == owner.generation > stale
+
+
+def test_shard_processes_scatter_gather():
+    X = raw_pool(2000, seed=3)
+    ids = np.array([str(i) for i in range(len(X))], dtype=object)
+    processes, workers = start_local_shard_processes(2)
+    router = ShardRouter(workers)
+    try:
+        router.load(X, ids)
+        for request in raw_requests(20, seed=4):
+            assert [vid for vid, _ in router.query(request, k=3)] == single_pool_ids(X, ids, request, 3)
+    finally:
+        router.close()
+        for p in processes:
+            p.terminate()
+
+
+def test_remote_shards_require_the_key_and_never_unpickle(monkeypatch):
+    monkeypatch.delenv("MATCH_SHARD_AUTHKEY", raising=False)
+    with pytest.raises(RuntimeError):
+        RemoteShardWorker(("127.0.0.1", 1))
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    threading.Thread(target=serve_shard, args=(("127.0.0.1", 0), b"secret", sender), daemon=True).start()
+    address = receiver.recv()
+    with pytest.raises(AuthenticationError):
+        RemoteShardWorker(address, b"wrong")
+
+    monkeypatch.setenv("MATCH_SHARD_AUTHKEY", "secret")
+    worker = RemoteShardWorker(address)
+    conn = worker._acquire()
+    conn.send_bytes(pickle.dumps(Payload()))
+    assert shards.decode_message(conn.recv_bytes())[0] == "error"
+    assert UNPICKLED == []
+    load = worker.request(("load", 1, np.zeros(3), np.ones(3), np.zeros((1, 3), np.float32),
+                           np.ones(1, np.uint16), np.array(["v1"]), np.array(["9vk"])))
+    assert load() == 1
+    # A generation nobody loaded is refused, and the connection stays usable.
+    with pytest.raises(StaleGenerationError):
+        worker.request(("query", 2, np.zeros(3, np.float32), 0, 1, None))()
+    assert worker.request(("publish", 1))() == 1
+    worker.close()
+
+
+def test_reload_swaps_generations_while_queries_run_concurrently():
+    X = raw_pool(2000, seed=5)
+    ids = np.array([str(i) for i in range(len(X))])
+    processes, workers = start_local_shard_processes(2)
+    router = ShardRouter(workers)
+    requests = raw_requests(40, seed=6)
+    try:
+        router.load(X, ids)
+        first = router.generation
+        expected = [[vid for vid, _ in router.query(r, k=3)] for r in requests]
+        results, errors = [], []
+
+        def client(chunk):
+            try:
+                results.extend((i, [vid for vid, _ in router.query(requests[i], k=3)]) for i in chunk)
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+
+        # Queries in flight during a reload of the same pool still get consistent answers.
+        threads = [threading.Thread(target=client, args=(range(i, 40, 4),)) for i in range(4)]
+        for t in threads:
+            t.start()
+        router.load(X, ids)
+        for t in threads:
+            t.join()
+        assert not errors and sorted(results) == list(enumerate(expected))
+        assert router.generation > first
+        # Requests in flight together each get a connection of their own.
+        pending = [workers[0].request(("size",)) for _ in range(3)]
+        sizes = [reply() for reply in pending]
+        assert sizes[0] > 0 and sizes == sizes[:1] * 3
+        assert len(workers[0]._idle) >= 3
+
+        # A volunteer who moves next to a request is found after the next load.
+        moved = X.copy()
+        moved[0, :2] = requests[0][:2]
+        moved[0, 2:9] = requests[0][2:9]
+        router.load(moved, ids)
+        assert router.query(requests[0], k=1)[0][0] == "0"
+    finally:
+        router.close()
+        for p in processes:
+            p.terminate()
@@ -0,0 +1,62 @@
+# 3_basic_function_testing/test_shared_pool.py
+
+import multiprocessing
+
+import numpy as np
+
+import model_store
+from bench_shards import raw_pool, raw_requests
+from matching_ai import rank_feature_matrix
+from shared_pool import PoolSnapshot, SharedPoolReader, build_snapshot, publish_snapshot
+
+
+def publish_pool(pool_dir, n, seed=0):
+    X = raw_pool(n, seed=seed)
+    ids = [f"v{i}" for i in range(n)]
+    return X, ids, publish_snapshot(build_snapshot(X, ids), str(pool_dir))
+
+
+def attach_and_query(pool_dir, request):
+    snapshot = SharedPoolReader(pool_dir).get()
+    return snapshot.generation, isinstance(snapshot.scaled, np.memmap), snapshot.scaled.flags.writeable, \
+        snapshot.query(request, k=3)
+
+
+def test_snapshot_query_matches_single_pool_search(tmp_path):
+    X, ids, generation = publish_pool(tmp_path, 2000)
+    snapshot = PoolSnapshot(generation, str(tmp_path))
+    for request in raw_requests(30):
+        _, _, _, indices = rank_feature_matrix(request, X, 5)
+        assert [vid for vid, _ in snapshot.query(request, k=5)] == [ids[i] for i in indices[0]]
+
+
+def test_reader_swaps_generation_and_old_snapshot_stays_readable(tmp_path):
+    publish_pool(tmp_path, 300)
+    reader = SharedPoolReader(str(tmp_path), check_interval=0)
+    old = reader.get()
+    request = raw_requests(1)[0]
+    before = old.query(request)
+
+    publish_pool(tmp_path, 500, seed=1)
+    publish_pool(tmp_path, 400, seed=2)  # keep=2 removes the generation `old` maps
+    current = reader.get()
+    assert current.generation == old.generation + 2 and len(current) == 400
+    assert old.query(request) == before
+
+
+def test_worker_processes_attach_read_only_to_the_same_snapshot(tmp_path):
+    publish_pool(tmp_path, 1000)
+    request = raw_requests(1)[0]
+    with multiprocessing.get_context("spawn").Pool(2) as pool:
+        results = pool.starmap(attach_and_query, [(str(tmp_path), request)] * 2)
+    assert results[0] == results[1]
+    generation, is_mapped, writeable, _ = results[0]
+    assert generation == 1 and is_mapped and not writeable
+
+
+def test_only_one_owner_per_directory(tmp_path):
+    first = model_store.try_acquire_owner(str(tmp_path))
+    assert first is not None
+    assert model_store.try_acquire_owner(str(tmp_path)) is None
+    first.close()
+    assert model_store.try_acquire_owner(str(tmp_path)) is not None
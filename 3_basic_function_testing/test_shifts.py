@@ -0,0 +1,182 @@
+# 3_basic_function_testing/test_shifts.py
+
+from datetime import datetime, time, timezone
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import load_test
+import models
+from shifts import ShiftIndex, available_clause
+
+# 2026-10-19 is a Monday.
+MONDAY = datetime(2026, 10, 19)
+
+
+def shift(shift_id, volunteer_id, weekday=None, start_time=None, end_time=None, starts_at=None, ends_at=None):
+    return SimpleNamespace(id=shift_id, volunteer_id=volunteer_id, weekday=weekday, start_time=start_time,
+                           end_time=end_time, starts_at=starts_at, ends_at=ends_at)
+
+
+def test_index_handles_overnight_and_week_wrapping_shifts():
+    index = ShiftIndex()
+    index.add(shift(1, 10, weekday=6, start_time=time(22), end_time=time(6)))  # Sunday night into Monday
+    index.add(shift(2, 20, weekday=0, start_time=time(9), end_time=time(17)))
+    index.add(shift(3, 30, starts_at=datetime(2026, 10, 19, 5), ends_at=datetime(2026, 10, 19, 12)))
+
+    assert index.on_shift(MONDAY.replace(hour=5)) == {10, 30}
+    assert index.on_shift(MONDAY.replace(hour=6)) == {30}
+    assert index.on_shift(MONDAY.replace(hour=10)) == {20, 30}
+    assert index.on_shift(MONDAY.replace(hour=9), MONDAY.replace(hour=13)) == {20}
+    assert index.on_shift(datetime(2026, 10, 25, 23)) == {10}
+    # Aware datetimes are converted to UTC.
+    assert index.on_shift(datetime(2026, 10, 26, 10, tzinfo=timezone.utc)) == {20}
+
+    profiles = [SimpleNamespace(id=volunteer_id) for volunteer_id in (10, 20, 30, 40)]
+    assert [p.id for p in index.filter(profiles, MONDAY.replace(hour=10))] == [20, 30, 40]
+    index.remove(3)
+    assert [p.id for p in index.filter(profiles, MONDAY.replace(hour=10))] == [20, 30, 40]
+    index.remove(2)
+    assert [p.id for p in index.filter(profiles, MONDAY.replace(hour=10))] == [20, 30, 40]
+    assert not index.is_scheduled(20) and index.is_scheduled(10)
+
+
+def test_shift_endpoints_and_available_listing():
+    app, _ = load_test.build_inprocess_app(volunteers=3, requests=0)
+    client = TestClient(app)
+    volunteer = {"X-Load-Role": "volunteer"}
+    profile_id = client.get("/volunteers/profile", headers=volunteer).json()["id"]
+
+    assert client.post("/volunteers/profile/shifts", headers=volunteer, json={
+        "weekday": 0, "start_time": "09:00:00", "end_time": "17:00:00",
+        "starts_at": "2026-10-19T09:00:00"}).status_code == 422
+    assert client.post("/volunteers/profile/shifts", headers={"X-Load-Role": "ngo"}, json={
+        "weekday": 0, "start_time": "09:00:00", "end_time": "17:00:00"}).status_code == 403
+    created = client.post("/volunteers/profile/shifts", headers=volunteer, json={
+        "weekday": 0, "start_time": "09:00:00", "end_time": "17:00:00"})
+    assert created.status_code == 200, created.text
+    shift_id = created.json()["id"]
+    assert [s["id"] for s in client.get("/volunteers/profile/shifts", headers=volunteer).json()] == [shift_id]
+
+    def listed(**params):
+        response = client.get("/volunteers/", params=params, headers={"X-Load-Role": "ngo"})
+        assert response.status_code == 200, response.text
+        return [p["id"] for p in response.json()]
+
+    everyone = listed()
+    assert len(everyone) == 3
+    assert profile_id in listed(available_at="2026-10-19T10:00:00")
+    assert profile_id not in listed(available_at="2026-10-19T18:00:00")
+    assert profile_id not in listed(available_at="2026-10-19T16:00:00", available_until="2026-10-19T18:00:00")
+    assert listed(available_at="2026-10-19T18:00:00", limit=1) == [p for p in everyone if p != profile_id][:1]
+    assert client.get("/volunteers/", params={"available_until": "2026-10-19T18:00:00"},
+                      headers={"X-Load-Role": "ngo"}).status_code == 400
+
+    assert client.delete(f"/volunteers/profile/shifts/{shift_id}", headers=volunteer).status_code == 204
+    assert client.delete(f"/volunteers/profile/shifts/{shift_id}", headers=volunteer).status_code == 404
+    assert profile_id in listed(available_at="2026-10-19T18:00:00")
+
+
+def test_batch_matches_skip_volunteers_off_shift():
+    app, _ = load_test.build_inprocess_app(volunteers=1, requests=3)
+    client = TestClient(app)
+    profile_id = client.get("/volunteers/profile", headers={"X-Load-Role": "volunteer"}).json()["id"]
+    client.post("/volunteers/profile/shifts", headers={"X-Load-Role": "volunteer"}, json={
+        "starts_at": "2020-10-19T08:00:00+02:00", "ends_at": "2020-10-19T20:00:00+02:00"})
+
+    def matched(**params):
+        response = client.get("/aid-requests/batch-matches", params=params)
+        assert response.status_code == 200, response.text
+        return {volunteer for match in response.json() for volunteer in match["volunteer_ids"]}
+
+    assert matched(available_at="2020-10-19T07:00:00", available_until="2020-10-19T17:00:00") == {profile_id}
+    assert matched(available_at="2020-10-19T17:00:00", available_until="2020-10-19T19:00:00") == set()
+    assert matched() == set()  # The shift is over by now.
+
+
+def test_index_catches_up_with_shifts_written_by_other_processes():
+    app, ctx = load_test.build_inprocess_app(volunteers=3, requests=0)
+    client = TestClient(app)
+    db = ctx["session_factory"]()
+    profile_ids = [p.id for p in db.query(models.VolunteerProfile).order_by(models.VolunteerProfile.id)]
+    other = ShiftIndex()  # Another worker's copy
+    assert other.refresh(db) == 0
+
+    # Written by this worker: the other one loads it by id.
+    client.post("/volunteers/profile/shifts", headers={"X-Load-Role": "volunteer"}, json={
+        "weekday": 0, "start_time": "09:00:00", "end_time": "17:00:00"})
+    assert other.refresh(db) == 1
+    scheduled = next(p for p in profile_ids if other.is_scheduled(p))
+    assert other.on_shift(MONDAY.replace(hour=10)) == {scheduled}
+
+    # Nothing written since: the refresh reads the sync clock and nothing else.
+    engine = ctx["session_factory"].kw["bind"]
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        assert other.refresh(db) == 0
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert len(statements) == 1 and "sync_clock" in statements[0]
+
+    # A row committed below the highest id seen, then a delete: each stamps the volunteer's profile.
+    late = models.VolunteerShift(id=0, volunteer_id=profile_ids[-1], weekday=0, start_time=time(18), end_time=time(20))
+    db.add(late)
+    db.commit()
+    other.refresh(db)
+    assert other.on_shift(MONDAY.replace(hour=19)) == {profile_ids[-1]}
+    db.delete(late)
+    db.commit()
+    other.refresh(db)
+    assert other.on_shift(MONDAY.replace(hour=19)) == set()
+    db.close()
+
+    def page(after):
+        response = client.get("/volunteers/", headers={"X-Load-Role": "ngo"},
+                              params={"available_at": "2026-10-19T18:00:00", "after": after, "limit": 1})
+        return [p["id"] for p in response.json()]
+
+    # Keyset pages over the volunteers off shift at 18:00.
+    unscheduled = [p for p in profile_ids if p != scheduled]
+    assert page(0) == unscheduled[:1] and page(unscheduled[0]) == unscheduled[1:2] and page(unscheduled[1]) == []
+
+
+def test_available_clause_matches_the_index():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    user = models.User(email="v@example.com", hashed_password="x", role=models.UserRole.VOLUNTEER)
+    db.add(user)
+    db.flush()
+    profiles = [models.VolunteerProfile(user_id=user.id, availability=True) for _ in range(5)]
+    db.add_all(profiles)
+    db.flush()
+    ids = [p.id for p in profiles]
+    db.add_all([
+        models.VolunteerShift(volunteer_id=ids[0], weekday=6, start_time=time(22), end_time=time(6)),
+        models.VolunteerShift(volunteer_id=ids[1], weekday=0, start_time=time(9), end_time=time(17)),
+        models.VolunteerShift(volunteer_id=ids[2], starts_at=datetime(2026, 10, 19, 5), ends_at=datetime(2026, 10, 19, 12)),
+        models.VolunteerShift(volunteer_id=ids[3], weekday=2, start_time=time(8), end_time=time(8)),  # A full day
+    ])
+    profiles[4].availability = False  # No shifts, but flagged off
+    db.commit()
+    index = ShiftIndex()
+    index.rebuild(db)
+
+    windows = [(MONDAY.replace(hour=5), None), (MONDAY.replace(hour=6), None), (MONDAY.replace(hour=10), None),
+               (MONDAY.replace(hour=9), MONDAY.replace(hour=13)), (datetime(2026, 10, 25, 23), None),
+               (datetime(2026, 10, 26, 10, tzinfo=timezone.utc), None), (MONDAY.replace(hour=5), MONDAY.replace(hour=12)),
+               (datetime(2026, 10, 21, 20), datetime(2026, 10, 22, 8)), (MONDAY, MONDAY.replace(day=27))]
+    for start, end in windows:
+        clause = available_clause(start, end)
+        # The window is a few bound values, not a list of the volunteers on shift.
+        assert " IN " not in str(clause.compile(compile_kwargs={"literal_binds": True}))
+        found = {p.id for p in db.query(models.VolunteerProfile).filter(clause)}
+        assert found == index.on_shift(start, end), (start, end)
+    db.close()
@@ -0,0 +1,57 @@
+# 3_basic_function_testing/test_skill_prefilter.py
+
+import numpy as np
+import pytest
+
+import matching_ai
+from load_test import StubGeocoder
+
+
+@pytest.fixture(autouse=True)
+def stub_geocoder(monkeypatch):
+    monkeypatch.setattr(matching_ai, "geolocator", StubGeocoder())
+
+
+def test_parse_skills_handles_lists_case_and_aliases():
+    assert matching_ai.parse_skills("Medical, rescue ,Unknown") == ["Medical", "Rescue"]
+    assert matching_ai.parse_skills(["food", "Shelter Management"]) == ["Food Logistics", "Shelter Management"]
+    assert matching_ai.skills_to_mask("") == 0
+
+
+def test_multi_skill_volunteer_gets_multi_hot_features():
+    features = matching_ai.extract_features_volunteer(
+        {"skills": "Medical,Rescue", "location": "Houston, TX", "availability": "available"})
+    mask = matching_ai.skill_masks_from_features(features)[0]
+    assert mask == matching_ai.SKILL_BITS["Medical"] | matching_ai.SKILL_BITS["Rescue"]
+
+
+def test_matching_only_ranks_qualified_volunteers():
+    volunteers = [
+        {"id": "near-cook", "skills": "Food Logistics", "location": "Houston, TX", "availability": "available"},
+        {"id": "far-medic", "skills": "Medical,Rescue", "location": "El Paso, TX", "availability": "available"},
+        {"id": "near-driver", "skills": "Transportation", "location": "Houston, TX", "availability": "available"},
+    ]
+    request = matching_ai.extract_features_request({"type": "Rescue", "location": "Houston, TX", "urgency": "high"})
+    matches = matching_ai.get_best_matches(request, volunteers, k=3)
+    assert [m["id"] for m in matches] == ["far-medic"]
+
+
+def test_unknown_request_type_ranks_whole_pool():
+    volunteers = [{"id": str(i), "skills": "Medical", "location": "Dallas, TX", "availability": "available"} for i in range(4)]
+    request = matching_ai.extract_features_request({"type": "Crafts", "location": "Dallas, TX"})
+    assert len(matching_ai.get_best_matches(request, volunteers, k=3)) == 3
+    masks = np.array([1, 2, 3], dtype=matching_ai.SKILL_MASK_DTYPE)
+    assert matching_ai.prefilter_by_skill(masks, 0) is None
+    assert matching_ai.prefilter_by_skill(masks, 2).tolist() == [1, 2]
+
+
+def test_matches_ranked_by_km_and_availability():
+    volunteers = [
+        {"id": "dallas", "skills": "Medical", "location": "Dallas, TX", "availability": "available"},
+        {"id": "houston-off", "skills": "Medical", "location": "Houston, TX", "availability": "unavailable"},
+        {"id": "houston", "skills": "Medical", "location": "Houston, TX", "availability": "available"},
+    ]
+    request = matching_ai.extract_features_request({"type": "Medical", "location": "Houston, TX"})
+    matches = matching_ai.get_best_matches(request, volunteers, k=3)
+    assert [m["id"] for m in matches] == ["houston", "houston-off", "dallas"]
+    assert matches[0]["distance_km"] == 0.0 and 300 < matches[2]["distance_km"] < 400
@@ -0,0 +1,157 @@
+# 3_basic_function_testing/test_sync.py
+
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select, update
+
+import load_test
+import models
+from archive import archive_completed
+from sync import backfill_change_seqs
+
+
+@pytest.fixture()
+def app_ctx():
+    app, ctx = load_test.build_inprocess_app(volunteers=3, requests=4)
+    return TestClient(app), ctx
+
+
+def sync(client, role, **params):
+    response = client.get("/sync", params=params, headers={"X-Load-Role": role})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def pull(client, role, since=0, limit=500):
+    """Follow has_more to the end; returns the responses."""
+    pages = [sync(client, role, since=since, limit=limit)]
+    while pages[-1]["has_more"]:
+        pages.append(sync(client, role, since=pages[-1]["version"], limit=limit))
+    return pages
+
+
+def create_request(client, description="Need water"):
+    response = client.post("/aid-requests/", headers={"X-Load-Role": "victim"}, json={
+        "type": "Food Logistics", "description": description, "latitude": 29.76, "longitude": -95.37})
+    return response.json()["id"]
+
+
+def hot_request_ids(ctx):
+    session = ctx["session_factory"]()
+    try:
+        return session.execute(select(models.AidRequest.id)).scalars().all()
+    finally:
+        session.close()
+
+
+def test_delta_contains_only_what_changed(app_ctx):
+    client, _ = app_ctx
+    snapshot = pull(client, "ngo", limit=2)
+    assert snapshot[0]["full"] and len(snapshot) == 4  # 4 requests + 3 profiles, 2 per page
+    assert sum(len(page["aid_requests"]) for page in snapshot) == 4
+    assert sum(len(page["volunteer_profiles"]) for page in snapshot) == 3
+    version = snapshot[-1]["version"]
+    assert sync(client, "ngo", since=version) == {
+        "version": version, "full": False, "has_more": False,
+        "aid_requests": [], "deleted_aid_requests": [], "volunteer_profiles": []}
+
+    first, second = create_request(client), create_request(client)
+    client.put(f"/aid-requests/{first}/status", params={"status": "assigned"})
+    client.put(f"/aid-requests/{first}/status", params={"status": "pending"})
+    delta = sync(client, "ngo", since=version)
+    # Compacted: the twice-updated request appears once, in its current state, after the newer insert.
+    assert [(r["id"], r["status"]) for r in delta["aid_requests"]] == [(second, "pending"), (first, "pending")]
+    assert delta["version"] > version and not delta["full"]
+
+    # Victims only ever see their own requests.
+    own = pull(client, "victim")[0]
+    assert {r["id"] for r in own["aid_requests"]} >= {first, second}
+    assert own["volunteer_profiles"] == []
+
+
+def test_volunteer_sees_assignments_and_loses_requests_taken_by_others(app_ctx):
+    client, ctx = app_ctx
+    session = ctx["session_factory"]()
+    profile_ids = session.execute(select(models.VolunteerProfile.id).order_by(models.VolunteerProfile.id)).scalars().all()
+    session.close()
+    version = pull(client, "volunteer")[-1]["version"]
+
+    mine, theirs = create_request(client), create_request(client)
+    client.put(f"/aid-requests/{mine}/assign", params={"volunteer_id": profile_ids[0]}, headers={"X-Load-Role": "ngo"})
+    # The role user owns every seeded profile; a profile of someone else's takes the other request.
+    session = ctx["session_factory"]()
+    other = models.User(email="other@example.com", hashed_password="x", role=models.UserRole.VOLUNTEER, is_active=True)
+    session.add(other)
+    session.flush()
+    session.execute(update(models.VolunteerProfile).where(models.VolunteerProfile.id == profile_ids[1])
+                    .values(user_id=other.id))
+    session.commit()
+    session.close()
+
+    client.put(f"/aid-requests/{theirs}/assign", params={"volunteer_id": profile_ids[1]}, headers={"X-Load-Role": "ngo"})
+    delta = sync(client, "volunteer", since=version)
+    assert [(r["id"], r["assigned_volunteer_id"]) for r in delta["aid_requests"]] == [(mine, profile_ids[0])]
+    assert delta["deleted_aid_requests"] == [theirs]
+
+
+def test_archived_requests_are_reported_deleted(app_ctx):
+    client, ctx = app_ctx
+    request_id = create_request(client)
+    client.put(f"/aid-requests/{request_id}/status", params={"status": "completed"})
+    version = sync(client, "victim")["version"]
+
+    session = ctx["session_factory"]()
+    try:
+        assert archive_completed(session, older_than=timedelta(0)) == 1
+        # Rows written outside the ORM hook are stamped by the backfill.
+        session.execute(update(models.AidRequest).values(change_seq=None))
+        session.commit()
+        assert backfill_change_seqs(session) == 4
+    finally:
+        session.close()
+
+    delta = sync(client, "victim", since=version)
+    assert delta["deleted_aid_requests"] == [request_id]
+    assert sorted(r["id"] for r in delta["aid_requests"]) == sorted(hot_request_ids(ctx))
+    # A version from the future (e.g. a restored database) gets a full snapshot.
+    assert sync(client, "victim", since=delta["version"] + 100)["full"]
+
+
+def test_changes_committed_between_table_reads_are_not_skipped(app_ctx):
+    client, ctx = app_ctx
+    version = pull(client, "ngo")[-1]["version"]
+    engine = ctx["session_factory"].kw["bind"]
+    writes = []
+
+    def before_profile_read(conn, cursor, statement, parameters, context, executemany):
+        # Another session commits a request (V+1), then a profile change (V+2), after
+        # the reader's request query ran but before its profile query.
+        if writes or "FROM volunteer_profiles" not in statement or "change_seq >" not in statement:
+            return
+        writer = ctx["session_factory"]()
+        try:
+            victim = writer.get(models.User, ctx["user_ids"]["victim"])
+            request = models.AidRequest(requester_id=victim.id, type="Food Logistics", description="late",
+                                        latitude=29.76, longitude=-95.37, status="pending")
+            writer.add(request)
+            writer.commit()
+            profile = writer.execute(select(models.VolunteerProfile)).scalars().first()
+            profile.skills = "Rescue"
+            writer.commit()
+            writes.extend([request.id, profile.id])
+        finally:
+            writer.close()
+
+    event.listen(engine, "before_cursor_execute", before_profile_read)
+    try:
+        racing = sync(client, "ngo", since=version)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_profile_read)
+    assert writes and racing["aid_requests"] == [] and racing["volunteer_profiles"] == []
+    assert racing["version"] == version
+
+    after = sync(client, "ngo", since=racing["version"])
+    assert [r["id"] for r in after["aid_requests"]] == [writes[0]]
+    assert [p["id"] for p in after["volunteer_profiles"]] == [writes[1]]
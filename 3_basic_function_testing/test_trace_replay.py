@@ -0,0 +1,60 @@
+# 3_basic_function_testing/test_trace_replay.py
+
+import asyncio
+import logging
+
+from fastapi.testclient import TestClient
+
+import load_test
+import metrics
+from trace_replay import generate_trace, read_trace_log, replay_trace
+
+TRACE = generate_trace(requests=40, volunteers=12, hours=4, seed=3)
+
+
+def test_replay_sends_the_recorded_assignments():
+    report = asyncio.run(replay_trace(TRACE, policy="replay"))
+    recorded = {event["request"] for event in TRACE if event["event"] == "assign"}
+    assignment = report["assignment"]
+    assert report["overall"]["errors"] == 0 and report["overall"]["requests"] == len(TRACE)
+    assert assignment["assigned"] == len(recorded) and assignment["unmatched"] == 40 - len(recorded)
+    assert assignment["skipped_events"] == 0
+    assert report["calls"]["assign"]["requests"] == len(recorded)
+    assert assignment["travel_km"]["max"] <= 100 and assignment["time_to_assignment_s"]["p50"] >= 0
+    assert report["speedup"] > 1
+
+
+def test_engine_policy_dispatches_from_batch_matches():
+    report = asyncio.run(replay_trace(TRACE, policy="engine", dispatch_interval=300))
+    assignment = report["assignment"]
+    assert report["overall"]["errors"] == 0
+    assert report["calls"]["batch_matches"]["requests"] > 0
+    assert assignment["assigned"] > 0 and assignment["assigned"] + assignment["unmatched"] == 40
+    assert assignment["completed"] == assignment["assigned"]
+    assert assignment["travel_km"]["total"] > 0
+
+
+def test_trace_recorded_from_api_logs_replays(monkeypatch, caplog):
+    app, ctx = load_test.build_inprocess_app(volunteers=0, requests=0)
+    client = TestClient(app)
+    monkeypatch.setattr(metrics, "TRACE_LOG_ENABLED", True)
+    with caplog.at_level(logging.INFO, logger="disaster_relief.trace"):
+        volunteer = client.post("/volunteers/profile", headers={"X-Load-Role": "volunteer"}, json={
+            "skills": "Medical", "current_latitude": 29.76, "current_longitude": -95.37}).json()
+        request = client.post("/aid-requests/", headers={"X-Load-Role": "victim"}, json={
+            "type": "Medical", "description": "Bleeding out", "latitude": 29.8, "longitude": -95.4}).json()
+        client.put(f"/aid-requests/{request['id']}/assign", params={"volunteer_id": volunteer["id"]},
+                   headers={"X-Load-Role": "ngo"})
+        client.put(f"/aid-requests/{request['id']}/status", params={"status": "completed"})
+
+    trace = read_trace_log(["INFO:uvicorn:started"] + [f"INFO:disaster_relief.trace:{record.getMessage()}"
+                                                       for record in caplog.records])
+    assert [event["event"] for event in trace] == ["volunteer", "request", "assign", "complete"]
+    assert trace[0]["t"] == 0 and trace[2] == {"t": trace[2]["t"], "event": "assign",
+                                                "request": request["id"], "volunteer": volunteer["id"]}
+    monkeypatch.setattr(metrics, "TRACE_LOG_ENABLED", False)
+
+    report = asyncio.run(replay_trace(trace, policy="replay"))
+    assert report["overall"]["errors"] == 0
+    assert report["assignment"]["assigned"] == 1 and report["assignment"]["completed"] == 1
+    assert report["assignment"]["travel_km"]["total"] == 5.3
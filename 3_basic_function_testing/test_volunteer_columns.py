@@ -0,0 +1,109 @@
+# 3_basic_function_testing/test_volunteer_columns.py
+
+import gc
+import random
+import tracemalloc
+
+import numpy as np
+import orjson
+
+import matching_ai
+from volunteer_columns import VolunteerColumns, VolunteerColumnsTable
+from volunteer_sync import VolunteerPool
+
+SKILLS = ["Medical", "Rescue, Medical", "Food Logistics", "Shelter Management", "Transportation"]
+
+
+def documents(count, seed=0):
+    rng = random.Random(seed)
+    for i in range(count):
+        location = f"City {i % 300}, TX"
+        data = {"name": f"Volunteer {i}", "skills": rng.choice(SKILLS), "location": location,
+                "availability": "available" if rng.random() < 0.8 else "unavailable",
+                "lat": 29 + rng.random() * 3, "lon": -98 + rng.random() * 3, "geocoded_location": location}
+        # Distinct objects per document, like Firestore's to_dict().
+        yield f"vol{i:06d}", orjson.loads(orjson.dumps(data))
+
+
+def request(skill="Medical"):
+    return matching_ai.extract_features_request(
+        {"type": skill, "location": "x", "geocoded_location": "x", "lat": 30.2, "lon": -97.1})
+
+
+def test_columns_match_like_the_list_of_dicts():
+    volunteers = [dict(data, id=doc_id) for doc_id, data in documents(500)]
+    pool = VolunteerColumns.from_documents(documents(500))
+
+    for skill in ("Medical", "Transportation", "unknown"):
+        expected = matching_ai.get_best_matches(request(skill), volunteers, k=5)
+        assert [match.to_dict() for match in pool.match(request(skill), k=5)] == expected
+
+    assert pool[7] == volunteers[7]
+    np.testing.assert_allclose(pool.feature_matrix(), matching_ai.build_feature_matrix(volunteers), atol=1e-4)
+
+
+def test_columns_without_documents_are_ten_times_smaller():
+    count = 5000
+
+    def traced(build):
+        gc.collect()
+        tracemalloc.start()
+        built = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return built, size
+
+    def dicts():
+        volunteers = [dict(data, id=doc_id) for doc_id, data in documents(count)]
+        return volunteers, matching_ai.build_feature_matrix(volunteers)
+
+    _, dict_bytes = traced(dicts)
+    pool, column_bytes = traced(lambda: VolunteerColumns.from_documents(documents(count), keep_documents=False))
+    assert dict_bytes / column_bytes >= 10
+    assert pool.nbytes < 64 * count
+
+    best = pool.match(request(), k=3)
+    assert [match.to_dict() for match in best] == [
+        {"id": match.id, "distance_km": round(match.distance_km, 2)} for match in best]
+
+
+def test_synced_pool_view_is_columnar():
+    pool = VolunteerPool()
+    pool.apply(dict(documents(50)))
+    view = pool.view()
+    assert len(view.columns) == 50 and view.columns.documents is None
+    assert sorted(v["id"] for v in view.volunteers) == [f"vol{i:06d}" for i in range(50)]
+    assert view.X.shape == (50, 3 + len(matching_ai.KNOWN_SKILLS))
+
+    version = pool.version
+    pool.apply(dict(documents(50)))  # same documents: nothing changes
+    assert pool.version == version
+
+
+def test_columns_table_patches_appends_and_swap_removes():
+    table = VolunteerColumnsTable(capacity=2)
+    expected = {}
+    rng = random.Random(3)
+    snapshots = []
+    for step in range(400):
+        doc_id = f"v{rng.randrange(60)}é"  # non-ASCII ids keep their byte offsets
+        if rng.random() < 0.3:
+            assert table.remove(doc_id) == (expected.pop(doc_id, None) is not None)
+        else:
+            row = (rng.uniform(25, 49), rng.uniform(-124, -67), rng.randrange(1, 32), rng.random() < 0.8)
+            table.set(doc_id, row)
+            expected[doc_id] = row
+        if step % 50 == 0:
+            snapshots.append((table.snapshot(), dict(expected)))
+    snapshots.append((table.snapshot(), dict(expected)))
+
+    # Every snapshot still holds exactly the rows of its moment, whatever changed later.
+    for columns, rows in snapshots:
+        assert len(columns) == len(rows)
+        got = {columns.id(i): (float(columns.latitude[i]), float(columns.longitude[i]),
+                               int(columns.skill_masks[i]), bool(columns.available[i]))
+               for i in range(len(columns))}
+        assert got.keys() == rows.keys()
+        for doc_id, (lat, lon, mask, available) in rows.items():
+            assert np.isclose(got[doc_id][0], lat) and np.isclose(got[doc_id][1], lon)
+            assert got[doc_id][2:] == (mask, available)
@@ -0,0 +1,83 @@
+# 3_basic_function_testing/test_volunteer_sync.py
+
+import time
+
+import pytest
+
+import matching_ai
+import volunteer_sync
+from load_test import StubGeocoder
+from local_firestore import LocalFirestoreClient
+from volunteer_sync import StalePoolError, VolunteerSynchronizer
+
+
+@pytest.fixture(autouse=True)
+def stub_geocoder(monkeypatch):
+    monkeypatch.setattr(matching_ai, "geolocator", StubGeocoder())
+
+
+@pytest.fixture
+def featurized(monkeypatch):
+    calls = []
+
+    def counting(data):
+        calls.append(data.get("name"))
+        return matching_ai.extract_features_volunteer(data)
+    monkeypatch.setattr(volunteer_sync, "extract_features_volunteer", counting)
+    return calls
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for the change feed"
+        time.sleep(0.01)
+
+
+def volunteer(name, location="Houston, TX", skills="Medical"):
+    return {"name": name, "skills": skills, "location": location, "availability": "available"}
+
+
+def test_feed_applies_only_deltas(featurized):
+    collection = LocalFirestoreClient().collection("volunteers")
+    collection.document("a").set(volunteer("a"))
+    collection.document("b").set(volunteer("b"))
+    sync = VolunteerSynchronizer(collection, reconnect_interval=0.05).start()
+    assert sync.wait_ready(5)
+    assert len(sync.pool) == 2 and sync.staleness() == 0.0
+    version = sync.pool.version
+
+    collection.document("c").set(volunteer("c", "Dallas, TX"))
+    collection.document("a").update({"phone": "555-0100"})  # not a matching feature
+    collection.document("b").delete()
+    wait_for(lambda: sync.pool.version == version + 3)
+
+    view = sync.read(max_staleness=1)
+    assert sorted(v["id"] for v in view.volunteers) == ["a", "c"]
+    assert view.X.shape[0] == 2
+    assert sorted(featurized) == ["a", "b", "c"]
+    sync.stop()
+
+
+def test_resubscribe_diffs_instead_of_reloading(featurized):
+    collection = LocalFirestoreClient().collection("volunteers")
+    for name in "abc":
+        collection.document(name).set(volunteer(name))
+    sync = VolunteerSynchronizer(collection, reconnect_interval=0.05).start()
+    assert sync.wait_ready(5)
+    version = sync.pool.version
+
+    sync._watch.close()  # dropped stream
+    assert sync.staleness() > 0
+    collection.document("c").set(volunteer("c", "Austin, TX"))
+    collection.document("d").set(volunteer("d"))
+    time.sleep(0.01)
+    with pytest.raises(StalePoolError):
+        sync.read(max_staleness=0)
+
+    wait_for(lambda: sync.live)
+    assert sync.pool.version == version + 1
+    assert sorted(v["id"] for v in sync.read(max_staleness=0).volunteers) == ["a", "b", "c", "d"]
+    # Only the volunteers that changed while disconnected were featurized again.
+    assert sorted(featurized) == ["a", "b", "c", "c", "d"]
+    sync.stop()
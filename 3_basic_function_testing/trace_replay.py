@@ -0,0 +1,587 @@
+# 3_basic_function_testing/trace_replay.py
+
+"""
+Disaster-day trace replay against the backend API.
+
+A trace is a JSON-lines file of time-stamped events, `t` seconds from the
+start of the trace:
+
+    {"t": 0.0, "event": "volunteer", "volunteer": 7, "skills": "Medical", "availability": true,
+     "latitude": 29.76, "longitude": -95.37}
+    {"t": 42.5, "event": "request", "request": 3, "type": "Medical", "urgency": "high",
+     "latitude": 29.8, "longitude": -95.4}
+    {"t": 300.0, "event": "assign", "request": 3, "volunteer": 7}
+    {"t": 2400.0, "event": "complete", "request": 3}
+
+A volunteer event is the volunteer's full state after a sign-up, location
+update or availability change. Ids are the trace's own; the replay maps them
+to the rows it creates.
+
+The trace is replayed against the in-process app (see load_test.py: SQLite,
+stubbed auth and geocoding). Each volunteer gets a user of their own. Events
+run on a virtual clock, as fast as possible by default or --speed times real
+time. Events for the same request or volunteer run in order; others run up
+to --concurrency at a time. Two policies:
+
+* replay: the trace's assignments and completions are sent as recorded, so
+  the numbers show how the API copes with the recorded day.
+* engine: recorded assignments and completions are ignored. Every
+  --dispatch-interval virtual seconds the dispatcher takes GET
+  /aid-requests/batch-matches and assigns each request its first free
+  proposed volunteer. That volunteer marks themselves unavailable, travels
+  at --travel-kmh, works --service-s seconds, completes the request, and
+  becomes available at its location. This shows how well the matching engine
+  would have done on the day.
+
+The report has throughput and latency percentiles per kind of API call,
+time-to-assignment in virtual seconds, volunteer travel distance, and the
+number of requests still unassigned at the end. Compare two reports to get
+before/after numbers for an engine or configuration change.
+
+Traces come from production or from a generator:
+
+* record: with REPLAY_TRACE_LOG=1 the API logs one JSON line per trace event
+  (metrics.record_trace_event). `record` extracts them from a log file,
+  which may mix other output and several processes, into a trace.
+* generate: a synthetic day in which requests surge a few hours in,
+  volunteers join over the first half of the day and work 8-hour shifts,
+  and a coordinator assigns the nearest free volunteer every few minutes.
+
+Usage:
+    python 3_basic_function_testing/trace_replay.py generate --requests 2000 --volunteers 300 --out day.jsonl
+    python 3_basic_function_testing/trace_replay.py record --log api.log --out day.jsonl
+    python 3_basic_function_testing/trace_replay.py replay day.jsonl --policy engine --report replay_report.json
+"""
+
+import argparse
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import load_test  # noqa: E402
+from load_test import CITIES, SKILLS, percentile, summarize  # noqa: E402
+
+POLICIES = ("replay", "engine")
+EARTH_RADIUS_KM = 6371.0088
+URGENCY_ORDER = {"high": 0, "medium": 1, "low": 2}
+# The generated coordinator's reach, and its preference for skill over distance.
+MAX_DISPATCH_KM = 100.0
+SKILL_DETOUR_KM = 50.0
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def load_trace(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_trace(events, path):
+    with open(path, "w") as f:
+        for event in events:
+            f.write(json.dumps(event) + "\n")
+
+
+def read_trace_log(lines):
+    """Trace events from REPLAY_TRACE_LOG lines among other log output, in time order from t=0."""
+    records = []
+    for line in lines:
+        start = line.find('{"trace"')
+        if start < 0:
+            continue
+        try:
+            record = json.loads(line[start:])
+        except ValueError:
+            continue
+        event, ts = record.pop("trace"), record.pop("ts")
+        records.append((ts, {"event": event, **record}))
+    records.sort(key=lambda record: record[0])
+    if not records:
+        return []
+    t0 = records[0][0]
+    return [{"t": round(ts - t0, 3), **event} for ts, event in records]
+
+
+def generate_trace(requests=1000, volunteers=200, hours=24.0, seed=0, ping_interval=3600.0,
+                   dispatch_interval=300.0, service_s=1800.0, travel_kmh=40.0, shift_hours=8.0):
+    """A synthetic disaster day, with assignments made by a nearest-free-volunteer coordinator."""
+    rng = random.Random(seed)
+    span = hours * 3600
+    cities = list(CITIES.values())
+    events = []
+    queue = []
+    seq = itertools.count()
+
+    def place():
+        lat, lon = rng.choice(cities)
+        return round(lat + rng.uniform(-0.15, 0.15), 5), round(lon + rng.uniform(-0.15, 0.15), 5)
+
+    def schedule(t, kind, key=None):
+        heapq.heappush(queue, (t, next(seq), kind, key))
+
+    def emit_volunteer(t, key):
+        v = crew[key]
+        events.append({"t": round(t, 3), "event": "volunteer", "volunteer": key, "skills": v["skills"],
+                       "availability": v["on_shift"], "latitude": v["latitude"], "longitude": v["longitude"]})
+
+    crew = {}
+    for key in range(1, volunteers + 1):
+        latitude, longitude = place()
+        crew[key] = {"skills": rng.choice(SKILLS), "latitude": latitude, "longitude": longitude,
+                     "on_shift": False, "busy": False}
+        joined = rng.uniform(0, span / 2)
+        schedule(joined, "join", key)
+        schedule(joined + shift_hours * 3600, "leave", key)
+    cases = {}
+    for key in range(1, requests + 1):
+        # Demand surges a few hours in and tails off over the day.
+        schedule(span * rng.betavariate(1.5, 4), "request", key)
+    schedule(dispatch_interval, "dispatch")
+    pending = []
+
+    while queue:
+        t, _, kind, key = heapq.heappop(queue)
+        if kind == "join":
+            crew[key]["on_shift"] = True
+            emit_volunteer(t, key)
+            schedule(t + ping_interval, "ping", key)
+        elif kind == "ping":
+            v = crew[key]
+            if v["on_shift"] and not v["busy"]:
+                v["latitude"] = round(v["latitude"] + rng.uniform(-0.01, 0.01), 5)
+                v["longitude"] = round(v["longitude"] + rng.uniform(-0.01, 0.01), 5)
+                emit_volunteer(t, key)
+            if v["on_shift"]:
+                schedule(t + ping_interval, "ping", key)
+        elif kind == "leave":
+            crew[key]["on_shift"] = False
+            if not crew[key]["busy"]:
+                emit_volunteer(t, key)
+        elif kind == "request":
+            latitude, longitude = place()
+            cases[key] = {"type": rng.choice(SKILLS), "urgency": rng.choices(["low", "medium", "high"], [3, 4, 3])[0],
+                          "latitude": latitude, "longitude": longitude, "created": t}
+            events.append({"t": round(t, 3), "event": "request", "request": key, **{
+                field: cases[key][field] for field in ("type", "urgency", "latitude", "longitude")}})
+            pending.append(key)
+        elif kind == "dispatch":
+            pending.sort(key=lambda r: (URGENCY_ORDER[cases[r]["urgency"]], cases[r]["created"]))
+            for request_key in list(pending):
+                case = cases[request_key]
+                # The nearest free volunteer within reach; a missing skill counts as SKILL_DETOUR_KM more.
+                reach = {v: distance_km(crew[v]["latitude"], crew[v]["longitude"], case["latitude"], case["longitude"])
+                         for v in crew if crew[v]["on_shift"] and not crew[v]["busy"]}
+                reach = {v: km for v, km in reach.items() if km <= MAX_DISPATCH_KM}
+                if not reach:
+                    continue
+                best = min(reach, key=lambda v: reach[v] + (crew[v]["skills"] != case["type"]) * SKILL_DETOUR_KM)
+                crew[best]["busy"] = True
+                case["volunteer"] = best
+                pending.remove(request_key)
+                events.append({"t": round(t, 3), "event": "assign", "request": request_key, "volunteer": best})
+                travel = reach[best] / travel_kmh * 3600
+                schedule(t + travel + rng.expovariate(1 / service_s), "complete", request_key)
+            if t < span:
+                schedule(t + dispatch_interval, "dispatch")
+        elif kind == "complete":
+            case = cases[key]
+            v = crew[case["volunteer"]]
+            events.append({"t": round(t, 3), "event": "complete", "request": key})
+            v["busy"] = False
+            v["latitude"], v["longitude"] = case["latitude"], case["longitude"]
+            emit_volunteer(t, case["volunteer"])
+    return events
+
+
+def _spread(values, digits=1):
+    values = sorted(values)
+    if not values:
+        return {"p50": None, "p95": None, "max": None, "mean": None}
+    return {
+        "p50": round(percentile(values, 50), digits),
+        "p95": round(percentile(values, 95), digits),
+        "max": round(values[-1], digits),
+        "mean": round(sum(values) / len(values), digits),
+    }
+
+
+class TraceReplay:
+    """Replays one trace through an httpx client bound to the in-process app."""
+
+    def __init__(self, client, ctx, policy="engine", speed=0.0, concurrency=16, dispatch_interval=60.0,
+                 dispatch_limit=50, service_s=1800.0, travel_kmh=40.0, drain_s=3600.0):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}")
+        self.client = client
+        self.ctx = ctx
+        self.policy = policy
+        self.speed = speed
+        self.concurrency = concurrency
+        self.dispatch_interval = dispatch_interval
+        self.dispatch_limit = dispatch_limit
+        self.service_s = service_s
+        self.travel_kmh = travel_kmh
+        self.drain_s = drain_s
+        self.requests = {}
+        self.volunteers = {}
+        # Server ids -> trace ids.
+        self.request_keys = {}
+        self.volunteer_keys = {}
+        self.samples = {}
+        self.assignments = []
+        self.skipped = 0
+        self.behind_s = 0.0
+        self._queue = []
+        self._seq = itertools.count()
+        self._last = {}
+        self._inflight = set()
+        self._semaphore = None
+
+    def config(self):
+        return {"policy": self.policy, "speed": self.speed, "concurrency": self.concurrency,
+                "dispatch_interval": self.dispatch_interval, "dispatch_limit": self.dispatch_limit,
+                "service_s": self.service_s, "travel_kmh": self.travel_kmh}
+
+    def prepare(self, trace):
+        """Create a volunteer user for each volunteer in the trace (not timed)."""
+        import models
+
+        session = self.ctx["session_factory"]()
+        try:
+            users = {}
+            for event in trace:
+                key = event.get("volunteer")
+                if event["event"] == "volunteer" and key not in users:
+                    users[key] = models.User(email=f"trace-volunteer-{key}@example.com", hashed_password="x",
+                                             full_name=f"Volunteer {key}", role=models.UserRole.VOLUNTEER,
+                                             is_active=True)
+                    session.add(users[key])
+            session.commit()
+            for key, user in users.items():
+                self.volunteers[key] = {"user_id": user.id, "profile_id": None, "skills": "General Labor",
+                                        "latitude": None, "longitude": None, "available": True, "busy": False}
+        finally:
+            session.close()
+
+    def _schedule(self, t, event):
+        heapq.heappush(self._queue, (t, 0 if event["event"] != "tick" else 1, next(self._seq), event))
+
+    async def _call(self, kind, method, path, user=None, role=None, **kwargs):
+        """Send one request and record its latency under `kind`; returns the JSON body, or None on failure."""
+        headers = {"X-Load-User": str(user)} if user is not None else {"X-Load-Role": role}
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                response = await self.client.request(method, path, headers=headers, **kwargs)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            self.samples.setdefault(kind, []).append((time.perf_counter() - start, ok))
+        return response.json() if ok else None
+
+    def _launch(self, keys, send):
+        """Run `send` after the earlier events of the same requests and volunteers."""
+        previous = [self._last[key] for key in keys if key in self._last]
+
+        async def run():
+            if previous:
+                await asyncio.gather(*previous)
+            await send()
+
+        task = asyncio.create_task(run())
+        for key in keys:
+            self._last[key] = task
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _drain(self):
+        while self._inflight:
+            await asyncio.gather(*list(self._inflight))
+
+    def _profile_body(self, volunteer):
+        return {"skills": volunteer["skills"], "availability": volunteer["available"] and not volunteer["busy"],
+                "current_latitude": volunteer["latitude"], "current_longitude": volunteer["longitude"]}
+
+    def on_request(self, event, t):
+        key = event["request"]
+        state = self.requests[key] = {"id": None, "created": t, "assigned": None, "completed": None,
+                                      "volunteer": None, "latitude": event["latitude"],
+                                      "longitude": event["longitude"]}
+        body = {"type": event.get("type") or "General Labor", "description": event.get("description") or "trace",
+                "latitude": event["latitude"], "longitude": event["longitude"], "urgency": event.get("urgency") or "low"}
+
+        async def send():
+            created = await self._call("create_request", "POST", "/aid-requests/", role="victim", json=body)
+            if created:
+                state["id"] = created["id"]
+                self.request_keys[created["id"]] = key
+
+        self._launch([("request", key)], send)
+
+    def on_volunteer(self, event, t):
+        key = event["volunteer"]
+        volunteer = self.volunteers[key]
+        for field, trace_field in (("skills", "skills"), ("latitude", "latitude"), ("longitude", "longitude"),
+                                   ("available", "availability")):
+            if event.get(trace_field) is not None:
+                volunteer[field] = event[trace_field]
+        body = self._profile_body(volunteer)
+
+        async def send():
+            if volunteer["profile_id"] is None:
+                created = await self._call("volunteer_update", "POST", "/volunteers/profile",
+                                           user=volunteer["user_id"], json=body)
+                if created:
+                    volunteer["profile_id"] = created["id"]
+                    self.volunteer_keys[created["id"]] = key
+            else:
+                await self._call("volunteer_update", "PUT", "/volunteers/profile", user=volunteer["user_id"], json=body)
+
+        self._launch([("volunteer", key)], send)
+
+    def on_assign(self, event, t):
+        if self.policy == "replay":
+            self._assign(event["request"], event["volunteer"], t)
+
+    def on_complete(self, event, t):
+        if self.policy != "replay":
+            return
+        state = self.requests.get(event["request"])
+        if state is None:
+            self.skipped += 1
+            return
+
+        async def send():
+            if state["id"] is None:
+                self.skipped += 1
+                return
+            done = await self._call("complete", "PUT", f"/aid-requests/{state['id']}/status", role="admin",
+                                    params={"status": "completed"})
+            if done:
+                state["completed"] = t
+                volunteer = self.volunteers.get(state["volunteer"])
+                if volunteer is not None:
+                    volunteer["busy"] = False
+
+        self._launch([("request", event["request"])], send)
+
+    def on_finish(self, event, t):
+        # Engine policy: the assigned volunteer completes the request and is free again where it was.
+        key = event["request"]
+        state = self.requests[key]
+        volunteer_key = state["volunteer"]
+        volunteer = self.volunteers[volunteer_key]
+        volunteer["busy"] = False
+        volunteer["latitude"], volunteer["longitude"] = state["latitude"], state["longitude"]
+        body = self._profile_body(volunteer)
+
+        async def send():
+            done = await self._call("complete", "PUT", f"/aid-requests/{state['id']}/status", role="admin",
+                                    params={"status": "completed"})
+            if done:
+                state["completed"] = t
+            await self._call("volunteer_update", "PUT", "/volunteers/profile", user=volunteer["user_id"], json=body)
+
+        self._launch([("request", key), ("volunteer", volunteer_key)], send)
+
+    def _assign(self, request_key, volunteer_key, t):
+        state = self.requests.get(request_key)
+        volunteer = self.volunteers.get(volunteer_key)
+        if state is None or volunteer is None:
+            self.skipped += 1
+            return
+        volunteer["busy"] = True
+        distance = None
+        if volunteer["latitude"] is not None and volunteer["longitude"] is not None:
+            distance = distance_km(volunteer["latitude"], volunteer["longitude"], state["latitude"], state["longitude"])
+
+        async def send():
+            if state["id"] is None or volunteer["profile_id"] is None:
+                self.skipped += 1
+                return
+            assigned = await self._call("assign", "PUT", f"/aid-requests/{state['id']}/assign", role="ngo",
+                                        params={"volunteer_id": volunteer["profile_id"]})
+            if not assigned:
+                return
+            state["volunteer"] = volunteer_key
+            if state["assigned"] is None:
+                state["assigned"] = t
+                self.assignments.append((t - state["created"], distance))
+            if self.policy == "engine":
+                await self._call("volunteer_update", "PUT", f"/volunteers/{volunteer['profile_id']}/availability",
+                                 user=volunteer["user_id"], params={"availability": False})
+                travel = (distance or 0.0) / self.travel_kmh * 3600
+                self._schedule(t + travel + self.service_s, {"event": "finish", "request": request_key})
+
+        self._launch([("request", request_key), ("volunteer", volunteer_key)], send)
+
+    async def dispatch(self, t):
+        """One engine round: assign each proposed request its first free proposed volunteer."""
+        await self._drain()
+        proposals = await self._call("batch_matches", "GET", "/aid-requests/batch-matches", role="ngo",
+                                     params={"limit": self.dispatch_limit})
+        for proposal in proposals or []:
+            request_key = self.request_keys.get(proposal["request_id"])
+            if request_key is None:
+                continue
+            for profile_id in proposal["volunteer_ids"]:
+                volunteer_key = self.volunteer_keys.get(profile_id)
+                if volunteer_key is not None and not self.volunteers[volunteer_key]["busy"]:
+                    self._assign(request_key, volunteer_key, t)
+                    break
+        await self._drain()
+
+    async def run(self, trace):
+        """Replay `trace` and return the report."""
+        self.prepare(trace)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        handlers = {"request": self.on_request, "volunteer": self.on_volunteer, "assign": self.on_assign,
+                    "complete": self.on_complete, "finish": self.on_finish}
+        for event in trace:
+            self._schedule(event["t"], event)
+        t0 = min((event["t"] for event in trace), default=0.0)
+        end = max((event["t"] for event in trace), default=0.0)
+        if self.policy == "engine":
+            self._schedule(t0 + self.dispatch_interval, {"event": "tick"})
+
+        start = time.perf_counter()
+        while self._queue:
+            t, _, _, event = heapq.heappop(self._queue)
+            if self.speed:
+                delay = start + (t - t0) / self.speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.behind_s = max(self.behind_s, -delay)
+            if event["event"] == "tick":
+                await self.dispatch(t)
+                if t + self.dispatch_interval <= end + self.drain_s:
+                    self._schedule(t + self.dispatch_interval, event)
+                continue
+            handler = handlers.get(event["event"])
+            if handler is None:
+                self.skipped += 1
+                continue
+            handler(event, t)
+            # Bound the work queued ahead of the API.
+            if len(self._inflight) >= 4 * self.concurrency:
+                await asyncio.wait(list(self._inflight), return_when=asyncio.FIRST_COMPLETED)
+        await self._drain()
+        return self.report(trace, end - t0, time.perf_counter() - start)
+
+    def report(self, trace, span, wall):
+        all_samples = [sample for group in self.samples.values() for sample in group]
+        created = [state for state in self.requests.values() if state["id"] is not None]
+        distances = [distance for _, distance in self.assignments if distance is not None]
+        return {
+            "config": self.config(),
+            "trace": {"events": len(trace), "requests": len(self.requests), "volunteers": len(self.volunteers),
+                      "span_s": round(span, 1)},
+            "wall_s": round(wall, 3),
+            "speedup": round(span / wall, 1) if wall > 0 else None,
+            "behind_schedule_s": round(self.behind_s, 3) if self.speed else None,
+            "overall": summarize(all_samples, wall),
+            "calls": {kind: summarize(group, wall) for kind, group in sorted(self.samples.items())},
+            "assignment": {
+                "assigned": len(self.assignments),
+                "completed": sum(1 for state in created if state["completed"] is not None),
+                "unmatched": sum(1 for state in created if state["assigned"] is None),
+                "skipped_events": self.skipped,
+                "time_to_assignment_s": _spread([wait for wait, _ in self.assignments]),
+                "travel_km": {**_spread(distances, 2), "total": round(sum(distances), 1)},
+            },
+        }
+
+
+async def replay_trace(trace, policy="engine", geocode_latency_ms=0.0, **options):
+    """Replay `trace` against a fresh in-process app and return the report."""
+    import httpx
+
+    app, ctx = load_test.build_inprocess_app(volunteers=0, requests=0, geocode_latency_ms=geocode_latency_ms)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=60.0) as client:
+        return await TraceReplay(client, ctx, policy=policy, **options).run(trace)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Disaster-day trace replay for the disaster relief API.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="Write a synthetic disaster-day trace.")
+    generate.add_argument("--requests", type=int, default=1000)
+    generate.add_argument("--volunteers", type=int, default=200)
+    generate.add_argument("--hours", type=float, default=24.0)
+    generate.add_argument("--seed", type=int, default=0)
+    generate.add_argument("--out", default="trace.jsonl")
+
+    record = commands.add_parser("record", help="Extract a trace from REPLAY_TRACE_LOG=1 log output.")
+    record.add_argument("--log", nargs="+", required=True, help="Log files; several processes' logs are merged.")
+    record.add_argument("--out", default="trace.jsonl")
+
+    replay = commands.add_parser("replay", help="Replay a trace in-process and write a report.")
+    replay.add_argument("trace")
+    replay.add_argument("--policy", choices=POLICIES, default="engine")
+    replay.add_argument("--speed", type=float, default=0.0,
+                        help="Virtual seconds per wall second; 0 runs as fast as possible.")
+    replay.add_argument("--concurrency", type=int, default=16, help="Maximum API calls in flight.")
+    replay.add_argument("--dispatch-interval", type=float, default=60.0, help="Engine rounds, in virtual seconds.")
+    replay.add_argument("--dispatch-limit", type=int, default=50, help="Requests proposed per engine round.")
+    replay.add_argument("--service-s", type=float, default=1800.0, help="Engine: time on site per request.")
+    replay.add_argument("--travel-kmh", type=float, default=40.0, help="Engine: volunteer travel speed.")
+    replay.add_argument("--geocode-latency-ms", type=float, default=0.0)
+    replay.add_argument("--report", default="replay_report.json")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        events = generate_trace(args.requests, args.volunteers, args.hours, args.seed)
+        write_trace(events, args.out)
+        print(f"{len(events):,} events over {args.hours:g} h written to {args.out}")
+        return
+    if args.command == "record":
+        lines = []
+        for path in args.log:
+            with open(path) as f:
+                lines.extend(f)
+        events = read_trace_log(lines)
+        write_trace(events, args.out)
+        print(f"{len(events):,} events written to {args.out}")
+        return
+
+    report = asyncio.run(replay_trace(
+        load_trace(args.trace), policy=args.policy, geocode_latency_ms=args.geocode_latency_ms, speed=args.speed,
+        concurrency=args.concurrency, dispatch_interval=args.dispatch_interval,
+        dispatch_limit=args.dispatch_limit, service_s=args.service_s, travel_kmh=args.travel_kmh))
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+
+    overall, assignment = report["overall"], report["assignment"]
+    print(f"{report['trace']['events']:,} events ({report['trace']['span_s'] / 3600:.1f} h) "
+          f"replayed in {report['wall_s']:.1f} s ({report['speedup']}x real time), policy {args.policy}")
+    print(f"API: {overall['requests']} calls, {overall['throughput_rps']} req/s, "
+          f"p50 {overall['latency_ms']['p50']} ms, p95 {overall['latency_ms']['p95']} ms, "
+          f"p99 {overall['latency_ms']['p99']} ms, errors {overall['errors']}")
+    for kind, section in report["calls"].items():
+        print(f"  {kind:18} {section['requests']:6} calls  p50 {section['latency_ms']['p50']} ms  "
+              f"p95 {section['latency_ms']['p95']} ms")
+    print(f"Assigned {assignment['assigned']}, unmatched {assignment['unmatched']}, "
+          f"time to assignment p50 {assignment['time_to_assignment_s']['p50']} s / "
+          f"p95 {assignment['time_to_assignment_s']['p95']} s, "
+          f"travel p50 {assignment['travel_km']['p50']} km (total {assignment['travel_km']['total']} km)")
+    print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
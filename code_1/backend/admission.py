@@ -0,0 +1,224 @@
+# 1_code/admission.py
+
+"""
+Admission control for the expensive matching endpoints.
+
+Each endpoint tier has an AdmissionController:
+
+* a concurrency limit. At most `concurrency` matches run at once, so a surge
+  can't multiply the volunteer pools held in memory or thrash the CPU.
+  Throughput under overload stays at what that many matches can deliver.
+* a bounded FIFO wait queue. A request that finds every slot busy waits for
+  one up to its deadline: the tier's max_wait, or the client's own
+  X-Request-Timeout if that is shorter. It is rejected with 503 and
+  Retry-After if the queue is full, if the expected wait (an EWMA of recent
+  service times, times the queue position) already exceeds the deadline,
+  or if the deadline passes while it waits. Work that would time out anyway
+  is never started.
+* per-caller token buckets. A caller (the user of a valid bearer token,
+  else the client address) over its rate gets 429 with Retry-After, before
+  it takes a queue position. Tokens that fail verification count against
+  the address, so rotating made-up tokens doesn't reset the quota.
+
+The controllers run on the event loop: waiting costs a future, not a
+threadpool thread. The matching itself still runs in the threadpool once
+it is admitted.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+
+from fastapi import HTTPException, Request
+from jose import JWTError, jwt
+
+from auth import ALGORITHM, SECRET_KEY
+from metrics import Counter, Gauge, Histogram
+
+# Weight of the newest service time in the moving average used to predict waits.
+SERVICE_TIME_ALPHA = 0.2
+MAX_TRACKED_CALLERS = 10000
+
+ADMISSION_IN_FLIGHT = Gauge("admission_in_flight", "Admitted requests currently running, by endpoint.", ["endpoint"])
+ADMISSION_QUEUE_DEPTH = Gauge("admission_queue_depth", "Requests waiting for a slot, by endpoint.", ["endpoint"])
+ADMISSION_SHED = Counter("admission_shed_total", "Requests rejected by admission control, by endpoint and reason.",
+                         ["endpoint", "reason"])
+ADMISSION_WAIT_SECONDS = Histogram("admission_wait_seconds", "Time admitted requests spent queued, by endpoint.",
+                                   ["endpoint"])
+
+
+class Rejected(Exception):
+    """A request was not admitted; carries the HTTP status and Retry-After seconds."""
+
+    def __init__(self, status_code, retry_after, reason):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def take(self):
+        """Take a token; returns 0 on success, else the seconds until one is available."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+
+class AdmissionController:
+    def __init__(self, name, concurrency, queue_size, max_wait, rate=None, burst=None):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.rate = rate
+        self.burst = burst or rate
+        self.service_time = None
+        self._in_flight = 0
+        self._waiters = deque()
+        self._buckets = OrderedDict()
+
+    def _shed(self, status_code, retry_after, reason):
+        ADMISSION_SHED.labels(endpoint=self.name, reason=reason).inc()
+        return Rejected(status_code, max(1, math.ceil(retry_after)), reason)
+
+    def _expected_wait(self, position):
+        return position * (self.service_time or 0.0) / self.concurrency
+
+    def _take_token(self, caller):
+        if not self.rate:
+            return 0.0
+        bucket = self._buckets.get(caller)
+        if bucket is None:
+            bucket = self._buckets[caller] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > MAX_TRACKED_CALLERS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(caller)
+        return bucket.take()
+
+    def _update_gauges(self):
+        ADMISSION_IN_FLIGHT.labels(endpoint=self.name).set(self._in_flight)
+        ADMISSION_QUEUE_DEPTH.labels(endpoint=self.name).set(len(self._waiters))
+
+    async def acquire(self, caller, timeout=None):
+        """Wait for a slot; raises Rejected if the request should be shed. Pair with release()."""
+        wait = self._take_token(caller)
+        if wait:
+            raise self._shed(429, wait, "quota")
+
+        if self._in_flight < self.concurrency and not self._waiters:
+            self._in_flight += 1
+            self._update_gauges()
+            return
+
+        budget = self.max_wait if timeout is None else min(self.max_wait, timeout)
+        position = len(self._waiters) + 1
+        if len(self._waiters) >= self.queue_size:
+            raise self._shed(503, self._expected_wait(position), "queue_full")
+        if self._expected_wait(position) > budget:
+            raise self._shed(503, self._expected_wait(position), "deadline")
+
+        granted = asyncio.get_running_loop().create_future()
+        self._waiters.append(granted)
+        self._update_gauges()
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), budget)
+        except asyncio.TimeoutError:
+            # release() may have handed over a slot just as the deadline passed.
+            if not granted.done():
+                granted.cancel()
+                self._waiters.remove(granted)
+                raise self._shed(503, self._expected_wait(len(self._waiters) + 1), "deadline")
+        except asyncio.CancelledError:
+            if granted.done() and not granted.cancelled():
+                self.release()
+            else:
+                granted.cancel()
+                self._waiters.remove(granted)
+            raise
+        finally:
+            self._update_gauges()
+        ADMISSION_WAIT_SECONDS.labels(endpoint=self.name).observe(time.monotonic() - start)
+
+    def release(self, service_time=None):
+        """Free a slot, handing it straight to the oldest waiter if there is one."""
+        if service_time is not None:
+            self.service_time = service_time if self.service_time is None else (
+                SERVICE_TIME_ALPHA * service_time + (1 - SERVICE_TIME_ALPHA) * self.service_time)
+        while self._waiters:
+            granted = self._waiters.popleft()
+            if not granted.done():
+                granted.set_result(None)
+                self._update_gauges()
+                return
+        self._in_flight -= 1
+        self._update_gauges()
+
+
+def tier_from_env(prefix, name, concurrency, queue_size, max_wait, rate, burst):
+    """An AdmissionController configured by <prefix>_CONCURRENCY, _QUEUE_SIZE, _MAX_WAIT, _CALLER_RATE, _CALLER_BURST."""
+    def setting(key, default, cast):
+        return cast(os.getenv(f"{prefix}_{key}", default))
+    return AdmissionController(
+        name,
+        concurrency=setting("CONCURRENCY", concurrency, int),
+        queue_size=setting("QUEUE_SIZE", queue_size, int),
+        max_wait=setting("MAX_WAIT", max_wait, float),
+        rate=setting("CALLER_RATE", rate, float),
+        burst=setting("CALLER_BURST", burst, float),
+    )
+
+
+def caller_key(request):
+    """Quota key: the user of a valid bearer token, else the client address."""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            subject = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+        except JWTError:
+            subject = None
+        if subject:
+            return f"user:{subject}"
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+
+def request_timeout(request):
+    """Seconds from X-Request-Timeout; None if absent, not a number or not positive."""
+    try:
+        timeout = float(request.headers.get("x-request-timeout", ""))
+    except ValueError:
+        return None
+    return timeout if 0 < timeout < math.inf else None
+
+
+def admission_dependency(controller):
+    """FastAPI dependency that holds one of the controller's slots for the request's duration."""
+    async def admit(request: Request):
+        try:
+            await controller.acquire(caller_key(request), request_timeout(request))
+        except Rejected as e:
+            raise HTTPException(
+                status_code=e.status_code,
+                detail=f"{controller.name} is overloaded ({e.reason}); retry later",
+                headers={"Retry-After": str(e.retry_after)},
+            )
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            controller.release(time.perf_counter() - start)
+    return admit
@@ -0,0 +1,134 @@
+# 1_code/alerts.py
+
+"""
+Geo-fenced emergency alerts.
+
+An alert targets a circle (center + radius_km) or a polygon. Recipients are
+resolved through the precision-7 geohash stored on each volunteer profile's
+last known location. The geohash cells covering the fence become B-tree range
+scans that fetch only (user_id, lat, lon) columns. The exact circle or
+polygon test then runs vectorized over those candidates, not once per user.
+
+Delivery is a fan-out into alert_deliveries, committed in batches of
+ALERT_FANOUT_BATCH rows with INSERT ... ON CONFLICT DO NOTHING on
+(user_id, dedup_key). Re-sending or widening an alert with the same
+dedup_key only reaches new recipients. Each batch takes its feed_seq values
+from the alert feed's own clock row (sync.next_seqs with ALERT_FEED_CLOCK),
+which hands them out in commit order without waiting on the sync clock, so
+feed_seq is the recipient's feed cursor: clients ask for deliveries after
+the last value they have seen and never miss a batch that committed late.
+"""
+
+import json
+import os
+
+import numpy as np
+from sqlalchemy import and_, or_, select
+
+import models
+from database import dialect_insert
+from geo import (
+    geohash_cover,
+    geohash_cover_bbox,
+    geohash_encode,
+    haversine_km,
+    points_in_polygon,
+    prefix_range,
+)
+from metrics import Counter, time_stage
+from sync import ALERT_FEED_CLOCK, next_seqs
+
+SUBSCRIBER_GEOHASH_PRECISION = 7
+ALERT_FANOUT_BATCH = int(os.getenv("ALERT_FANOUT_BATCH", "5000"))
+
+ALERT_DELIVERIES = Counter("alert_deliveries_total", "Alert deliveries written by the fan-out.")
+
+
+def subscriber_geohash(latitude, longitude):
+    """Geohash stored with a volunteer's last known location (None without a location)."""
+    if latitude is None or longitude is None:
+        return None
+    return geohash_encode(latitude, longitude, SUBSCRIBER_GEOHASH_PRECISION)
+
+
+def fence_cells(alert):
+    """Geohash prefixes covering an alert's circle or polygon."""
+    if alert.radius_km is not None:
+        return geohash_cover(alert.center_latitude, alert.center_longitude, alert.radius_km,
+                             SUBSCRIBER_GEOHASH_PRECISION)
+    vertices = np.asarray(json.loads(alert.polygon), dtype=np.float64)
+    return geohash_cover_bbox(vertices[:, 0].min(), vertices[:, 0].max(),
+                              vertices[:, 1].min(), vertices[:, 1].max())
+
+
+def resolve_recipients(db, alert):
+    """Sorted array of distinct user ids whose last known location is inside the fence."""
+    profile = models.VolunteerProfile
+    ranges = [and_(profile.current_geohash >= low, profile.current_geohash < high)
+              for low, high in map(prefix_range, fence_cells(alert))]
+    with time_stage("alert_candidates"):
+        rows = db.execute(
+            select(profile.user_id, profile.current_latitude, profile.current_longitude)
+            .where(or_(*ranges))
+        ).all()
+    if not rows:
+        return np.empty(0, dtype=np.int64)
+    user_ids, lats, lons = (np.asarray(column) for column in zip(*rows))
+    with time_stage("alert_fence"):
+        if alert.radius_km is not None:
+            inside = haversine_km(alert.center_latitude, alert.center_longitude,
+                                  lats.astype(np.float64), lons.astype(np.float64)) <= alert.radius_km
+        else:
+            inside = points_in_polygon(lats, lons, json.loads(alert.polygon))
+    return np.unique(user_ids[inside].astype(np.int64))
+
+
+def fan_out(db, alert, batch_size=ALERT_FANOUT_BATCH):
+    """
+    Deliver an alert to everyone inside its fence, skipping recipients who
+    already got an alert with the same dedup key. Returns the number of new
+    deliveries.
+    """
+    recipients = resolve_recipients(db, alert)
+    table = models.AlertDelivery.__table__
+    # RETURNING yields only the rows inserted, not the ones skipped as duplicates.
+    stmt = (dialect_insert(db)(table).on_conflict_do_nothing(index_elements=["user_id", "dedup_key"])
+            .returning(table.c.id))
+    delivered = 0
+    with time_stage("alert_fanout"):
+        for start in range(0, len(recipients), batch_size):
+            batch = recipients[start:start + batch_size].tolist()
+            first = next_seqs(db, len(batch), ALERT_FEED_CLOCK)
+            rows = [{"user_id": user_id, "alert_id": alert.id, "dedup_key": alert.dedup_key, "feed_seq": seq}
+                    for seq, user_id in enumerate(batch, first)]
+            delivered += len(db.execute(stmt, rows).all())
+            db.commit()
+    ALERT_DELIVERIES.inc(delivered)
+    return delivered
+
+
+def run_fan_out(session_factory, alert_id):
+    """Background entry point: fan out one alert in its own session and record the outcome."""
+    db = session_factory()
+    try:
+        alert = db.get(models.Alert, alert_id)
+        try:
+            alert.recipient_count = fan_out(db, alert)
+            alert.status = "delivered"
+        except Exception as e:
+            db.rollback()
+            print(f"Error fanning out alert {alert_id}: {e}")
+            alert.status = "failed"
+        db.commit()
+    finally:
+        db.close()
+
+
+def alert_feed(db, user_id, after=0, limit=50):
+    """(feed_seq, Alert) pairs for a user after the cursor, oldest first."""
+    return (db.query(models.AlertDelivery.feed_seq, models.Alert)
+            .join(models.Alert, models.AlertDelivery.alert_id == models.Alert.id)
+            .filter(models.AlertDelivery.user_id == user_id, models.AlertDelivery.feed_seq > after)
+            .order_by(models.AlertDelivery.feed_seq)
+            .limit(limit)
+            .all())
@@ -0,0 +1,178 @@
+# 1_code/ann_index.py
+
+"""
+Nearest-neighbour engines for volunteer matching.
+
+Two engines share one interface, `query(vector, k) -> (distances, indices)`:
+
+  - ExactIndex: scikit-learn NearestNeighbors, the original behaviour.
+  - IVFIndex: an inverted-file index. Volunteers are clustered with k-means into
+    `nlist` cells; a query scans only the `nprobe` cells whose centroids are
+    closest. Larger nprobe trades speed for recall.
+
+The engine is chosen with MATCH_ENGINE ("exact" or "ivf") for indexes built
+once per model version and queried many times (model_store.py);
+ranking a pool loaded for a single request is always exact. Pools smaller than
+MATCH_ANN_MIN_POOL always use the exact engine, since brute force is already
+fast there and IVF training would cost more than it saves.
+`measure_recall` compares any engine against the exact one on the same data.
+"""
+
+import os
+import time
+
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+
+MATCH_ENGINE = os.getenv("MATCH_ENGINE", "exact")
+MATCH_ANN_MIN_POOL = int(os.getenv("MATCH_ANN_MIN_POOL", "20000"))
+MATCH_IVF_NLIST = int(os.getenv("MATCH_IVF_NLIST", "0"))  # 0 = pick from pool size
+MATCH_IVF_NPROBE = int(os.getenv("MATCH_IVF_NPROBE", "4"))
+
+# Rows per block when computing point-to-centroid distances, bounds peak memory.
+_BLOCK_ROWS = 16384
+
+
+def _sq_distances(X, C, C_sq=None):
+    """Squared Euclidean distances between rows of X and rows of C."""
+    if C_sq is None:
+        C_sq = np.einsum('ij,ij->i', C, C)
+    X_sq = np.einsum('ij,ij->i', X, X)[:, None]
+    d = X_sq - 2.0 * (X @ C.T) + C_sq[None, :]
+    np.maximum(d, 0.0, out=d)
+    return d
+
+
+def _assign(X, C):
+    """Index of the nearest centroid for every row of X, computed in blocks."""
+    C_sq = np.einsum('ij,ij->i', C, C)
+    labels = np.empty(len(X), dtype=np.int32)
+    for start in range(0, len(X), _BLOCK_ROWS):
+        block = X[start:start + _BLOCK_ROWS]
+        labels[start:start + len(block)] = np.argmin(_sq_distances(block, C, C_sq), axis=1)
+    return labels
+
+
+def kmeans(X, n_clusters, n_iter=10, seed=0):
+    """Plain Lloyd k-means; empty clusters are re-seeded from random points."""
+    rng = np.random.default_rng(seed)
+    centroids = X[rng.choice(len(X), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        labels = _assign(X, centroids)
+        counts = np.bincount(labels, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, X)
+        nonempty = counts > 0
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+        empty = np.flatnonzero(~nonempty)
+        if len(empty):
+            centroids[empty] = X[rng.choice(len(X), len(empty), replace=False)]
+    return centroids
+
+
+class ExactIndex:
+    """Exact KNN over the full matrix."""
+
+    engine = "exact"
+
+    def __init__(self, X):
+        self.size = len(X)
+        self._nn = NearestNeighbors(metric='euclidean').fit(X)
+
+    def query(self, vector, k=3):
+        k = min(k, self.size)
+        distances, indices = self._nn.kneighbors(np.asarray(vector).reshape(1, -1), n_neighbors=k)
+        return distances[0], indices[0]
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate KNN.
+
+    Rows are stored grouped by cell (`vectors`, with `row_ids` mapping back to
+    the original row) so scanning a cell is one contiguous slice.
+    """
+
+    engine = "ivf"
+
+    def __init__(self, X, nlist=None, nprobe=None, train_size=100000, n_iter=10, seed=0):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        self.size = len(X)
+        self.nlist = min(nlist or MATCH_IVF_NLIST or max(1, int(np.sqrt(self.size))), self.size)
+        self.nprobe = nprobe or MATCH_IVF_NPROBE
+
+        rng = np.random.default_rng(seed)
+        train = X if self.size <= train_size else X[rng.choice(self.size, train_size, replace=False)]
+        self.centroids = kmeans(train, self.nlist, n_iter=n_iter, seed=seed)
+        self._centroid_sq = np.einsum('ij,ij->i', self.centroids, self.centroids)
+
+        labels = _assign(X, self.centroids)
+        order = np.argsort(labels, kind='stable')
+        self.row_ids = order.astype(np.int64)
+        self.vectors = X[order]
+        self.offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=self.nlist), out=self.offsets[1:])
+
+    def query(self, vector, k=3, nprobe=None):
+        q = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        centroid_d = _sq_distances(q, self.centroids, self._centroid_sq)[0]
+        probe = np.argpartition(centroid_d, nprobe - 1)[:nprobe] if nprobe < self.nlist else np.arange(self.nlist)
+
+        starts, ends = self.offsets[probe], self.offsets[probe + 1]
+        positions = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)]) if len(probe) else np.empty(0, np.int64)
+        if len(positions) == 0:
+            return np.empty(0), np.empty(0, dtype=np.int64)
+        diff = self.vectors[positions] - q
+        d = np.einsum('ij,ij->i', diff, diff)
+        k = min(k, len(d))
+        top = np.argpartition(d, k - 1)[:k] if k < len(d) else np.arange(len(d))
+        top = top[np.argsort(d[top])]
+        return np.sqrt(d[top]), self.row_ids[positions[top]]
+
+
+ENGINES = {"exact": ExactIndex, "ivf": IVFIndex}
+
+
+def build_index(X, engine=None, **options):
+    """
+    Build the configured nearest-neighbour engine over the rows of X.
+    Small pools fall back to the exact engine.
+    """
+    engine = engine or MATCH_ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown matching engine '{engine}'. Choose from: {', '.join(ENGINES)}")
+    if engine != "exact" and len(X) < MATCH_ANN_MIN_POOL:
+        engine = "exact"
+    return ENGINES[engine](X, **options)
+
+
+def measure_recall(index, X, queries, k=3, **query_options):
+    """
+    Recall@k of `index` against exact search over the same matrix X.
+
+    A returned neighbour counts as correct when its true distance is within the
+    exact k-th neighbour distance, so ties between identical volunteers (same
+    skill, same city) are not counted as misses.
+    Returns a dict with recall and mean/p99 query latency in milliseconds.
+    """
+    X = np.asarray(X, dtype=np.float32)
+    hits, latencies = 0, []
+    for q in np.asarray(queries, dtype=np.float32):
+        start = time.perf_counter()
+        _, indices = index.query(q, k, **query_options)
+        latencies.append(time.perf_counter() - start)
+
+        true_d = np.einsum('ij,ij->i', X - q, X - q)
+        kth = np.partition(true_d, min(k, len(true_d)) - 1)[min(k, len(true_d)) - 1]
+        found = true_d[np.asarray(indices, dtype=np.int64)]
+        hits += int(np.sum(found <= kth * (1 + 1e-5) + 1e-9))
+    latencies = np.sort(np.array(latencies)) * 1000
+    return {
+        "engine": index.engine,
+        "k": k,
+        "queries": len(latencies),
+        "recall": hits / float(k * len(latencies)),
+        "mean_ms": float(latencies.mean()),
+        "p99_ms": float(latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]),
+    }
@@ -1,13 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 
 from database import get_db
 import models
 import schemas
 from auth import get_current_active_user
-from matching import find_matching_volunteers
+from matching import find_matching_volunteers, match_pending_requests
+from scheduler import pending_scheduler
+from heatmap import demand_keys, record_change
+from etags import list_etag, not_modified, row_etag, set_etag
+from metrics import record_trace_event
+from profiling import profiled
+from search import search_aid_requests, search_index
+from serialization import respond, row_payload, rows_payload
 
 router = APIRouter(
     prefix="/aid-requests",
@@ -32,8 +39,13 @@ def create_aid_request(
         status="pending"
     )
     db.add(db_request)
+    record_change(db, [], demand_keys(db_request), db_request)
     db.commit()
     db.refresh(db_request)
+    pending_scheduler.add(db_request)
+    search_index.add(db_request.id, db_request.description)
+    record_trace_event("request", request=db_request.id, type=db_request.type, urgency=db_request.urgency,
+                       latitude=db_request.latitude, longitude=db_request.longitude)
     
     # Find matching volunteers
     matches = find_matching_volunteers(db, db_request)
@@ -42,38 +54,172 @@ def create_aid_request(
     return db_request
 
 @router.get("/", response_model=List[schemas.AidRequest])
+@profiled
 def read_aid_requests(
+    http_request: Request,
     skip: int = 0,
     limit: int = 100,
     current_user: models.User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
+    # Resolve the page to (id, version) pairs first; an unchanged page is never loaded.
+    versions = models.AidRequest.id, models.AidRequest.version
     if current_user.role == models.UserRole.VICTIM:
-        requests = db.query(models.AidRequest).filter(
+        page = db.query(*versions).filter(
             models.AidRequest.requester_id == current_user.id
-        ).offset(skip).limit(limit).all()
+        ).order_by(models.AidRequest.id).offset(skip).limit(limit).all()
     elif current_user.role == models.UserRole.VOLUNTEER:
-        requests = db.query(models.AidRequest).filter(
-            models.AidRequest.status == "pending"
-        ).offset(skip).limit(limit).all()
+        # Pending requests in priority order (urgency, type and waiting time).
+        pending_scheduler.refresh(db)
+        page = versions_in_order(db, pending_scheduler.next_ids(limit, skip))
     else:  # NGO or ADMIN
-        requests = db.query(models.AidRequest).offset(skip).limit(limit).all()
-    return requests
+        page = db.query(*versions).order_by(models.AidRequest.id).offset(skip).limit(limit).all()
+
+    scope = (current_user.role.value, current_user.id)
+    unchanged = not_modified(http_request, "aid_requests", list_etag("aid-requests", scope, page))
+    if unchanged:
+        return unchanged
+    requests = load_in_order(db, [request_id for request_id, _ in page])
+    return set_etag(respond(http_request, rows_payload(schemas.AidRequest, requests)),
+                    list_etag("aid-requests", scope, [(request.id, request.version) for request in requests]))
+
+def load_in_order(db, request_ids):
+    """Load aid requests by id, preserving the order of request_ids."""
+    if not request_ids:
+        return []
+    rows = db.query(models.AidRequest).filter(models.AidRequest.id.in_(request_ids)).all()
+    by_id = {row.id: row for row in rows}
+    return [by_id[request_id] for request_id in request_ids if request_id in by_id]
+
+def versions_in_order(db, request_ids):
+    """(id, version) of aid requests by id, preserving the order of request_ids."""
+    if not request_ids:
+        return []
+    rows = db.query(models.AidRequest.id, models.AidRequest.version).filter(
+        models.AidRequest.id.in_(request_ids)
+    ).all()
+    by_id = dict(rows)
+    return [(request_id, by_id[request_id]) for request_id in request_ids if request_id in by_id]
+
+@router.get("/next", response_model=List[schemas.AidRequest])
+@profiled
+def read_next_aid_requests(
+    http_request: Request,
+    limit: int = 10,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Volunteer work feed: the highest-priority pending requests."""
+    if current_user.role not in [models.UserRole.VOLUNTEER, models.UserRole.NGO, models.UserRole.ADMIN]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    pending_scheduler.refresh(db)
+    return respond(http_request, rows_payload(schemas.AidRequest, load_in_order(db, pending_scheduler.next_ids(limit))))
+
+@router.get("/batch-matches", response_model=List[schemas.BatchMatch])
+@profiled
+def read_batch_matches(
+    limit: int = 50,
+    available_at: Optional[datetime] = None,
+    available_until: Optional[datetime] = None,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Propose volunteers for pending requests, higher-priority requests picking
+    first. Volunteers must be available now, or at `available_at` (through
+    `available_until` if given) to plan ahead.
+    """
+    if current_user.role not in [models.UserRole.NGO, models.UserRole.ADMIN]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    if available_until is not None and (available_at is None or available_until <= available_at):
+        raise HTTPException(status_code=400, detail="available_until must be after available_at")
+    pending_scheduler.refresh(db)
+    proposals = match_pending_requests(db, pending_scheduler.next_ids(limit), start=available_at, end=available_until)
+    return [
+        {"request_id": request.id, "volunteer_ids": [profile.id for profile in profiles]}
+        for request, profiles in proposals
+    ]
+
+@router.get("/archived", response_model=List[schemas.AidRequest])
+def read_archived_aid_requests(
+    http_request: Request,
+    after: int = 0,
+    limit: int = Query(100, gt=0, le=1000),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Archived (completed) requests in id order; pass the last id as `after` for the next page."""
+    query = db.query(models.AidRequestArchive).filter(models.AidRequestArchive.id > after)
+    if current_user.role == models.UserRole.VICTIM:
+        query = query.filter(models.AidRequestArchive.requester_id == current_user.id)
+    elif current_user.role not in [models.UserRole.NGO, models.UserRole.ADMIN]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    archived = query.order_by(models.AidRequestArchive.id).limit(limit).all()
+    return respond(http_request, rows_payload(schemas.AidRequest, archived))
+
+@router.get("/search", response_model=List[schemas.AidRequest])
+@profiled
+def search_aid_requests_endpoint(
+    http_request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    status: Optional[str] = None,
+    type: Optional[str] = None,
+    min_latitude: Optional[float] = Query(None, ge=-90, le=90),
+    max_latitude: Optional[float] = Query(None, ge=-90, le=90),
+    min_longitude: Optional[float] = Query(None, ge=-180, le=180),
+    max_longitude: Optional[float] = Query(None, ge=-180, le=180),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, gt=0, le=200),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Aid requests whose description matches `q`, best match first, optionally
+    filtered by status, type and a bounding box (all four bounds, or none).
+    """
+    if current_user.role not in [models.UserRole.NGO, models.UserRole.ADMIN]:
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions"
+        )
+    bounds = (min_latitude, max_latitude, min_longitude, max_longitude)
+    if any(bound is None for bound in bounds) and any(bound is not None for bound in bounds):
+        raise HTTPException(status_code=400, detail="Give all four bounding box bounds, or none")
+    bbox = bounds if min_latitude is not None else None
+    if bbox is not None and (min_latitude > max_latitude or min_longitude > max_longitude):
+        raise HTTPException(status_code=400, detail="Bounding box minimum exceeds maximum")
+    request_ids = search_aid_requests(db, q, status=status, request_type=type, bbox=bbox, skip=skip, limit=limit)
+    return respond(http_request, rows_payload(schemas.AidRequest, load_in_order(db, request_ids)))
 
 @router.get("/{request_id}", response_model=schemas.AidRequest)
 def read_aid_request(
     request_id: int,
+    http_request: Request,
     current_user: models.User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    request = db.query(models.AidRequest).filter(models.AidRequest.id == request_id).first()
-    if not request:
+    # Permission and version checks need only these columns; an unchanged request is never loaded.
+    model = models.AidRequest
+    current = db.query(model.requester_id, model.version).filter(model.id == request_id).first()
+    if not current:
+        # Completed requests may have been moved out of the hot table.
+        model = models.AidRequestArchive
+        current = db.query(model.requester_id, model.version).filter(model.id == request_id).first()
+    if not current:
         raise HTTPException(status_code=404, detail="Aid request not found")
     
-    if current_user.role == models.UserRole.VICTIM and request.requester_id != current_user.id:
+    if current_user.role == models.UserRole.VICTIM and current.requester_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    return request
+    unchanged = not_modified(http_request, "aid_request", row_etag("aid-request", request_id, current.version))
+    if unchanged:
+        return unchanged
+    # Archiving keeps the version, so a request moved in between is still served with a valid tag.
+    request = db.get(model, request_id) or db.get(models.AidRequestArchive, request_id)
+    if not request:
+        raise HTTPException(status_code=404, detail="Aid request not found")
+    return set_etag(respond(http_request, row_payload(schemas.AidRequest, request)),
+                    row_etag("aid-request", request.id, request.version))
 
 @router.put("/{request_id}/status", response_model=schemas.AidRequest)
 def update_request_status(
@@ -99,12 +245,17 @@ def update_request_status(
         if request.assigned_volunteer_id != volunteer_profile.id:
             raise HTTPException(status_code=403, detail="Not assigned to this request")
     
+    before = demand_keys(request)
     request.status = status
     if status == "completed":
         request.assigned_volunteer_id = None
+    record_change(db, before, demand_keys(request), request)
     
     db.commit()
     db.refresh(request)
+    pending_scheduler.sync(request)
+    if status == "completed":
+        record_trace_event("complete", request=request.id)
     return request
 
 @router.put("/{request_id}/assign", response_model=schemas.AidRequest)
@@ -127,9 +278,13 @@ def assign_volunteer(
     if not volunteer_profile:
         raise HTTPException(status_code=404, detail="Volunteer profile not found")
     
+    before = demand_keys(request)
     request.assigned_volunteer_id = volunteer_id
     request.status = "assigned"
+    record_change(db, before, demand_keys(request), request)
     
     db.commit()
     db.refresh(request)
+    pending_scheduler.remove(request.id)
+    record_trace_event("assign", request=request.id, volunteer=volunteer_id)
     return request 
\ No newline at end of file
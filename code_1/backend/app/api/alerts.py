@@ -0,0 +1,76 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session, sessionmaker
+import json
+
+from database import get_db
+import models
+import schemas
+from auth import get_current_active_user
+from alerts import alert_feed, run_fan_out
+
+router = APIRouter(
+    prefix="/alerts",
+    tags=["alerts"]
+)
+
+@router.post("/", response_model=schemas.Alert, status_code=status.HTTP_202_ACCEPTED)
+def create_alert(
+    alert: schemas.AlertCreate,
+    background_tasks: BackgroundTasks,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Create a geo-fenced alert. Delivery to everyone inside the fence runs in
+    the background; poll GET /alerts/{id} for status and recipient_count.
+    """
+    if current_user.role not in [models.UserRole.NGO, models.UserRole.ADMIN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only NGOs and admins can send alerts"
+        )
+
+    data = alert.dict()
+    if data["polygon"] is not None:
+        data["polygon"] = json.dumps(data["polygon"])
+    db_alert = models.Alert(**data, status="pending", recipient_count=0, created_by=current_user.id)
+    db.add(db_alert)
+    db.flush()
+    if not db_alert.dedup_key:
+        db_alert.dedup_key = f"alert-{db_alert.id}"
+    db.commit()
+    db.refresh(db_alert)
+
+    # The fan-out gets its own session; the request's session closes with the response.
+    background_tasks.add_task(run_fan_out, sessionmaker(bind=db.get_bind()), db_alert.id)
+    return db_alert
+
+@router.get("/feed", response_model=schemas.AlertFeed)
+def read_alert_feed(
+    after: int = 0,
+    limit: int = Query(50, gt=0, le=500),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Alerts delivered to the current user after the `after` cursor, oldest first."""
+    rows = alert_feed(db, current_user.id, after, limit)
+    return {
+        "alerts": [{"cursor": cursor, "alert": alert} for cursor, alert in rows],
+        "next_cursor": rows[-1][0] if rows else after,
+    }
+
+@router.get("/{alert_id}", response_model=schemas.Alert)
+def read_alert(
+    alert_id: int,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.role not in [models.UserRole.NGO, models.UserRole.ADMIN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    alert = db.get(models.Alert, alert_id)
+    if alert is None:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    return alert
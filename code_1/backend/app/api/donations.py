@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, sessionmaker
+from typing import List, Optional
+
+from database import get_db
+import models
+import schemas
+from auth import get_current_active_user
+from donations import donation_totals, donations_after, record_donations, stream_donations
+from serialization import respond, rows_payload
+
+router = APIRouter(
+    prefix="/donations",
+    tags=["donations"]
+)
+
+@router.post("/", response_model=schemas.DonationBatchResult, status_code=201)
+def create_donations(
+    donations: List[schemas.DonationCreate],
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Record a batch of donations. Each carries a client-chosen idempotency_key;
+    resending a batch (or part of one) does not record anything twice.
+    """
+    accepted, duplicates = record_donations(db, donations, donor_id=current_user.id)
+    return {"accepted": accepted, "duplicates": duplicates}
+
+@router.get("/", response_model=schemas.DonationPage)
+def read_donations(
+    request: Request,
+    after: int = 0,
+    limit: int = Query(100, gt=0, le=1000),
+    type: Optional[str] = None,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Donations after the `after` cursor, oldest first; pass next_cursor back to continue."""
+    donations = donations_after(db, after, limit, type)
+    return respond(request, {"donations": rows_payload(schemas.Donation, donations),
+                             "next_cursor": donations[-1].log_seq if donations else after})
+
+@router.get("/stream")
+def stream_all_donations(
+    after: int = 0,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Every donation after the cursor as newline-delimited JSON."""
+    # The stream outlives the request's session, so it reads on its own.
+    return StreamingResponse(stream_donations(sessionmaker(bind=db.get_bind()), after),
+                             media_type="application/x-ndjson")
+
+@router.get("/totals", response_model=List[schemas.DonationTotal])
+def read_donation_totals(
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Running count and amount per donation type."""
+    return donation_totals(db)
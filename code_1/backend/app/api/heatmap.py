@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from database import get_db
+import models
+import schemas
+from auth import get_current_active_user
+from heatmap import HEATMAP_PRECISIONS, read_heatmap
+
+router = APIRouter(
+    prefix="/heatmap",
+    tags=["heatmap"]
+)
+
+@router.get("/", response_model=schemas.Heatmap)
+def read_demand_supply_heatmap(
+    min_latitude: float = Query(..., ge=-90, le=90),
+    max_latitude: float = Query(..., ge=-90, le=90),
+    min_longitude: float = Query(..., ge=-180, le=180),
+    max_longitude: float = Query(..., ge=-180, le=180),
+    precision: Optional[int] = None,
+    since: int = 0,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Pending demand and available supply per geohash cell in the viewport.
+    Without `precision`, the finest zoom level that keeps the response small
+    is used. Pass the previous response's `version` as `since` to receive
+    only the cells that changed; `full` is true when everything was sent.
+    """
+    if current_user.role not in [models.UserRole.NGO, models.UserRole.ADMIN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    if min_latitude > max_latitude or min_longitude > max_longitude:
+        raise HTTPException(status_code=400, detail="Viewport minimum exceeds maximum")
+    if precision is not None and precision not in HEATMAP_PRECISIONS:
+        raise HTTPException(status_code=400, detail=f"precision must be one of {list(HEATMAP_PRECISIONS)}")
+    return read_heatmap(db, min_latitude, max_latitude, min_longitude, max_longitude, precision, since)
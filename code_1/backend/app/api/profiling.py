@@ -0,0 +1,72 @@
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from typing import List
+
+import models
+import schemas
+from auth import get_current_active_user
+from profiling import ADMIN_PREFIX, PROFILER
+
+router = APIRouter(
+    prefix=ADMIN_PREFIX,
+    tags=["admin"]
+)
+
+def require_admin(current_user: models.User = Depends(get_current_active_user)):
+    if current_user.role != models.UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return current_user
+
+def get_profile(profile_id: int):
+    profile = PROFILER.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found (it may have left the ring buffer)")
+    return profile
+
+@router.get("", response_model=schemas.ProfilingSettings)
+def read_profiling_settings(current_user: models.User = Depends(require_admin)):
+    return PROFILER.settings()
+
+@router.put("", response_model=schemas.ProfilingSettings)
+def update_profiling_settings(
+    settings: schemas.ProfilingSettings,
+    current_user: models.User = Depends(require_admin)
+):
+    """
+    Turn request profiling on or off in this process. Requests carrying
+    `header_name: header_value` are always profiled; otherwise a
+    `sample_rate` fraction of the requests whose path matches `path` is.
+    After `limit` profiles, profiling turns itself off.
+    """
+    print(f"Profiling settings changed by user {current_user.id}: {settings.dict()}")
+    PROFILER.configure(**settings.dict())
+    return PROFILER.settings()
+
+@router.get("/profiles", response_model=List[schemas.ProfileSummary])
+def read_profiles(current_user: models.User = Depends(require_admin)):
+    """The profiles in the ring buffer, newest first."""
+    return [profile.summary() for profile in reversed(list(PROFILER.profiles))]
+
+@router.get("/profiles/{profile_id}", response_model=schemas.ProfileDetail)
+def read_profile(profile_id: int, current_user: models.User = Depends(require_admin)):
+    profile = get_profile(profile_id)
+    return dict(profile.summary(), top_functions=profile.top_functions())
+
+@router.get("/profiles/{profile_id}/folded")
+def read_profile_folded(profile_id: int, current_user: models.User = Depends(require_admin)):
+    """Folded stacks of a sample-mode profile, for flamegraph.pl, speedscope or inferno."""
+    profile = get_profile(profile_id)
+    if profile.mode != "sample":
+        raise HTTPException(status_code=404, detail="Only sample-mode profiles have folded stacks")
+    return Response(content=profile.folded(), media_type="text/plain")
+
+@router.get("/profiles/{profile_id}/pstats")
+def read_profile_pstats(profile_id: int, current_user: models.User = Depends(require_admin)):
+    """cProfile stats of a cprofile-mode profile, loadable with pstats or snakeviz."""
+    profile = get_profile(profile_id)
+    if profile.stats is None:
+        raise HTTPException(status_code=404, detail="Only cprofile-mode profiles have pstats")
+    return Response(content=profile.pstats_dump(), media_type="application/octet-stream",
+                    headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.pstats"'})
@@ -0,0 +1,111 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from database import get_db
+import models
+import schemas
+from auth import get_current_active_user
+from inventory import (
+    InsufficientStockError,
+    create_site,
+    record_movements,
+    region_totals,
+    stock_within,
+)
+
+router = APIRouter(
+    prefix="/resources",
+    tags=["resources"]
+)
+
+def require_inventory_manager(current_user: models.User):
+    if current_user.role not in [models.UserRole.NGO, models.UserRole.ADMIN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only NGOs and admins can manage inventory"
+        )
+
+@router.post("/sites", response_model=schemas.ResourceSite)
+def create_resource_site(
+    site: schemas.ResourceSiteCreate,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    require_inventory_manager(current_user)
+    return create_site(db, site.name, site.latitude, site.longitude, site.region)
+
+@router.get("/sites", response_model=List[schemas.ResourceSite])
+def read_resource_sites(
+    skip: int = 0,
+    limit: int = 100,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    return db.query(models.ResourceSite).order_by(models.ResourceSite.id).offset(skip).limit(limit).all()
+
+@router.get("/sites/{site_id}/levels", response_model=List[schemas.InventoryLevel])
+def read_site_levels(
+    site_id: int,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    if db.get(models.ResourceSite, site_id) is None:
+        raise HTTPException(status_code=404, detail="Resource site not found")
+    return db.query(models.InventoryLevel).filter(
+        models.InventoryLevel.site_id == site_id
+    ).order_by(models.InventoryLevel.item).all()
+
+@router.post("/movements", response_model=schemas.MovementBatchResult)
+def ingest_movements(
+    movements: List[schemas.StockMovementCreate],
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Record a batch of stock movements (positive quantities are receipts,
+    negative ones are issues). The batch is applied atomically.
+    """
+    require_inventory_manager(current_user)
+    try:
+        accepted = record_movements(db, movements)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except InsufficientStockError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"accepted": accepted}
+
+@router.get("/regions", response_model=List[schemas.RegionInventoryTotal])
+def read_region_totals(
+    item: Optional[str] = None,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Stock per region and item, read from the materialized totals."""
+    return region_totals(db, item)
+
+@router.get("/nearby", response_model=List[schemas.NearbyStock])
+def read_nearby_stock(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(50.0, gt=0),
+    item: Optional[str] = None,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """In-stock items within radius_km of a point, nearest site first."""
+    return [
+        {"site": site, "item": level.item, "quantity": level.quantity, "distance_km": round(distance, 2)}
+        for site, level, distance in stock_within(db, latitude, longitude, radius_km, item)
+    ]
+
+@router.get("/inventory", response_model=List[schemas.InventoryItem])
+def read_inventory(
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Flat in-stock list in the shape the mobile app's resource screen uses."""
+    rows = db.query(models.InventoryLevel, models.ResourceSite).join(
+        models.ResourceSite, models.InventoryLevel.site_id == models.ResourceSite.id
+    ).filter(models.InventoryLevel.quantity > 0).order_by(models.ResourceSite.name, models.InventoryLevel.item).all()
+    return [{"name": level.item, "quantity": level.quantity, "location": site.name} for level, site in rows]
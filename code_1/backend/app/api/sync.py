@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.orm import Session
+
+from database import get_db
+import models
+import schemas
+from auth import get_current_active_user
+from serialization import respond, rows_payload
+from sync import SYNC_BATCH, SYNC_MAX_BATCH, read_changes
+
+router = APIRouter(
+    prefix="/sync",
+    tags=["sync"]
+)
+
+@router.get("", response_model=schemas.SyncChanges)
+def read_sync_changes(
+    request: Request,
+    since: int = 0,
+    limit: int = Query(SYNC_BATCH, gt=0, le=SYNC_MAX_BATCH),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Aid requests and volunteer profiles changed since the `version` of the
+    previous response, oldest change first. Omit `since` for a full snapshot.
+    While `has_more` is true, call again with the new `version`.
+    """
+    changes = read_changes(db, current_user, since, limit)
+    changes["aid_requests"] = rows_payload(schemas.AidRequest, changes["aid_requests"])
+    changes["volunteer_profiles"] = rows_payload(schemas.VolunteerProfile, changes["volunteer_profiles"])
+    return respond(request, changes)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from typing import List
 from datetime import timedelta
@@ -13,6 +13,9 @@ from auth import (
     get_current_active_user,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from etags import not_modified, row_etag, set_etag
+from profiling import profiled
+from serialization import respond, row_payload, rows_payload
 
 router = APIRouter(
     prefix="/users",
@@ -62,11 +65,20 @@ def login_for_access_token(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=schemas.User)
-def read_users_me(current_user: models.User = Depends(get_current_active_user)):
-    return current_user
+def read_users_me(
+    request: Request,
+    current_user: models.User = Depends(get_current_active_user)
+):
+    etag = row_etag("user", current_user.id, current_user.version)
+    unchanged = not_modified(request, "users_me", etag)
+    if unchanged:
+        return unchanged
+    return set_etag(respond(request, row_payload(schemas.User, current_user)), etag)
 
 @router.get("/", response_model=List[schemas.User])
+@profiled
 def read_users(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     current_user: models.User = Depends(get_current_active_user),
@@ -78,7 +90,7 @@ def read_users(
             detail="Not enough permissions"
         )
     users = db.query(models.User).offset(skip).limit(limit).all()
-    return users
+    return respond(request, rows_payload(schemas.User, users))
 
 @router.put("/me", response_model=schemas.User)
 def update_user(
@@ -1,18 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 
 from database import get_db
 import models
 import schemas
 from auth import get_current_active_user
+from alerts import subscriber_geohash
+from heatmap import record_change, supply_keys
+from etags import not_modified, row_etag, set_etag
+from metrics import record_trace_event
+from profiling import profiled
+from serialization import respond, row_payload, rows_payload
+from shifts import available_clause, shift_index
 
 router = APIRouter(
     prefix="/volunteers",
     tags=["volunteers"]
 )
 
+def trace_profile(profile):
+    record_trace_event("volunteer", volunteer=profile.id, skills=profile.skills, availability=profile.availability,
+                       latitude=profile.current_latitude, longitude=profile.current_longitude)
+
 @router.post("/profile", response_model=schemas.VolunteerProfile)
 def create_volunteer_profile(
     profile: schemas.VolunteerProfileCreate,
@@ -39,13 +50,17 @@ def create_volunteer_profile(
         **profile.dict(),
         user_id=current_user.id
     )
+    db_profile.current_geohash = subscriber_geohash(db_profile.current_latitude, db_profile.current_longitude)
     db.add(db_profile)
+    record_change(db, [], supply_keys(db_profile), db_profile)
     db.commit()
     db.refresh(db_profile)
+    trace_profile(db_profile)
     return db_profile
 
 @router.get("/profile", response_model=schemas.VolunteerProfile)
 def read_volunteer_profile(
+    request: Request,
     current_user: models.User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -55,15 +70,27 @@ def read_volunteer_profile(
             detail="Only volunteers can access profiles"
         )
     
-    profile = db.query(models.VolunteerProfile).filter(
+    # Check the version first; an unchanged profile is never loaded.
+    current = db.query(models.VolunteerProfile.id, models.VolunteerProfile.version).filter(
         models.VolunteerProfile.user_id == current_user.id
     ).first()
+    if not current:
+        raise HTTPException(
+            status_code=404,
+            detail="Profile not found"
+        )
+    unchanged = not_modified(request, "volunteer_profile", row_etag("volunteer_profile", current.id, current.version))
+    if unchanged:
+        return unchanged
+    
+    profile = db.get(models.VolunteerProfile, current.id)
     if not profile:
         raise HTTPException(
             status_code=404,
             detail="Profile not found"
         )
-    return profile
+    return set_etag(respond(request, row_payload(schemas.VolunteerProfile, profile)),
+                    row_etag("volunteer_profile", profile.id, profile.version))
 
 @router.put("/profile", response_model=schemas.VolunteerProfile)
 def update_volunteer_profile(
@@ -86,31 +113,112 @@ def update_volunteer_profile(
             detail="Profile not found"
         )
     
+    before = supply_keys(profile)
     for field, value in profile_update.dict(exclude_unset=True).items():
         setattr(profile, field, value)
     
     if profile_update.current_latitude is not None or profile_update.current_longitude is not None:
         profile.last_location_update = datetime.utcnow()
+    profile.current_geohash = subscriber_geohash(profile.current_latitude, profile.current_longitude)
+    record_change(db, before, supply_keys(profile), profile)
     
     db.commit()
     db.refresh(profile)
+    trace_profile(profile)
+    return profile
+
+def own_profile(db, current_user):
+    if current_user.role != models.UserRole.VOLUNTEER:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only volunteers can manage shifts"
+        )
+    profile = db.query(models.VolunteerProfile).filter(
+        models.VolunteerProfile.user_id == current_user.id
+    ).first()
+    if not profile:
+        raise HTTPException(
+            status_code=404,
+            detail="Profile not found"
+        )
     return profile
 
+@router.post("/profile/shifts", response_model=schemas.VolunteerShift)
+def create_volunteer_shift(
+    shift: schemas.VolunteerShiftCreate,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Add a one-off or weekly shift; while a volunteer has shifts, they are matched only during them."""
+    profile = own_profile(db, current_user)
+    db_shift = models.VolunteerShift(**shift.dict(), volunteer_id=profile.id)
+    db.add(db_shift)
+    db.commit()
+    db.refresh(db_shift)
+    shift_index.add(db_shift)
+    return db_shift
+
+@router.get("/profile/shifts", response_model=List[schemas.VolunteerShift])
+def read_volunteer_shifts(
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    profile = own_profile(db, current_user)
+    return db.query(models.VolunteerShift).filter(
+        models.VolunteerShift.volunteer_id == profile.id
+    ).order_by(models.VolunteerShift.id).all()
+
+@router.delete("/profile/shifts/{shift_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_volunteer_shift(
+    shift_id: int,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    profile = own_profile(db, current_user)
+    shift = db.get(models.VolunteerShift, shift_id)
+    if not shift or shift.volunteer_id != profile.id:
+        raise HTTPException(
+            status_code=404,
+            detail="Shift not found"
+        )
+    db.delete(shift)
+    db.commit()
+    shift_index.remove(shift_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
 @router.get("/", response_model=List[schemas.VolunteerProfile])
+@profiled
 def read_volunteers(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
+    after: int = 0,
+    available_at: Optional[datetime] = None,
+    available_until: Optional[datetime] = None,
     current_user: models.User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
+    """
+    Volunteer profiles in id order. With `available_at` (and optionally
+    `available_until`), only the volunteers available at that time, or over
+    that whole window. Pass the last id seen as `after` to page by key.
+    """
     if current_user.role not in [models.UserRole.NGO, models.UserRole.ADMIN]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
-    
-    volunteers = db.query(models.VolunteerProfile).offset(skip).limit(limit).all()
-    return volunteers
+    query = db.query(models.VolunteerProfile).filter(models.VolunteerProfile.id > after)
+    if available_at is None:
+        if available_until is not None:
+            raise HTTPException(status_code=400, detail="available_until needs available_at")
+    else:
+        if available_until is not None and available_until <= available_at:
+            raise HTTPException(status_code=400, detail="available_until must be after available_at")
+        # The flag, and a shift covering the window (EXISTS on the shift indexes) or no shifts at all.
+        query = query.filter(available_clause(available_at, available_until))
+    volunteers = query.order_by(models.VolunteerProfile.id).offset(skip).limit(limit).all()
+    return respond(request, rows_payload(schemas.VolunteerProfile, volunteers))
 
 @router.put("/{volunteer_id}/availability", response_model=schemas.VolunteerProfile)
 def update_volunteer_availability(
@@ -140,7 +248,10 @@ def update_volunteer_availability(
             detail="Not authorized to update this profile"
         )
     
+    before = supply_keys(profile)
     profile.availability = availability
+    record_change(db, before, supply_keys(profile), profile)
     db.commit()
     db.refresh(profile)
+    trace_profile(profile)
     return profile 
\ No newline at end of file
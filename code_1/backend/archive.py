@@ -0,0 +1,147 @@
+# 1_code/archive.py
+
+"""
+Archival of completed aid requests.
+
+aid_requests is the hot table. It holds the active set (pending and
+assigned) and recent history, and its partial indexes cover only the active
+rows. Completed requests older than AID_REQUEST_ARCHIVE_AFTER_DAYS move to
+aid_requests_archive. Each batch is moved in one transaction, which copies
+the rows and deletes them from the hot table. Once it commits, the archived
+rows are stamped with sync clock values in a separate short transaction
+(sync.stamp_archived), which is how GET /sync reports them as deleted; the
+batch itself never locks the clock, so synced writes don't wait on it. A
+run that stops in between leaves rows without a value, which the next
+stamp, or the startup backfill, picks up.
+Whatever the archive grows to, the pending feed, matching and status
+updates only touch the hot rows.
+
+The archiver is resumable without any bookkeeping. A batch either moves
+completely or not at all, so an interrupted run leaves only unmoved rows
+behind, and the next run picks them up. Within a run it walks the
+completed-rows partial index by id, so it never rescans rows it already
+skipped. Batch rows are locked with SKIP LOCKED on PostgreSQL, so a
+concurrent archiver or status update can't make a row be both copied and
+kept.
+
+    python archive.py --older-than-days 7 --batch-size 1000 --pause 0.1
+"""
+
+import argparse
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, literal, select
+
+import models
+from metrics import Counter, time_stage
+from sync import stamp_archived
+
+AID_REQUEST_ARCHIVE_AFTER_DAYS = float(os.getenv("AID_REQUEST_ARCHIVE_AFTER_DAYS", "7"))
+ARCHIVE_BATCH = 1000
+ARCHIVER_DIR = os.getenv("ARCHIVER_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archiver"))
+ARCHIVABLE_STATUS = "completed"
+# Columns copied as-is from aid_requests.
+ARCHIVED_COLUMNS = ("id", "requester_id", "type", "description", "latitude", "longitude",
+                    "urgency", "status", "created_at", "assigned_volunteer_id", "version")
+
+ARCHIVED_REQUESTS = Counter("aid_requests_archived_total", "Completed aid requests moved to the archive.")
+
+
+def archive_batch(db, cutoff, after=0, batch_size=ARCHIVE_BATCH):
+    """
+    Move up to batch_size completed requests created before cutoff, with
+    id > after, into the archive in one transaction. Returns the moved ids.
+    """
+    hot = models.AidRequest
+    eligible = (hot.status == ARCHIVABLE_STATUS, hot.created_at < cutoff)
+    with time_stage("archive_batch"):
+        ids = db.execute(
+            select(hot.id).where(*eligible, hot.id > after)
+            .order_by(hot.id).limit(batch_size).with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not ids:
+            db.rollback()
+            return []
+        table = hot.__table__
+        db.execute(models.AidRequestArchive.__table__.insert().from_select(
+            list(ARCHIVED_COLUMNS) + ["archived_at"],
+            select(*[table.c[name] for name in ARCHIVED_COLUMNS], literal(datetime.utcnow()))
+            .where(hot.id.in_(ids)),
+        ))
+        db.execute(delete(hot).where(hot.id.in_(ids)))
+        db.commit()
+        # Each archived row gets its own value, so GET /sync can page through the deletions.
+        stamp_archived(db)
+    ARCHIVED_REQUESTS.inc(len(ids))
+    return ids
+
+
+def archive_completed(db, older_than=timedelta(days=AID_REQUEST_ARCHIVE_AFTER_DAYS),
+                      batch_size=ARCHIVE_BATCH, pause=0.0, max_batches=None):
+    """
+    Archive every completed request older than `older_than`, a batch at a
+    time, sleeping `pause` seconds between batches to leave the database
+    room for live traffic. Returns the number of requests moved.
+    """
+    cutoff = datetime.utcnow() - older_than
+    moved, after, batches = 0, 0, 0
+    while max_batches is None or batches < max_batches:
+        ids = archive_batch(db, cutoff, after, batch_size)
+        if not ids:
+            break
+        moved += len(ids)
+        after = ids[-1]
+        batches += 1
+        if pause:
+            time.sleep(pause)
+    return moved
+
+
+class ArchiveJob:
+    """Background thread that runs archive_completed every `interval` seconds."""
+
+    def __init__(self, session_factory, interval, pause=0.1):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.pause = pause
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="aid-request-archiver", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            db = self.session_factory()
+            try:
+                moved = archive_completed(db, pause=self.pause)
+                if moved:
+                    print(f"Archived {moved} completed aid requests.")
+            except Exception as e:
+                db.rollback()
+                print(f"Error archiving aid requests: {e}")
+            finally:
+                db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move completed aid requests to the archive table.")
+    parser.add_argument("--older-than-days", type=float, default=AID_REQUEST_ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH)
+    parser.add_argument("--pause", type=float, default=0.1, help="Seconds to sleep between batches.")
+    args = parser.parse_args()
+
+    from database import SessionLocal
+    session = SessionLocal()
+    try:
+        total = archive_completed(session, timedelta(days=args.older_than_days), args.batch_size, args.pause)
+    finally:
+        session.close()
+    print(f"Archived {total} completed aid requests.")
@@ -16,6 +16,17 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+def dialect_insert(db):
+    """The INSERT construct for the session's database, with ON CONFLICT support (PostgreSQL or SQLite)."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"ON CONFLICT inserts need PostgreSQL or SQLite, not {dialect}")
+    return insert
+
 # Dependency
 def get_db():
     db = SessionLocal()
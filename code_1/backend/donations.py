@@ -0,0 +1,138 @@
+# 1_code/donations.py
+
+"""
+Donations: an append-only log with incrementally maintained per-type totals.
+
+A batch of donations is written as one multi-row INSERT ... ON CONFLICT DO
+NOTHING on the client's idempotency key, with RETURNING. Only the rows that
+were actually new come back, and only those are added to donation_totals
+("count = count + n" upserts, one per type in the batch) in the same
+transaction. A retried batch is therefore a no-op, and the totals never need
+recomputing from the log.
+
+Each batch takes its log_seq values from the donation log's own clock row
+(sync.next_seqs with DONATION_LOG_CLOCK), so ingest never waits on the sync
+clock. The row stays locked until the batch commits, so values are handed
+out in commit order, unlike ids, which a slow batch can commit behind a later
+one. Readers page through the log by log_seq > cursor, so they never skip a
+late batch and never see a half-applied one. GET /donations/totals reads one
+row per type, however large the log grows.
+"""
+
+import json
+import re
+from collections import defaultdict
+
+from sqlalchemy import select
+
+import models
+from database import dialect_insert
+from metrics import Counter, time_stage
+from sync import DONATION_LOG_CLOCK, next_seqs
+
+DONATION_STREAM_CHUNK = 1000
+
+DONATIONS_RECORDED = Counter("donations_recorded_total", "Donations appended to the log, by type.", ["type"])
+DONATION_DUPLICATES = Counter("donation_duplicates_total", "Donations skipped because their idempotency key was seen.")
+
+_MONEY = re.compile(r"^\s*\$?\s*([0-9][0-9,]*)(?:\.([0-9]{1,2}))?\s*$")
+
+
+def parse_amount_cents(type_, detail):
+    """Cents for a money donation such as "$1,000.50"; None for resources or free text."""
+    if type_ != "Money":
+        return None
+    match = _MONEY.match(detail or "")
+    if match is None:
+        return None
+    dollars, cents = match.groups()
+    return int(dollars.replace(",", "")) * 100 + int((cents or "0").ljust(2, "0"))
+
+
+def record_donations(db, donations, donor_id=None):
+    """
+    Append a batch of donations (objects with idempotency_key, name, type,
+    detail) and add the new ones to the running totals in one transaction.
+    Returns (accepted, duplicates).
+    """
+    rows = {}
+    for d in donations:
+        rows.setdefault(d.idempotency_key, {
+            "idempotency_key": d.idempotency_key, "donor_id": donor_id,
+            "name": d.name, "type": d.type, "detail": d.detail,
+            "amount_cents": parse_amount_cents(d.type, d.detail),
+        })
+    if not rows:
+        return 0, 0
+
+    table = models.Donation.__table__
+    stmt = (dialect_insert(db)(table)
+            .on_conflict_do_nothing(index_elements=["idempotency_key"])
+            .returning(table.c.type, table.c.amount_cents))
+    with time_stage("donation_ingest"):
+        # Duplicates skip their value; the cursor only needs values to increase.
+        for seq, row in enumerate(rows.values(), next_seqs(db, len(rows), DONATION_LOG_CLOCK)):
+            row["log_seq"] = seq
+        inserted = db.execute(stmt, list(rows.values())).all()
+
+        counts = defaultdict(int)
+        amounts = defaultdict(int)
+        for type_, amount_cents in inserted:
+            counts[type_] += 1
+            amounts[type_] += amount_cents or 0
+        if counts:
+            totals = models.DonationTotal.__table__
+            upsert = dialect_insert(db)(totals)
+            upsert = upsert.on_conflict_do_update(
+                index_elements=["type"],
+                set_={"count": totals.c.count + upsert.excluded.count,
+                      "amount_cents": totals.c.amount_cents + upsert.excluded.amount_cents},
+            )
+            db.execute(upsert, [{"type": t, "count": n, "amount_cents": amounts[t]} for t, n in counts.items()])
+        db.commit()
+
+    for type_, n in counts.items():
+        DONATIONS_RECORDED.labels(type=type_).inc(n)
+    duplicates = len(donations) - len(inserted)
+    DONATION_DUPLICATES.inc(duplicates)
+    return len(inserted), duplicates
+
+
+def donations_after(db, after=0, limit=100, type_=None):
+    """Up to `limit` donations with log_seq > after, oldest first."""
+    query = db.query(models.Donation).filter(models.Donation.log_seq > after)
+    if type_:
+        query = query.filter(models.Donation.type == type_)
+    return query.order_by(models.Donation.log_seq).limit(limit).all()
+
+
+def stream_donations(session_factory, after=0, chunk=DONATION_STREAM_CHUNK):
+    """
+    Newline-delimited JSON for every donation after the cursor, read in
+    keyset chunks on a dedicated session so memory stays flat for any log size.
+    """
+    donation = models.Donation
+    columns = (donation.id, donation.log_seq, donation.name, donation.type, donation.detail,
+               donation.amount_cents, donation.created_at)
+    db = session_factory()
+    try:
+        while True:
+            rows = db.execute(
+                select(*columns).where(donation.log_seq > after).order_by(donation.log_seq).limit(chunk)
+            ).all()
+            if not rows:
+                return
+            yield "".join(
+                json.dumps({"id": r.id, "log_seq": r.log_seq, "name": r.name, "type": r.type, "detail": r.detail,
+                            "amount_cents": r.amount_cents, "created_at": r.created_at.isoformat()}) + "\n"
+                for r in rows
+            )
+            after = rows[-1].log_seq
+            # Don't hold a read snapshot open between chunks while writers append.
+            db.commit()
+    finally:
+        db.close()
+
+
+def donation_totals(db):
+    return db.query(models.DonationTotal).order_by(models.DonationTotal.type).all()
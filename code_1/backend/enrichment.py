@@ -0,0 +1,304 @@
+# 1_code/enrichment.py
+
+"""
+Write-time coordinate enrichment for Firestore volunteer and request documents.
+
+Documents only carry a free-text `location`. Enrichment resolves it once and
+writes the result back onto the document:
+
+    lat, lon           coordinates (None when the address wasn't found)
+    geohash            precision-7 geohash of the coordinates
+    geocoded_location  the location string they were resolved from
+
+Feature extraction (matching_ai.document_coordinates) uses the stored
+coordinates whenever geocoded_location still equals location, so matching
+doesn't call the geocoder.
+
+Two paths keep documents enriched:
+
+* DocumentEnricher watches the collections' change feeds and enriches every
+  document that is created, or whose location changes, on a background
+  thread. Its own write-back arrives as a change too, but by then the
+  document no longer needs enrichment, so it doesn't loop.
+* backfill() walks a collection in document-id order, a page at a time, and
+  enriches the documents written before the enricher ran. It records the
+  last id of every committed page in a checkpoint file, so an interrupted
+  run resumes where it stopped:
+
+      python enrichment.py backfill volunteers requests --rate 1
+
+Both share one Geocoder: lookups are cached by address, and cache misses
+pass a token-bucket rate limiter (Nominatim allows one request per second).
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from geopy.exc import GeocoderServiceError, GeocoderTimedOut
+
+import matching_ai
+from geo import geohash_encode
+from metrics import Counter
+
+ENRICH_GEOHASH_PRECISION = 7
+GEOCODE_RATE = float(os.getenv("GEOCODE_RATE", "1"))
+ENRICH_BACKFILL_BATCH = 200
+ENRICH_RETRY_DELAY = 30.0
+ENRICH_MAX_RETRIES = 3
+ENRICHMENT_DIR = os.getenv("ENRICHMENT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "enrichment"))
+CHECKPOINT_FILE = "backfill_checkpoint.json"
+
+ENRICHED_DOCUMENTS = Counter("enriched_documents_total", "Documents enriched with coordinates, by path and outcome.",
+                             ["path", "outcome"])
+GEOCODE_CACHE = Counter("enrichment_geocode_cache_total", "Enrichment geocode lookups by cache outcome.", ["outcome"])
+
+
+class RateLimiter:
+    """Token bucket: acquire() blocks until a token is free. Thread-safe."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        # Sleep outside the lock; the debt is already booked, so waiters queue up in order.
+        if wait:
+            time.sleep(wait)
+
+
+class Geocoder:
+    """
+    Address -> coordinates with an LRU cache in front of a rate-limited
+    geocoder. Returns None for addresses that aren't found (cached too);
+    geocoder errors propagate and are not cached.
+    """
+
+    def __init__(self, limiter=None, cache_size=10000, geocode=None):
+        self.limiter = limiter or RateLimiter(GEOCODE_RATE)
+        self.cache_size = cache_size
+        self._geocode = geocode or matching_ai.geocode
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, location):
+        key = location.strip().lower()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                GEOCODE_CACHE.labels(outcome="hit").inc()
+                return self._cache[key]
+        GEOCODE_CACHE.labels(outcome="miss").inc()
+        self.limiter.acquire()
+        coordinates = self._geocode(location)
+        with self._lock:
+            self._cache[key] = coordinates
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return coordinates
+
+
+def needs_enrichment(data):
+    """True if a document has a location its stored coordinates weren't resolved from."""
+    location = data.get('location')
+    return bool(location) and data.get('geocoded_location') != location
+
+
+def enrichment_fields(location, coordinates):
+    """The fields written back onto a document for its location."""
+    if coordinates is None:
+        return {"lat": None, "lon": None, "geohash": None, "geocoded_location": location}
+    lat, lon = coordinates
+    return {"lat": lat, "lon": lon, "geohash": geohash_encode(lat, lon, ENRICH_GEOHASH_PRECISION),
+            "geocoded_location": location}
+
+
+class DocumentEnricher:
+    """
+    Enriches documents created or relocated in the watched collections. The
+    first snapshot of each watch (the existing documents) is left to
+    backfill(), so starting the enricher doesn't geocode a whole collection.
+    """
+
+    def __init__(self, collections, geocoder=None, reconnect_interval=5.0, retry_delay=ENRICH_RETRY_DELAY):
+        self.collections = {collection.id: collection for collection in collections}
+        self.geocoder = geocoder or Geocoder()
+        self.reconnect_interval = reconnect_interval
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._queued_lock = threading.Lock()
+        self._watches = {}
+        self._initial = {}
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._watch_loop, name="enrichment-watch", daemon=True),
+            threading.Thread(target=self._work, name="enrichment-worker", daemon=True),
+        ]
+
+    def start(self):
+        # Subscribe before returning so that writes made after start() are seen.
+        self._resubscribe()
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for watch in self._watches.values():
+            watch.unsubscribe()
+        self._queue.put(None)
+
+    def _enqueue(self, name, doc_id, attempt=0):
+        with self._queued_lock:
+            if attempt == 0 and (name, doc_id) in self._queued:
+                return
+            self._queued.add((name, doc_id))
+        self._queue.put((name, doc_id, attempt))
+
+    def _subscribe(self, name):
+        self._initial[name] = True
+
+        def on_snapshot(docs, changes, read_time):
+            if self._initial[name]:
+                self._initial[name] = False
+                return
+            for change in changes:
+                if change.type.name != "REMOVED" and needs_enrichment(change.document.to_dict() or {}):
+                    self._enqueue(name, change.document.id)
+
+        self._watches[name] = self.collections[name].on_snapshot(on_snapshot)
+
+    def _resubscribe(self):
+        for name in self.collections:
+            watch = self._watches.get(name)
+            if watch is None or not getattr(watch, "is_active", True):
+                try:
+                    self._subscribe(name)
+                except Exception as e:
+                    print(f"Error subscribing to {name} for enrichment: {e}")
+
+    def _watch_loop(self):
+        while not self._stop.wait(self.reconnect_interval):
+            self._resubscribe()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            name, doc_id, attempt = item
+            try:
+                self._enrich(name, doc_id)
+            except (GeocoderTimedOut, GeocoderServiceError) as e:
+                if attempt < ENRICH_MAX_RETRIES:
+                    threading.Timer(self.retry_delay, self._enqueue, (name, doc_id, attempt + 1)).start()
+                    continue
+                ENRICHED_DOCUMENTS.labels(path="live", outcome="error").inc()
+                print(f"Giving up enriching {name}/{doc_id}: {e}")
+            except Exception as e:
+                ENRICHED_DOCUMENTS.labels(path="live", outcome="error").inc()
+                print(f"Error enriching {name}/{doc_id}: {e}")
+            with self._queued_lock:
+                self._queued.discard((name, doc_id))
+
+    def _enrich(self, name, doc_id):
+        # Re-read: the location may have changed again while the document was queued.
+        ref = self.collections[name].document(doc_id)
+        snapshot = ref.get()
+        data = snapshot.to_dict() if snapshot.exists else None
+        if data is None or not needs_enrichment(data):
+            return
+        coordinates = self.geocoder.resolve(data['location'])
+        ref.update(enrichment_fields(data['location'], coordinates))
+        ENRICHED_DOCUMENTS.labels(path="live", outcome="found" if coordinates else "not_found").inc()
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_checkpoint(path, checkpoint):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+
+def backfill(collection, batch_factory, geocoder=None, checkpoint_path=None,
+             batch_size=ENRICH_BACKFILL_BATCH, restart=False):
+    """
+    Enrich every document of a collection that needs it, in document-id
+    order. The updates for a page go out as one write batch, and then the
+    page's last id is checkpointed. On a geocoder error, the documents
+    before the failing one are committed and checkpointed, and the error is
+    raised; the next run resumes from there. Returns counts of scanned,
+    enriched and not_found documents.
+    """
+    geocoder = geocoder or Geocoder()
+    checkpoint_path = checkpoint_path or os.path.join(ENRICHMENT_DIR, CHECKPOINT_FILE)
+    checkpoint = load_checkpoint(checkpoint_path)
+    after = None if restart else checkpoint.get(collection.id)
+    counts = {"scanned": 0, "enriched": 0, "not_found": 0}
+
+    while True:
+        query = collection.order_by("__name__")
+        if after is not None:
+            query = query.start_after({"__name__": after})
+        docs = list(query.limit(batch_size).stream())
+        if not docs:
+            return counts
+        batch = batch_factory()
+        last = after
+        try:
+            for doc in docs:
+                data = doc.to_dict() or {}
+                if needs_enrichment(data):
+                    coordinates = geocoder.resolve(data['location'])
+                    batch.update(doc.reference, enrichment_fields(data['location'], coordinates))
+                    counts["enriched" if coordinates else "not_found"] += 1
+                    ENRICHED_DOCUMENTS.labels(path="backfill", outcome="found" if coordinates else "not_found").inc()
+                counts["scanned"] += 1
+                last = doc.id
+        finally:
+            batch.commit()
+            if last is not None:
+                checkpoint[collection.id] = last
+                save_checkpoint(checkpoint_path, checkpoint)
+        after = last
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill coordinates onto Firestore documents.")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("collections", nargs="+")
+    parser.add_argument("--rate", type=float, default=GEOCODE_RATE, help="Geocoder requests per second.")
+    parser.add_argument("--batch-size", type=int, default=ENRICH_BACKFILL_BATCH)
+    parser.add_argument("--checkpoint", default=os.path.join(ENRICHMENT_DIR, CHECKPOINT_FILE))
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over.")
+    args = parser.parse_args()
+
+    from main import db as firestore_db
+    shared_geocoder = Geocoder(RateLimiter(args.rate))
+    for name in args.collections:
+        result = backfill(firestore_db.collection(name), firestore_db.batch, shared_geocoder,
+                          args.checkpoint, args.batch_size, args.restart)
+        print(f"{name}: {result}")
@@ -0,0 +1,72 @@
+# 1_code/etags.py
+
+"""
+Strong ETags and conditional GETs for the endpoints the mobile app polls.
+
+users, volunteer_profiles and aid_requests carry a `version` column that
+SQLAlchemy bumps on every ORM update (version_id_col). A row's ETag is its
+kind, id and version. A listing's ETag is a digest of the ids and versions
+of the rows on the page, in order, plus whose view it is. Either can be
+computed from a query that selects only (id, version). When the client's
+If-None-Match matches, the endpoint returns 304 before loading or
+serializing the rows.
+
+The JSON and MessagePack bodies of a resource differ byte for byte, so
+their strong tags differ too: not_modified and set_etag add "-msgpack" for
+MessagePack. The compressed variants get their suffix from
+CompressionMiddleware (serialization.py).
+"""
+
+import hashlib
+
+from fastapi import Response
+
+from metrics import Counter
+from serialization import MSGPACK, etag_variant, negotiate_media_type
+
+CONDITIONAL_REQUESTS = Counter("conditional_requests_total", "Conditional GETs by endpoint and outcome.",
+                               ["endpoint", "outcome"])
+
+# Polled data is private to the caller and must be revalidated before reuse.
+CACHE_CONTROL = "private, no-cache"
+
+
+def row_etag(kind, row_id, version):
+    return f'"{kind}-{row_id}-{version}"'
+
+
+def list_etag(kind, scope, versions):
+    """ETag of a page given its (id, version) pairs in response order; scope names the caller's view."""
+    digest = hashlib.sha256(repr((scope, [tuple(pair) for pair in versions])).encode()).hexdigest()[:32]
+    return f'"{kind}-{digest}"'
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match comparison (weak, as RFC 9110 requires for GET)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+def _for_media_type(etag, media_type):
+    return etag_variant(etag, "msgpack") if media_type == MSGPACK else etag
+
+
+def not_modified(request, endpoint, etag):
+    """A 304 response if the request's If-None-Match matches etag (for the negotiated media type), else None."""
+    etag = _for_media_type(etag, negotiate_media_type(request))
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        CONDITIONAL_REQUESTS.labels(endpoint=endpoint, outcome="not_modified").inc()
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    CONDITIONAL_REQUESTS.labels(endpoint=endpoint, outcome="modified").inc()
+    return None
+
+
+def set_etag(response, etag):
+    """Tag a full response; use the version of the rows actually loaded, which may be newer."""
+    response.headers["ETag"] = _for_media_type(etag, response.media_type)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
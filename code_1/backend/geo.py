@@ -0,0 +1,227 @@
+# 1_code/geo.py
+
+"""
+Geographic helpers shared by matching, sharding and spatial indexes.
+
+Geohashes interleave longitude and latitude bits into a base-32 string; every
+extra character narrows the cell (precision 3 is roughly 156 km x 156 km,
+precision 5 roughly 5 km x 5 km). Cells sharing a prefix are nested, so a
+prefix is a cheap partition key.
+
+haversine_km computes great-circle distances from one point to many in
+float32, a chunk at a time, so scoring a million volunteers needs a few
+megabytes of scratch space rather than several full-length temporaries.
+"""
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+# Rows per haversine chunk: large enough to amortize NumPy call overhead,
+# small enough that the float32 temporaries stay in cache.
+HAVERSINE_CHUNK = 65536
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {c: i for i, c in enumerate(_BASE32)}
+
+
+def geohash_encode(lat, lon, precision=5):
+    """Geohash of one coordinate pair."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                value = (value << 1) | 1
+                lon_lo = mid
+            else:
+                value <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value = (value << 1) | 1
+                lat_lo = mid
+            else:
+                value <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def geohash_encode_many(lats, lons, precision=5):
+    """Vectorized geohash for arrays of coordinates; returns a NumPy array of strings."""
+    lats = np.clip(np.asarray(lats, dtype=np.float64), -90.0, 90.0)
+    lons = np.clip(np.asarray(lons, dtype=np.float64), -180.0, 180.0)
+    n_bits = precision * 5
+    lon_bits = (n_bits + 1) // 2
+    lat_bits = n_bits // 2
+    # Integer cell coordinates, then interleave longitude (even) and latitude (odd) bits.
+    lon_cells = np.minimum(((lons + 180.0) / 360.0 * (1 << lon_bits)).astype(np.int64), (1 << lon_bits) - 1)
+    lat_cells = np.minimum(((lats + 90.0) / 180.0 * (1 << lat_bits)).astype(np.int64), (1 << lat_bits) - 1)
+    code = np.zeros(len(lats), dtype=np.int64)
+    lon_i, lat_i = lon_bits - 1, lat_bits - 1
+    for bit in range(n_bits):
+        code <<= 1
+        if bit % 2 == 0:
+            code |= (lon_cells >> lon_i) & 1
+            lon_i -= 1
+        else:
+            code |= (lat_cells >> lat_i) & 1
+            lat_i -= 1
+    alphabet = np.array(list(_BASE32))
+    chars = [alphabet[(code >> (5 * (precision - 1 - i))) & 31] for i in range(precision)]
+    return np.array(["".join(t) for t in zip(*chars)]) if len(lats) else np.array([], dtype=str)
+
+
+def geohash_bbox(geohash):
+    """(lat_min, lat_max, lon_min, lon_max) of a geohash cell."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    even = True
+    for c in geohash:
+        value = _DECODE[c]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                if bit:
+                    lon_lo = mid
+                else:
+                    lon_hi = mid
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                if bit:
+                    lat_lo = mid
+                else:
+                    lat_hi = mid
+            even = not even
+    return lat_lo, lat_hi, lon_lo, lon_hi
+
+
+def geohash_cell_size(precision):
+    """(d_lat, d_lon) in degrees of every cell at a precision."""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** (bits - bits // 2)
+
+
+def geohash_neighbors(geohash):
+    """The up-to-8 cells around a geohash cell at the same precision."""
+    lat_lo, lat_hi, lon_lo, lon_hi = geohash_bbox(geohash)
+    lat_c, lon_c = (lat_lo + lat_hi) / 2, (lon_lo + lon_hi) / 2
+    d_lat, d_lon = lat_hi - lat_lo, lon_hi - lon_lo
+    cells = set()
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            if dx == 0 and dy == 0:
+                continue
+            lat = lat_c + dy * d_lat
+            if not -90.0 <= lat <= 90.0:
+                continue
+            lon = (lon_c + dx * d_lon + 180.0) % 360.0 - 180.0
+            cells.add(geohash_encode(lat, lon, len(geohash)))
+    cells.discard(geohash)
+    return sorted(cells)
+
+
+def haversine_km(lat, lon, lats, lons, chunk=HAVERSINE_CHUNK):
+    """Great-circle distances in km from (lat, lon) to every (lats[i], lons[i]), as float32."""
+    lats = np.asarray(lats)
+    lons = np.asarray(lons)
+    n = len(lats)
+    out = np.empty(n, dtype=np.float32)
+    lat0 = np.float32(np.radians(lat))
+    lon0 = np.float32(np.radians(lon))
+    cos_lat0 = np.float32(np.cos(lat0))
+    to_rad = np.float32(np.pi / 180.0)
+    for start in range(0, n, chunk):
+        end = min(start + chunk, n)
+        phi = lats[start:end].astype(np.float32) * to_rad
+        d_lambda = lons[start:end].astype(np.float32) * to_rad
+        d_lambda -= lon0
+        d_lambda *= 0.5
+        np.sin(d_lambda, out=d_lambda)
+        d_lambda *= d_lambda
+        cos_phi = np.cos(phi)
+        d_lambda *= cos_phi
+        d_lambda *= cos_lat0
+        # a = sin^2(d_phi / 2) + cos(phi0) cos(phi) sin^2(d_lambda / 2)
+        phi -= lat0
+        phi *= 0.5
+        np.sin(phi, out=phi)
+        phi *= phi
+        phi += d_lambda
+        np.clip(phi, 0.0, 1.0, out=phi)
+        np.sqrt(phi, out=phi)
+        np.arcsin(phi, out=phi)
+        np.multiply(phi, np.float32(2 * EARTH_RADIUS_KM), out=out[start:end])
+    return out
+
+
+def geohash_cover(lat, lon, radius_km, max_precision=7):
+    """
+    Geohash prefixes whose cells together cover every point within radius_km
+    of (lat, lon): the home cell and its neighbours at the finest precision
+    (up to max_precision) whose cells are at least radius_km across. Returns
+    [""] (everything) when the radius is wider than the coarsest cells.
+    """
+    for precision in range(max_precision, 0, -1):
+        home = geohash_encode(lat, lon, precision)
+        lat_lo, lat_hi, lon_lo, lon_hi = geohash_bbox(home)
+        d_lat = lat_hi - lat_lo
+        # Longitude cells are narrowest at the poleward edge of the 3x3 block.
+        edge = min(90.0, max(abs(lat_lo - d_lat), abs(lat_hi + d_lat)))
+        height_km = d_lat * 111.32
+        width_km = (lon_hi - lon_lo) * 111.32 * np.cos(np.radians(edge))
+        if min(height_km, width_km) >= radius_km:
+            return [home] + geohash_neighbors(home)
+    return [""]
+
+
+def prefix_range(prefix):
+    """(low, high) bounds such that low <= geohash < high selects every geohash with the prefix."""
+    return prefix, prefix + "~"
+
+
+def geohash_cover_bbox(lat_min, lat_max, lon_min, lon_max, max_cells=64):
+    """
+    Geohash prefixes covering a bounding box: every cell intersecting it at
+    the finest precision that needs at most max_cells cells.
+    """
+    for precision in range(7, 0, -1):
+        lat_lo, lat_hi, lon_lo, lon_hi = geohash_bbox(geohash_encode(lat_min, lon_min, precision))
+        d_lat, d_lon = lat_hi - lat_lo, lon_hi - lon_lo
+        rows = int(np.floor((lat_max - lat_lo) / d_lat)) + 1
+        cols = int(np.floor((lon_max - lon_lo) / d_lon)) + 1
+        if rows * cols <= max_cells:
+            cells = set()
+            for r in range(rows):
+                for c in range(cols):
+                    lat = min(lat_lo + (r + 0.5) * d_lat, 90.0)
+                    lon = lon_lo + (c + 0.5) * d_lon
+                    cells.add(geohash_encode(lat, (lon + 180.0) % 360.0 - 180.0, precision))
+            return sorted(cells)
+    return [""]
+
+
+def points_in_polygon(lats, lons, polygon):
+    """
+    Boolean mask of the points inside a polygon given as [(lat, lon), ...]
+    (even-odd rule; vectorized over points, looping over the polygon edges).
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    inside = np.zeros(len(lats), dtype=bool)
+    vertices = np.asarray(polygon, dtype=np.float64)
+    for (lat1, lon1), (lat2, lon2) in zip(vertices, np.roll(vertices, -1, axis=0)):
+        if lat1 == lat2:
+            continue
+        crosses = (lat1 > lats) != (lat2 > lats)
+        lon_at_lat = lon1 + (lats - lat1) * (lon2 - lon1) / (lat2 - lat1)
+        inside ^= crosses & (lons < lon_at_lat)
+    return inside
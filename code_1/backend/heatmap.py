@@ -0,0 +1,191 @@
+# 1_code/heatmap.py
+
+"""
+Demand/supply heatmap: counts of pending aid requests (by type and urgency)
+and available volunteers (by skill) per geohash cell at several zoom levels.
+
+The counts are never aggregated at read time. Every write that changes a
+request's or a volunteer's contribution (create, assign, complete, a moved
+location, toggled availability) diffs the counter keys it contributed before
+against the ones it contributes after, and applies the difference as
+"count = count + delta" upserts in the same transaction. A heatmap query
+therefore reads only the rows of the cells in the viewport.
+
+Request types and volunteer skills are counted under their KNOWN_SKILLS
+names (canonical_skill / parse_skills, as matching reads them), so demand
+and supply for the same skill line up and spelling variants share a counter.
+
+An update stamps the rows it touched with the change_seq of the request or
+profile write that caused it (sync.py), so the heatmap needs no clock of its
+own and its versions are in commit order. A client that passes back the
+version of its last response receives only the cells that changed since
+then. A cell that dropped to zero still appears in the delta, so the client
+can clear it.
+"""
+
+import os
+from collections import Counter, defaultdict
+
+from sqlalchemy import and_, delete, or_, select
+
+import models
+from database import dialect_insert
+from geo import geohash_bbox, geohash_cell_size, geohash_cover_bbox, geohash_encode, prefix_range
+from matching_ai import canonical_skill, parse_skills
+from metrics import time_stage
+from sync import current_version, next_seqs
+
+# Zoom levels kept up to date (geohash lengths): ~156 km, ~39 km, ~5 km and ~1.2 km cells.
+HEATMAP_PRECISIONS = tuple(sorted(int(p) for p in os.getenv("HEATMAP_PRECISIONS", "3,4,5,6").split(",")))
+# Largest number of cells one response covers when the zoom level is picked automatically.
+HEATMAP_MAX_CELLS = 1024
+
+DEMAND = "demand"
+SUPPLY = "supply"
+# Category for requests without a type and volunteers without known skills.
+UNSPECIFIED = "unspecified"
+
+
+def _cell_keys(latitude, longitude, layer, categories):
+    finest = geohash_encode(latitude, longitude, HEATMAP_PRECISIONS[-1])
+    return [(finest[:precision], layer, category, urgency)
+            for precision in HEATMAP_PRECISIONS for category, urgency in categories]
+
+
+def demand_keys(request):
+    """Counter keys an aid request contributes; only pending requests with a location count."""
+    if request.status != "pending" or request.latitude is None or request.longitude is None:
+        return []
+    category = canonical_skill(request.type or "") or request.type or UNSPECIFIED
+    return _cell_keys(request.latitude, request.longitude, DEMAND, [(category, request.urgency or "low")])
+
+
+def supply_keys(profile):
+    """Counter keys a volunteer profile contributes: one per skill while available with a location."""
+    if not profile.availability or profile.current_latitude is None or profile.current_longitude is None:
+        return []
+    skills = parse_skills(profile.skills or "")
+    return _cell_keys(profile.current_latitude, profile.current_longitude, SUPPLY,
+                      [(skill, "") for skill in skills or [UNSPECIFIED]])
+
+
+def _add_counts(db, deltas, version):
+    table = models.HeatmapCount.__table__
+    stmt = dialect_insert(db)(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["precision", "cell", "layer", "category", "urgency"],
+        set_={"count": table.c.count + stmt.excluded.count, "version": stmt.excluded.version},
+    )
+    db.execute(stmt, [
+        {"precision": len(cell), "cell": cell, "layer": layer, "category": category,
+         "urgency": urgency, "count": delta, "version": version}
+        for (cell, layer, category, urgency), delta in deltas.items()
+    ])
+
+
+def record_change(db, before, after, source):
+    """
+    Apply the difference between the counter keys `source` (the request or
+    profile being written) contributed before a write and after it. Call
+    before committing the write so both land in one transaction. Returns the
+    new heatmap version, or None if nothing changed.
+    """
+    deltas = Counter(after)
+    deltas.subtract(before)
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return None
+    with time_stage("heatmap_update"):
+        # Flushing stamps the write's change_seq, which versions the cells it touches.
+        db.flush()
+        version = source.change_seq
+        _add_counts(db, deltas, version)
+    return version
+
+
+def rebuild_heatmap(db):
+    """
+    Recount every cell from the aid_requests and volunteer_profiles tables
+    (backfill, or repair after writes that bypassed record_change). Clients
+    holding an older delta cursor get a full response next time.
+    """
+    request = models.AidRequest
+    profile = models.VolunteerProfile
+    keys = Counter()
+    for row in db.execute(select(request.status, request.type, request.urgency, request.latitude, request.longitude)
+                          .where(request.status == "pending")):
+        keys.update(demand_keys(row))
+    for row in db.execute(select(profile.availability, profile.skills, profile.current_latitude,
+                                 profile.current_longitude).where(profile.availability.is_(True))):
+        keys.update(supply_keys(row))
+
+    version = next_seqs(db)
+    db.execute(delete(models.HeatmapCount))
+    if keys:
+        _add_counts(db, keys, version)
+    reset = models.HeatmapReset.__table__
+    stmt = dialect_insert(db)(reset).values(id=1, reset_version=version)
+    db.execute(stmt.on_conflict_do_update(index_elements=["id"], set_={"reset_version": version}))
+    db.commit()
+    return version
+
+
+def zoom_for(lat_min, lat_max, lon_min, lon_max, max_cells=HEATMAP_MAX_CELLS):
+    """Finest kept precision at which the viewport spans at most max_cells cells."""
+    for precision in reversed(HEATMAP_PRECISIONS):
+        d_lat, d_lon = geohash_cell_size(precision)
+        if ((lat_max - lat_min) / d_lat + 2) * ((lon_max - lon_min) / d_lon + 2) <= max_cells:
+            return precision
+    return HEATMAP_PRECISIONS[0]
+
+
+def read_heatmap(db, lat_min, lat_max, lon_min, lon_max, precision=None, since=0):
+    """
+    Cells intersecting the viewport at one zoom level. Returns a dict with
+    version, precision, full (False when only cells changed after `since`
+    are included) and cells.
+    """
+    if precision is None:
+        precision = zoom_for(lat_min, lat_max, lon_min, lon_max)
+    # The version is read before the cells, so a cell written in between is sent again next time, not skipped.
+    version = current_version(db)
+    reset = db.get(models.HeatmapReset, 1)
+    reset_version = reset.reset_version if reset else 0
+    full = since <= 0 or since < reset_version or since > version
+
+    counts = models.HeatmapCount
+    # Cover prefixes may be finer than the zoom level; cut them to cell length.
+    prefixes = sorted({prefix[:precision] for prefix in geohash_cover_bbox(lat_min, lat_max, lon_min, lon_max)})
+    with time_stage("heatmap_read"):
+        rows = db.execute(
+            select(counts.cell, counts.layer, counts.category, counts.urgency, counts.count, counts.version)
+            .where(counts.precision == precision,
+                   or_(*[and_(counts.cell >= low, counts.cell < high) for low, high in map(prefix_range, prefixes)]))
+        ).all()
+
+    cells = defaultdict(lambda: {"demand": defaultdict(dict), "supply": {}, "version": 0, "total": 0})
+    for row in rows:
+        cell = cells[row.cell]
+        if row.layer == DEMAND:
+            cell["demand"][row.category][row.urgency] = row.count
+        else:
+            cell["supply"][row.category] = row.count
+        cell["version"] = max(cell["version"], row.version)
+        cell["total"] += row.count
+
+    result = []
+    for geohash, cell in sorted(cells.items()):
+        if (full and cell["total"] == 0) or (not full and cell["version"] <= since):
+            continue
+        c_lat_lo, c_lat_hi, c_lon_lo, c_lon_hi = geohash_bbox(geohash)
+        if c_lat_hi < lat_min or c_lat_lo > lat_max or c_lon_hi < lon_min or c_lon_lo > lon_max:
+            continue
+        result.append({
+            "cell": geohash,
+            "latitude": (c_lat_lo + c_lat_hi) / 2,
+            "longitude": (c_lon_lo + c_lon_hi) / 2,
+            "demand": {category: {u: n for u, n in by_urgency.items() if n}
+                       for category, by_urgency in cell["demand"].items() if any(by_urgency.values())},
+            "supply": {skill: n for skill, n in cell["supply"].items() if n},
+        })
+    return {"version": version, "precision": precision, "full": full, "cells": result}
@@ -0,0 +1,142 @@
+# 1_code/inventory.py
+
+"""
+Resource inventory: sites, stock movements and incrementally maintained totals.
+
+Every stock movement is appended to stock_movements and, in the same
+transaction, its quantity is added to two materialized tables: the level per
+(site, item) and the total per (region, item). The totals are updated with
+"quantity = quantity + delta" upserts, one per distinct key in a batch, and
+are never recomputed from the movement log, so a regional dashboard reads
+O(regions x items) rows no matter how many movements there have been.
+
+Sites carry a precision-7 geohash. A radius query scans the sites in the
+geohash cells covering the circle (B-tree range scans on the geohash index),
+then keeps those within the exact haversine distance.
+"""
+
+from collections import defaultdict
+
+from sqlalchemy import and_, or_, tuple_
+
+import models
+from database import dialect_insert
+from geo import geohash_cover, geohash_encode, haversine_km, prefix_range
+from metrics import time_stage
+
+SITE_GEOHASH_PRECISION = 7
+# Sites created without a region are grouped by their 3-character geohash (~156 km cells).
+REGION_PRECISION = 3
+
+
+class InsufficientStockError(ValueError):
+    """A batch would take a site's stock of an item below zero."""
+
+
+def normalize_item(item):
+    return " ".join(item.split())
+
+
+def create_site(db, name, latitude, longitude, region=None):
+    geohash = geohash_encode(latitude, longitude, SITE_GEOHASH_PRECISION)
+    site = models.ResourceSite(
+        name=name, latitude=latitude, longitude=longitude,
+        geohash=geohash, region=region or geohash[:REGION_PRECISION],
+    )
+    db.add(site)
+    db.commit()
+    db.refresh(site)
+    return site
+
+
+def _upsert_add(db, table, key_columns, deltas):
+    """Add each delta to table.quantity for its key, inserting missing rows."""
+    rows = [dict(zip(key_columns, key), quantity=delta) for key, delta in deltas.items() if delta]
+    if not rows:
+        return
+    stmt = dialect_insert(db)(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(key_columns),
+        set_={"quantity": table.c.quantity + stmt.excluded.quantity},
+    )
+    db.execute(stmt, rows)
+
+
+def record_movements(db, movements):
+    """
+    Append a batch of movements (objects with site_id, item, quantity, reason)
+    and apply them to the site levels and region totals in one transaction.
+    Raises LookupError for unknown sites and InsufficientStockError if any
+    level would go negative; nothing is written in either case.
+    Returns the number of movements recorded.
+    """
+    movements = list(movements)
+    if not movements:
+        return 0
+    site_ids = {m.site_id for m in movements}
+    regions = dict(db.query(models.ResourceSite.id, models.ResourceSite.region)
+                   .filter(models.ResourceSite.id.in_(site_ids)).all())
+    missing = site_ids - set(regions)
+    if missing:
+        raise LookupError(f"Unknown resource site ids: {sorted(missing)}")
+
+    level_deltas = defaultdict(int)
+    region_deltas = defaultdict(int)
+    for m in movements:
+        item = normalize_item(m.item)
+        level_deltas[(m.site_id, item)] += m.quantity
+        region_deltas[(regions[m.site_id], item)] += m.quantity
+
+    with time_stage("inventory_ingest"):
+        levels = models.InventoryLevel
+        current = dict(
+            ((row.site_id, row.item), row.quantity)
+            for row in db.query(levels.site_id, levels.item, levels.quantity)
+            .filter(tuple_(levels.site_id, levels.item).in_(list(level_deltas)))
+            .with_for_update()
+        )
+        short = [key for key, delta in level_deltas.items() if current.get(key, 0) + delta < 0]
+        if short:
+            db.rollback()
+            site_id, item = short[0]
+            raise InsufficientStockError(
+                f"Not enough {item} at site {site_id}: have {current.get(short[0], 0)}, "
+                f"batch needs {-level_deltas[short[0]]}")
+
+        db.bulk_insert_mappings(models.StockMovement, [
+            {"site_id": m.site_id, "item": normalize_item(m.item), "quantity": m.quantity, "reason": m.reason}
+            for m in movements
+        ])
+        _upsert_add(db, levels.__table__, ("site_id", "item"), level_deltas)
+        _upsert_add(db, models.RegionInventoryTotal.__table__, ("region", "item"), region_deltas)
+        db.commit()
+    return len(movements)
+
+
+def region_totals(db, item=None):
+    query = db.query(models.RegionInventoryTotal)
+    if item:
+        query = query.filter(models.RegionInventoryTotal.item == normalize_item(item))
+    return query.order_by(models.RegionInventoryTotal.region, models.RegionInventoryTotal.item).all()
+
+
+def stock_within(db, latitude, longitude, radius_km, item=None):
+    """
+    In-stock (site, level, distance_km) triples within radius_km of a point,
+    nearest first.
+    """
+    site = models.ResourceSite
+    cells = [and_(site.geohash >= low, site.geohash < high)
+             for low, high in map(prefix_range, geohash_cover(latitude, longitude, radius_km, SITE_GEOHASH_PRECISION))]
+    query = (db.query(site, models.InventoryLevel)
+             .join(models.InventoryLevel, models.InventoryLevel.site_id == site.id)
+             .filter(or_(*cells), models.InventoryLevel.quantity > 0))
+    if item:
+        query = query.filter(models.InventoryLevel.item == normalize_item(item))
+    rows = query.all()
+    if not rows:
+        return []
+    distances = haversine_km(latitude, longitude,
+                             [s.latitude for s, _ in rows], [s.longitude for s, _ in rows])
+    nearby = [(s, level, float(d)) for (s, level), d in zip(rows, distances) if d <= radius_km]
+    return sorted(nearby, key=lambda row: row[2])
@@ -0,0 +1,229 @@
+# 1_code/local_firestore.py
+
+"""
+In-process stand-in for the subset of the Firestore client used by the backend.
+
+Selected with FIRESTORE_MODE=local. It lets the API, load tests and data
+scripts run without a Firebase project: collections are plain dictionaries
+guarded by a lock, and documents are copied on read and write so callers can't
+mutate stored data by accident.
+
+Collections can be paged with order_by(field or "__name__").start_after({field: value}).limit(n).
+
+Collections also support on_snapshot(): like a Firestore watch, the callback
+first receives every existing document as ADDED, then one call per write, on
+a separate delivery thread and in write order.
+"""
+
+import queue
+import threading
+import uuid
+from datetime import datetime, timezone
+from enum import Enum
+
+ChangeType = Enum("ChangeType", "ADDED REMOVED MODIFIED")
+
+
+class LocalDocumentChange:
+    def __init__(self, change_type, document):
+        self.type = change_type
+        self.document = document
+
+
+class LocalWatch:
+    """Subscription returned by on_snapshot(); delivers callbacks on its own thread."""
+
+    def __init__(self, callback):
+        self._callback = callback
+        self._queue = queue.Queue()
+        self._active = True
+        self._thread = threading.Thread(target=self._deliver, name="local-firestore-watch", daemon=True)
+        self._thread.start()
+
+    @property
+    def is_active(self):
+        return self._active
+
+    def _push(self, docs, changes):
+        if self._active:
+            self._queue.put((docs, changes, datetime.now(timezone.utc)))
+
+    def _deliver(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            self._callback(*item)
+
+    def close(self, reason=None):
+        """Stop delivering; also how tests simulate a dropped watch stream."""
+        self._active = False
+        self._queue.put(None)
+
+    def unsubscribe(self):
+        self.close()
+
+
+class LocalDocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class LocalDocumentReference:
+    def __init__(self, collection, doc_id):
+        self._collection = collection
+        self.id = doc_id
+
+    def get(self):
+        return LocalDocumentSnapshot(self, self._collection._read(self.id))
+
+    def set(self, data, merge=False):
+        self._collection._write(self.id, data, merge=merge)
+
+    def update(self, data):
+        if self._collection._read(self.id) is None:
+            raise KeyError(f"No document to update: {self._collection.id}/{self.id}")
+        self._collection._write(self.id, data, merge=True)
+
+    def delete(self):
+        self._collection._delete(self.id)
+
+
+class LocalQuery:
+    """order_by / start_after / limit over a collection, enough for paging through it."""
+
+    def __init__(self, collection, field, after=None, count=None):
+        self._collection = collection
+        self._field = field
+        self._after = after
+        self._count = count
+
+    def _key(self, doc_id, data):
+        return doc_id if self._field == "__name__" else data.get(self._field)
+
+    def start_after(self, values):
+        return LocalQuery(self._collection, self._field, values[self._field], self._count)
+
+    def limit(self, count):
+        return LocalQuery(self._collection, self._field, self._after, count)
+
+    def stream(self):
+        with self._collection._client._lock:
+            items = sorted(self._collection._docs.items(), key=lambda item: self._key(*item))
+        if self._after is not None:
+            items = [item for item in items if self._key(*item) > self._after]
+        for doc_id, data in items[:self._count]:
+            yield LocalDocumentSnapshot(self._collection.document(doc_id), dict(data))
+
+
+class LocalCollectionReference:
+    def __init__(self, client, name):
+        self._client = client
+        self.id = name
+        self._docs = {}
+        self._watches = []
+
+    def document(self, doc_id=None):
+        return LocalDocumentReference(self, doc_id or uuid.uuid4().hex[:20])
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+    def stream(self):
+        with self._client._lock:
+            items = list(self._docs.items())
+        for doc_id, data in items:
+            yield LocalDocumentSnapshot(self.document(doc_id), dict(data))
+
+    def order_by(self, field):
+        return LocalQuery(self, field)
+
+    def on_snapshot(self, callback):
+        """Call callback(docs, changes, read_time) with the current documents, then on every change."""
+        watch = LocalWatch(callback)
+        with self._client._lock:
+            docs = [LocalDocumentSnapshot(self.document(doc_id), dict(data)) for doc_id, data in self._docs.items()]
+            watch._push(docs, [LocalDocumentChange(ChangeType.ADDED, doc) for doc in docs])
+            self._watches.append(watch)
+        return watch
+
+    def _notify(self, change_type, doc_id, data):
+        # Called with the client lock held, so watches see writes in order.
+        self._watches = [w for w in self._watches if w.is_active]
+        if not self._watches:
+            return
+        change = LocalDocumentChange(change_type, LocalDocumentSnapshot(self.document(doc_id), data))
+        docs = [LocalDocumentSnapshot(self.document(i), dict(d)) for i, d in self._docs.items()]
+        for watch in self._watches:
+            watch._push(docs, [change])
+
+    def _read(self, doc_id):
+        with self._client._lock:
+            data = self._docs.get(doc_id)
+            return dict(data) if data is not None else None
+
+    def _write(self, doc_id, data, merge=False):
+        with self._client._lock:
+            existed = doc_id in self._docs
+            if merge and existed:
+                merged = dict(self._docs[doc_id])
+                merged.update(data)
+                self._docs[doc_id] = merged
+            else:
+                self._docs[doc_id] = dict(data)
+            self._notify(ChangeType.MODIFIED if existed else ChangeType.ADDED, doc_id, dict(self._docs[doc_id]))
+
+    def _delete(self, doc_id):
+        with self._client._lock:
+            data = self._docs.pop(doc_id, None)
+            if data is not None:
+                self._notify(ChangeType.REMOVED, doc_id, data)
+
+
+class LocalWriteBatch:
+    def __init__(self):
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append(lambda: ref.set(data, merge=merge))
+
+    def update(self, ref, data):
+        self._ops.append(lambda: ref.update(data))
+
+    def delete(self, ref):
+        self._ops.append(ref.delete)
+
+    def commit(self):
+        for op in self._ops:
+            op()
+        self._ops = []
+
+
+class LocalFirestoreClient:
+    """Minimal Firestore client: collection(), batch(), get_all() and nothing else."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._collections = {}
+
+    def collection(self, name):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = LocalCollectionReference(self, name)
+            return self._collections[name]
+
+    def batch(self):
+        return LocalWriteBatch()
+
+    def get_all(self, references):
+        """Snapshots of the referenced documents, missing ones included with exists False."""
+        for ref in references:
+            yield ref.get()
@@ -9,41 +9,83 @@ if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
 
 # Import the necessary functions from matching_ai.
-from matching_ai import extract_features_request, get_best_matches  # production matching
+from matching_ai import MATCH_RERANK_CANDIDATES, extract_features_request, rerank_candidates, with_distance  # production matching
 # We will use get_best_matches_debug for the debug endpoint.
 import numpy as np
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm.exc import StaleDataError
 from firebase_admin import credentials, firestore
 import firebase_admin
 
+from metrics import (
+    CONTENT_TYPE_LATEST,
+    MetricsMiddleware,
+    observe_pool_size,
+    record_match_error,
+    render_latest,
+    time_stage,
+)
+from model_store import RefitJob, candidates_with_artifacts, model_store, try_acquire_owner
+from shared_pool import PoolPublisher, SharedPoolReader
+from volunteer_sync import StalePoolError, VolunteerSynchronizer
+from volunteer_columns import VolunteerColumns
+from enrichment import ENRICHMENT_DIR, DocumentEnricher
+from archive import ARCHIVER_DIR, ArchiveJob
+from admission import admission_dependency, tier_from_env
+from serialization import CompressionMiddleware, respond
+from profiling import ProfileMiddleware, profiled
+from shards import SHARD_OWNER_DIR, ShardRefreshJob, ShardRouter, RemoteShardWorker, parse_addresses, start_local_shard_processes
+from scheduler import pending_scheduler
+from search import search_index, uses_database_search
+from shifts import shift_index
+from sync import backfill_change_seqs
+from database import SessionLocal
+from app.api import aid_requests, alerts, donations, heatmap, profiling, resources, sync, users, volunteers
+
 # Firebase Admin SDK Setup
-try:
-    # Set the service account key path via environment variable, default to "1_code/serviceAccountKey.json".
-    cred_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "1_code/serviceAccountKey.json")
-    if not os.path.exists(cred_path):
-        raise FileNotFoundError(f"Service account key file not found at: {cred_path}. Set GOOGLE_APPLICATION_CREDENTIALS.")
+def init_firestore_client():
+    """
+    Initialize the Firebase Admin SDK and return a Firestore client.
+    Exits the process if credentials are missing or invalid.
+    """
+    try:
+        # Set the service account key path via environment variable, default to "1_code/serviceAccountKey.json".
+        cred_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "1_code/serviceAccountKey.json")
+        if not os.path.exists(cred_path):
+            raise FileNotFoundError(f"Service account key file not found at: {cred_path}. Set GOOGLE_APPLICATION_CREDENTIALS.")
     
-    if not firebase_admin._apps:
-        cred = credentials.Certificate(cred_path)
-        firebase_admin.initialize_app(cred)
-        print("Firebase Admin SDK initialized successfully.")
-    else:
-        print("Firebase Admin SDK already initialized.")
-except FileNotFoundError as fnf_error:
-    print(f"Error: {fnf_error}")
-    exit(1)
-except Exception as e:
-    print(f"Unexpected error during Firebase initialization: {e}")
-    exit(1)
-
-# Get Firestore client.
-try:
-    db = firestore.client()
-    print("Firestore client obtained successfully.")
-except Exception as e:
-    print(f"Error obtaining Firestore client: {e}")
-    exit(1)
+        if not firebase_admin._apps:
+            cred = credentials.Certificate(cred_path)
+            firebase_admin.initialize_app(cred)
+            print("Firebase Admin SDK initialized successfully.")
+        else:
+            print("Firebase Admin SDK already initialized.")
+    except FileNotFoundError as fnf_error:
+        print(f"Error: {fnf_error}")
+        exit(1)
+    except Exception as e:
+        print(f"Unexpected error during Firebase initialization: {e}")
+        exit(1)
+
+    # Get Firestore client.
+    try:
+        firestore_db = firestore.client()
+        print("Firestore client obtained successfully.")
+    except Exception as e:
+        print(f"Error obtaining Firestore client: {e}")
+        exit(1)
+    return firestore_db
+
+# FIRESTORE_MODE=local swaps Firestore for an in-process store (load tests, offline development).
+FIRESTORE_MODE = os.getenv("FIRESTORE_MODE", "firebase")
+if FIRESTORE_MODE == "local":
+    from local_firestore import LocalFirestoreClient
+    db = LocalFirestoreClient()
+    print("Using in-process local Firestore (FIRESTORE_MODE=local).")
+else:
+    db = init_firestore_client()
 
 
 # FastAPI Application Setup
@@ -56,78 +98,387 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Brotli/gzip per Accept-Encoding, for clients on slow links.
+app.add_middleware(CompressionMiddleware)
+# Admin-controlled profiling of selected live requests (see profiling.py); inside
+# MetricsMiddleware so profiles pick up the request's stage timings.
+app.add_middleware(ProfileMiddleware)
+# Records request latency by route for every endpoint, including the app/api routers.
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(StaleDataError)
+def version_conflict(request, exc):
+    """Another request updated the row between this one's read and write (models' version_id_col)."""
+    print(f"Version conflict on {request.url.path}: {exc}")
+    return JSONResponse(status_code=409, content={"detail": "The resource was modified concurrently; retry"})
+
+app.include_router(users.router)
+app.include_router(volunteers.router)
+app.include_router(aid_requests.router)
+app.include_router(resources.router)
+app.include_router(alerts.router)
+app.include_router(donations.router)
+app.include_router(heatmap.router)
+app.include_router(profiling.router)
+app.include_router(sync.router)
+
+# Admission control for the matching endpoints (see admission.py). /debug-match does far
+# more work per call, so it gets a much smaller tier. Each setting can be overridden by
+# MATCH_* / DEBUG_MATCH_* environment variables.
+MATCH_CONCURRENCY = max(2, os.cpu_count() or 1)
+match_admission = tier_from_env("MATCH", "match", concurrency=MATCH_CONCURRENCY,
+                                queue_size=4 * MATCH_CONCURRENCY, max_wait=2.0, rate=10, burst=20)
+debug_match_admission = tier_from_env("DEBUG_MATCH", "debug_match", concurrency=1,
+                                      queue_size=2, max_wait=1.0, rate=0.2, burst=2)
 
 # Firestore collection references.
 volunteers_ref = db.collection('volunteers')
 requests_ref = db.collection('requests')
 
-# API Endpoints
-@app.get("/")
-def read_root():
-    return {"message": "Welcome to the Crowdsourced Disaster Relief API (Firebase)"}
+# Persisted matching model. Refitting is opt-in (MODEL_REFIT_INTERVAL seconds) and runs in
+# the owner process only; every worker picks up newly published versions automatically.
+MODEL_REFIT_INTERVAL = float(os.getenv("MODEL_REFIT_INTERVAL", "0"))
 
-@app.get("/match/{request_id}")
-def match_volunteers_firebase(request_id: str):
-    """
-    Production endpoint: returns matched volunteers for the given request_id.
-    """
+# Owner locks held by this process (see model_store.try_acquire_owner).
+owner_locks = []
+
+def claim_owner(directory):
+    lock = try_acquire_owner(directory)
+    if lock is None:
+        return False
+    owner_locks.append(lock)  # held for the life of the process
+    return True
+
+@app.on_event("startup")
+def load_matching_model():
+    try:
+        model_store.refresh()
+    except Exception as e:
+        print(f"Error loading matching model, falling back to per-request fitting: {e}")
+    if MODEL_REFIT_INTERVAL > 0 and claim_owner(model_store.model_dir):
+        RefitJob(model_store, lambda: fetch_volunteers("refit"), MODEL_REFIT_INTERVAL).start()
+
+# Shared volunteer pool (opt-in, SHARED_POOL_REFRESH seconds): one owner process per host
+# publishes the pool into shared memory and every worker maps the same pages read-only.
+SHARED_POOL_REFRESH = float(os.getenv("SHARED_POOL_REFRESH", "0"))
+shared_pool = SharedPoolReader()
+
+@app.on_event("startup")
+def attach_shared_pool():
+    if SHARED_POOL_REFRESH <= 0:
+        return
+    try:
+        shared_pool.refresh()
+    except Exception as e:
+        print(f"Error attaching shared volunteer pool: {e}")
+    if claim_owner(shared_pool.pool_dir):
+        PoolPublisher(shared_pool, lambda: fetch_volunteers("shared_pool"), SHARED_POOL_REFRESH).start()
+
+# Change-feed synced volunteer pool (opt-in, VOLUNTEER_SYNC=1). Matching reads the
+# in-memory pool instead of streaming the collection while it is at most
+# VOLUNTEER_MAX_STALENESS seconds behind; otherwise it falls back to a full read.
+VOLUNTEER_SYNC = os.getenv("VOLUNTEER_SYNC", "0") == "1"
+VOLUNTEER_MAX_STALENESS = float(os.getenv("VOLUNTEER_MAX_STALENESS", "30"))
+volunteer_sync = VolunteerSynchronizer(volunteers_ref)
+
+@app.on_event("startup")
+def start_volunteer_sync():
+    if VOLUNTEER_SYNC:
+        volunteer_sync.start()
+
+# Write-time coordinate enrichment (opt-in, DOCUMENT_ENRICHMENT=1): one process per host
+# geocodes volunteer and request documents when they are created or relocated, so
+# matching reads stored lat/lon. Run `python enrichment.py backfill` for older documents.
+DOCUMENT_ENRICHMENT = os.getenv("DOCUMENT_ENRICHMENT", "0") == "1"
+
+@app.on_event("startup")
+def start_document_enrichment():
+    if DOCUMENT_ENRICHMENT and claim_owner(ENRICHMENT_DIR):
+        DocumentEnricher([volunteers_ref, requests_ref]).start()
+
+# Geohash-sharded matching (opt-in): MATCH_SHARDS=N starts N local shard processes,
+# MATCH_SHARD_ADDRESSES=host:port,... connects to shard servers on other nodes. The pool
+# is reloaded into the shards every MATCH_SHARD_REFRESH seconds; remote shards are shared,
+# so one process per host loads them and the others follow the generation it publishes.
+MATCH_SHARDS = int(os.getenv("MATCH_SHARDS", "0"))
+MATCH_SHARD_ADDRESSES = os.getenv("MATCH_SHARD_ADDRESSES", "")
+MATCH_SHARD_REFRESH = float(os.getenv("MATCH_SHARD_REFRESH", "60"))
+shard_router = None
+
+@app.on_event("startup")
+def start_shard_router():
+    global shard_router
+    if not (MATCH_SHARDS or MATCH_SHARD_ADDRESSES):
+        return
+    try:
+        if MATCH_SHARD_ADDRESSES:
+            workers = [RemoteShardWorker(address) for address in parse_addresses(MATCH_SHARD_ADDRESSES)]
+            loads = claim_owner(SHARD_OWNER_DIR)
+        else:
+            # Local shard processes belong to this worker alone.
+            _, workers = start_local_shard_processes(MATCH_SHARDS)
+            loads = True
+        shard_router = ShardRouter(workers)
+    except Exception as e:
+        print(f"Error starting shard workers, matching stays in-process: {e}")
+        return
+    # Geocoding the pool can take a while; serve in-process matching until the first load is done.
+    if loads:
+        ShardRefreshJob(shard_router, lambda: fetch_volunteers("shard_load"), MATCH_SHARD_REFRESH).start()
+    else:
+        ShardRefreshJob(shard_router).start()
+
+# Archival of completed aid requests (opt-in, AID_REQUEST_ARCHIVE_INTERVAL seconds), run by
+# one process per host; see archive.py.
+AID_REQUEST_ARCHIVE_INTERVAL = float(os.getenv("AID_REQUEST_ARCHIVE_INTERVAL", "0"))
+
+@app.on_event("startup")
+def start_aid_request_archiver():
+    if AID_REQUEST_ARCHIVE_INTERVAL > 0 and claim_owner(ARCHIVER_DIR):
+        ArchiveJob(SessionLocal, AID_REQUEST_ARCHIVE_INTERVAL).start()
+
+@app.on_event("startup")
+def rebuild_pending_scheduler():
+    # The SQL database is optional for Firebase-only deployments; skip if it is unreachable.
+    db_session = SessionLocal()
+    try:
+        count = pending_scheduler.rebuild(db_session)
+        print(f"Pending request scheduler rebuilt with {count} requests.")
+    except Exception as e:
+        print(f"Could not rebuild pending request scheduler: {e}")
+    finally:
+        db_session.close()
+
+@app.on_event("startup")
+def rebuild_search_index():
+    # PostgreSQL searches its own indexes; elsewhere aid request search needs the in-memory index.
+    db_session = SessionLocal()
+    try:
+        if not uses_database_search(db_session):
+            count = search_index.rebuild(db_session)
+            print(f"Aid request search index rebuilt with {count} requests.")
+    except Exception as e:
+        print(f"Could not rebuild aid request search index: {e}")
+    finally:
+        db_session.close()
+
+@app.on_event("startup")
+def rebuild_shift_index():
+    db_session = SessionLocal()
+    try:
+        count = shift_index.rebuild(db_session)
+        print(f"Volunteer shift index rebuilt with {count} shifts.")
+    except Exception as e:
+        print(f"Could not rebuild volunteer shift index: {e}")
+    finally:
+        db_session.close()
+
+@app.on_event("startup")
+def stamp_unsynced_rows():
+    # Rows written without the sync hook (scripts, bulk loads) are invisible to GET /sync until stamped.
+    db_session = SessionLocal()
+    try:
+        count = backfill_change_seqs(db_session)
+        if count:
+            print(f"Stamped {count} rows for delta sync.")
+    except Exception as e:
+        print(f"Could not stamp rows for delta sync: {e}")
+    finally:
+        db_session.close()
+
+# Helper Functions
+def fetch_request(request_id, endpoint):
+    """Fetch a request document, recording fetch latency and errors for the endpoint."""
     try:
-        request_doc = requests_ref.document(request_id).get()
+        with time_stage("request_fetch"):
+            request_doc = requests_ref.document(request_id).get()
         if not request_doc.exists:
             raise HTTPException(status_code=404, detail="Request not found")
         req_data = request_doc.to_dict()
         req_data['id'] = request_doc.id
+        return req_data
+    except HTTPException:
+        raise
     except Exception as e:
+        record_match_error(endpoint, "request_fetch")
         print(f"Error fetching request {request_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Error fetching request data: {e}")
 
+def fetch_volunteers(endpoint):
+    """Stream every volunteer document, recording stream latency and pool size."""
     try:
-        volunteer_docs = volunteers_ref.stream()
-        all_volunteers = []
-        for doc in volunteer_docs:
-            v_data = doc.to_dict()
-            v_data['id'] = doc.id
-            all_volunteers.append(v_data)
-        if not all_volunteers:
-            raise HTTPException(status_code=404, detail="No volunteers available")
+        with time_stage("volunteer_stream"):
+            volunteer_docs = volunteers_ref.stream()
+            all_volunteers = []
+            for doc in volunteer_docs:
+                v_data = doc.to_dict()
+                v_data['id'] = doc.id
+                all_volunteers.append(v_data)
     except Exception as e:
+        record_match_error(endpoint, "volunteer_stream")
         print(f"Error fetching volunteers: {e}")
         raise HTTPException(status_code=500, detail=f"Error fetching volunteer data: {e}")
+    observe_pool_size(endpoint, len(all_volunteers))
+    if not all_volunteers:
+        raise HTTPException(status_code=404, detail="No volunteers available")
+    return all_volunteers
 
-    # Extract features from the request.
-    request_features = extract_features_request(req_data)
-    # Perform AI matching using KNN.
-    matches = get_best_matches(request_features, all_volunteers, k=3)
-    return {"matched_volunteers": matches}
-
-@app.get("/debug-match/{request_id}")
-def debug_match(request_id: str):
+def fetch_volunteer_columns(endpoint):
     """
-    Debug endpoint: returns detailed matching process information.
+    Stream every volunteer document straight into a columnar pool, so no
+    per-volunteer dicts outlive the stream. Records stream latency and pool size.
     """
     try:
-        request_doc = requests_ref.document(request_id).get()
-        if not request_doc.exists:
-            raise HTTPException(status_code=404, detail="Request not found")
-        req_data = request_doc.to_dict()
-        req_data['id'] = request_doc.id
+        with time_stage("volunteer_stream"):
+            pool = VolunteerColumns.from_documents((doc.id, doc.to_dict()) for doc in volunteers_ref.stream())
     except Exception as e:
-        print(f"Error fetching request {request_id}: {e}")
-        raise HTTPException(status_code=500, detail=f"Error fetching request data: {e}")
+        record_match_error(endpoint, "volunteer_stream")
+        print(f"Error fetching volunteers: {e}")
+        raise HTTPException(status_code=500, detail=f"Error fetching volunteer data: {e}")
+    observe_pool_size(endpoint, len(pool))
+    if not len(pool):
+        raise HTTPException(status_code=404, detail="No volunteers available")
+    return pool
+
+def synced_pool(endpoint):
+    """The change-feed pool view if sync is on and fresh enough, else None."""
+    if not VOLUNTEER_SYNC:
+        return None
+    try:
+        view = volunteer_sync.read(VOLUNTEER_MAX_STALENESS)
+    except StalePoolError as e:
+        print(f"{e}; reading volunteers from Firestore.")
+        return None
+    observe_pool_size(endpoint, len(view.columns))
+    if not len(view.columns):
+        raise HTTPException(status_code=404, detail="No volunteers available")
+    return view
 
+def fetch_volunteers_by_id(volunteer_ids, endpoint):
+    """Fetch only the matched volunteer documents in one read, skipping any deleted since the model was fitted."""
+    if not volunteer_ids:
+        return []
     try:
-        volunteer_docs = volunteers_ref.stream()
-        all_volunteers = []
-        for doc in volunteer_docs:
-            v_data = doc.to_dict()
-            v_data['id'] = doc.id
-            all_volunteers.append(v_data)
-        if not all_volunteers:
-            raise HTTPException(status_code=404, detail="No volunteers available")
+        with time_stage("volunteer_fetch"):
+            matches = []
+            for doc in db.get_all([volunteers_ref.document(volunteer_id) for volunteer_id in volunteer_ids]):
+                if doc.exists:
+                    v_data = doc.to_dict()
+                    v_data['id'] = doc.id
+                    matches.append(v_data)
+            return matches
     except Exception as e:
-        print(f"Error fetching volunteers: {e}")
+        record_match_error(endpoint, "volunteer_fetch")
+        print(f"Error fetching matched volunteers: {e}")
         raise HTTPException(status_code=500, detail=f"Error fetching volunteer data: {e}")
 
+def with_documents(matches, pool, endpoint):
+    """
+    Matched volunteers (dicts with id and distance_km) with their documents.
+    A pool that keeps no documents (the synced pool) has them read by id.
+    """
+    if pool.documents is not None or not matches:
+        return matches
+    fetched = {doc['id']: doc for doc in fetch_volunteers_by_id([match['id'] for match in matches], endpoint)}
+    return [dict(fetched[match['id']], distance_km=match['distance_km']) for match in matches if match['id'] in fetched]
+
+def rerank(request_features, candidates, endpoint, k=3):
+    """
+    The top k of an index search's candidates by composite score, as documents
+    with distance_km. Index distances are over scaled features, so the candidates
+    are re-scored by great-circle distance, skill and availability from the
+    coordinates the index holds; only the k winners' documents are read.
+    """
+    try:
+        ranked = rerank_candidates(request_features, candidates, k)
+    except Exception:
+        record_match_error(endpoint, "matching")
+        raise
+    fetched = {doc['id']: doc for doc in fetch_volunteers_by_id([volunteer_id for volunteer_id, _ in ranked], endpoint)}
+    return [with_distance(fetched[volunteer_id], d) for volunteer_id, d in ranked if volunteer_id in fetched]
+
+# API Endpoints
+@app.get("/")
+def read_root():
+    return {"message": "Welcome to the Crowdsourced Disaster Relief API (Firebase)"}
+
+@app.get("/metrics")
+def read_metrics():
+    """
+    Prometheus scrape endpoint: matching stage latencies, pool sizes, geocoding
+    and error counters, and request latency by route.
+    """
+    # As a header: Starlette would append a second charset to a text/ media_type.
+    return Response(content=render_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+@app.get("/match/{request_id}", dependencies=[Depends(admission_dependency(match_admission))])
+@profiled
+def match_volunteers_firebase(request_id: str, request: Request):
+    """
+    Production endpoint: returns matched volunteers for the given request_id.
+    """
+    req_data = fetch_request(request_id, "match")
+    try:
+        # Extract features from the request.
+        request_features = extract_features_request(req_data)
+    except Exception:
+        record_match_error("match", "matching")
+        raise
+
+    if shard_router is not None and shard_router.ready:
+        try:
+            candidates = shard_router.candidates(request_features, k=MATCH_RERANK_CANDIDATES)
+        except Exception:
+            record_match_error("match", "matching")
+            raise
+        matches = rerank(request_features, candidates, "match")
+        return respond(request, {"matched_volunteers": matches, "shards": len(shard_router.workers)})
+
+    snapshot = shared_pool.get() if SHARED_POOL_REFRESH > 0 else None
+    if snapshot is not None:
+        try:
+            candidates = snapshot.candidates(request_features, k=MATCH_RERANK_CANDIDATES)
+        except Exception:
+            record_match_error("match", "matching")
+            raise
+        matches = rerank(request_features, candidates, "match")
+        return respond(request, {"matched_volunteers": matches, "pool_generation": snapshot.generation})
+
+    # With a published model, only transform the request and query the saved index.
+    artifacts = model_store.get()
+    if artifacts is not None:
+        try:
+            candidates = candidates_with_artifacts(artifacts, request_features, k=MATCH_RERANK_CANDIDATES)
+        except Exception:
+            record_match_error("match", "matching")
+            raise
+        matches = rerank(request_features, candidates, "match")
+        return respond(request, {"matched_volunteers": matches, "model_version": artifacts["version"]})
+
+    view = synced_pool("match")
+    pool = view.columns if view is not None else fetch_volunteer_columns("match")
+
+    try:
+        # Score the pool's columns; only the top k volunteers are decoded.
+        matches = [match.to_dict() for match in pool.match(request_features, k=3)]
+    except Exception:
+        record_match_error("match", "matching")
+        raise
+    matches = with_documents(matches, pool, "match")
+    if view is not None:
+        return respond(request, {"matched_volunteers": matches, "pool_version": view.version})
+    return respond(request, {"matched_volunteers": matches})
+
+@app.get("/debug-match/{request_id}", dependencies=[Depends(admission_dependency(debug_match_admission))])
+@profiled
+def debug_match(request_id: str, request: Request):
+    """
+    Debug endpoint: returns detailed matching process information.
+    """
+    req_data = fetch_request(request_id, "debug_match")
+    view = synced_pool("debug_match")
+    pool = view.columns if view is not None else fetch_volunteer_columns("debug_match")
+
     # Extract the request feature vector.
     request_features = extract_features_request(req_data)
     
@@ -137,5 +488,10 @@ def debug_match(request_id: str):
     except ImportError:
         raise HTTPException(status_code=500, detail="Debug matching function not found in matching_ai.py")
     
-    debug_data = get_best_matches_debug(request_features, all_volunteers, k=3)
-    return debug_data
\ No newline at end of file
+    try:
+        debug_data = get_best_matches_debug(request_features, pool, k=3, X=view.X if view is not None else pool.feature_matrix())
+    except Exception:
+        record_match_error("debug_match", "matching")
+        raise
+    debug_data["matched_volunteers"] = with_documents(debug_data["matched_volunteers"], pool, "debug_match")
+    return respond(request, debug_data)
@@ -0,0 +1,110 @@
+# 1_code/matching.py
+
+"""
+Volunteer matching for the SQL-backed aid request API.
+
+Profiles stored in SQL already carry coordinates, so features are built
+directly from the columns instead of geocoding a free-text location.
+Candidates are ranked by the same composite score as the Firestore API
+(great-circle distance, skill match, availability; see matching_ai.rank_by_score),
+so no scaler is involved. With a published model version (model_store.py)
+request types are encoded with that version's encoder.
+"""
+
+import numpy as np
+
+import models
+from matching_ai import canonical_skill, encode_skills, encoder, rank_by_score, skill_masks_from_features
+from metrics import observe_pool_size, time_stage
+from model_store import model_store
+from shifts import available_clause
+
+URGENCY_SCORES = {"low": 1, "medium": 2, "high": 3}
+
+
+def extract_features_profile(profile):
+    """
+    Extract features from a VolunteerProfile row.
+    Returns: [latitude, longitude] + multi-hot encoded skills + [availability_flag]
+    """
+    encoded_skill = encode_skills(profile.skills or '')
+    lat = profile.current_latitude or 0.0
+    lon = profile.current_longitude or 0.0
+    return np.concatenate(([lat, lon], encoded_skill, [1 if profile.availability else 0]))
+
+
+def extract_features_aid_request(aid_request, type_encoder=None):
+    """
+    Extract features from an AidRequest row.
+    Pass type_encoder to use the encoder saved with a model version.
+    Returns: [latitude, longitude] + one-hot encoded type + [urgency_score]
+    """
+    encoded_type = (type_encoder or encoder).transform([[canonical_skill(aid_request.type or '') or '']])[0]
+    urgency_score = URGENCY_SCORES.get((aid_request.urgency or 'low').lower(), 1)
+    return np.concatenate(([aid_request.latitude, aid_request.longitude], encoded_type, [urgency_score]))
+
+
+def load_available_profiles(db, start=None, end=None):
+    """Flagged-available profiles on shift over [start, end) (default: now); see shifts.py."""
+    with time_stage("volunteer_query"):
+        return (db.query(models.VolunteerProfile).filter(available_clause(start, end))
+                .order_by(models.VolunteerProfile.id).all())
+
+
+def fitted_encoder():
+    """Request type encoder of the published model version, or None if there is none."""
+    artifacts = model_store.get()
+    return None if artifacts is None else artifacts["encoder"]
+
+
+def profile_matrix(profiles):
+    """Feature matrix of the profiles and its skill bitmasks, built once per pool."""
+    with time_stage("build_feature_matrix"):
+        X = np.vstack([extract_features_profile(p) for p in profiles])
+    return X, skill_masks_from_features(X)
+
+
+def find_matching_volunteers(db, aid_request, k=3, start=None, end=None):
+    """
+    Return up to k available VolunteerProfile rows closest to the aid request.
+    """
+    profiles = load_available_profiles(db, start, end)
+    observe_pool_size("aid_requests", len(profiles))
+    if not profiles:
+        return []
+    X, skill_masks = profile_matrix(profiles)
+    request_features = extract_features_aid_request(aid_request, fitted_encoder())
+    _, _, indices = rank_by_score(request_features, X, k, skill_masks)
+    return [profiles[i] for i in indices]
+
+
+def match_pending_requests(db, request_ids, k=3, start=None, end=None):
+    """
+    Batch matching in the given (priority) order. Each request gets up to k
+    candidates; a volunteer who is the top pick of an earlier request is not
+    offered to later ones. Only volunteers available over [start, end)
+    (default: now) are considered. Returns a list of (AidRequest, [VolunteerProfile]).
+    """
+    if not request_ids:
+        return []
+    profiles = load_available_profiles(db, start, end)
+    observe_pool_size("batch_match", len(profiles))
+    requests = {r.id: r for r in db.query(models.AidRequest).filter(models.AidRequest.id.in_(request_ids))}
+    if not profiles:
+        return [(requests[i], []) for i in request_ids if i in requests]
+
+    X, skill_masks = profile_matrix(profiles)
+    type_encoder = fitted_encoder()
+    reserved = set()
+    proposals = []
+    for request_id in request_ids:
+        aid_request = requests.get(request_id)
+        if aid_request is None:
+            continue
+        request_features = extract_features_aid_request(aid_request, type_encoder)
+        _, _, indices = rank_by_score(request_features, X, k + len(reserved), skill_masks)
+        chosen = [i for i in indices if i not in reserved][:k]
+        if chosen:
+            reserved.add(chosen[0])
+        proposals.append((aid_request, [profiles[i] for i in chosen]))
+    return proposals
@@ -1,46 +1,157 @@
 # 1_code/matching_ai.py
 
+import os
+
 import numpy as np
-from sklearn.neighbors import NearestNeighbors
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
-import joblib  # For persistence (if needed in the future)
 from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 
+from ann_index import build_index
+from geo import haversine_km
+from metrics import COORDINATE_FALLBACKS, GEOCODE_CALLS, time_stage
+
 # Configuration and Encoder Setup
 KNOWN_SKILLS = ['Medical', 'Food Logistics', 'Rescue', 'Shelter Management', 'Transportation', 'Communication', 'General Labor']
 
 encoder = OneHotEncoder(categories=[KNOWN_SKILLS], sparse_output=False, handle_unknown='ignore')
 encoder.fit(np.array(KNOWN_SKILLS).reshape(-1, 1))
 
-# Initialize global scaler (if needed) and geolocator
-global_scaler = StandardScaler()  # Not used globally, as each matching gets its own scaler.
+# Skills as bits: volunteer skill sets and request types are compared with a bitwise AND.
+SKILL_BITS = {skill: 1 << i for i, skill in enumerate(KNOWN_SKILLS)}
+SKILL_MASK_DTYPE = np.uint16
+# Lower-case request types used by the SQL API, mapped onto the known skills.
+SKILL_ALIASES = {
+    'food': 'Food Logistics',
+    'shelter': 'Shelter Management',
+    'transport': 'Transportation',
+    'labor': 'General Labor',
+}
+# Composite match score (lower is better): great-circle km divided by the distance
+# scale, plus a penalty for lacking the requested skill or being unavailable.
+# With the defaults an unavailable volunteer ranks behind an available one up to 200 km further away.
+MATCH_DISTANCE_SCALE_KM = float(os.getenv("MATCH_DISTANCE_SCALE_KM", "50"))
+MATCH_SKILL_WEIGHT = float(os.getenv("MATCH_SKILL_WEIGHT", "2"))
+MATCH_AVAILABILITY_WEIGHT = float(os.getenv("MATCH_AVAILABILITY_WEIGHT", "4"))
+# Index searches (shards, shared pool, model versions) rank by scaled feature distance;
+# this many nearest candidates are re-ranked by the composite score.
+MATCH_RERANK_CANDIDATES = int(os.getenv("MATCH_RERANK_CANDIDATES", "12"))
+_SKILL_LOOKUP = {skill.lower(): skill for skill in KNOWN_SKILLS}
+_SKILL_LOOKUP.update(SKILL_ALIASES)
+
+# Documents carry lat/lon written by enrichment.py. Geocode on read only for documents
+# it hasn't reached yet; set MATCH_GEOCODE_ON_READ=0 once the backfill has run.
+MATCH_GEOCODE_ON_READ = os.getenv("MATCH_GEOCODE_ON_READ", "1") == "1"
+
+# Initialize geolocator. Fitted scalers are versioned and persisted by model_store.py.
 geolocator = Nominatim(user_agent="disaster_matching_ai")
 
-# Geocoding Function
+# Geocoding Functions
+def geocode(address):
+    """
+    Resolve an address to (latitude, longitude), or None if it isn't found.
+    Geocoder timeouts and service errors propagate.
+    """
+    with time_stage("geocode"):
+        location = geolocator.geocode(address, timeout=10)
+    if location:
+        GEOCODE_CALLS.labels(outcome="hit").inc()
+        return location.latitude, location.longitude
+    GEOCODE_CALLS.labels(outcome="miss").inc()
+    return None
+
 def get_lat_long(address):
     """
     Convert an address string to a (latitude, longitude) tuple.
     Returns (0.0, 0.0) if the address cannot be resolved.
     """
     try:
-        location = geolocator.geocode(address, timeout=10)
-        if location:
-            return location.latitude, location.longitude
+        return geocode(address) or (0.0, 0.0)
     except (GeocoderTimedOut, GeocoderServiceError):
-        pass
+        GEOCODE_CALLS.labels(outcome="error").inc()
     return (0.0, 0.0)
 
+def stored_coordinates(data):
+    """
+    Coordinates enrichment wrote onto a document, or None if it has none for
+    the document's current location. An address the geocoder couldn't find
+    is stored without coordinates and reads as (0.0, 0.0), like get_lat_long.
+    """
+    if 'geocoded_location' not in data or data['geocoded_location'] != data.get('location', ''):
+        return None
+    if data.get('lat') is None or data.get('lon') is None:
+        return (0.0, 0.0)
+    return float(data['lat']), float(data['lon'])
+
+def document_coordinates(data):
+    """(latitude, longitude) of a volunteer or request document, geocoding only as a fallback."""
+    coordinates = stored_coordinates(data)
+    if coordinates is not None:
+        return coordinates
+    if MATCH_GEOCODE_ON_READ:
+        COORDINATE_FALLBACKS.labels(outcome="geocoded").inc()
+        return get_lat_long(data.get('location', ''))
+    COORDINATE_FALLBACKS.labels(outcome="missing").inc()
+    return (0.0, 0.0)
+
+# Skill Parsing Functions
+def canonical_skill(name):
+    """Map a skill or request type to its KNOWN_SKILLS spelling, or None if unknown."""
+    return _SKILL_LOOKUP.get(str(name).strip().lower())
+
+def parse_skills(skills):
+    """
+    Parse a comma-separated skill string (or a list of skills) into the known
+    skills it names, in KNOWN_SKILLS order. Unknown entries are dropped.
+    """
+    if isinstance(skills, str):
+        skills = skills.split(',')
+    found = {canonical_skill(s) for s in skills or []}
+    return [skill for skill in KNOWN_SKILLS if skill in found]
+
+def skills_to_mask(skills):
+    """Bitmask of the known skills named by `skills`."""
+    mask = 0
+    for skill in parse_skills(skills):
+        mask |= SKILL_BITS[skill]
+    return mask
+
+def encode_skills(skills):
+    """Multi-hot vector over KNOWN_SKILLS."""
+    mask = skills_to_mask(skills)
+    return np.array([1.0 if mask & bit else 0.0 for bit in SKILL_BITS.values()])
+
+def skill_masks_from_features(X):
+    """
+    Per-row skill bitmasks read from the skill columns of feature vectors
+    built by extract_features_volunteer / extract_features_request.
+    """
+    X = np.atleast_2d(X)
+    bits = X[:, 2:2 + len(KNOWN_SKILLS)] > 0
+    weights = (1 << np.arange(len(KNOWN_SKILLS))).astype(SKILL_MASK_DTYPE)
+    return (bits.astype(SKILL_MASK_DTYPE) * weights).sum(axis=1).astype(SKILL_MASK_DTYPE)
+
+def prefilter_by_skill(skill_masks, request_mask):
+    """
+    Row indices of volunteers holding any skill in request_mask.
+    Returns None when the request names no known skill (nothing to filter on).
+    """
+    if not request_mask:
+        return None
+    with time_stage("skill_prefilter"):
+        return np.flatnonzero(skill_masks & SKILL_MASK_DTYPE(request_mask))
+
 # Feature Extraction Functions
-def extract_features_request(request_data):
+def extract_features_request(request_data, type_encoder=None):
     """
     Extract features from an aid request.
-    Expected keys: 'type', 'location', 'urgency'
+    Expected keys: 'type', 'location', 'urgency' (and 'lat'/'lon' once enriched)
+    Pass type_encoder to use the encoder saved with a model version.
     Returns: [latitude, longitude] + one-hot encoded type + [urgency_score]
     """
-    req_type = request_data.get('type', '')
-    encoded_type = encoder.transform([[req_type]])[0]
-    lat, lon = get_lat_long(request_data.get('location', ''))
+    req_type = canonical_skill(request_data.get('type', '')) or ''
+    encoded_type = (type_encoder or encoder).transform([[req_type]])[0]
+    lat, lon = document_coordinates(request_data)
     urgency_mapping = {"low": 1, "medium": 2, "high": 3}
     urgency_score = urgency_mapping.get(request_data.get('urgency', 'low'), 1)
     return np.concatenate(([lat, lon], encoded_type, [urgency_score]))
@@ -48,12 +159,11 @@ def extract_features_request(request_data):
 def extract_features_volunteer(volunteer_data):
     """
     Extract features from a volunteer.
-    Expected keys: 'skills', 'location', 'availability'
-    Returns: [latitude, longitude] + one-hot encoded skill + [availability_flag]
+    Expected keys: 'skills' (comma-separated), 'location', 'availability' (and 'lat'/'lon' once enriched)
+    Returns: [latitude, longitude] + multi-hot encoded skills + [availability_flag]
     """
-    v_skill = volunteer_data.get('skills', '')
-    encoded_skill = encoder.transform([[v_skill]])[0]
-    lat, lon = get_lat_long(volunteer_data.get('location', ''))
+    encoded_skill = encode_skills(volunteer_data.get('skills', ''))
+    lat, lon = document_coordinates(volunteer_data)
     availability = 1 if volunteer_data.get('availability', 'available').lower() == 'available' else 0
     return np.concatenate(([lat, lon], encoded_skill, [availability]))
 
@@ -63,35 +173,143 @@ def build_feature_matrix(volunteers):
     Build a feature matrix from a list of volunteer dictionaries.
     Each row represents one volunteer's feature vector.
     """
-    features = [extract_features_volunteer(vol) for vol in volunteers]
-    return np.vstack(features)
+    with time_stage("build_feature_matrix"):
+        features = [extract_features_volunteer(vol) for vol in volunteers]
+        return np.vstack(features)
+
+def rank_feature_matrix(request_features, X, k=3, skill_masks=None, scaler=None):
+    """
+    Scale the volunteer feature matrix X, then run KNN for the request vector
+    over the volunteers whose skills cover the request type.
+    If nobody has the requested skill, the whole pool is ranked instead.
+    Pass the fitted scaler of a model version to only transform; without one
+    a scaler is fitted on X.
+    Returns (X_scaled, req_scaled, distances, indices) with indices into X.
+    """
+    with time_stage("standard_scaler"):
+        if scaler is None:
+            scaler = StandardScaler().fit(X)
+        X_scaled = scaler.transform(X)
+        req_scaled = scaler.transform([request_features])
+    if skill_masks is None:
+        skill_masks = skill_masks_from_features(X)
+    candidates = prefilter_by_skill(skill_masks, int(skill_masks_from_features(request_features)[0]))
+    if candidates is None or len(candidates) == 0:
+        candidates = np.arange(len(X))
+    with time_stage("nearest_neighbors"):
+        # Always exact: the pool is loaded per request, and training an IVF index on
+        # every call costs more than the search it saves. IVF serves the indexes built
+        # once per model version (model_store.py).
+        index = build_index(X_scaled[candidates], engine="exact")
+        distances, indices = index.query(req_scaled[0], k)
+    return X_scaled, req_scaled, distances[None, :], candidates[indices][None, :]
+
+def score_columns(request_features, latitude, longitude, skill_masks, available):
+    """
+    composite_scores over volunteer columns: latitude/longitude arrays,
+    skill bitmasks and a boolean availability array.
+    Returns (scores, distances_km), both float32.
+    """
+    with time_stage("haversine"):
+        distances = haversine_km(request_features[0], request_features[1], latitude, longitude)
+    scores = distances / np.float32(MATCH_DISTANCE_SCALE_KM)
+    request_mask = int(skill_masks_from_features(request_features)[0])
+    if request_mask:
+        scores += np.float32(MATCH_SKILL_WEIGHT) * ((skill_masks & SKILL_MASK_DTYPE(request_mask)) == 0)
+    scores += np.float32(MATCH_AVAILABILITY_WEIGHT) * ~np.asarray(available, dtype=bool)
+    return scores, distances
+
+def composite_scores(request_features, X, skill_masks=None):
+    """
+    Score every volunteer row of X for a request: distance in km over
+    MATCH_DISTANCE_SCALE_KM, plus MATCH_SKILL_WEIGHT if the volunteer holds
+    none of the requested skills, plus MATCH_AVAILABILITY_WEIGHT if unavailable.
+    Returns (scores, distances_km), both float32.
+    """
+    if skill_masks is None:
+        skill_masks = skill_masks_from_features(X)
+    return score_columns(request_features, X[:, 0], X[:, 1], skill_masks, X[:, -1] > 0)
+
+def rank_columns(request_features, latitude, longitude, skill_masks, available, k=3):
+    """
+    rank_by_score over volunteer columns (see score_columns). The columns are
+    only gathered for the skill-prefiltered candidates; an unfiltered pool is
+    scored in place. Returns (scores, distances_km, row indices), best first.
+    """
+    candidates = prefilter_by_skill(skill_masks, int(skill_masks_from_features(request_features)[0]))
+    if candidates is None or len(candidates) == 0:
+        candidates = np.arange(len(latitude))
+        scores, distances = score_columns(request_features, latitude, longitude, skill_masks, available)
+    else:
+        scores, distances = score_columns(request_features, latitude[candidates], longitude[candidates],
+                                          skill_masks[candidates], available[candidates])
+    k = min(k, len(candidates))
+    top = np.argpartition(scores, k - 1)[:k] if k < len(candidates) else np.arange(len(candidates))
+    top = top[np.lexsort((top, scores[top]))]
+    return scores[top], distances[top], candidates[top]
+
+def rank_by_score(request_features, X, k=3, skill_masks=None):
+    """
+    Rank the volunteers holding the requested skill (the whole pool if nobody
+    does) by composite_scores. Returns (scores, distances_km, indices into X), best first.
+    """
+    if skill_masks is None:
+        skill_masks = skill_masks_from_features(X)
+    return rank_columns(request_features, X[:, 0], X[:, 1], skill_masks, X[:, -1] > 0, k)
+
+def candidate_columns(X_scaled, mean, scale):
+    """
+    (latitude, longitude, available) of scaled feature rows, recovered with the
+    scaler's mean and scale, so an index's candidates can be re-scored without
+    reading their documents.
+    """
+    X_scaled = np.asarray(X_scaled, dtype=np.float64)
+    latitude = X_scaled[:, 0] * scale[0] + mean[0]
+    longitude = X_scaled[:, 1] * scale[1] + mean[1]
+    available = X_scaled[:, -1] * scale[-1] + mean[-1] > 0.5
+    return latitude, longitude, available
+
+def rerank_candidates(request_features, candidates, k=3):
+    """
+    rank_columns over an index search's candidates, given as (volunteer_id,
+    latitude, longitude, skill_mask, available) rows.
+    Returns (volunteer_id, distance_km) pairs, best first.
+    """
+    if not candidates:
+        return []
+    ids, latitude, longitude, skill_masks, available = zip(*candidates)
+    _, distances, top = rank_columns(request_features, np.asarray(latitude, dtype=np.float64),
+                                     np.asarray(longitude, dtype=np.float64),
+                                     np.asarray(skill_masks, dtype=SKILL_MASK_DTYPE),
+                                     np.asarray(available, dtype=bool), k)
+    return [(ids[i], float(d)) for i, d in zip(top, distances)]
+
+def with_distance(volunteer, distance_km):
+    return dict(volunteer, distance_km=round(float(distance_km), 2))
 
-def get_best_matches(request_features, volunteers, k=3):
+def get_best_matches(request_features, volunteers, k=3, X=None):
     """
-    Production function: Uses KNN to find the top k matching volunteers.
-    Returns a list of volunteer dictionaries for the best matches.
+    Production function: finds the top k volunteers by composite score
+    (great-circle distance, skill match and availability).
+    Pass X to reuse an already built feature matrix (rows follow volunteers).
+    Returns volunteer dictionaries for the best matches, each with `distance_km`.
     """
     if not volunteers:
         return []
-    X = build_feature_matrix(volunteers)
-    scaler_local = StandardScaler()
-    X_scaled = scaler_local.fit_transform(X)
-    req_scaled = scaler_local.transform([request_features])
-    nn = NearestNeighbors(n_neighbors=min(k, len(volunteers)), metric='euclidean')
-    nn.fit(X_scaled)
-    distances, indices = nn.kneighbors(req_scaled)
-    matches = [volunteers[i] for i in indices[0]]
+    if X is None:
+        X = build_feature_matrix(volunteers)
+    _, distances, indices = rank_by_score(request_features, X, k)
+    matches = [with_distance(volunteers[i], d) for i, d in zip(indices, distances)]
     return matches
 
-def get_best_matches_debug(request_features, volunteers, k=3):
+def get_best_matches_debug(request_features, volunteers, k=3, X=None):
     """
     Debug function: Similar to get_best_matches, but returns detailed matching info.
     Returns a dictionary with:
       - Raw request feature vector.
       - Volunteer feature matrix.
-      - Scaled feature matrix.
-      - Scaled request vector.
-      - Distances and indices from KNN.
+      - Scaled feature matrix and scaled request vector (for inspection).
+      - Composite scores, km distances and indices of the best matches.
       - Final matched volunteer dictionaries.
     """
     if not volunteers:
@@ -99,23 +317,18 @@ def get_best_matches_debug(request_features, volunteers, k=3):
             "message": "No volunteers available",
             "matched_volunteers": []
         }
-    X = build_feature_matrix(volunteers)
-    from sklearn.preprocessing import StandardScaler
-    scaler_local = StandardScaler()
-    X_scaled = scaler_local.fit_transform(X)
-    req_scaled = scaler_local.transform([request_features])
-    nn = NearestNeighbors(n_neighbors=min(k, len(volunteers)), metric='euclidean')
-    nn.fit(X_scaled)
-    distances, indices = nn.kneighbors(req_scaled)
-    distances_list = distances[0].tolist()
-    indices_list = indices[0].tolist()
-    matched_vols = [volunteers[i] for i in indices_list]
+    if X is None:
+        X = build_feature_matrix(volunteers)
+    scaler_local = StandardScaler().fit(X)
+    scores, distances, indices = rank_by_score(request_features, X, k)
+    matched_vols = [with_distance(volunteers[i], d) for i, d in zip(indices, distances)]
     return {
         "request_features": request_features.tolist(),
         "volunteer_features": X.tolist(),
-        "X_scaled": X_scaled.tolist(),
-        "req_scaled": req_scaled[0].tolist(),
-        "distances": distances_list,
-        "indices": indices_list,
+        "X_scaled": scaler_local.transform(X).tolist(),
+        "req_scaled": scaler_local.transform([request_features])[0].tolist(),
+        "scores": scores.tolist(),
+        "distances": distances.tolist(),
+        "indices": indices.tolist(),
         "matched_volunteers": matched_vols
-    }
\ No newline at end of file
+    }
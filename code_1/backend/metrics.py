@@ -0,0 +1,371 @@
+# 1_code/metrics.py
+
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms are kept in plain Python structures guarded by
+a lock, so recording a sample costs a dict lookup and a few additions. The
+registry is rendered on demand by the /metrics endpoint.
+
+Matching code records per-stage latency through `time_stage`, which also
+collects the stage timings of the current request so they can be emitted as a
+structured log line when REQUEST_TIMING_LOG=1.
+
+With REPLAY_TRACE_LOG=1, the write endpoints also log one JSON line per
+request creation, volunteer update, assignment and completion
+(`record_trace_event`). 3_basic_function_testing/trace_replay.py turns those
+lines into a replayable trace.
+"""
+
+import bisect
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from sub-millisecond index lookups up to slow geocoding.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Buckets for volunteer pool sizes.
+SIZE_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+
+TIMING_LOG_ENABLED = os.getenv("REQUEST_TIMING_LOG", "0") == "1"
+timing_logger = logging.getLogger("disaster_relief.timing")
+TRACE_LOG_ENABLED = os.getenv("REPLAY_TRACE_LOG", "0") == "1"
+trace_logger = logging.getLogger("disaster_relief.trace")
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Registry:
+    """Holds every metric and renders them in Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, **labels):
+        """Return the child series for the given label values."""
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"Metric {self.name} requires labels {self.labelnames}")
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+    def samples(self):
+        for key, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+
+
+class _GaugeChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = float(value)
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1.0):
+        with self._lock:
+            self.value -= amount
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount=1.0):
+        self._default().dec(amount)
+
+    def samples(self):
+        for key, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum", "_lock")
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        # One slot per bucket plus the implicit +Inf bucket.
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        idx = bisect.bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def samples(self):
+        bounds = self.buckets + (float("inf"),)
+        for key, child in list(self._children.items()):
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+# Metrics shared by the matching path and the HTTP layer.
+MATCH_STAGE_SECONDS = Histogram(
+    "match_stage_duration_seconds",
+    "Latency of each stage of the matching pipeline.",
+    ["stage"],
+)
+MATCH_POOL_SIZE = Histogram(
+    "match_volunteer_pool_size",
+    "Number of volunteers considered per match.",
+    ["endpoint"],
+    buckets=SIZE_BUCKETS,
+)
+MATCH_ERRORS = Counter(
+    "match_errors_total",
+    "Errors raised while matching, by endpoint and stage.",
+    ["endpoint", "stage"],
+)
+GEOCODE_CALLS = Counter(
+    "geocode_calls_total",
+    "Geocoding lookups by outcome (hit, miss, error).",
+    ["outcome"],
+)
+COORDINATE_FALLBACKS = Counter(
+    "match_coordinate_fallbacks_total",
+    "Documents matched without enriched coordinates, by what was used instead (geocoded, missing).",
+    ["outcome"],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by method, route template and status code.",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being served.",
+)
+
+# Stage timings of the request being served, used for structured timing logs.
+_request_stages = contextvars.ContextVar("request_stages", default=None)
+
+
+@contextmanager
+def time_stage(stage):
+    """Time a block of the matching pipeline and record it under `stage`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        MATCH_STAGE_SECONDS.labels(stage=stage).observe(elapsed)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages[stage] = stages.get(stage, 0.0) + elapsed
+
+
+def current_stages():
+    """Stage timings recorded so far for the request being served, or None outside MetricsMiddleware."""
+    return _request_stages.get()
+
+
+def observe_pool_size(endpoint, size):
+    MATCH_POOL_SIZE.labels(endpoint=endpoint).observe(size)
+
+
+def record_match_error(endpoint, stage):
+    MATCH_ERRORS.labels(endpoint=endpoint, stage=stage).inc()
+
+
+def record_trace_event(event, **fields):
+    """Log one replay trace event ("request", "volunteer", "assign" or "complete") if REPLAY_TRACE_LOG=1."""
+    if TRACE_LOG_ENABLED:
+        trace_logger.info(json.dumps({"trace": event, "ts": round(time.time(), 3), **fields}))
+
+
+def render_latest():
+    """Render the default registry in Prometheus text format."""
+    return REGISTRY.render()
+
+
+def _route_template(scope):
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    # Unmatched paths share one label so arbitrary URLs can't blow up cardinality.
+    return path if path else "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency by route template.
+
+    It is a plain ASGI wrapper rather than a BaseHTTPMiddleware so that the
+    per-request overhead stays at a couple of clock reads and a histogram update.
+    """
+
+    def __init__(self, app, timing_log=None):
+        self.app = app
+        self.timing_log = TIMING_LOG_ENABLED if timing_log is None else timing_log
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_holder = {"status": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        # Sync endpoints run in a threadpool with a copy of this context, so the
+        # shared dict still collects their stage timings.
+        stages = {}
+        token = _request_stages.set(stages)
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+            _request_stages.reset(token)
+            route = _route_template(scope)
+            status = status_holder["status"]
+            HTTP_REQUEST_SECONDS.labels(method=scope["method"], route=route, status=status).observe(elapsed)
+            if self.timing_log:
+                timing_logger.info(json.dumps({
+                    "method": scope["method"],
+                    "route": route,
+                    "path": scope.get("path"),
+                    "status": status,
+                    "duration_ms": round(elapsed * 1000, 3),
+                    "stages_ms": {k: round(v * 1000, 3) for k, v in stages.items()},
+                }))
@@ -0,0 +1,61 @@
+"""archive completed aid requests, partial indexes on the active set
+
+Revision ID: add_aid_request_archive
+Revises: add_heatmap
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_aid_request_archive'
+down_revision = 'add_heatmap'
+branch_labels = None
+depends_on = None
+
+ACTIVE = sa.text("status IN ('pending', 'assigned')")
+ASSIGNED = sa.text("status = 'assigned'")
+COMPLETED = sa.text("status = 'completed'")
+
+def upgrade() -> None:
+    op.create_table(
+        'aid_requests_archive',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('requester_id', sa.Integer(), nullable=True),
+        sa.Column('type', sa.String(), nullable=True),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('latitude', sa.Float(), nullable=True),
+        sa.Column('longitude', sa.Float(), nullable=True),
+        sa.Column('urgency', sa.String(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('assigned_volunteer_id', sa.Integer(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_aid_requests_archive_requester_id'), 'aid_requests_archive', ['requester_id'], unique=False)
+
+    # Build the partial indexes without blocking writes on a large table (PostgreSQL);
+    # CONCURRENTLY can't run inside a transaction.
+    with op.get_context().autocommit_block():
+        op.create_index('ix_aid_requests_active', 'aid_requests', ['status', 'urgency', 'created_at'], unique=False,
+                        postgresql_where=ACTIVE, sqlite_where=ACTIVE, postgresql_concurrently=True)
+        op.create_index('ix_aid_requests_assigned_volunteer', 'aid_requests', ['assigned_volunteer_id'], unique=False,
+                        postgresql_where=ASSIGNED, sqlite_where=ASSIGNED, postgresql_concurrently=True)
+        op.create_index('ix_aid_requests_archivable', 'aid_requests', ['id'], unique=False,
+                        postgresql_where=COMPLETED, sqlite_where=COMPLETED, postgresql_concurrently=True)
+        # Superseded by ix_aid_requests_active, which leaves out completed rows.
+        op.drop_index('ix_aid_requests_status', table_name='aid_requests', postgresql_concurrently=True)
+
+def downgrade() -> None:
+    # Archived rows are moved back so no request is lost.
+    columns = ('id, requester_id, type, description, latitude, longitude, urgency, status, '
+               'created_at, assigned_volunteer_id')
+    op.execute(f'INSERT INTO aid_requests ({columns}) SELECT {columns} FROM aid_requests_archive')
+    op.create_index('ix_aid_requests_status', 'aid_requests', ['status'], unique=False)
+    op.drop_index('ix_aid_requests_archivable', table_name='aid_requests')
+    op.drop_index('ix_aid_requests_assigned_volunteer', table_name='aid_requests')
+    op.drop_index('ix_aid_requests_active', table_name='aid_requests')
+    op.drop_index(op.f('ix_aid_requests_archive_requester_id'), table_name='aid_requests_archive')
+    op.drop_table('aid_requests_archive')
@@ -0,0 +1,36 @@
+"""full-text and trigram indexes on aid request descriptions
+
+Revision ID: add_aid_request_search
+Revises: add_row_versions
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_aid_request_search'
+down_revision = 'add_row_versions'
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR = sa.text("to_tsvector('english', coalesce(description, ''))")
+
+def upgrade() -> None:
+    # Other databases search with the in-memory index in search.py.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # Built without blocking writes; CONCURRENTLY can't run inside a transaction.
+    with op.get_context().autocommit_block():
+        op.create_index('ix_aid_requests_description_fts', 'aid_requests', [SEARCH_VECTOR], unique=False,
+                        postgresql_using='gin', postgresql_concurrently=True)
+        op.create_index('ix_aid_requests_description_trgm', 'aid_requests', ['description'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'description': 'gin_trgm_ops'},
+                        postgresql_concurrently=True)
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_aid_requests_description_trgm', table_name='aid_requests')
+    op.drop_index('ix_aid_requests_description_fts', table_name='aid_requests')
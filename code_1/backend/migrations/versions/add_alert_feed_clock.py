@@ -0,0 +1,38 @@
+"""separate clock for the alert feed
+
+Revision ID: add_alert_feed_clock
+Revises: add_donation_log_seqs
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_alert_feed_clock'
+down_revision = 'add_donation_log_seqs'
+branch_labels = None
+depends_on = None
+
+SYNC_CLOCK = 1
+ALERT_FEED_CLOCK = 2
+
+clock = sa.table('sync_clock', sa.column('id', sa.Integer), sa.column('seq', sa.BigInteger))
+deliveries = sa.table('alert_deliveries', sa.column('feed_seq', sa.BigInteger))
+
+def upgrade() -> None:
+    # The feed's clock continues after the last feed_seq taken from the sync clock.
+    conn = op.get_bind()
+    seq = conn.execute(sa.select(sa.func.max(deliveries.c.feed_seq))).scalar() or 0
+    conn.execute(clock.insert().values(id=ALERT_FEED_CLOCK, seq=seq))
+
+def downgrade() -> None:
+    # Back on the sync clock, which must stay ahead of every feed_seq handed out.
+    conn = op.get_bind()
+    feed = conn.execute(sa.select(clock.c.seq).where(clock.c.id == ALERT_FEED_CLOCK)).scalar() or 0
+    sync = conn.execute(sa.select(clock.c.seq).where(clock.c.id == SYNC_CLOCK)).scalar()
+    if sync is None:
+        conn.execute(clock.insert().values(id=SYNC_CLOCK, seq=feed))
+    elif feed > sync:
+        conn.execute(clock.update().where(clock.c.id == SYNC_CLOCK).values(seq=feed))
+    conn.execute(clock.delete().where(clock.c.id == ALERT_FEED_CLOCK))
@@ -0,0 +1,39 @@
+"""commit-ordered alert feed cursor
+
+Revision ID: add_alert_feed_seqs
+Revises: add_volunteer_shifts
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_alert_feed_seqs'
+down_revision = 'add_volunteer_shifts'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('alert_deliveries', sa.Column('feed_seq', sa.BigInteger(), nullable=True))
+
+    # Stamp the existing deliveries in id order, after every sync clock value handed out so far.
+    conn = op.get_bind()
+    deliveries = sa.table('alert_deliveries', sa.column('id', sa.Integer), sa.column('feed_seq', sa.BigInteger))
+    clock = sa.table('sync_clock', sa.column('id', sa.Integer), sa.column('seq', sa.BigInteger))
+    low, high = conn.execute(sa.select(sa.func.min(deliveries.c.id), sa.func.max(deliveries.c.id))).one()
+    if low is not None:
+        seq = conn.execute(sa.select(clock.c.seq).where(clock.c.id == 1)).scalar()
+        if seq is None:
+            seq = 0
+            conn.execute(clock.insert().values(id=1, seq=0))
+        conn.execute(deliveries.update().values(feed_seq=deliveries.c.id + (seq + 1 - low)))
+        conn.execute(clock.update().where(clock.c.id == 1).values(seq=seq + high - low + 1))
+
+    op.drop_index('ix_alert_deliveries_user_cursor', table_name='alert_deliveries')
+    op.create_index('ix_alert_deliveries_user_feed', 'alert_deliveries', ['user_id', 'feed_seq'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index('ix_alert_deliveries_user_feed', table_name='alert_deliveries')
+    op.create_index('ix_alert_deliveries_user_cursor', 'alert_deliveries', ['user_id', 'id'], unique=False)
+    op.drop_column('alert_deliveries', 'feed_seq')
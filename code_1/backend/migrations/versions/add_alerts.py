@@ -0,0 +1,102 @@
+"""add geo-fenced alerts
+
+Revision ID: add_alerts
+Revises: add_resource_inventory
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_alerts'
+down_revision = 'add_resource_inventory'
+branch_labels = None
+depends_on = None
+
+# As alerts.subscriber_geohash at this revision; copied so the backfill doesn't change when the app does.
+SUBSCRIBER_GEOHASH_PRECISION = 7
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+def _geohash(lat, lon, precision):
+    bounds = {"lat": [-90.0, 90.0], "lon": [-180.0, 180.0]}
+    chars, value, bits, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, x = (bounds["lon"], lon) if even else (bounds["lat"], lat)
+        mid = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if x >= mid:
+            value |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+def upgrade() -> None:
+    op.add_column('volunteer_profiles', sa.Column('current_geohash', sa.String(), nullable=True))
+    # Alert targeting is range scans on geohash prefixes.
+    op.create_index(op.f('ix_volunteer_profiles_current_geohash'), 'volunteer_profiles', ['current_geohash'], unique=False)
+
+    # Backfill from the stored coordinates.
+    conn = op.get_bind()
+    profiles = sa.table('volunteer_profiles',
+                        sa.column('id', sa.Integer), sa.column('current_latitude', sa.Float),
+                        sa.column('current_longitude', sa.Float), sa.column('current_geohash', sa.String))
+    rows = conn.execute(sa.select(profiles.c.id, profiles.c.current_latitude, profiles.c.current_longitude)
+                        .where(profiles.c.current_latitude.isnot(None), profiles.c.current_longitude.isnot(None))).all()
+    if rows:
+        conn.execute(
+            profiles.update().where(profiles.c.id == sa.bindparam('profile_id'))
+            .values(current_geohash=sa.bindparam('geohash')),
+            [{'profile_id': row.id, 'geohash': _geohash(row.current_latitude, row.current_longitude, SUBSCRIBER_GEOHASH_PRECISION)}
+             for row in rows]
+        )
+
+    op.create_table(
+        'alerts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('severity', sa.String(), nullable=True),
+        sa.Column('center_latitude', sa.Float(), nullable=True),
+        sa.Column('center_longitude', sa.Float(), nullable=True),
+        sa.Column('radius_km', sa.Float(), nullable=True),
+        sa.Column('polygon', sa.String(), nullable=True),
+        sa.Column('dedup_key', sa.String(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('recipient_count', sa.Integer(), nullable=True),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_alerts_id'), 'alerts', ['id'], unique=False)
+
+    op.create_table(
+        'alert_deliveries',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('alert_id', sa.Integer(), nullable=True),
+        sa.Column('dedup_key', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['alert_id'], ['alerts.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'dedup_key', name='uq_alert_deliveries_user_dedup')
+    )
+    # Feed reads are "deliveries for user after cursor", in id order.
+    op.create_index('ix_alert_deliveries_user_cursor', 'alert_deliveries', ['user_id', 'id'], unique=False)
+    op.create_index('ix_alert_deliveries_alert_id', 'alert_deliveries', ['alert_id'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index('ix_alert_deliveries_alert_id', table_name='alert_deliveries')
+    op.drop_index('ix_alert_deliveries_user_cursor', table_name='alert_deliveries')
+    op.drop_table('alert_deliveries')
+    op.drop_index(op.f('ix_alerts_id'), table_name='alerts')
+    op.drop_table('alerts')
+    op.drop_index(op.f('ix_volunteer_profiles_current_geohash'), table_name='volunteer_profiles')
+    op.drop_column('volunteer_profiles', 'current_geohash')
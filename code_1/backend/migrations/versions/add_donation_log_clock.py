@@ -0,0 +1,38 @@
+"""separate clock for the donation log
+
+Revision ID: add_donation_log_clock
+Revises: add_alert_feed_clock
+Create Date: 2026-10-20 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_donation_log_clock'
+down_revision = 'add_alert_feed_clock'
+branch_labels = None
+depends_on = None
+
+SYNC_CLOCK = 1
+DONATION_LOG_CLOCK = 3
+
+clock = sa.table('sync_clock', sa.column('id', sa.Integer), sa.column('seq', sa.BigInteger))
+donations = sa.table('donations', sa.column('log_seq', sa.BigInteger))
+
+def upgrade() -> None:
+    # The log's clock continues after the last log_seq taken from the sync clock.
+    conn = op.get_bind()
+    seq = conn.execute(sa.select(sa.func.max(donations.c.log_seq))).scalar() or 0
+    conn.execute(clock.insert().values(id=DONATION_LOG_CLOCK, seq=seq))
+
+def downgrade() -> None:
+    # Back on the sync clock, which must stay ahead of every log_seq handed out.
+    conn = op.get_bind()
+    log = conn.execute(sa.select(clock.c.seq).where(clock.c.id == DONATION_LOG_CLOCK)).scalar() or 0
+    sync = conn.execute(sa.select(clock.c.seq).where(clock.c.id == SYNC_CLOCK)).scalar()
+    if sync is None:
+        conn.execute(clock.insert().values(id=SYNC_CLOCK, seq=log))
+    elif log > sync:
+        conn.execute(clock.update().where(clock.c.id == SYNC_CLOCK).values(seq=log))
+    conn.execute(clock.delete().where(clock.c.id == DONATION_LOG_CLOCK))
@@ -0,0 +1,38 @@
+"""commit-ordered donation log cursor
+
+Revision ID: add_donation_log_seqs
+Revises: add_alert_feed_seqs
+Create Date: 2026-10-19 22:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_donation_log_seqs'
+down_revision = 'add_alert_feed_seqs'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('donations', sa.Column('log_seq', sa.BigInteger(), nullable=True))
+
+    # Stamp the existing donations in id order, after every sync clock value handed out so far.
+    conn = op.get_bind()
+    donations = sa.table('donations', sa.column('id', sa.Integer), sa.column('log_seq', sa.BigInteger))
+    clock = sa.table('sync_clock', sa.column('id', sa.Integer), sa.column('seq', sa.BigInteger))
+    low, high = conn.execute(sa.select(sa.func.min(donations.c.id), sa.func.max(donations.c.id))).one()
+    if low is not None:
+        seq = conn.execute(sa.select(clock.c.seq).where(clock.c.id == 1)).scalar()
+        if seq is None:
+            seq = 0
+            conn.execute(clock.insert().values(id=1, seq=0))
+        conn.execute(donations.update().values(log_seq=donations.c.id + (seq + 1 - low)))
+        conn.execute(clock.update().where(clock.c.id == 1).values(seq=seq + high - low + 1))
+
+    # Reads page by log_seq.
+    op.create_unique_constraint('uq_donations_log_seq', 'donations', ['log_seq'])
+
+def downgrade() -> None:
+    op.drop_constraint('uq_donations_log_seq', 'donations', type_='unique')
+    op.drop_column('donations', 'log_seq')
@@ -0,0 +1,44 @@
+"""add donations log and totals
+
+Revision ID: add_donations
+Revises: add_alerts
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_donations'
+down_revision = 'add_alerts'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'donations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('idempotency_key', sa.String(), nullable=False),
+        sa.Column('donor_id', sa.Integer(), nullable=True),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('type', sa.String(), nullable=True),
+        sa.Column('detail', sa.String(), nullable=True),
+        sa.Column('amount_cents', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['donor_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('idempotency_key')
+    )
+    # Reads page by primary key, so no other index is kept on the write path.
+
+    op.create_table(
+        'donation_totals',
+        sa.Column('type', sa.String(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('amount_cents', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('type')
+    )
+
+def downgrade() -> None:
+    op.drop_table('donation_totals')
+    op.drop_table('donations')
@@ -0,0 +1,105 @@
+"""add demand/supply heatmap counters
+
+Revision ID: add_heatmap
+Revises: add_donations
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+import os
+from collections import Counter
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_heatmap'
+down_revision = 'add_donations'
+branch_labels = None
+depends_on = None
+
+# As in heatmap.py at this revision; copied so the backfill doesn't change when the app does.
+HEATMAP_PRECISIONS = tuple(sorted(int(p) for p in os.getenv("HEATMAP_PRECISIONS", "3,4,5,6").split(",")))
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+def _geohash(lat, lon, precision):
+    bounds = {"lat": [-90.0, 90.0], "lon": [-180.0, 180.0]}
+    chars, value, bits, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, x = (bounds["lon"], lon) if even else (bounds["lat"], lat)
+        mid = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if x >= mid:
+            value |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+def _cell_keys(lat, lon, layer, categories):
+    finest = _geohash(lat, lon, HEATMAP_PRECISIONS[-1])
+    return [(finest[:precision], layer, category, urgency)
+            for precision in HEATMAP_PRECISIONS for category, urgency in categories]
+
+def upgrade() -> None:
+    op.create_table(
+        'heatmap_counts',
+        sa.Column('precision', sa.Integer(), nullable=False),
+        sa.Column('cell', sa.String(), nullable=False),
+        sa.Column('layer', sa.String(), nullable=False),
+        sa.Column('category', sa.String(), nullable=False),
+        sa.Column('urgency', sa.String(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('version', sa.BigInteger(), nullable=False, server_default='0'),
+        # Viewport reads are range scans on (precision, cell prefix).
+        sa.PrimaryKeyConstraint('precision', 'cell', 'layer', 'category', 'urgency')
+    )
+    op.create_table(
+        'heatmap_clock',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('reset_version', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # Backfill from the current pending requests and available volunteers.
+    conn = op.get_bind()
+    requests = sa.table('aid_requests', sa.column('type', sa.String), sa.column('urgency', sa.String),
+                        sa.column('status', sa.String), sa.column('latitude', sa.Float),
+                        sa.column('longitude', sa.Float))
+    profiles = sa.table('volunteer_profiles', sa.column('skills', sa.String), sa.column('availability', sa.Boolean),
+                        sa.column('current_latitude', sa.Float), sa.column('current_longitude', sa.Float))
+    keys = Counter()
+    for row in conn.execute(sa.select(requests.c.type, requests.c.urgency, requests.c.latitude, requests.c.longitude)
+                            .where(requests.c.status == 'pending', requests.c.latitude.isnot(None),
+                                   requests.c.longitude.isnot(None))):
+        keys.update(_cell_keys(row.latitude, row.longitude, 'demand',
+                               [(row.type or 'unspecified', row.urgency or 'low')]))
+    for row in conn.execute(sa.select(profiles.c.skills, profiles.c.current_latitude, profiles.c.current_longitude)
+                            .where(profiles.c.availability.is_(True), profiles.c.current_latitude.isnot(None),
+                                   profiles.c.current_longitude.isnot(None))):
+        skills = sorted({skill.strip() for skill in (row.skills or '').split(',') if skill.strip()})
+        keys.update(_cell_keys(row.current_latitude, row.current_longitude, 'supply',
+                               [(skill, '') for skill in skills or ['unspecified']]))
+
+    counts = sa.table('heatmap_counts', sa.column('precision', sa.Integer), sa.column('cell', sa.String),
+                      sa.column('layer', sa.String), sa.column('category', sa.String),
+                      sa.column('urgency', sa.String), sa.column('count', sa.Integer),
+                      sa.column('version', sa.BigInteger))
+    clock = sa.table('heatmap_clock', sa.column('id', sa.Integer), sa.column('version', sa.BigInteger),
+                     sa.column('reset_version', sa.BigInteger))
+    if keys:
+        conn.execute(counts.insert(), [
+            {'precision': len(cell), 'cell': cell, 'layer': layer, 'category': category,
+             'urgency': urgency, 'count': count, 'version': 1}
+            for (cell, layer, category, urgency), count in keys.items()
+        ])
+    conn.execute(clock.insert().values(id=1, version=1, reset_version=1))
+
+def downgrade() -> None:
+    op.drop_table('heatmap_clock')
+    op.drop_table('heatmap_counts')
@@ -0,0 +1,24 @@
+"""add urgency to aid requests
+
+Revision ID: add_request_urgency
+Revises: initial
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_request_urgency'
+down_revision = 'initial'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('aid_requests', sa.Column('urgency', sa.String(), nullable=False, server_default='low'))
+    # Startup rebuild of the pending-request scheduler only scans pending rows.
+    op.create_index('ix_aid_requests_status', 'aid_requests', ['status'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index('ix_aid_requests_status', table_name='aid_requests')
+    op.drop_column('aid_requests', 'urgency')
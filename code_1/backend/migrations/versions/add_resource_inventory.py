@@ -0,0 +1,76 @@
+"""add resource inventory
+
+Revision ID: add_resource_inventory
+Revises: add_request_urgency
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_resource_inventory'
+down_revision = 'add_request_urgency'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'resource_sites',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('region', sa.String(), nullable=False),
+        sa.Column('latitude', sa.Float(), nullable=False),
+        sa.Column('longitude', sa.Float(), nullable=False),
+        sa.Column('geohash', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.text('now()')),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_resource_sites_id'), 'resource_sites', ['id'], unique=False)
+    op.create_index(op.f('ix_resource_sites_region'), 'resource_sites', ['region'], unique=False)
+    # Radius queries are range scans on geohash prefixes.
+    op.create_index(op.f('ix_resource_sites_geohash'), 'resource_sites', ['geohash'], unique=False)
+
+    op.create_table(
+        'stock_movements',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('site_id', sa.Integer(), nullable=False),
+        sa.Column('item', sa.String(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('reason', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.text('now()')),
+        sa.ForeignKeyConstraint(['site_id'], ['resource_sites.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_stock_movements_id'), 'stock_movements', ['id'], unique=False)
+    op.create_index(op.f('ix_stock_movements_site_id'), 'stock_movements', ['site_id'], unique=False)
+
+    op.create_table(
+        'inventory_levels',
+        sa.Column('site_id', sa.Integer(), nullable=False),
+        sa.Column('item', sa.String(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['site_id'], ['resource_sites.id'], ),
+        sa.PrimaryKeyConstraint('site_id', 'item')
+    )
+    op.create_index('ix_inventory_levels_item', 'inventory_levels', ['item'], unique=False)
+
+    op.create_table(
+        'region_inventory_totals',
+        sa.Column('region', sa.String(), nullable=False),
+        sa.Column('item', sa.String(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('region', 'item')
+    )
+
+def downgrade() -> None:
+    op.drop_table('region_inventory_totals')
+    op.drop_index('ix_inventory_levels_item', table_name='inventory_levels')
+    op.drop_table('inventory_levels')
+    op.drop_index(op.f('ix_stock_movements_site_id'), table_name='stock_movements')
+    op.drop_index(op.f('ix_stock_movements_id'), table_name='stock_movements')
+    op.drop_table('stock_movements')
+    op.drop_index(op.f('ix_resource_sites_geohash'), table_name='resource_sites')
+    op.drop_index(op.f('ix_resource_sites_region'), table_name='resource_sites')
+    op.drop_index(op.f('ix_resource_sites_id'), table_name='resource_sites')
+    op.drop_table('resource_sites')
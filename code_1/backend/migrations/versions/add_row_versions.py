@@ -0,0 +1,26 @@
+"""row version columns for ETags
+
+Revision ID: add_row_versions
+Revises: add_aid_request_archive
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_row_versions'
+down_revision = 'add_aid_request_archive'
+branch_labels = None
+depends_on = None
+
+TABLES = ('users', 'volunteer_profiles', 'aid_requests', 'aid_requests_archive')
+
+def upgrade() -> None:
+    # A constant server default fills existing rows without rewriting them (PostgreSQL 11+).
+    for table in TABLES:
+        op.add_column(table, sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+def downgrade() -> None:
+    for table in reversed(TABLES):
+        op.drop_column(table, 'version')
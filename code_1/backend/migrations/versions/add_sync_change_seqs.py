@@ -0,0 +1,51 @@
+"""change sequence for delta sync
+
+Revision ID: add_sync_change_seqs
+Revises: add_aid_request_search
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_sync_change_seqs'
+down_revision = 'add_aid_request_search'
+branch_labels = None
+depends_on = None
+
+TABLES = ('volunteer_profiles', 'aid_requests', 'aid_requests_archive')
+
+def upgrade() -> None:
+    op.create_table(
+        'sync_clock',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('seq', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    for table in TABLES:
+        op.add_column(table, sa.Column('change_seq', sa.BigInteger(), nullable=True))
+
+    # Stamp the existing rows, then index them. Values follow the ids, so one
+    # UPDATE stamps a table; the clock then starts after the last value used.
+    conn = op.get_bind()
+    seq = 0
+    for table in TABLES:
+        rows = sa.table(table, sa.column('id', sa.Integer), sa.column('change_seq', sa.BigInteger))
+        low, high = conn.execute(sa.select(sa.func.min(rows.c.id), sa.func.max(rows.c.id))).one()
+        if low is None:
+            continue
+        conn.execute(rows.update().values(change_seq=rows.c.id + (seq + 1 - low)))
+        seq += high - low + 1
+    clock = sa.table('sync_clock', sa.column('id', sa.Integer), sa.column('seq', sa.BigInteger))
+    conn.execute(clock.insert().values(id=1, seq=seq))
+    for table in TABLES:
+        op.create_index(f'ix_{table}_change_seq', table, ['change_seq'], unique=False)
+    op.create_index('ix_aid_requests_requester_changes', 'aid_requests', ['requester_id', 'change_seq'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index('ix_aid_requests_requester_changes', table_name='aid_requests')
+    for table in reversed(TABLES):
+        op.drop_index(f'ix_{table}_change_seq', table_name=table)
+        op.drop_column(table, 'change_seq')
+    op.drop_table('sync_clock')
@@ -0,0 +1,47 @@
+"""index volunteer shift windows for SQL availability checks
+
+Revision ID: add_volunteer_shift_windows
+Revises: heatmap_versions_from_change_seq
+Create Date: 2026-10-20 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_volunteer_shift_windows'
+down_revision = 'heatmap_versions_from_change_seq'
+branch_labels = None
+depends_on = None
+
+DAY_SECONDS = 86400
+
+def _time_of_day(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+def upgrade() -> None:
+    op.add_column('volunteer_shifts', sa.Column('week_start', sa.Integer(), nullable=True))
+    op.add_column('volunteer_shifts', sa.Column('week_end', sa.Integer(), nullable=True))
+
+    # As shifts.week_window at this revision: seconds since Monday 00:00, past midnight into the next day.
+    conn = op.get_bind()
+    shifts = sa.table('volunteer_shifts', sa.column('id', sa.Integer), sa.column('weekday', sa.Integer),
+                      sa.column('start_time', sa.Time), sa.column('end_time', sa.Time),
+                      sa.column('week_start', sa.Integer), sa.column('week_end', sa.Integer))
+    for row in conn.execute(sa.select(shifts.c.id, shifts.c.weekday, shifts.c.start_time, shifts.c.end_time)
+                            .where(shifts.c.weekday.isnot(None))).all():
+        start = row.weekday * DAY_SECONDS + _time_of_day(row.start_time)
+        length = (_time_of_day(row.end_time) - _time_of_day(row.start_time)) % DAY_SECONDS or DAY_SECONDS
+        conn.execute(shifts.update().where(shifts.c.id == row.id).values(week_start=start, week_end=start + length))
+
+    # The composite indexes lead with volunteer_id, so they replace the single-column one.
+    op.create_index('ix_volunteer_shifts_once', 'volunteer_shifts', ['volunteer_id', 'starts_at', 'ends_at'], unique=False)
+    op.create_index('ix_volunteer_shifts_weekly', 'volunteer_shifts', ['volunteer_id', 'week_start', 'week_end'], unique=False)
+    op.drop_index('ix_volunteer_shifts_volunteer_id', table_name='volunteer_shifts')
+
+def downgrade() -> None:
+    op.create_index('ix_volunteer_shifts_volunteer_id', 'volunteer_shifts', ['volunteer_id'], unique=False)
+    op.drop_index('ix_volunteer_shifts_weekly', table_name='volunteer_shifts')
+    op.drop_index('ix_volunteer_shifts_once', table_name='volunteer_shifts')
+    op.drop_column('volunteer_shifts', 'week_end')
+    op.drop_column('volunteer_shifts', 'week_start')
@@ -0,0 +1,37 @@
+"""add volunteer shifts
+
+Revision ID: add_volunteer_shifts
+Revises: add_sync_change_seqs
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_volunteer_shifts'
+down_revision = 'add_sync_change_seqs'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'volunteer_shifts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('volunteer_id', sa.Integer(), nullable=False),
+        sa.Column('starts_at', sa.DateTime(), nullable=True),
+        sa.Column('ends_at', sa.DateTime(), nullable=True),
+        sa.Column('weekday', sa.Integer(), nullable=True),
+        sa.Column('start_time', sa.Time(), nullable=True),
+        sa.Column('end_time', sa.Time(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['volunteer_id'], ['volunteer_profiles.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_volunteer_shifts_id'), 'volunteer_shifts', ['id'], unique=False)
+    op.create_index(op.f('ix_volunteer_shifts_volunteer_id'), 'volunteer_shifts', ['volunteer_id'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_volunteer_shifts_volunteer_id'), table_name='volunteer_shifts')
+    op.drop_index(op.f('ix_volunteer_shifts_id'), table_name='volunteer_shifts')
+    op.drop_table('volunteer_shifts')
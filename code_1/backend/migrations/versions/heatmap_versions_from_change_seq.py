@@ -0,0 +1,130 @@
+"""heatmap: canonical skill categories, versions from change_seq
+
+Revision ID: heatmap_versions_from_change_seq
+Revises: add_donation_log_clock
+Create Date: 2026-10-20 11:00:00.000000
+
+"""
+import os
+from collections import Counter
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'heatmap_versions_from_change_seq'
+down_revision = 'add_donation_log_clock'
+branch_labels = None
+depends_on = None
+
+# As in heatmap.py and matching_ai.py at this revision; copied so the backfill doesn't change when the app does.
+HEATMAP_PRECISIONS = tuple(sorted(int(p) for p in os.getenv("HEATMAP_PRECISIONS", "3,4,5,6").split(",")))
+KNOWN_SKILLS = ['Medical', 'Food Logistics', 'Rescue', 'Shelter Management', 'Transportation', 'Communication', 'General Labor']
+SKILL_ALIASES = {'food': 'Food Logistics', 'shelter': 'Shelter Management', 'transport': 'Transportation',
+                 'labor': 'General Labor'}
+_SKILL_LOOKUP = dict({skill.lower(): skill for skill in KNOWN_SKILLS}, **SKILL_ALIASES)
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+SYNC_CLOCK = 1
+
+counts = sa.table('heatmap_counts', sa.column('precision', sa.Integer), sa.column('cell', sa.String),
+                  sa.column('layer', sa.String), sa.column('category', sa.String),
+                  sa.column('urgency', sa.String), sa.column('count', sa.Integer),
+                  sa.column('version', sa.BigInteger))
+sync_clock = sa.table('sync_clock', sa.column('id', sa.Integer), sa.column('seq', sa.BigInteger))
+
+def _geohash(lat, lon, precision):
+    bounds = {"lat": [-90.0, 90.0], "lon": [-180.0, 180.0]}
+    chars, value, bits, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, x = (bounds["lon"], lon) if even else (bounds["lat"], lat)
+        mid = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if x >= mid:
+            value |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+def _canonical_type(request_type):
+    return _SKILL_LOOKUP.get((request_type or '').strip().lower()) or request_type or 'unspecified'
+
+def _canonical_skills(skills):
+    found = {_SKILL_LOOKUP.get(skill.strip().lower()) for skill in (skills or '').split(',')}
+    return [skill for skill in KNOWN_SKILLS if skill in found]
+
+def _raw_type(request_type):
+    return request_type or 'unspecified'
+
+def _raw_skills(skills):
+    return sorted({skill.strip() for skill in (skills or '').split(',') if skill.strip()})
+
+def _recount(conn, request_category, profile_skills, version):
+    """Replace every heatmap counter with a recount under the given category rules."""
+    requests = sa.table('aid_requests', sa.column('type', sa.String), sa.column('urgency', sa.String),
+                        sa.column('status', sa.String), sa.column('latitude', sa.Float),
+                        sa.column('longitude', sa.Float))
+    profiles = sa.table('volunteer_profiles', sa.column('skills', sa.String), sa.column('availability', sa.Boolean),
+                        sa.column('current_latitude', sa.Float), sa.column('current_longitude', sa.Float))
+
+    def cell_keys(lat, lon, layer, categories):
+        finest = _geohash(lat, lon, HEATMAP_PRECISIONS[-1])
+        return [(finest[:precision], layer, category, urgency)
+                for precision in HEATMAP_PRECISIONS for category, urgency in categories]
+
+    keys = Counter()
+    for row in conn.execute(sa.select(requests.c.type, requests.c.urgency, requests.c.latitude, requests.c.longitude)
+                            .where(requests.c.status == 'pending', requests.c.latitude.isnot(None),
+                                   requests.c.longitude.isnot(None))):
+        keys.update(cell_keys(row.latitude, row.longitude, 'demand',
+                              [(request_category(row.type), row.urgency or 'low')]))
+    for row in conn.execute(sa.select(profiles.c.skills, profiles.c.current_latitude, profiles.c.current_longitude)
+                            .where(profiles.c.availability.is_(True), profiles.c.current_latitude.isnot(None),
+                                   profiles.c.current_longitude.isnot(None))):
+        keys.update(cell_keys(row.current_latitude, row.current_longitude, 'supply',
+                              [(skill, '') for skill in profile_skills(row.skills) or ['unspecified']]))
+
+    conn.execute(counts.delete())
+    if keys:
+        conn.execute(counts.insert(), [
+            {'precision': len(cell), 'cell': cell, 'layer': layer, 'category': category,
+             'urgency': urgency, 'count': count, 'version': version}
+            for (cell, layer, category, urgency), count in keys.items()
+        ])
+
+def upgrade() -> None:
+    # Cells are versioned by change_seq from now on; recount them at the next sync clock
+    # value, which is also the reset version, so every older heatmap cursor refetches.
+    conn = op.get_bind()
+    seq = conn.execute(sa.select(sync_clock.c.seq).where(sync_clock.c.id == SYNC_CLOCK)).scalar()
+    if seq is None:
+        version = 1
+        conn.execute(sync_clock.insert().values(id=SYNC_CLOCK, seq=version))
+    else:
+        version = seq + 1
+        conn.execute(sync_clock.update().where(sync_clock.c.id == SYNC_CLOCK).values(seq=version))
+    _recount(conn, _canonical_type, _canonical_skills, version)
+
+    op.rename_table('heatmap_clock', 'heatmap_reset')
+    op.drop_column('heatmap_reset', 'version')
+    reset = sa.table('heatmap_reset', sa.column('id', sa.Integer), sa.column('reset_version', sa.BigInteger))
+    conn.execute(reset.delete())
+    conn.execute(reset.insert().values(id=1, reset_version=version))
+
+def downgrade() -> None:
+    # Back on a heatmap clock of its own, which starts past every cell version handed out.
+    conn = op.get_bind()
+    version = (conn.execute(sa.select(sa.func.max(counts.c.version))).scalar() or 0) + 1
+    _recount(conn, _raw_type, _raw_skills, version)
+
+    op.rename_table('heatmap_reset', 'heatmap_clock')
+    op.add_column('heatmap_clock', sa.Column('version', sa.BigInteger(), nullable=False, server_default='0'))
+    clock = sa.table('heatmap_clock', sa.column('id', sa.Integer), sa.column('version', sa.BigInteger),
+                     sa.column('reset_version', sa.BigInteger))
+    conn.execute(clock.delete())
+    conn.execute(clock.insert().values(id=1, version=version, reset_version=version))
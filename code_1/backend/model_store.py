@@ -0,0 +1,284 @@
+# 1_code/model_store.py
+
+"""
+Versioned, persisted matching artifacts.
+
+A model version bundles everything fitted from the volunteer pool: the skill
+encoder, the StandardScaler, the nearest-neighbour index over the scaled
+volunteer matrix and the volunteer ids for each index row. Versions are saved
+with joblib under MODEL_DIR/vNNNNNN/ and published by atomically replacing the
+MODEL_DIR/CURRENT pointer file, so readers never see a half-written version.
+The volunteers' coordinates, skill masks and availability are saved too, so
+index candidates are re-scored without reading their documents.
+
+Serving processes load the current version with mmap_mode='r' (the large
+arrays stay in the page cache, shared between workers) and swap to a newer
+version as soon as CURRENT changes. Requests then only transform the request
+vector and query the index; rankings are reproducible for a given version.
+The SQL routers (matching.py) rank a pool loaded per request, but reuse
+the version's encoder.
+A RefitJob thread periodically refits from the live pool and publishes.
+"""
+
+import fcntl
+import os
+import shutil
+import threading
+import time
+
+import joblib
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+import matching_ai
+from ann_index import build_index
+from metrics import Gauge, time_stage
+
+MODEL_DIR = os.getenv("MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"))
+MODEL_CHECK_INTERVAL = float(os.getenv("MODEL_CHECK_INTERVAL", "5"))
+ARTIFACT_FILE = "artifacts.joblib"
+POINTER_FILE = "CURRENT"
+OWNER_FILE = "OWNER"
+
+MODEL_VERSION = Gauge("match_model_version", "Model version currently served by this process.")
+
+
+def _version_name(version):
+    return f"v{version:06d}"
+
+
+def fit_artifacts(volunteers, engine=None):
+    """
+    Fit encoder, scaler and index from a list of volunteer dictionaries.
+    Returns the artifact dict that publish() persists.
+    """
+    if not volunteers:
+        raise ValueError("Cannot fit matching artifacts without volunteers")
+    X = matching_ai.build_feature_matrix(volunteers)
+    scaler = StandardScaler().fit(X)
+    X_scaled = scaler.transform(X).astype(np.float32)
+    skill_masks = matching_ai.skill_masks_from_features(X)
+    # One index per skill over just the volunteers holding it, so a request only
+    # searches qualified volunteers. Each entry is (index, rows into X).
+    skill_indexes = {}
+    for bit in matching_ai.SKILL_BITS.values():
+        rows = np.flatnonzero(skill_masks & bit)
+        if len(rows):
+            skill_indexes[bit] = (build_index(X_scaled[rows], engine=engine), rows)
+    return {
+        "encoder": matching_ai.encoder,
+        "scaler": scaler,
+        "index": build_index(X_scaled, engine=engine),
+        "skill_masks": skill_masks,
+        "skill_indexes": skill_indexes,
+        "volunteer_ids": np.array([str(v['id']) for v in volunteers]),
+        "latitude": X[:, 0].copy(),
+        "longitude": X[:, 1].copy(),
+        "available": X[:, -1] > 0,
+        "fitted_at": time.time(),
+    }
+
+
+def list_versions(model_dir=MODEL_DIR):
+    if not os.path.isdir(model_dir):
+        return []
+    return sorted(int(name[1:]) for name in os.listdir(model_dir)
+                  if name.startswith("v") and name[1:].isdigit())
+
+
+def read_current_version(model_dir=MODEL_DIR):
+    try:
+        with open(os.path.join(model_dir, POINTER_FILE)) as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def publish_version(write, model_dir=MODEL_DIR, keep=3):
+    """
+    Create the next version directory, fill it with write(tmp_dir), then rename
+    it into place and point CURRENT at it. Older versions beyond `keep` are
+    removed. Returns the new version number.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    version = (max(list_versions(model_dir), default=0)) + 1
+    final_dir = os.path.join(model_dir, _version_name(version))
+    tmp_dir = final_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    write(tmp_dir, version)
+    os.rename(tmp_dir, final_dir)
+
+    pointer_tmp = os.path.join(model_dir, POINTER_FILE + ".tmp")
+    with open(pointer_tmp, "w") as f:
+        f.write(str(version))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer_tmp, os.path.join(model_dir, POINTER_FILE))
+
+    for old in list_versions(model_dir)[:-keep] if keep else []:
+        shutil.rmtree(os.path.join(model_dir, _version_name(old)), ignore_errors=True)
+    return version
+
+
+def publish(artifacts, model_dir=MODEL_DIR, keep=3):
+    """Save artifacts as the next version and point CURRENT at it."""
+    def write(tmp_dir, version):
+        # Uncompressed so the arrays can be memory-mapped on load.
+        joblib.dump(dict(artifacts, version=version), os.path.join(tmp_dir, ARTIFACT_FILE))
+    return publish_version(write, model_dir, keep)
+
+
+def version_dir(version, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, _version_name(version))
+
+
+def try_acquire_owner(model_dir=MODEL_DIR):
+    """
+    Non-blocking exclusive lock on model_dir/OWNER. Exactly one process on the
+    host gets it (until it exits) and should do the fitting and publishing;
+    the others only read. Returns the open lock file, or None.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    lock_file = open(os.path.join(model_dir, OWNER_FILE), "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def load_artifacts(version, model_dir=MODEL_DIR):
+    """Load a published version with its arrays memory-mapped read-only."""
+    path = os.path.join(version_dir(version, model_dir), ARTIFACT_FILE)
+    return joblib.load(path, mmap_mode='r')
+
+
+def match_with_artifacts(artifacts, request_features, k=3):
+    """
+    Rank volunteers against a fitted model version for the caller's request
+    features (extract_features_request), so the request is not featurized,
+    or geocoded, a second time.
+    Returns a list of (volunteer_id, distance) pairs, best first.
+    """
+    distances, indices = _search_artifacts(artifacts, request_features, k)
+    ids = artifacts["volunteer_ids"]
+    return [(str(ids[i]), float(d)) for d, i in zip(distances, indices)]
+
+
+def candidates_with_artifacts(artifacts, request_features, k=3):
+    """
+    The same top k as match_with_artifacts, as (volunteer_id, latitude,
+    longitude, skill_mask, available) rows for matching_ai.rerank_candidates.
+    """
+    _, indices = _search_artifacts(artifacts, request_features, k)
+    return [(str(artifacts["volunteer_ids"][i]), float(artifacts["latitude"][i]), float(artifacts["longitude"][i]),
+             int(artifacts["skill_masks"][i]), bool(artifacts["available"][i])) for i in indices]
+
+
+def _search_artifacts(artifacts, request_features, k):
+    with time_stage("standard_scaler"):
+        req_scaled = artifacts["scaler"].transform([request_features])[0]
+    request_mask = int(matching_ai.skill_masks_from_features(request_features)[0])
+    with time_stage("nearest_neighbors"):
+        skill_index = artifacts.get("skill_indexes", {}).get(request_mask)
+        if skill_index is not None:
+            index, rows = skill_index
+            distances, positions = index.query(req_scaled, k)
+            indices = rows[positions]
+        else:
+            # Unknown request type, or nobody holds the skill: rank the whole pool.
+            distances, indices = artifacts["index"].query(req_scaled, k)
+    return distances, indices
+
+
+class ModelStore:
+    """
+    Holds the model version this process serves and hot-swaps it when a new
+    version is published. `current` is replaced in a single assignment, so a
+    request that already grabbed the old artifacts keeps a consistent version.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, check_interval=MODEL_CHECK_INTERVAL):
+        self.model_dir = model_dir
+        self.check_interval = check_interval
+        self.current = None
+        # A version published before candidate coordinates were saved is not served.
+        self._outdated = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self.current["version"] if self.current is not None else None
+
+    def refresh(self):
+        """Load the published version if it differs from the one being served."""
+        with self._lock:
+            self._last_check = time.monotonic()
+            version = read_current_version(self.model_dir)
+            if version is None or version in (self.version, self._outdated):
+                return False
+            artifacts = load_artifacts(version, self.model_dir)
+            if "latitude" not in artifacts:
+                self._outdated = version
+                print(f"Matching model version {version} has no candidate coordinates; waiting for a refit.")
+                return False
+            self.current = artifacts
+            MODEL_VERSION.set(version)
+            print(f"Loaded matching model version {version}.")
+            return True
+
+    def get(self):
+        """Return the current artifacts, checking for a newer version at most every check_interval seconds."""
+        if time.monotonic() - self._last_check >= self.check_interval:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error reloading matching model: {e}")
+        return self.current
+
+
+# The version served by this process: /match, and the encoder of the SQL-path matching.
+model_store = ModelStore()
+
+
+class RefitJob:
+    """
+    Background thread that refits artifacts from `load_volunteers()` every
+    `interval` seconds, publishes a new version and reloads `store`.
+    """
+
+    def __init__(self, store, load_volunteers, interval, engine=None):
+        self.store = store
+        self.load_volunteers = load_volunteers
+        self.interval = interval
+        self.engine = engine
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="model-refit", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self):
+        volunteers = self.load_volunteers()
+        if not volunteers:
+            return None
+        version = publish(fit_artifacts(volunteers, self.engine), self.store.model_dir)
+        self.store.refresh()
+        return version
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                version = self.run_once()
+                if version is not None:
+                    print(f"Published matching model version {version}.")
+            except Exception as e:
+                print(f"Error refitting matching model: {e}")
+            self._stop.wait(self.interval)
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Enum
+from sqlalchemy import BigInteger, Boolean, Column, DDL, ForeignKey, Integer, String, Float, DateTime, Enum, Index, Time, UniqueConstraint, event, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -6,6 +6,12 @@ import enum
 
 Base = declarative_base()
 
+# Requests in these states make up the active set served by the pending feed and matching.
+ACTIVE_STATUS_CLAUSE = "status IN ('pending', 'assigned')"
+# Full-text document of an aid request (PostgreSQL); search.py queries this exact
+# expression so the planner uses ix_aid_requests_description_fts.
+SEARCH_VECTOR = "to_tsvector('english', coalesce(description, ''))"
+
 class UserRole(str, enum.Enum):
     VICTIM = "victim"
     VOLUNTEER = "volunteer"
@@ -22,11 +28,15 @@ class User(Base):
     role = Column(Enum(UserRole))
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Bumped on every ORM update; the row's ETag (etags.py).
+    version = Column(Integer, nullable=False, server_default="1")
     
     # Relationships
     aid_requests = relationship("AidRequest", back_populates="requester")
     volunteer_profile = relationship("VolunteerProfile", back_populates="user", uselist=False)
 
+    __mapper_args__ = {"version_id_col": version}
+
 class VolunteerProfile(Base):
     __tablename__ = "volunteer_profiles"
 
@@ -36,11 +46,45 @@ class VolunteerProfile(Base):
     availability = Column(Boolean, default=True)
     current_latitude = Column(Float)
     current_longitude = Column(Float)
+    current_geohash = Column(String, index=True)  # Precision 7, for geo-fenced alert targeting
     last_location_update = Column(DateTime)
+    version = Column(Integer, nullable=False, server_default="1")
+    # Sync clock value of the last change (sync.py); what GET /sync pages by.
+    change_seq = Column(BigInteger, index=True)
 
     # Relationships
     user = relationship("User", back_populates="volunteer_profile")
     assigned_requests = relationship("AidRequest", back_populates="assigned_volunteer")
+    shifts = relationship("VolunteerShift", back_populates="volunteer")
+
+    __mapper_args__ = {"version_id_col": version}
+
+class VolunteerShift(Base):
+    """
+    When a volunteer is available (shifts.py), in UTC: one-off (starts_at to
+    ends_at) or weekly (weekday, start_time to end_time).
+    """
+    __tablename__ = "volunteer_shifts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    volunteer_id = Column(Integer, ForeignKey("volunteer_profiles.id"), nullable=False)
+    starts_at = Column(DateTime)  # One-off shifts
+    ends_at = Column(DateTime)
+    weekday = Column(Integer)  # Weekly shifts: 0 = Monday
+    start_time = Column(Time)
+    end_time = Column(Time)  # At or before start_time: ends the next day
+    # Weekly shifts as seconds since Monday 00:00; week_end may run past the end of the week.
+    week_start = Column(Integer)
+    week_end = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    volunteer = relationship("VolunteerProfile", back_populates="shifts")
+
+    __table_args__ = (
+        # Availability checks are correlated EXISTS probes: one volunteer, then a range on the window.
+        Index("ix_volunteer_shifts_once", "volunteer_id", "starts_at", "ends_at"),
+        Index("ix_volunteer_shifts_weekly", "volunteer_id", "week_start", "week_end"),
+    )
 
 class AidRequest(Base):
     __tablename__ = "aid_requests"
@@ -51,10 +95,198 @@ class AidRequest(Base):
     description = Column(String)
     latitude = Column(Float)
     longitude = Column(Float)
+    urgency = Column(String, default="low")  # "low", "medium", "high"
     status = Column(String)  # "pending", "assigned", "completed"
     created_at = Column(DateTime, default=datetime.utcnow)
     assigned_volunteer_id = Column(Integer, ForeignKey("volunteer_profiles.id"), nullable=True)
+    version = Column(Integer, nullable=False, server_default="1")
+    change_seq = Column(BigInteger, index=True)  # Sync clock value of the last change (sync.py)
 
     # Relationships
     requester = relationship("User", back_populates="aid_requests")
-    assigned_volunteer = relationship("VolunteerProfile", back_populates="assigned_requests") 
\ No newline at end of file
+    assigned_volunteer = relationship("VolunteerProfile", back_populates="assigned_requests")
+
+    # Completed requests move to aid_requests_archive (archive.py), so this table
+    # holds the active set plus recent history. Partial indexes cover only the
+    # active rows, which keeps them small however long the incident runs.
+    __table_args__ = (
+        Index("ix_aid_requests_active", "status", "urgency", "created_at",
+              postgresql_where=text(ACTIVE_STATUS_CLAUSE), sqlite_where=text(ACTIVE_STATUS_CLAUSE)),
+        Index("ix_aid_requests_assigned_volunteer", "assigned_volunteer_id",
+              postgresql_where=text("status = 'assigned'"), sqlite_where=text("status = 'assigned'")),
+        # What the archiver scans; drained continuously, so it stays small too.
+        Index("ix_aid_requests_archivable", "id",
+              postgresql_where=text("status = 'completed'"), sqlite_where=text("status = 'completed'")),
+        # Text search (search.py): word matches, and trigram similarity for misspellings.
+        # Other databases use search.py's in-memory index instead.
+        Index("ix_aid_requests_description_fts", text(SEARCH_VECTOR),
+              postgresql_using="gin").ddl_if(dialect="postgresql"),
+        Index("ix_aid_requests_description_trgm", "description", postgresql_using="gin",
+              postgresql_ops={"description": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        # A requester's own changes, for victims' delta sync.
+        Index("ix_aid_requests_requester_changes", "requester_id", "change_seq"),
+        # Never reuse ids of archived rows (SQLite otherwise reuses the maximum id).
+        {"sqlite_autoincrement": True},
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+# gin_trgm_ops comes from the pg_trgm extension.
+event.listen(AidRequest.__table__, "before_create",
+             DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+
+class AidRequestArchive(Base):
+    """Completed aid requests moved out of aid_requests; same columns, plus when they moved."""
+    __tablename__ = "aid_requests_archive"
+
+    id = Column(Integer, primary_key=True)
+    requester_id = Column(Integer, index=True)
+    type = Column(String)
+    description = Column(String)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    urgency = Column(String)
+    status = Column(String)
+    created_at = Column(DateTime)
+    assigned_volunteer_id = Column(Integer, nullable=True)
+    version = Column(Integer, nullable=False, server_default="1")
+    archived_at = Column(DateTime, default=datetime.utcnow)
+    # Sync clock value when archived; GET /sync reports the request as deleted.
+    change_seq = Column(BigInteger, index=True)
+
+class ResourceSite(Base):
+    __tablename__ = "resource_sites"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String)
+    region = Column(String, index=True)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    geohash = Column(String, index=True)  # Precision 7, for radius queries by prefix range
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    levels = relationship("InventoryLevel", back_populates="site")
+
+class StockMovement(Base):
+    __tablename__ = "stock_movements"
+
+    id = Column(Integer, primary_key=True, index=True)
+    site_id = Column(Integer, ForeignKey("resource_sites.id"), index=True)
+    item = Column(String)
+    quantity = Column(Integer)  # Positive for receipts, negative for issues
+    reason = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class InventoryLevel(Base):
+    """Current stock per site and item, maintained incrementally from movements."""
+    __tablename__ = "inventory_levels"
+
+    site_id = Column(Integer, ForeignKey("resource_sites.id"), primary_key=True)
+    item = Column(String, primary_key=True)
+    quantity = Column(Integer, default=0)
+
+    # Relationships
+    site = relationship("ResourceSite", back_populates="levels")
+
+    __table_args__ = (Index("ix_inventory_levels_item", "item"),)
+
+class RegionInventoryTotal(Base):
+    """Stock per region and item, maintained incrementally from movements."""
+    __tablename__ = "region_inventory_totals"
+
+    region = Column(String, primary_key=True)
+    item = Column(String, primary_key=True)
+    quantity = Column(Integer, default=0)
+
+class Alert(Base):
+    __tablename__ = "alerts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    title = Column(String)
+    description = Column(String)
+    severity = Column(String, default="warning")  # "advisory", "warning", "emergency"
+    # Geo-fence: a circle (center + radius_km) or a polygon (JSON [[lat, lon], ...]).
+    center_latitude = Column(Float, nullable=True)
+    center_longitude = Column(Float, nullable=True)
+    radius_km = Column(Float, nullable=True)
+    polygon = Column(String, nullable=True)
+    # Alerts sharing a dedup key reach each recipient at most once.
+    dedup_key = Column(String)
+    status = Column(String, default="pending")  # "pending", "delivered", "failed"
+    recipient_count = Column(Integer, default=0)
+    created_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class AlertDelivery(Base):
+    """One row per (recipient, dedup key); feed_seq is the recipient's feed cursor."""
+    __tablename__ = "alert_deliveries"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    alert_id = Column(Integer, ForeignKey("alerts.id"))
+    dedup_key = Column(String)
+    # Taken from the alert feed clock (sync.next_seqs), so values are in commit order.
+    feed_seq = Column(BigInteger, nullable=True)
+
+    # Relationships
+    alert = relationship("Alert")
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "dedup_key", name="uq_alert_deliveries_user_dedup"),
+        Index("ix_alert_deliveries_user_feed", "user_id", "feed_seq"),
+        Index("ix_alert_deliveries_alert_id", "alert_id"),
+    )
+
+class Donation(Base):
+    """Append-only donation log; rows are never updated, and log_seq is the read cursor."""
+    __tablename__ = "donations"
+
+    id = Column(Integer, primary_key=True)
+    # Taken from the donation log clock (sync.next_seqs), so values are in commit order.
+    log_seq = Column(BigInteger, unique=True, nullable=True)
+    # Client-chosen key; a retried POST with the same key is not recorded twice.
+    idempotency_key = Column(String, unique=True, nullable=False)
+    donor_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    name = Column(String)
+    type = Column(String)  # "Money" or "Resource"
+    detail = Column(String)  # "$500", "100 cases of water", ...
+    amount_cents = Column(Integer, nullable=True)  # Parsed from detail for money donations
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class DonationTotal(Base):
+    """Running count and amount per donation type, maintained incrementally."""
+    __tablename__ = "donation_totals"
+
+    type = Column(String, primary_key=True)
+    count = Column(Integer, default=0)
+    amount_cents = Column(BigInteger, default=0)
+
+class HeatmapCount(Base):
+    """
+    Pending demand or available supply in one geohash cell, per category.
+    Maintained incrementally; rows that drop to zero are kept so that delta
+    reads can report the cell as emptied.
+    """
+    __tablename__ = "heatmap_counts"
+
+    precision = Column(Integer, primary_key=True)  # Zoom level: the cell's geohash length
+    cell = Column(String, primary_key=True)
+    layer = Column(String, primary_key=True)  # "demand" or "supply"
+    category = Column(String, primary_key=True)  # Request type, or volunteer skill
+    urgency = Column(String, primary_key=True)  # Request urgency; "" for supply
+    count = Column(Integer, default=0)
+    version = Column(BigInteger, default=0)  # change_seq of the write that last changed it
+
+class HeatmapReset(Base):
+    """Single row: the version of the last full rebuild; older delta cursors must refetch everything."""
+    __tablename__ = "heatmap_reset"
+
+    id = Column(Integer, primary_key=True)
+    reset_version = Column(BigInteger, default=0)
+
+class SyncClock(Base):
+    """Commit-ordered counters, one row per stream: sync change_seq, alert feed_seq, donation log_seq (sync.py)."""
+    __tablename__ = "sync_clock"
+
+    id = Column(Integer, primary_key=True)
+    seq = Column(BigInteger, default=0)
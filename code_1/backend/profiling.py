@@ -0,0 +1,327 @@
+# 1_code/profiling.py
+
+"""
+On-demand profiling of live requests.
+
+Profiling is off until an admin turns it on at runtime (PUT
+/admin/profiling). Nothing is redeployed. A request is profiled if it
+carries the configured header value, or if its path matches the configured
+pattern and it falls in the sampled fraction. An optional limit turns
+profiling off again after that many requests. Two modes:
+
+* sample: a background thread reads the stack of each thread serving a
+  selected request every PROFILE_INTERVAL seconds (sys._current_frames)
+  and counts it as a folded stack ("main.debug_match;matching_ai.rank_columns 12").
+  That is the input format of flamegraph.pl, speedscope and inferno. The
+  request itself runs untouched.
+* cprofile: the endpoint runs under cProfile. Every call is counted, at a
+  large slowdown, so it is meant for single requests (limit=1). The
+  stats download is a pstats file for snakeviz or `python -m pstats`.
+
+Each profile also records the request's route, status, duration and the
+per-stage timings from metrics.time_stage. The last PROFILE_CAPACITY
+profiles are kept in a ring buffer. Settings and profiles are per process.
+
+Sync endpoints run in the threadpool, so only endpoints decorated with
+@profiled, which marks the thread serving the request, are sampled or
+cProfiled. Undecorated routes still get stage timings. While profiling is
+off, ProfileMiddleware costs one attribute check per request.
+"""
+
+import cProfile
+import contextvars
+import fnmatch
+import functools
+import itertools
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter as StackCounter, deque
+
+from metrics import Counter, current_stages
+
+PROFILE_MODES = ("sample", "cprofile")
+PROFILE_CAPACITY = int(os.getenv("PROFILE_CAPACITY", "50"))
+# 200 Hz, the most a CPU-bound request allows anyway: the sampler needs the GIL, which
+# the busy thread hands over every sys.getswitchinterval() (5 ms by default).
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+MAX_STACK_DEPTH = 200
+# The profiling endpoints themselves are never profiled.
+ADMIN_PREFIX = "/admin/profiling"
+
+PROFILES_CAPTURED = Counter("profiles_captured_total", "Requests profiled, by mode.", ["mode"])
+
+_current = contextvars.ContextVar("request_profile", default=None)
+
+
+class RequestProfile:
+    """One profiled request: metadata, stage timings, and folded stack samples or cProfile stats."""
+
+    def __init__(self, profile_id, mode, method, path):
+        self.id = profile_id
+        self.mode = mode
+        self.method = method
+        self.path = path
+        self.route = None
+        self.status = None
+        self.started_at = time.time()
+        self.duration_ms = None
+        self.stages_ms = {}
+        self.samples = StackCounter()
+        # Thread ident -> the @profiled wrapper's frame; frames below it are not the request's.
+        self.threads = {}
+        self.stats = None
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "mode": self.mode,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "samples": sum(self.samples.values()),
+            "stages_ms": self.stages_ms,
+        }
+
+    def run(self, endpoint, args, kwargs):
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(endpoint, *args, **kwargs)
+        finally:
+            profiler.create_stats()
+            self.stats = profiler.stats
+
+    def folded(self):
+        """Folded stacks, one "frame;frame;frame count" line per distinct stack."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def pstats_dump(self):
+        """cProfile stats in the format of Profile.dump_stats."""
+        return marshal.dumps(self.stats)
+
+    def top_functions(self, limit=25):
+        """The cProfile functions with the most cumulative time."""
+        if self.stats is None:
+            return []
+        stats = pstats.Stats(_StatsSource(self.stats)).sort_stats("cumulative")
+        top = []
+        for func in stats.fcn_list[:limit]:
+            _, calls, total, cumulative, _ = stats.stats[func]
+            top.append({"function": pstats.func_std_string(func), "calls": calls,
+                        "total_ms": round(total * 1000, 3), "cumulative_ms": round(cumulative * 1000, 3)})
+        return top
+
+
+class _StatsSource:
+    # pstats.Stats loads any object with create_stats() and a stats dict.
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def _label(code, frame, labels):
+    label = labels.get(code)
+    if label is None:
+        module = frame.f_globals.get("__name__", "?")
+        label = labels[code] = f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+    return label
+
+
+def fold(frame, root, labels):
+    """Folded stack of `frame` from just above `root` (exclusive) to the leaf."""
+    stack = []
+    while frame is not None and frame is not root and len(stack) < MAX_STACK_DEPTH:
+        stack.append(_label(frame.f_code, frame, labels))
+        frame = frame.f_back
+    stack.reverse()
+    return ";".join(stack)
+
+
+class Sampler:
+    """
+    A daemon thread sampling the stacks of the threads attached to active
+    sample-mode profiles. It blocks on an event while none are active.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self._active = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._labels = {}
+
+    def add(self, profile):
+        with self._lock:
+            self._active.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profile-sampler", daemon=True)
+                self._thread.start()
+            self._wake.set()
+
+    def remove(self, profile):
+        with self._lock:
+            self._active.discard(profile)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            with self._lock:
+                profiles = list(self._active)
+                if not profiles:
+                    self._wake.clear()
+                    continue
+            frames = sys._current_frames()
+            for profile in profiles:
+                for ident, root in list(profile.threads.items()):
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        profile.samples[fold(frame, root, self._labels)] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+class Profiler:
+    """Profiling settings, request selection and the ring buffer of recent profiles."""
+
+    def __init__(self, capacity=PROFILE_CAPACITY, interval=PROFILE_INTERVAL):
+        self.profiles = deque(maxlen=capacity)
+        self.sampler = Sampler(interval)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.configure(enabled=False)
+
+    def configure(self, enabled, mode="sample", sample_rate=0.0, path=None, header_name=None, header_value=None,
+                  limit=None):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"mode must be one of {PROFILE_MODES}")
+        if (header_name is None) != (header_value is None):
+            raise ValueError("header_name and header_value go together")
+        with self._lock:
+            self.mode = mode
+            self.sample_rate = sample_rate
+            self.path = path
+            self.header = (header_name.lower().encode("latin-1"), header_value.encode("latin-1")) if header_name else None
+            self.remaining = limit
+            # Read without the lock on every request; set last.
+            self.active = enabled and (sample_rate > 0 or header_name is not None)
+
+    def settings(self):
+        return {
+            "enabled": self.active,
+            "mode": self.mode,
+            "sample_rate": self.sample_rate,
+            "path": self.path,
+            "header_name": self.header[0].decode("latin-1") if self.header else None,
+            "header_value": self.header[1].decode("latin-1") if self.header else None,
+            "limit": self.remaining or None,
+        }
+
+    def select(self, scope):
+        """Whether to profile this request; counts it against the limit."""
+        path = scope["path"]
+        if path.startswith(ADMIN_PREFIX):
+            return False
+        header = self.header
+        chosen = header is not None and any(name == header[0] and value == header[1]
+                                            for name, value in scope["headers"])
+        if not chosen:
+            if self.path is not None and not fnmatch.fnmatchcase(path, self.path):
+                return False
+            chosen = random.random() < self.sample_rate
+        if chosen and self.remaining is not None:
+            with self._lock:
+                if not self.active or self.remaining <= 0:
+                    return False
+                self.remaining -= 1
+                if self.remaining == 0:
+                    self.active = False
+        return chosen
+
+    def start(self, scope):
+        profile = RequestProfile(next(self._ids), self.mode, scope["method"], scope["path"])
+        if profile.mode == "sample":
+            self.sampler.add(profile)
+        return profile
+
+    def finish(self, profile, scope, status, elapsed):
+        self.sampler.remove(profile)
+        route = scope.get("route")
+        profile.route = getattr(route, "path", None)
+        profile.status = status
+        profile.duration_ms = round(elapsed * 1000, 3)
+        stages = current_stages()
+        profile.stages_ms = {k: round(v * 1000, 3) for k, v in (stages or {}).items()}
+        self.profiles.append(profile)
+        PROFILES_CAPTURED.labels(mode=profile.mode).inc()
+
+    def get(self, profile_id):
+        for profile in list(self.profiles):
+            if profile.id == profile_id:
+                return profile
+        return None
+
+
+PROFILER = Profiler()
+
+
+def profiled(endpoint):
+    """
+    Decorator for sync endpoints: when the request is being profiled, sample
+    the threadpool thread running the endpoint, or run it under cProfile.
+    """
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        if profile.mode == "cprofile":
+            return profile.run(endpoint, args, kwargs)
+        ident = threading.get_ident()
+        profile.threads[ident] = sys._getframe()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profile.threads.pop(ident, None)
+
+    return wrapper
+
+
+class ProfileMiddleware:
+    """ASGI middleware selecting requests to profile and storing their profiles in the ring buffer."""
+
+    def __init__(self, app, profiler=None):
+        self.app = app
+        self.profiler = profiler or PROFILER
+
+    async def __call__(self, scope, receive, send):
+        profiler = self.profiler
+        if not profiler.active or scope["type"] != "http" or not profiler.select(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = profiler.start(scope)
+        status_holder = {"status": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        # Sync endpoints run in the threadpool with a copy of this context; @profiled reads it there.
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            profiler.finish(profile, scope, status_holder["status"], time.perf_counter() - start)
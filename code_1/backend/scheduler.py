@@ -0,0 +1,257 @@
+# 1_code/scheduler.py
+
+"""
+Priority scheduling of pending aid requests.
+
+Pending requests live in an indexed binary heap (a heap plus a position map),
+so insert, reprioritize, remove and pop are all O(log n). The heap is kept in
+memory and rebuilt from the database on startup.
+
+Priority combines urgency, request type and waiting time. Every request ages
+at the same rate, so "head start minus time waited" orders requests the same
+way at any moment: the heap key is
+
+    created_at (seconds) - urgency head start - type head start
+
+and a smaller key is served first. Keys never need to be recomputed as time
+passes, and a low-urgency request that has waited longer than the high-urgency
+head start overtakes newly arriving high-urgency requests, so nothing starves.
+
+Each process holds its own heap, while requests are also created, assigned
+and completed by other workers and by scripts. Before serving, `refresh`
+applies every aid request change committed since the last one, found by the
+change_seq stamped on each write (sync.py) with an index range scan. Writes
+that bypass the stamping are picked up by a full reload every
+PENDING_RELOAD_INTERVAL seconds.
+"""
+
+import heapq
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import func
+
+import models
+
+# Head starts in seconds of waiting time.
+URGENCY_HEAD_START = {"high": 4 * 3600, "medium": 3600, "low": 0}
+TYPE_HEAD_START = {"medical": 1800, "rescue": 1800}
+PENDING_RELOAD_INTERVAL = float(os.getenv("PENDING_RELOAD_INTERVAL", "300"))
+
+
+def priority_key(urgency, request_type, created_at):
+    """Heap key for a request; smaller keys are served first."""
+    created = created_at or datetime.utcnow()
+    return (created.timestamp()
+            - URGENCY_HEAD_START.get((urgency or "low").lower(), 0)
+            - TYPE_HEAD_START.get((request_type or "").lower(), 0))
+
+
+class IndexedHeap:
+    """
+    Binary min-heap of (key, item_id) with a position map, so an entry can be
+    updated or removed by id in O(log n).
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._pos = {}
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, item_id):
+        return item_id in self._pos
+
+    def key(self, item_id):
+        return self._heap[self._pos[item_id]][0]
+
+    def push(self, item_id, key):
+        """Insert an item, or update its key if it is already present."""
+        if item_id in self._pos:
+            self.update(item_id, key)
+            return
+        self._heap.append((key, item_id))
+        self._pos[item_id] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+
+    def update(self, item_id, key):
+        i = self._pos[item_id]
+        old_key = self._heap[i][0]
+        self._heap[i] = (key, item_id)
+        if key < old_key:
+            self._sift_up(i)
+        else:
+            self._sift_down(i)
+
+    def remove(self, item_id):
+        """Remove an item by id; returns False if it was not present."""
+        i = self._pos.pop(item_id, None)
+        if i is None:
+            return False
+        last = self._heap.pop()
+        if i < len(self._heap):
+            self._heap[i] = last
+            self._pos[last[1]] = i
+            self._sift_down(i)
+            self._sift_up(i)
+        return True
+
+    def peek(self):
+        if not self._heap:
+            return None
+        key, item_id = self._heap[0]
+        return item_id, key
+
+    def pop(self):
+        if not self._heap:
+            raise IndexError("pop from empty heap")
+        key, item_id = self._heap[0]
+        self.remove(item_id)
+        return item_id, key
+
+    def smallest(self, n):
+        """
+        The n smallest (item_id, key) pairs in order, without removing them.
+        Walks the heap with a frontier heap, so it costs O(n log n) not O(size).
+        """
+        result = []
+        if not self._heap or n <= 0:
+            return result
+        frontier = [(self._heap[0][0], self._heap[0][1], 0)]
+        while frontier and len(result) < n:
+            key, item_id, i = heapq.heappop(frontier)
+            result.append((item_id, key))
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(self._heap):
+                    child_key, child_id = self._heap[child]
+                    heapq.heappush(frontier, (child_key, child_id, child))
+        return result
+
+    def heapify(self, entries):
+        """Replace the contents with (item_id, key) pairs in O(n)."""
+        self._heap = [(key, item_id) for item_id, key in entries]
+        heapq.heapify(self._heap)
+        self._pos = {item_id: i for i, (_, item_id) in enumerate(self._heap)}
+
+    def _sift_up(self, i):
+        heap, pos = self._heap, self._pos
+        entry = heap[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if heap[parent] <= entry:
+                break
+            heap[i] = heap[parent]
+            pos[heap[i][1]] = i
+            i = parent
+        heap[i] = entry
+        pos[entry[1]] = i
+
+    def _sift_down(self, i):
+        heap, pos = self._heap, self._pos
+        size = len(heap)
+        entry = heap[i]
+        while True:
+            child = 2 * i + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1] < heap[child]:
+                child += 1
+            if entry <= heap[child]:
+                break
+            heap[i] = heap[child]
+            pos[heap[i][1]] = i
+            i = child
+        heap[i] = entry
+        pos[entry[1]] = i
+
+
+class PendingRequestScheduler:
+    """Thread-safe priority queue of pending AidRequest ids."""
+
+    def __init__(self, reload_interval=PENDING_RELOAD_INTERVAL):
+        self.reload_interval = reload_interval
+        self._heap = IndexedHeap()
+        self._lock = threading.Lock()
+        # Highest change_seq applied, and when the heap was last reloaded in full.
+        self._seq = None
+        self._reloaded_at = 0.0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, request_id):
+        return request_id in self._heap
+
+    def add(self, request):
+        """Insert or reprioritize a pending AidRequest."""
+        key = priority_key(request.urgency, request.type, request.created_at)
+        with self._lock:
+            self._heap.push(request.id, key)
+
+    reprioritize = add
+
+    def remove(self, request_id):
+        with self._lock:
+            return self._heap.remove(request_id)
+
+    def sync(self, request):
+        """Add the request if it is pending, otherwise drop it from the queue."""
+        if request.status == "pending":
+            self.add(request)
+        else:
+            self.remove(request.id)
+
+    def pop(self):
+        """Remove and return the id of the highest-priority request, or None."""
+        with self._lock:
+            return self._heap.pop()[0] if len(self._heap) else None
+
+    def next_ids(self, limit, skip=0):
+        """Ids of the highest-priority pending requests, in order, without removing them."""
+        with self._lock:
+            return [item_id for item_id, _ in self._heap.smallest(skip + limit)[skip:]]
+
+    def rebuild(self, db):
+        """Reload every pending request from the database."""
+        # Read first: changes committed during the reload are applied again by refresh.
+        seq = db.query(func.max(models.AidRequest.change_seq)).scalar() or 0
+        rows = db.query(
+            models.AidRequest.id, models.AidRequest.urgency,
+            models.AidRequest.type, models.AidRequest.created_at,
+        ).filter(models.AidRequest.status == "pending").all()
+        entries = [(row.id, priority_key(row.urgency, row.type, row.created_at)) for row in rows]
+        with self._lock:
+            self._heap.heapify(entries)
+            self._seq = seq
+            self._reloaded_at = time.monotonic()
+        return len(entries)
+
+    def refresh(self, db):
+        """
+        Apply the aid request changes committed since the last refresh, by
+        this or any other process; reload in full every reload_interval
+        seconds. Returns the number of changes applied.
+        """
+        if self._seq is None or time.monotonic() - self._reloaded_at >= self.reload_interval:
+            return self.rebuild(db)
+        rows = db.query(
+            models.AidRequest.id, models.AidRequest.urgency, models.AidRequest.type,
+            models.AidRequest.created_at, models.AidRequest.status, models.AidRequest.change_seq,
+        ).filter(models.AidRequest.change_seq > self._seq).order_by(models.AidRequest.change_seq).all()
+        if not rows:
+            return 0
+        with self._lock:
+            for row in rows:
+                if row.status == "pending":
+                    self._heap.push(row.id, priority_key(row.urgency, row.type, row.created_at))
+                else:
+                    self._heap.remove(row.id)
+            self._seq = max(self._seq, rows[-1].change_seq)
+        return len(rows)
+
+
+# Shared by the aid request routes and batch matching.
+pending_scheduler = PendingRequestScheduler()
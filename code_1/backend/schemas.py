@@ -1,7 +1,9 @@
-from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field, field_validator, model_validator
+import json
+from typing import Dict, Optional, List, Literal
+from datetime import datetime, time
 from models import UserRole
+from shifts import utc_naive
 
 class UserBase(BaseModel):
     email: EmailStr
@@ -36,11 +38,43 @@ class VolunteerProfile(VolunteerProfileBase):
     class Config:
         from_attributes = True
 
+class VolunteerShiftBase(BaseModel):
+    # One-off: starts_at and ends_at. Weekly: weekday (0 = Monday), start_time and end_time. UTC.
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
+    weekday: Optional[int] = Field(None, ge=0, le=6)
+    start_time: Optional[time] = None
+    end_time: Optional[time] = None  # At or before start_time: ends the next day
+
+class VolunteerShiftCreate(VolunteerShiftBase):
+    @field_validator("starts_at", "ends_at")
+    @classmethod
+    def to_utc(cls, value):
+        return utc_naive(value)
+
+    @model_validator(mode="after")
+    def check_kind(self):
+        once = (self.starts_at, self.ends_at)
+        weekly = (self.weekday, self.start_time, self.end_time)
+        if not (None not in once and set(weekly) == {None} or None not in weekly and set(once) == {None}):
+            raise ValueError("Give either starts_at and ends_at, or weekday, start_time and end_time")
+        if self.starts_at is not None and self.ends_at <= self.starts_at:
+            raise ValueError("ends_at must be after starts_at")
+        return self
+
+class VolunteerShift(VolunteerShiftBase):
+    id: int
+    volunteer_id: int
+
+    class Config:
+        from_attributes = True
+
 class AidRequestBase(BaseModel):
     type: str
     description: str
     latitude: float
     longitude: float
+    urgency: str = "low"
 
 class AidRequestCreate(AidRequestBase):
     pass
@@ -55,6 +89,197 @@ class AidRequest(AidRequestBase):
     class Config:
         from_attributes = True
 
+class BatchMatch(BaseModel):
+    request_id: int
+    volunteer_ids: List[int]
+
+class SyncChanges(BaseModel):
+    version: int  # Pass back as `since`
+    full: bool  # A full snapshot: replace the local copy
+    has_more: bool  # More changes are waiting; ask again with `version`
+    aid_requests: List[AidRequest]  # Inserted or updated since `since`, current state
+    deleted_aid_requests: List[int]  # Archived, or no longer visible to the caller
+    volunteer_profiles: List[VolunteerProfile]
+
+class HeatmapCell(BaseModel):
+    cell: str
+    latitude: float
+    longitude: float
+    demand: Dict[str, Dict[str, int]]  # Pending requests by type, then urgency
+    supply: Dict[str, int]  # Available volunteers by skill
+
+class Heatmap(BaseModel):
+    version: int
+    precision: int
+    full: bool
+    cells: List[HeatmapCell]
+
+class ResourceSiteBase(BaseModel):
+    name: str
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    region: Optional[str] = None
+
+class ResourceSiteCreate(ResourceSiteBase):
+    pass
+
+class ResourceSite(ResourceSiteBase):
+    id: int
+    region: str
+    geohash: str
+
+    class Config:
+        from_attributes = True
+
+class StockMovementCreate(BaseModel):
+    site_id: int
+    item: str
+    quantity: int
+    reason: Optional[str] = None
+
+class MovementBatchResult(BaseModel):
+    accepted: int
+
+class InventoryLevel(BaseModel):
+    site_id: int
+    item: str
+    quantity: int
+
+    class Config:
+        from_attributes = True
+
+class RegionInventoryTotal(BaseModel):
+    region: str
+    item: str
+    quantity: int
+
+    class Config:
+        from_attributes = True
+
+class NearbyStock(BaseModel):
+    site: ResourceSite
+    item: str
+    quantity: int
+    distance_km: float
+
+class InventoryItem(BaseModel):
+    name: str
+    quantity: int
+    location: str
+
+class DonationCreate(BaseModel):
+    idempotency_key: str = Field(..., min_length=1, max_length=128)
+    name: str
+    type: str
+    detail: str
+
+class Donation(BaseModel):
+    id: int
+    log_seq: int
+    name: str
+    type: str
+    detail: str
+    amount_cents: Optional[int] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class DonationBatchResult(BaseModel):
+    accepted: int
+    duplicates: int
+
+class DonationPage(BaseModel):
+    donations: List[Donation]
+    next_cursor: int
+
+class DonationTotal(BaseModel):
+    type: str
+    count: int
+    amount_cents: int
+
+    class Config:
+        from_attributes = True
+
+class AlertBase(BaseModel):
+    title: str
+    description: str
+    severity: str = "warning"
+    center_latitude: Optional[float] = None
+    center_longitude: Optional[float] = None
+    radius_km: Optional[float] = Field(None, gt=0)
+    polygon: Optional[List[List[float]]] = None  # [[lat, lon], ...]
+    dedup_key: Optional[str] = None
+
+class AlertCreate(AlertBase):
+    @model_validator(mode="after")
+    def check_fence(self):
+        circle = None not in (self.center_latitude, self.center_longitude, self.radius_km)
+        if circle == (self.polygon is not None):
+            raise ValueError("Give either center_latitude, center_longitude and radius_km, or polygon")
+        if self.polygon is not None and (len(self.polygon) < 3 or any(len(p) != 2 for p in self.polygon)):
+            raise ValueError("polygon needs at least 3 [lat, lon] points")
+        return self
+
+class Alert(AlertBase):
+    id: int
+    dedup_key: str
+    status: str
+    recipient_count: int
+    created_at: datetime
+
+    @field_validator("polygon", mode="before")
+    @classmethod
+    def parse_polygon(cls, value):
+        return json.loads(value) if isinstance(value, str) else value
+
+    class Config:
+        from_attributes = True
+
+class AlertFeedItem(BaseModel):
+    cursor: int
+    alert: Alert
+
+class AlertFeed(BaseModel):
+    alerts: List[AlertFeedItem]
+    next_cursor: int
+
+class ProfilingSettings(BaseModel):
+    enabled: bool = False
+    mode: Literal["sample", "cprofile"] = "sample"
+    sample_rate: float = Field(0.0, ge=0, le=1)
+    path: Optional[str] = None  # fnmatch pattern, e.g. "/match/*"
+    header_name: Optional[str] = None
+    header_value: Optional[str] = None
+    limit: Optional[int] = Field(None, gt=0)  # profiles left before profiling turns itself off
+
+    @model_validator(mode="after")
+    def check_header(self):
+        if (self.header_name is None) != (self.header_value is None):
+            raise ValueError("Give both header_name and header_value, or neither")
+        return self
+
+class ProfileSummary(BaseModel):
+    id: int
+    mode: str
+    method: str
+    path: str
+    route: Optional[str] = None
+    status: Optional[int] = None
+    started_at: datetime
+    duration_ms: Optional[float] = None
+    samples: int
+    stages_ms: Dict[str, float]
+
+class ProfileFunction(BaseModel):
+    function: str
+    calls: int
+    total_ms: float
+    cumulative_ms: float
+
+class ProfileDetail(ProfileSummary):
+    top_functions: List[ProfileFunction]
+
 class Token(BaseModel):
     access_token: str
     token_type: str
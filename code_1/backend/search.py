@@ -0,0 +1,299 @@
+# 1_code/search.py
+
+"""
+Full-text search over aid request descriptions.
+
+On PostgreSQL, search runs in the database on two GIN indexes over
+aid_requests.description (migration add_aid_request_search):
+
+* an expression index on models.SEARCH_VECTOR
+  (to_tsvector('english', ...)) for stemmed word matches. The query is
+  parsed with websearch_to_tsquery, so "quoted phrases", "or" and -negation
+  work.
+* a pg_trgm index. The query also matches descriptions that contain a
+  close-enough spelling of it (word_similarity, the <% operator), so
+  "bleding" still finds "Bleeding out".
+
+Matches are ranked by ts_rank_cd plus the trigram similarity. Status, type
+and bounding-box filters go into the same statement, so PostgreSQL can
+combine the text indexes with the partial status index.
+
+Other databases (SQLite in local mode and tests) fall back to InvertedIndex,
+an in-memory inverted index over the same descriptions. Like the pending
+scheduler, it is rebuilt from the table on startup (or on the first search)
+and updated as requests are created. It requires every query word, after
+light English suffix stripping, to appear, and it ranks with BM25. It has
+no phrase, negation or typo support. The filters are applied in SQL to the
+ranked ids, a chunk at a time, until the page is full. Ids that are no
+longer in aid_requests (archived) are dropped from the index when a search
+comes across them.
+"""
+
+import math
+import re
+import threading
+from collections import defaultdict
+
+import numpy as np
+from sqlalchemy import and_, func, literal, literal_column, or_, select, true
+
+import models
+from metrics import time_stage
+
+SEARCH_CONFIG = "english"
+# Ranked ids checked against the filters per query in the fallback.
+FILTER_CHUNK = 500
+# The fallback ranks this many pages' worth of matches before it ranks them all.
+FILTER_HEADROOM = 4
+# Below this many requests for the rarest query term, search probes dicts; above, it uses arrays.
+SMALL_POSTING = 2000
+# BM25 parameters (the usual defaults).
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its my no not of on or our so that the "
+    "their there they this to us was we were with".split()
+)
+
+
+def stem(word):
+    """Light English suffix stripping, so "burned", "burning" and "burns" all index as "burn"."""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            # "trapped" -> "trapp" -> "trap"
+            if len(word) > 3 and word[-1] == word[-2] and word[-1] not in "lsz":
+                word = word[:-1]
+            return word
+    if word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def analyze(text):
+    """Index terms of a text: lowercased words, stopwords dropped, stemmed."""
+    return [stem(word) for word in _WORD.findall((text or "").lower()) if word not in STOPWORDS]
+
+
+class InvertedIndex:
+    """
+    Thread-safe in-memory inverted index: term -> {request id: term frequency},
+    plus each request's terms and length for removal and BM25.
+    """
+
+    def __init__(self):
+        self._postings = defaultdict(dict)
+        self._docs = {}
+        # Term count per request id, for vectorized BM25; ids are dense autoincrement keys.
+        self._lengths = np.zeros(1024, dtype=np.float64)
+        self._total_length = 0
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._pending = None
+        self.built = False
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _add(self, request_id, description):
+        self._remove(request_id)
+        terms = analyze(description)
+        counts = defaultdict(int)
+        for term in terms:
+            counts[term] += 1
+        for term, count in counts.items():
+            self._postings[term][request_id] = count
+        self._docs[request_id] = (len(terms), tuple(counts))
+        if request_id >= len(self._lengths):
+            self._lengths = np.concatenate([self._lengths, np.zeros(max(request_id + 1, 2 * len(self._lengths))
+                                                                     - len(self._lengths))])
+        self._lengths[request_id] = len(terms)
+        self._total_length += len(terms)
+
+    def _remove(self, request_id):
+        doc = self._docs.pop(request_id, None)
+        if doc is None:
+            return False
+        length, terms = doc
+        for term in terms:
+            posting = self._postings[term]
+            posting.pop(request_id, None)
+            if not posting:
+                del self._postings[term]
+        self._total_length -= length
+        return True
+
+    def add(self, request_id, description):
+        """Index a new or changed request. A no-op until the index is built (on PostgreSQL, never)."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((request_id, description))
+            if self.built:
+                self._add(request_id, description)
+
+    def remove(self, request_ids):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.extend((request_id, None) for request_id in request_ids)
+            for request_id in request_ids:
+                self._remove(request_id)
+
+    def rebuild(self, db):
+        """Index every request in aid_requests; returns the count. Writes made meanwhile are replayed."""
+        with self._build_lock:
+            return self._rebuild(db)
+
+    def ensure_built(self, db):
+        if not self.built:
+            with self._build_lock:
+                if not self.built:
+                    self._rebuild(db)
+
+    def _rebuild(self, db):
+        with self._lock:
+            self._pending = []
+        fresh = InvertedIndex()
+        request = models.AidRequest
+        with time_stage("search_index_rebuild"):
+            rows = db.execute(select(request.id, request.description).execution_options(yield_per=10000))
+            for request_id, description in rows:
+                fresh._add(request_id, description)
+        with self._lock:
+            for request_id, description in self._pending:
+                if description is None:
+                    fresh._remove(request_id)
+                else:
+                    fresh._add(request_id, description)
+            self._postings, self._docs, self._lengths = fresh._postings, fresh._docs, fresh._lengths
+            self._total_length = fresh._total_length
+            self._pending = None
+            self.built = True
+            return len(self._docs)
+
+    def search(self, query, limit=None):
+        """
+        (request id, BM25 score) of the requests containing every query term,
+        best first: the best `limit` of them, or all.
+        """
+        terms = list(dict.fromkeys(analyze(query)))
+        if not terms:
+            return []
+        with self._lock:
+            postings = [self._postings.get(term) for term in terms]
+            if not all(postings) or not self._docs:
+                return []
+            count = len(self._docs)
+            postings.sort(key=len)
+            if len(postings[0]) <= SMALL_POSTING:
+                # Rare term: probe the other postings for each of its requests.
+                ids = [request_id for request_id in postings[0]
+                       if all(request_id in posting for posting in postings[1:])]
+                frequencies = [(len(posting), np.fromiter(map(posting.__getitem__, ids), dtype=np.float64,
+                                                          count=len(ids))) for posting in postings]
+                ids = np.array(ids, dtype=np.int64)
+            else:
+                # Common terms: intersect and look up whole posting lists as sorted arrays.
+                arrays = [_posting_arrays(posting) for posting in postings]
+                ids = arrays[0][0]
+                for term_ids, _ in arrays[1:]:
+                    ids = np.intersect1d(ids, term_ids, assume_unique=True)
+                frequencies = [(len(term_ids), term_frequencies[np.searchsorted(term_ids, ids)])
+                               for term_ids, term_frequencies in arrays]
+            if not len(ids):
+                return []
+            # BM25: sum of idf * f * (k1 + 1) / (f + k1 * (1 - b + b * length / average length)).
+            norms = BM25_K1 * (1 - BM25_B) + BM25_K1 * BM25_B * count / (self._total_length or 1) * self._lengths[ids]
+        scores = np.zeros(len(ids))
+        for document_count, f in frequencies:
+            idf = math.log(1 + (count - document_count + 0.5) / (document_count + 0.5))
+            scores += idf * (BM25_K1 + 1) * f / (f + norms)
+        if limit is not None and limit < len(ids):
+            best = np.argpartition(-scores, limit)[:limit]
+            ids, scores = ids[best], scores[best]
+        order = np.lexsort((ids, -scores))
+        return list(zip(ids[order].tolist(), scores[order].tolist()))
+
+
+def _posting_arrays(posting):
+    """A posting's request ids (ascending) and term frequencies as arrays."""
+    ids = np.fromiter(posting.keys(), dtype=np.int64, count=len(posting))
+    frequencies = np.fromiter(posting.values(), dtype=np.float64, count=len(posting))
+    # Postings fill in id order, except for requests re-added after a rebuild started.
+    if len(ids) > 1 and (ids[1:] < ids[:-1]).any():
+        order = np.argsort(ids)
+        ids, frequencies = ids[order], frequencies[order]
+    return ids, frequencies
+
+
+search_index = InvertedIndex()
+
+
+def uses_database_search(db):
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _filters(status=None, request_type=None, bbox=None):
+    request = models.AidRequest
+    filters = []
+    if status:
+        filters.append(request.status == status)
+    if request_type:
+        filters.append(func.lower(request.type) == request_type.lower())
+    if bbox is not None:
+        min_latitude, max_latitude, min_longitude, max_longitude = bbox
+        filters += [request.latitude.between(min_latitude, max_latitude),
+                    request.longitude.between(min_longitude, max_longitude)]
+    return filters
+
+
+def _search_postgresql(db, query, filters, skip, limit):
+    request = models.AidRequest
+    vector = literal_column(models.SEARCH_VECTOR)
+    tsquery = func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'"), query)
+    rank = func.ts_rank_cd(vector, tsquery) + func.word_similarity(query, request.description)
+    stmt = (select(request.id)
+            .where(or_(vector.op("@@")(tsquery), literal(query).op("<%")(request.description)), *filters)
+            .order_by(rank.desc(), request.id).offset(skip).limit(limit))
+    return db.execute(stmt).scalars().all()
+
+
+def _search_fallback(db, query, filters, skip, limit):
+    search_index.ensure_built(db)
+    request = models.AidRequest
+    passes = and_(*filters) if filters else true()
+    wanted = skip + limit
+    # Rank only the first few pages' worth unless the filters reject most of them.
+    ranked = search_index.search(query, limit=wanted * FILTER_HEADROOM)
+    full = len(ranked) < wanted * FILTER_HEADROOM
+    hits, gone, start = [], [], 0
+    while len(hits) < wanted:
+        if start >= len(ranked):
+            if full:
+                break
+            ranked, full = search_index.search(query), True
+        ids = [request_id for request_id, _ in ranked[start:start + FILTER_CHUNK]]
+        start += FILTER_CHUNK
+        rows = dict(db.execute(select(request.id, passes).where(request.id.in_(ids))).all())
+        gone += [request_id for request_id in ids if request_id not in rows]
+        hits += [request_id for request_id in ids if rows.get(request_id)]
+    if gone:
+        search_index.remove(gone)
+    return hits[skip:wanted]
+
+
+def search_aid_requests(db, query, status=None, request_type=None, bbox=None, skip=0, limit=50):
+    """
+    Ids of the aid requests matching a text query and the filters, best match
+    first. bbox is (min_latitude, max_latitude, min_longitude, max_longitude).
+    """
+    filters = _filters(status, request_type, bbox)
+    with time_stage("aid_request_search"):
+        if uses_database_search(db):
+            return _search_postgresql(db, query, filters, skip, limit)
+        return _search_fallback(db, query, filters, skip, limit)
@@ -0,0 +1,285 @@
+# 1_code/serialization.py
+
+"""
+Fast response encoding.
+
+FastAPI's default path validates every returned object against the
+endpoint's response_model, converts it to JSON-compatible data, and encodes
+it with the stdlib json module. For ORM rows we wrote ourselves, the
+validation is redundant and dominates the cost of large listings.
+respond() skips it. rows_payload() reads exactly the response schema's fields
+off each row, and the result is encoded with orjson, which handles
+datetimes, enums and numpy arrays natively. Endpoints keep their
+response_model, so the OpenAPI schema is unchanged.
+
+Clients on slow links can ask for a smaller body:
+
+* Accept: application/msgpack gets MessagePack instead of JSON.
+* Accept-Encoding: br or gzip compresses any response over
+  COMPRESS_MIN_SIZE bytes (CompressionMiddleware). Streaming responses are
+  compressed chunk by chunk, flushing after each one so NDJSON lines still
+  arrive as they are produced. Brotli is used only if the brotli package is
+  installed.
+
+Each of these is a different representation, so a strong ETag names the
+one it was sent with. A MessagePack body's tag ends in "-msgpack"
+(etags.py), and CompressionMiddleware appends "-gzip" or "-br". It strips
+that suffix from If-None-Match before the endpoint compares tags, and puts
+it back on the 304.
+"""
+
+import datetime
+import enum
+import operator
+import zlib
+
+import msgpack
+import numpy as np
+import orjson
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+MSGPACK_TYPES = (MSGPACK, "application/x-msgpack")
+
+COMPRESS_MIN_SIZE = 500
+GZIP_LEVEL = 5
+# Brotli quality 4-5 compresses better than gzip at similar CPU cost for dynamic responses.
+BROTLI_QUALITY = 4
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+_PICKERS = {}
+
+
+def _picker(schema):
+    picker = _PICKERS.get(schema)
+    if picker is None:
+        fields = tuple(schema.model_fields)
+        pick = operator.itemgetter(*fields)
+        picker = _PICKERS[schema] = (fields, pick if len(fields) > 1 else lambda state: (pick(state),))
+    return picker
+
+
+def rows_payload(schema, rows):
+    """Plain dicts of the schema's fields for trusted ORM rows, without Pydantic validation."""
+    fields, pick = _picker(schema)
+    payload = []
+    for row in rows:
+        try:
+            # Loaded column values sit in the instance dict; reading them there
+            # skips the ORM's attribute instrumentation, most of the cost.
+            values = pick(row.__dict__)
+        except (AttributeError, KeyError):
+            # Expired or deferred attributes: let the ORM load them.
+            values = [getattr(row, field) for field in fields]
+        payload.append(dict(zip(fields, values)))
+    return payload
+
+
+def row_payload(schema, row):
+    return rows_payload(schema, [row])[0]
+
+
+def json_default(obj):
+    # Types orjson doesn't take natively (datetime subclasses such as Firestore
+    # timestamps) and everything msgpack doesn't; same wire values as JSON.
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return jsonable_encoder(obj)
+
+
+def _ranges(header):
+    for part in header.split(","):
+        name, *params = part.strip().split(";")
+        q = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name.strip():
+            yield name.strip().lower(), q
+
+
+def _specificity(name, offer):
+    if name == offer:
+        return 2
+    if name.endswith("/*") and offer.startswith(name[:-1]):
+        return 1
+    if name in ("*", "*/*"):
+        return 0
+    return None
+
+
+def preferred(header, offers):
+    """
+    The offer the client ranks highest in an Accept or Accept-Encoding
+    header. Each offer takes the q-value of the most specific range matching
+    it. Explicitly named offers beat wildcard matches, and ties go to the
+    earlier offer. Returns None if no offer is acceptable.
+    """
+    ranges = list(_ranges(header or ""))
+    best, best_key = None, None
+    for index, offer in enumerate(offers):
+        matches = []
+        for name, q in ranges:
+            specificity = _specificity(name, offer)
+            if specificity is not None:
+                matches.append((specificity, q))
+        if not matches:
+            continue
+        specificity, q = max(matches)
+        key = (q, specificity, -index)
+        if q > 0 and (best_key is None or key > best_key):
+            best, best_key = offer, key
+    return best
+
+
+def encode(data, media_type=JSON):
+    if media_type == MSGPACK:
+        return msgpack.packb(data, default=json_default, use_bin_type=True)
+    return orjson.dumps(data, default=json_default, option=ORJSON_OPTIONS)
+
+
+def negotiate_media_type(request):
+    """JSON or MessagePack, whichever the request's Accept header prefers."""
+    accept = request.headers.get("accept")
+    return MSGPACK if accept and preferred(accept, [JSON, *MSGPACK_TYPES]) in MSGPACK_TYPES else JSON
+
+
+def etag_variant(etag, suffix):
+    """A strong ETag with -suffix added inside the quotes; weak tags are equivalent across variants."""
+    if not etag or etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{suffix}"'
+
+
+def _strip_variant(if_none_match, suffix):
+    """If-None-Match with -suffix removed from each tag; returns (header, whether any tag had it)."""
+    end = f'-{suffix}"'
+    tags, stripped = [], False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.endswith(end):
+            tag, stripped = tag[:-len(end)] + '"', True
+        tags.append(tag)
+    return ", ".join(tags), stripped
+
+
+def respond(request, data, status_code=200, headers=None):
+    """Encode data as JSON or MessagePack, whichever the request's Accept header prefers."""
+    media_type = negotiate_media_type(request)
+    response = Response(content=encode(data, media_type), status_code=status_code,
+                        media_type=media_type, headers=headers)
+    response.headers["Vary"] = "Accept"
+    return response
+
+
+class _Compressor:
+    def __init__(self, encoding):
+        if encoding == "br":
+            self._stream = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._flush = self._stream.flush
+            self._finish = self._stream.finish
+            self.compress = self._stream.process
+        else:
+            self._stream = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+            self._flush = lambda: self._stream.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = self._stream.flush
+            self.compress = self._stream.compress
+
+    def chunk(self, body, last):
+        return self.compress(body) + (self._finish() if last else self._flush())
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses with brotli or gzip per
+    Accept-Encoding. Like starlette's GZipMiddleware, but negotiates the
+    encoding and flushes after each streamed chunk.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = ["br", "gzip"] if brotli is not None else ["gzip"]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        encoding = preferred(request_headers.get("accept-encoding"), self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        # The endpoint knows the uncompressed tag; the client holds the compressed one.
+        tagged = False
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match:
+            if_none_match, tagged = _strip_variant(if_none_match, encoding)
+            scope = dict(scope, headers=[(key, value) for key, value in scope["headers"] if key != b"if-none-match"]
+                         + [(b"if-none-match", if_none_match.encode("latin-1"))])
+
+        state = {"start": None, "compressor": None, "passthrough": False}
+
+        async def send_compressed(message):
+            if message["type"] == "http.response.start":
+                # Hold the headers until the first body chunk shows whether to compress.
+                state["start"] = message
+                state["passthrough"] = "content-encoding" in Headers(raw=message["headers"])
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            start = state.pop("start", None)
+            if start is not None:
+                if state["passthrough"] or (not more_body and len(body) < self.minimum_size):
+                    state["passthrough"] = True
+                    if start["status"] == 304 and tagged:
+                        headers = MutableHeaders(raw=start["headers"])
+                        if "etag" in headers:
+                            headers["ETag"] = etag_variant(headers["etag"], encoding)
+                    await send(start)
+                    await send(message)
+                    return
+                state["compressor"] = _Compressor(encoding)
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if "etag" in headers:
+                    headers["ETag"] = etag_variant(headers["etag"], encoding)
+                del headers["Content-Length"]
+                body = state["compressor"].chunk(body, last=not more_body)
+                if not more_body:
+                    headers["Content-Length"] = str(len(body))
+                await send(start)
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+            if state["passthrough"]:
+                await send(message)
+                return
+            await send({"type": "http.response.body", "body": state["compressor"].chunk(body, last=not more_body),
+                        "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,604 @@
+# 1_code/shards.py
+
+"""
+Geohash-partitioned volunteer shards with scatter-gather matching.
+
+The volunteer pool is split by geohash prefix (SHARD_PRECISION characters,
+about 156 km cells at precision 3). Each cell is owned by one shard, chosen
+by a stable hash of the cell, so a shard holds many scattered cells and load
+spreads evenly. Inside a shard the rows are sorted by cell, so a query only
+scans the cells it asks for.
+
+A request is routed to the shards owning its home cell and the 8 neighbouring
+cells. Every shard returns its local top k, and the router merges them. Distances
+are computed in one global scaled feature space (the scaler is fitted on the
+whole pool), so results from different shards are directly comparable. Any
+volunteer outside the 3x3 block is at least one cell away in latitude or
+longitude, which bounds their distance from below; when the merged k-th
+distance is beyond that bound the router re-asks every shard, so results
+always equal a single-pool search.
+
+Every load is a new generation, numbered by the time it was made, so
+generations from different routers never collide. A shard keeps the scaler
+(mean and scale) with each generation and reports the newest one published;
+routers that did not load it adopt it from there (ShardRouter.sync). A query
+names its generation, and a shard that no longer holds it refuses it rather
+than answering in another generation's scale.
+
+Shards run in-process (LocalShardWorker) or in separate processes reached over
+multiprocessing.connection (RemoteShardWorker). The same socket protocol works
+across hosts: start `python shards.py serve --host <address> --port 7101` on
+each node and list the addresses in MATCH_SHARD_ADDRESSES. Connections are
+authenticated with MATCH_SHARD_AUTHKEY, which both sides must set; there is
+no default. Messages are MessagePack with arrays as .npy frames, never
+pickles, so neither end can be made to run code by what it receives. Local
+shard processes get a random key of their own.
+"""
+
+import argparse
+import heapq
+import io
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+import zlib
+from multiprocessing.connection import AuthenticationError, Client, Listener, answer_challenge, deliver_challenge
+
+import msgpack
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+from geo import geohash_bbox, geohash_encode, geohash_encode_many, geohash_neighbors
+from matching_ai import build_feature_matrix, candidate_columns, prefilter_by_skill, skill_masks_from_features
+from metrics import time_stage
+
+SHARD_PRECISION = int(os.getenv("MATCH_SHARD_PRECISION", "3"))
+# Idle connections kept per remote shard; concurrent queries beyond it open more.
+SHARD_POOL_SIZE = int(os.getenv("MATCH_SHARD_POOL_SIZE", "8"))
+# Lock file naming the one process per host that loads shared (remote) shards.
+SHARD_OWNER_DIR = os.getenv("MATCH_SHARD_OWNER_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "shard_owner"))
+# Seconds between checks for a generation published by another router.
+SHARD_FOLLOW_INTERVAL = float(os.getenv("MATCH_SHARD_FOLLOW_INTERVAL", "5"))
+# MessagePack extension type of an .npy-encoded array.
+_NPY_EXT = 1
+
+
+def shard_authkey():
+    """MATCH_SHARD_AUTHKEY as bytes; remote shards refuse to run without one."""
+    key = os.getenv("MATCH_SHARD_AUTHKEY", "")
+    if not key:
+        raise RuntimeError("MATCH_SHARD_AUTHKEY must be set to serve or connect to remote shards")
+    return key.encode()
+
+
+def _encode_default(value):
+    if isinstance(value, np.ndarray):
+        buffer = io.BytesIO()
+        np.save(buffer, value, allow_pickle=False)
+        return msgpack.ExtType(_NPY_EXT, buffer.getvalue())
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot send {type(value).__name__} to a shard")
+
+
+def _decode_ext(code, data):
+    if code != _NPY_EXT:
+        raise ValueError(f"Unknown shard message extension {code}")
+    return np.load(io.BytesIO(data), allow_pickle=False)
+
+
+def encode_message(message):
+    return msgpack.packb(message, default=_encode_default, use_bin_type=True)
+
+
+def decode_message(data):
+    return msgpack.unpackb(data, ext_hook=_decode_ext, raw=False)
+
+
+class StaleGenerationError(Exception):
+    """A query named a generation the shard does not hold."""
+
+
+def shard_for_cell(cell, n_shards):
+    """Stable owner shard of a geohash cell."""
+    return zlib.crc32(cell.encode()) % n_shards
+
+
+def outside_block_bound(lat, lon, precision, scale):
+    """
+    Lower bound on the scaled distance from (lat, lon) to any volunteer outside
+    its home cell and 8 neighbours: they are at least one cell away in latitude
+    or longitude. `scale` is the StandardScaler scale_ of the feature matrix.
+    """
+    lat_lo, lat_hi, lon_lo, lon_hi = geohash_bbox(geohash_encode(lat, lon, precision))
+    return min((lat_hi - lat_lo) / scale[0], (lon_hi - lon_lo) / scale[1])
+
+
+class _ShardRows:
+    """One generation of a shard's rows, sorted by cell. Never changed once built."""
+
+    __slots__ = ("X", "skill_masks", "ids", "cell_ranges")
+
+    def __init__(self, X_scaled, skill_masks, ids, cells):
+        order = np.argsort(cells, kind='stable')
+        self.X = np.ascontiguousarray(X_scaled[order], dtype=np.float32)
+        self.skill_masks = skill_masks[order]
+        self.ids = ids[order]
+        cells = cells[order]
+        # cell -> (start, end) row range
+        self.cell_ranges = {}
+        if len(cells):
+            boundaries = np.flatnonzero(cells[1:] != cells[:-1]) + 1
+            starts = np.concatenate(([0], boundaries))
+            ends = np.concatenate((boundaries, [len(cells)]))
+            self.cell_ranges = {cells[s]: (int(s), int(e)) for s, e in zip(starts, ends)}
+
+
+_NO_ROWS = _ShardRows(np.empty((0, 0), np.float32), np.empty(0, np.uint16), np.empty(0, dtype=str), np.empty(0, dtype=str))
+
+
+class VolunteerShard:
+    """
+    One partition of the pool: scaled features, skill masks and ids, grouped
+    by cell. A load builds a new generation, with the scaler it was scaled
+    by, next to the current one; publishing makes it current once every shard
+    holds it. A query names the generation the router scaled it for. Queries
+    take no lock, and older generations stay for queries still in flight.
+    """
+
+    KEEP_GENERATIONS = 3
+
+    def __init__(self):
+        # generation -> (_ShardRows, scaler mean, scaler scale)
+        self._generations = {}
+        self._current = None
+        self._lock = threading.Lock()
+
+    def load(self, generation, mean, scale, X_scaled, skill_masks, ids, cells):
+        rows = _ShardRows(X_scaled, skill_masks, ids, cells)
+        with self._lock:
+            generations = dict(self._generations)
+            generations[generation] = (rows, mean, scale)
+            keep = set(sorted(generations)[-self.KEEP_GENERATIONS:])
+            keep.add(self._current)
+            self._generations = {g: entry for g, entry in generations.items() if g in keep}
+        return len(rows.ids)
+
+    def publish(self, generation):
+        """Make a loaded generation current unless a newer one already is; returns the current one."""
+        with self._lock:
+            if generation not in self._generations:
+                raise StaleGenerationError(f"generation {generation} is not loaded")
+            if self._current is None or generation > self._current:
+                self._current = generation
+            return self._current
+
+    def current(self):
+        """[generation, mean, scale] of the current generation, or None before the first publish."""
+        current = self._current
+        if current is None:
+            return None
+        _, mean, scale = self._generations[current]
+        return [current, mean, scale]
+
+    def _generation(self, generation):
+        entry = self._generations.get(generation)
+        if entry is None:
+            raise StaleGenerationError(f"generation {generation} is not loaded")
+        return entry
+
+    def size(self):
+        current = self._current
+        return 0 if current is None else len(self._generation(current)[0].ids)
+
+    def query(self, generation, req_scaled, request_mask, k, cells=None):
+        """
+        Local top k as a list of (distance, volunteer_id, latitude, longitude,
+        skill_mask, available), scanning only `cells` if given.
+        """
+        data, mean, scale = self._generation(generation)
+        if cells is None:
+            rows = np.arange(len(data.ids))
+        else:
+            ranges = [data.cell_ranges[c] for c in cells if c in data.cell_ranges]
+            if not ranges:
+                return []
+            rows = np.concatenate([np.arange(s, e) for s, e in ranges])
+        qualified = prefilter_by_skill(data.skill_masks[rows], request_mask)
+        if qualified is not None:
+            rows = rows[qualified]
+        diff = data.X[rows] - np.asarray(req_scaled, dtype=np.float32)
+        d = np.einsum('ij,ij->i', diff, diff)
+        k = min(k, len(d))
+        if k == 0:
+            return []
+        top = np.argpartition(d, k - 1)[:k]
+        hits = rows[top]
+        latitude, longitude, available = candidate_columns(data.X[hits], mean, scale)
+        return [(float(np.sqrt(d[t])), str(data.ids[h]), float(lat), float(lon), int(data.skill_masks[h]), bool(a))
+                for t, h, lat, lon, a in zip(top, hits, latitude, longitude, available)]
+
+    def handle(self, message):
+        op, args = message[0], message[1:]
+        if op == "load":
+            return self.load(*args)
+        if op == "publish":
+            return self.publish(*args)
+        if op == "current":
+            return self.current()
+        if op == "query":
+            return self.query(*args)
+        if op == "size":
+            return self.size()
+        raise ValueError(f"Unknown shard operation '{op}'")
+
+
+class LocalShardWorker:
+    """Shard served in the calling process."""
+
+    def __init__(self):
+        self.shard = VolunteerShard()
+
+    def request(self, message):
+        """Handle the message; returns a function that returns the reply (or raises its error)."""
+        try:
+            result = self.shard.handle(message)
+        except Exception as e:
+            error = e
+
+            def reply():
+                raise error
+            return reply
+        return lambda: result
+
+    def close(self):
+        pass
+
+
+class RemoteShardWorker:
+    """
+    Client for a shard served by `serve_shard`, locally or on another node.
+    Each request in flight has a connection of its own, so concurrent
+    queries reach the shard in parallel; up to `pool_size` idle connections
+    are kept for reuse.
+    """
+
+    def __init__(self, address, authkey=None, pool_size=SHARD_POOL_SIZE):
+        self.address = address
+        self.pool_size = pool_size
+        self._authkey = authkey or shard_authkey()
+        self._idle = []
+        self._lock = threading.Lock()
+        self._closed = False
+        # Connect once up front, so a wrong address or key fails here.
+        self._release(self._connect())
+
+    def _connect(self):
+        return Client(self.address, authkey=self._authkey)
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._connect()
+
+    def _release(self, conn):
+        with self._lock:
+            if not self._closed and len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, message):
+        """Send the message on a free connection; returns a function that waits for the reply."""
+        conn = self._acquire()
+        try:
+            conn.send_bytes(encode_message(message))
+        except BaseException:
+            conn.close()
+            raise
+
+        def reply():
+            try:
+                status, result = decode_message(conn.recv_bytes())
+            except BaseException:
+                conn.close()
+                raise
+            self._release(conn)
+            if status == "stale":
+                raise StaleGenerationError(result)
+            if status == "error":
+                raise RuntimeError(f"Shard {self.address} failed: {result}")
+            return result
+        return reply
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+def serve_shard(address, authkey=None, ready=None):
+    """
+    Serve one shard on `address` until the process is stopped. If `ready` (a
+    Connection) is given, the bound address is sent on it once listening, so
+    port 0 can be used to pick a free port. Each connection is served by its
+    own thread.
+    """
+    authkey = authkey or shard_authkey()
+    shard = VolunteerShard()
+    # The key handshake runs on each connection's thread, so a burst of new
+    # pooled connections is not serialized (or dropped) behind the accept loop.
+    with Listener(address, backlog=64) as listener:
+        if ready is not None:
+            ready.send(listener.address)
+            ready.close()
+
+        def handle_connection(conn):
+            with conn:
+                try:
+                    deliver_challenge(conn, authkey)
+                    answer_challenge(conn, authkey)
+                except (AuthenticationError, EOFError, OSError) as e:
+                    # A client without the key must not stop the server.
+                    print(f"Rejected shard connection: {e}")
+                    return
+                while True:
+                    try:
+                        message = conn.recv_bytes()
+                    except EOFError:
+                        return
+                    try:
+                        reply = ("ok", shard.handle(decode_message(message)))
+                    except StaleGenerationError as e:
+                        reply = ("stale", str(e))
+                    except Exception as e:
+                        reply = ("error", f"{type(e).__name__}: {e}")
+                    conn.send_bytes(encode_message(reply))
+
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError as e:
+                print(f"Failed to accept shard connection: {e}")
+                continue
+            threading.Thread(target=handle_connection, args=(conn,), daemon=True).start()
+
+
+def start_local_shard_processes(n_shards, host="127.0.0.1", base_port=0):
+    """
+    Spawn n_shards shard server processes on this machine (free ports unless
+    base_port is given); returns (processes, workers).
+    """
+    ctx = multiprocessing.get_context("spawn")
+    # Only this process talks to them, so they need no shared secret.
+    authkey = secrets.token_bytes(32)
+    processes, workers = [], []
+    for i in range(n_shards):
+        address = (host, base_port + i if base_port else 0)
+        receiver, sender = ctx.Pipe(duplex=False)
+        process = ctx.Process(target=serve_shard, args=(address, authkey, sender), daemon=True)
+        process.start()
+        sender.close()
+        if not receiver.poll(30):
+            process.terminate()
+            raise RuntimeError(f"Shard process {i} did not start")
+        processes.append(process)
+        workers.append(RemoteShardWorker(receiver.recv(), authkey))
+    return processes, workers
+
+
+class ShardRouter:
+    """
+    Partitions the pool across workers and answers match queries by
+    scatter-gather over the home and neighbouring cells.
+    """
+
+    def __init__(self, workers, precision=SHARD_PRECISION):
+        self.workers = list(workers)
+        self.precision = precision
+        # (generation, scaler mean, scaler scale) of the pool every shard holds,
+        # swapped in one assignment.
+        self._state = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def generation(self):
+        return self._state[0] if self._state is not None else 0
+
+    def load(self, X, ids, scaler=None):
+        """
+        Partition the raw feature matrix X (rows from build_feature_matrix) and
+        load each shard as a new generation, published once every shard holds
+        it. Queries keep using the previous one until then. Returns the number
+        of volunteers per shard.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        # Ids travel as a fixed-width string array, which .npy encodes without pickling.
+        ids = np.asarray(ids, dtype=str)
+        scaler = scaler or StandardScaler().fit(X)
+        X_scaled = scaler.transform(X).astype(np.float32)
+        masks = skill_masks_from_features(X)
+        cells = geohash_encode_many(X[:, 0], X[:, 1], self.precision)
+        owners = np.array([shard_for_cell(c, len(self.workers)) for c in cells], dtype=np.int64)
+        mean = np.asarray(scaler.mean_, dtype=np.float64)
+        scale = np.asarray(scaler.scale_, dtype=np.float64)
+        with self._load_lock:
+            # Nanoseconds since the epoch: unique across routers, newest loads highest.
+            generation = max(time.time_ns(), self.generation + 1)
+            sizes = self._scatter({
+                i: ("load", generation, mean, scale,
+                    X_scaled[owners == i], masks[owners == i], ids[owners == i], cells[owners == i])
+                for i in range(len(self.workers))
+            })
+            self._scatter({i: ("publish", generation) for i in range(len(self.workers))})
+            self._state = (generation, mean, scale)
+        return [sizes[i] for i in range(len(self.workers))]
+
+    def sync(self):
+        """
+        Adopt the newest generation published on the shards, with its scaler,
+        for routers that share shards loaded by another process. Returns the
+        generation, or None if nothing is published yet.
+        """
+        published = [c for c in self._scatter({i: ("current",) for i in range(len(self.workers))}).values()
+                     if c is not None]
+        if not published:
+            return None
+        generation, mean, scale = max(published, key=lambda c: c[0])
+        if generation > self.generation:
+            self._state = (generation, np.asarray(mean, dtype=np.float64), np.asarray(scale, dtype=np.float64))
+        return self.generation
+
+    @property
+    def ready(self):
+        return self._state is not None
+
+    def route(self, lat, lon):
+        """Map of worker index -> cells to scan for a request at (lat, lon)."""
+        home = geohash_encode(lat, lon, self.precision)
+        targets = {}
+        for cell in [home] + geohash_neighbors(home):
+            targets.setdefault(shard_for_cell(cell, len(self.workers)), []).append(cell)
+        return targets
+
+    def query(self, request_features, k=3):
+        """Top k (volunteer_id, distance) pairs for a request feature vector, best first."""
+        return [(hit[1], hit[0]) for hit in self._search(request_features, k)]
+
+    def candidates(self, request_features, k=3):
+        """
+        The same top k as (volunteer_id, latitude, longitude, skill_mask, available)
+        rows, for matching_ai.rerank_candidates.
+        """
+        return [hit[1:] for hit in self._search(request_features, k)]
+
+    def _search(self, request_features, k):
+        if self._state is None:
+            raise RuntimeError("ShardRouter.load or sync must be called before querying")
+        try:
+            return self._search_state(self._state, request_features, k)
+        except StaleGenerationError:
+            # Another router's newer loads evicted ours; adopt the current generation and ask again.
+            self.sync()
+            return self._search_state(self._state, request_features, k)
+
+    def _search_state(self, state, request_features, k):
+        generation, mean, scale = state
+        req_scaled = ((np.asarray(request_features, dtype=np.float64) - mean) / scale).astype(np.float32)
+        request_mask = int(skill_masks_from_features(request_features)[0])
+        lat, lon = request_features[0], request_features[1]
+        with time_stage("shard_scatter_gather"):
+            merged = self._gather(self.route(lat, lon), generation, req_scaled, request_mask, k)
+            if len(merged) < k or merged[-1][0] > outside_block_bound(lat, lon, self.precision, scale):
+                # Someone outside the neighbourhood may be closer: ask every shard.
+                everywhere = {i: None for i in range(len(self.workers))}
+                merged = self._gather(everywhere, generation, req_scaled, request_mask, k)
+                if not merged and request_mask:
+                    # Nobody holds the skill; rank the whole pool like rank_feature_matrix does.
+                    merged = self._gather(everywhere, generation, req_scaled, 0, k)
+        return merged
+
+    def _gather(self, targets, generation, req_scaled, request_mask, k):
+        results = self._scatter({i: ("query", generation, req_scaled, request_mask, k, cells)
+                                 for i, cells in targets.items()})
+        return heapq.nsmallest(k, (tuple(hit) for hits in results.values() for hit in hits))
+
+    def _scatter(self, messages):
+        """Send every message before reading any reply, so shards work in parallel."""
+        replies = {i: self.workers[i].request(messages[i]) for i in sorted(messages)}
+        # Read every reply even after a failure, so no connection goes back to
+        # the pool with an unread answer on it.
+        results, error = {}, None
+        for i, reply in replies.items():
+            try:
+                results[i] = reply()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+        return results
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+
+class ShardRefreshJob:
+    """
+    Background thread that loads `router` from `load_volunteers()` now and
+    then every `interval` seconds (once if interval is 0), so volunteers
+    added, moved or toggled since the last load are matched. Without
+    `load_volunteers` the job follows instead: every SHARD_FOLLOW_INTERVAL
+    seconds it adopts the generation the loading process published.
+    """
+
+    def __init__(self, router, load_volunteers=None, interval=0):
+        self.router = router
+        self.load_volunteers = load_volunteers
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="shard-load", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self):
+        if self.load_volunteers is None:
+            before = self.router.generation
+            if self.router.sync() not in (None, before):
+                print(f"Following shard generation {self.router.generation}")
+            return None
+        volunteers = self.load_volunteers()
+        if not volunteers:
+            return None
+        X = build_feature_matrix(volunteers)
+        return self.router.load(X, [str(v['id']) for v in volunteers])
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                sizes = self.run_once()
+                if sizes is not None:
+                    print(f"Loaded generation {self.router.generation} of {sum(sizes)} volunteers "
+                          f"into {len(sizes)} shards: {sizes}")
+            except Exception as e:
+                print(f"Error loading volunteer shards: {e}")
+            if self.load_volunteers is None:
+                self._stop.wait(SHARD_FOLLOW_INTERVAL)
+                continue
+            if self.interval <= 0:
+                return
+            self._stop.wait(self.interval)
+
+
+def parse_addresses(spec):
+    """'host:port,host:port' -> [(host, port), ...]"""
+    addresses = []
+    for part in spec.split(","):
+        host, _, port = part.strip().rpartition(":")
+        addresses.append((host or "127.0.0.1", int(port)))
+    return addresses
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a volunteer shard server.")
+    parser.add_argument("command", choices=["serve"])
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="Address to listen on; give the node's private address to serve other hosts.")
+    parser.add_argument("--port", type=int, default=7101)
+    args = parser.parse_args()
+    try:
+        authkey = shard_authkey()
+    except RuntimeError as e:
+        parser.error(str(e))
+    print(f"Serving volunteer shard on {args.host}:{args.port}")
+    serve_shard((args.host, args.port), authkey)
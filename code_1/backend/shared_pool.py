@@ -0,0 +1,224 @@
+# 1_code/shared_pool.py
+
+"""
+Volunteer pool snapshot shared by every worker process on a host.
+
+One owner process (whichever takes the OWNER lock first) builds the pool: the
+scaled volunteer feature matrix, the volunteer ids, the skill bitmasks and a
+geohash spatial index, with rows sorted by cell so each cell is a contiguous
+row range. Each generation is written as plain .npy files under
+SHARED_POOL_DIR/vNNNNNN/ and published by atomically replacing the CURRENT
+pointer (the same scheme as model_store).
+
+Workers attach with np.load(mmap_mode='r'): zero-copy, read-only views of the
+same pages, so memory does not grow with the number of uvicorn workers. The
+default directory is on /dev/shm (tmpfs), so the pages never touch disk. A
+worker swaps to a new generation by replacing one attribute; a request that
+already holds the old snapshot keeps reading it, and the old files stay
+mapped until the last reader drops them.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+from geo import geohash_encode, geohash_encode_many, geohash_neighbors
+from matching_ai import build_feature_matrix, candidate_columns, prefilter_by_skill, skill_masks_from_features
+from metrics import Gauge, time_stage
+from model_store import publish_version, read_current_version, version_dir
+from shards import SHARD_PRECISION, outside_block_bound
+
+_DEFAULT_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+SHARED_POOL_DIR = os.getenv("SHARED_POOL_DIR", os.path.join(_DEFAULT_DIR, "disaster_relief_pool"))
+SHARED_POOL_CHECK_INTERVAL = float(os.getenv("SHARED_POOL_CHECK_INTERVAL", "1"))
+META_FILE = "meta.json"
+ARRAYS = ("scaled", "ids", "skill_masks", "cell_keys", "cell_offsets", "scaler_mean", "scaler_scale")
+
+POOL_GENERATION = Gauge("shared_pool_generation", "Shared volunteer pool generation this process reads.")
+
+
+def build_snapshot(X, ids, precision=SHARD_PRECISION):
+    """Arrays for one pool generation from a raw feature matrix (rows from build_feature_matrix)."""
+    X = np.asarray(X, dtype=np.float64)
+    if not len(X):
+        raise ValueError("Cannot build a volunteer pool snapshot without volunteers")
+    scaler = StandardScaler().fit(X)
+    cells = geohash_encode_many(X[:, 0], X[:, 1], precision)
+    order = np.argsort(cells, kind='stable')
+    cell_keys, starts = np.unique(cells[order], return_index=True)
+    return {
+        "scaled": scaler.transform(X[order]).astype(np.float32),
+        "ids": np.asarray([str(i) for i in ids])[order],
+        "skill_masks": skill_masks_from_features(X)[order],
+        "cell_keys": cell_keys,
+        "cell_offsets": np.append(starts, len(X)).astype(np.int64),
+        "scaler_mean": scaler.mean_,
+        "scaler_scale": scaler.scale_,
+        "precision": precision,
+    }
+
+
+def publish_snapshot(snapshot, pool_dir=SHARED_POOL_DIR, keep=2):
+    """Write a snapshot as the next generation and point CURRENT at it. Returns the generation."""
+    def write(tmp_dir, generation):
+        for name in ARRAYS:
+            np.save(os.path.join(tmp_dir, name + ".npy"), snapshot[name])
+        with open(os.path.join(tmp_dir, META_FILE), "w") as f:
+            json.dump({"generation": generation, "precision": snapshot["precision"],
+                       "size": len(snapshot["ids"]), "published_at": time.time()}, f)
+    return publish_version(write, pool_dir, keep)
+
+
+class PoolSnapshot:
+    """Read-only, memory-mapped view of one published pool generation."""
+
+    def __init__(self, generation, pool_dir=SHARED_POOL_DIR):
+        path = version_dir(generation, pool_dir)
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        self.generation = generation
+        self.precision = meta["precision"]
+        self.published_at = meta["published_at"]
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, name + ".npy"), mmap_mode='r'))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def cell_rows(self, cells):
+        """Row indices of every volunteer in the given geohash cells."""
+        cells = np.asarray(cells)
+        pos = np.searchsorted(self.cell_keys, cells)
+        found = pos < len(self.cell_keys)
+        found[found] = self.cell_keys[pos[found]] == cells[found]
+        ranges = [np.arange(self.cell_offsets[p], self.cell_offsets[p + 1]) for p in pos[found]]
+        return np.concatenate(ranges) if ranges else np.empty(0, dtype=np.int64)
+
+    def query(self, request_features, k=3):
+        """
+        Top k (volunteer_id, distance) pairs, best first. Searches the request's
+        geohash cell and its neighbours, and the whole pool only when someone
+        outside them could be closer.
+        """
+        return [(hit[1], hit[0]) for hit in self._search(request_features, k)]
+
+    def candidates(self, request_features, k=3):
+        """
+        The same top k as (volunteer_id, latitude, longitude, skill_mask, available)
+        rows, for matching_ai.rerank_candidates.
+        """
+        return [hit[1:] for hit in self._search(request_features, k)]
+
+    def _search(self, request_features, k):
+        request_features = np.asarray(request_features, dtype=np.float64)
+        req_scaled = ((request_features - self.scaler_mean) / self.scaler_scale).astype(np.float32)
+        request_mask = int(skill_masks_from_features(request_features)[0])
+        lat, lon = request_features[0], request_features[1]
+        home = geohash_encode(lat, lon, self.precision)
+        with time_stage("nearest_neighbors"):
+            hits = self._rank(self.cell_rows([home] + geohash_neighbors(home)), req_scaled, request_mask, k)
+            if len(hits) < k or hits[-1][0] > outside_block_bound(lat, lon, self.precision, self.scaler_scale):
+                hits = self._rank(None, req_scaled, request_mask, k)
+                if not hits and request_mask:
+                    hits = self._rank(None, req_scaled, 0, k)
+        return hits
+
+    def _rank(self, rows, req_scaled, request_mask, k):
+        masks = self.skill_masks if rows is None else self.skill_masks[rows]
+        qualified = prefilter_by_skill(masks, request_mask)
+        if rows is None:
+            rows = qualified
+        elif qualified is not None:
+            rows = rows[qualified]
+        candidates = self.scaled if rows is None else self.scaled[rows]
+        diff = candidates - req_scaled
+        d = np.einsum('ij,ij->i', diff, diff)
+        k = min(k, len(d))
+        if k == 0:
+            return []
+        top = np.argpartition(d, k - 1)[:k]
+        positions = top if rows is None else rows[top]
+        latitude, longitude, available = candidate_columns(self.scaled[positions], self.scaler_mean, self.scaler_scale)
+        return sorted((float(np.sqrt(d[t])), str(self.ids[p]), float(lat), float(lon), int(self.skill_masks[p]), bool(a))
+                      for t, p, lat, lon, a in zip(top, positions, latitude, longitude, available))
+
+
+class SharedPoolReader:
+    """
+    Holds the pool generation this process serves and attaches to a newer one
+    when CURRENT changes (checked at most every check_interval seconds).
+    """
+
+    def __init__(self, pool_dir=SHARED_POOL_DIR, check_interval=SHARED_POOL_CHECK_INTERVAL):
+        self.pool_dir = pool_dir
+        self.check_interval = check_interval
+        self.current = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self):
+        return self.current.generation if self.current is not None else None
+
+    def refresh(self):
+        with self._lock:
+            self._last_check = time.monotonic()
+            generation = read_current_version(self.pool_dir)
+            if generation is None or generation == self.generation:
+                return False
+            self.current = PoolSnapshot(generation, self.pool_dir)
+            POOL_GENERATION.set(generation)
+            return True
+
+    def get(self):
+        if time.monotonic() - self._last_check >= self.check_interval:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error attaching shared volunteer pool: {e}")
+        return self.current
+
+
+class PoolPublisher:
+    """
+    Owner-side thread: rebuilds the pool from `load_volunteers()` every
+    `interval` seconds and publishes it as a new generation.
+    """
+
+    def __init__(self, reader, load_volunteers, interval):
+        self.reader = reader
+        self.load_volunteers = load_volunteers
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="shared-pool-publish", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self):
+        volunteers = self.load_volunteers()
+        if not volunteers:
+            return None
+        X = build_feature_matrix(volunteers)
+        generation = publish_snapshot(build_snapshot(X, [v['id'] for v in volunteers]), self.reader.pool_dir)
+        self.reader.refresh()
+        return generation
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                generation = self.run_once()
+                if generation is not None:
+                    print(f"Published shared volunteer pool generation {generation}.")
+            except Exception as e:
+                print(f"Error publishing shared volunteer pool: {e}")
+            self._stop.wait(self.interval)
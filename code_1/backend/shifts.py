@@ -0,0 +1,345 @@
+# 1_code/shifts.py
+
+"""
+Schedule-based volunteer availability.
+
+Volunteers record shifts (volunteer_shifts): one-off ones with a start and
+end, and weekly ones with a weekday and start/end times of day. All times
+are UTC. A weekly shift whose end time is at or before its start time runs
+into the next day. A volunteer with at least one shift is available while a
+shift covers the time in question. A volunteer without shifts falls back to
+the availability flag alone. The flag still turns anyone off.
+
+A weekly shift is placed on a one-week timeline as [week_start, week_end)
+seconds since Monday 00:00, stamped on the row when it is written; an
+occurrence that started the week before is found by also looking at the
+same point one week later.
+
+Listings and matching ask SQL (available_clause): flagged available, and
+either without any shift or with a shift covering the whole window,
+checked by a correlated EXISTS on the (volunteer_id, starts_at, ends_at) and
+(volunteer_id, week_start, week_end) indexes. The query carries only the
+window, however many volunteers are on shift.
+
+ShiftIndex answers the same question in memory, for profiles already
+loaded (filter), from two interval indexes: one-off shifts on an absolute
+timeline, weekly ones on the one-week timeline. Like the pending scheduler,
+it is rebuilt from the database on startup and updated as shifts are
+created or deleted. refresh() catches up with shifts written by other
+processes through the sync clock: a shift write stamps its volunteer's
+profile with a change_seq (sync.py), so a refresh reads the clock, and only
+when it moved reloads the shifts of the profiles stamped since. It reloads
+in full every SHIFT_INDEX_RELOAD_INTERVAL seconds, for rows written
+without the ORM hook.
+
+Each IntervalIndex is a centred interval tree. Every node keeps the
+intervals that contain its centre, sorted by start and by end, so a point
+query walks one root-to-leaf path and stops scanning each list at the first
+miss: O(log n + k). Shifts added or deleted since the last build wait in a
+small buffer that queries check directly. The tree is rebuilt once the
+buffer reaches SHIFT_INDEX_BUFFER.
+"""
+
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, event, exists, or_, select
+
+import models
+from sync import current_version
+
+WEEK_SECONDS = 7 * 86400
+DAY_SECONDS = 86400
+# Shifts added or deleted between rebuilds of an interval tree.
+SHIFT_INDEX_BUFFER = 256
+SHIFT_INDEX_RELOAD_INTERVAL = float(os.getenv("SHIFT_INDEX_RELOAD_INTERVAL", "300"))
+
+_EPOCH = datetime(1970, 1, 1)
+# A Monday, the start of week offsets.
+_WEEK_EPOCH = datetime(1970, 1, 5)
+
+
+def utc_naive(value):
+    """Naive UTC datetime, the way the database stores them."""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _seconds(value):
+    return (value - _EPOCH).total_seconds()
+
+
+def _time_of_day(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+class _Node:
+    __slots__ = ("center", "by_start", "by_end", "left", "right")
+
+
+def _build(intervals):
+    """Centred interval tree over (start, end, key, value) tuples; None if empty."""
+    if not intervals:
+        return None
+    endpoints = sorted(point for start, end, _, _ in intervals for point in (start, end))
+    node = _Node()
+    # The lower median: each side gets at most half the intervals.
+    node.center = center = endpoints[(len(endpoints) - 1) // 2]
+    here, left, right = [], [], []
+    for interval in intervals:
+        if interval[1] <= center:
+            left.append(interval)
+        elif interval[0] > center:
+            right.append(interval)
+        else:
+            here.append(interval)
+    node.by_start = sorted(here, key=lambda interval: interval[0])
+    node.by_end = sorted(here, key=lambda interval: interval[1], reverse=True)
+    node.left = _build(left)
+    node.right = _build(right)
+    return node
+
+
+class IntervalIndex:
+    """Half-open intervals [start, end) with a key and a value, queried by point."""
+
+    def __init__(self, buffer=SHIFT_INDEX_BUFFER):
+        self.buffer = buffer
+        self._intervals = {}
+        self._root = None
+        self._added = {}
+        self._removed = set()
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def add(self, key, start, end, value):
+        self.remove(key)
+        self._intervals[key] = self._added[key] = (start, end, key, value)
+        self._maybe_rebuild()
+
+    def remove(self, key):
+        if self._intervals.pop(key, None) is None:
+            return
+        if self._added.pop(key, None) is None:
+            self._removed.add(key)
+            self._maybe_rebuild()
+
+    def _maybe_rebuild(self):
+        if len(self._added) + len(self._removed) >= self.buffer:
+            self.rebuild()
+
+    def rebuild(self, intervals=None):
+        """Rebuild the tree, from (key, start, end, value) tuples if given."""
+        if intervals is not None:
+            self._intervals = {key: (start, end, key, value) for key, start, end, value in intervals}
+        self._root = _build(list(self._intervals.values()))
+        self._added, self._removed = {}, set()
+
+    def stab(self, point):
+        """(start, end, key, value) of every interval containing point."""
+        found = []
+        node = self._root
+        while node is not None:
+            if point < node.center:
+                for interval in node.by_start:
+                    if interval[0] > point:
+                        break
+                    found.append(interval)
+                node = node.left
+            else:
+                for interval in node.by_end:
+                    if interval[1] <= point:
+                        break
+                    found.append(interval)
+                node = node.right
+        if self._removed:
+            found = [interval for interval in found if interval[2] not in self._removed]
+        found += [interval for interval in self._added.values() if interval[0] <= point < interval[1]]
+        return found
+
+    def covering(self, start, end):
+        """Values of the intervals that contain all of [start, end)."""
+        return [interval[3] for interval in self.stab(start) if interval[1] >= end]
+
+
+def week_window(weekday, start_time, end_time):
+    """[start, end) of a weekly shift in seconds since Monday 00:00; end may pass the end of the week."""
+    start = weekday * DAY_SECONDS + _time_of_day(start_time)
+    length = (_time_of_day(end_time) - _time_of_day(start_time)) % DAY_SECONDS or DAY_SECONDS
+    return start, start + length
+
+
+@event.listens_for(models.VolunteerShift, "before_insert")
+@event.listens_for(models.VolunteerShift, "before_update")
+def _stamp_week_window(mapper, connection, shift):
+    if shift.weekday is None:
+        shift.week_start = shift.week_end = None
+    else:
+        shift.week_start, shift.week_end = week_window(shift.weekday, shift.start_time, shift.end_time)
+
+
+def shift_interval(shift):
+    """(index, start, end) of a VolunteerShift: "weekly" in week seconds, "once" in epoch seconds."""
+    if shift.weekday is not None:
+        return ("weekly",) + week_window(shift.weekday, shift.start_time, shift.end_time)
+    return "once", _seconds(shift.starts_at), _seconds(shift.ends_at)
+
+
+def _window(start, end):
+    """Naive UTC start, length in seconds and week offset of [start, end), or of the instant start if end is None."""
+    start, end = utc_naive(start), utc_naive(end)
+    length = 0.0 if end is None else max((end - start).total_seconds(), 0.0)
+    return start, length, (start - _WEEK_EPOCH).total_seconds() % WEEK_SECONDS
+
+
+def available_clause(start=None, end=None):
+    """
+    SQL filter for the profiles available over [start, end) (default: now):
+    flagged available, and on shift or without any shift.
+    """
+    profile, shift = models.VolunteerProfile, models.VolunteerShift
+    start, length, offset = _window(start or datetime.utcnow(), end)
+
+    def covers(low, high, at, until):
+        # [low, high) contains the instant `at` and runs on to `until`.
+        return and_(low <= at, high > at, high >= until)
+
+    windows = [covers(shift.starts_at, shift.ends_at, start, start + timedelta(seconds=length))]
+    if length < WEEK_SECONDS:
+        # This week's occurrences, and last week's that run on into this one.
+        windows += [covers(shift.week_start, shift.week_end, at, at + length)
+                    for at in (offset, offset + WEEK_SECONDS)]
+    unscheduled = ~exists().where(shift.volunteer_id == profile.id)
+    on_shift = exists().where(shift.volunteer_id == profile.id, or_(*windows))
+    return and_(profile.availability.is_(True), or_(on_shift, unscheduled))
+
+
+class ShiftIndex:
+    """Thread-safe index of volunteer shifts: which volunteers are on shift at a time or over a window."""
+
+    def __init__(self, reload_interval=SHIFT_INDEX_RELOAD_INTERVAL):
+        self.reload_interval = reload_interval
+        self._indexes = {"once": IntervalIndex(), "weekly": IntervalIndex()}
+        # Volunteer id -> ids of their shifts; volunteers without shifts go by the availability flag.
+        self._scheduled = defaultdict(set)
+        self._volunteers = {}
+        self._lock = threading.Lock()
+        # Sync clock value the index has caught up to, and when it was last reloaded in full.
+        self._version = None
+        self._reloaded_at = 0.0
+
+    def __len__(self):
+        return len(self._volunteers)
+
+    def _remove(self, shift_id):
+        volunteer_id = self._volunteers.pop(shift_id, None)
+        if volunteer_id is None:
+            return
+        for index in self._indexes.values():
+            index.remove(shift_id)
+        self._scheduled[volunteer_id].discard(shift_id)
+        if not self._scheduled[volunteer_id]:
+            del self._scheduled[volunteer_id]
+
+    def _add(self, shift):
+        kind, start, end = shift_interval(shift)
+        self._remove(shift.id)
+        self._indexes[kind].add(shift.id, start, end, shift.volunteer_id)
+        self._volunteers[shift.id] = shift.volunteer_id
+        self._scheduled[shift.volunteer_id].add(shift.id)
+
+    def add(self, shift):
+        """Index a new or changed VolunteerShift."""
+        with self._lock:
+            self._add(shift)
+
+    def remove(self, shift_id):
+        with self._lock:
+            self._remove(shift_id)
+
+    def rebuild(self, db):
+        """Reload every shift from the database; returns the count."""
+        # The clock first: a shift written while the shifts load is reloaded by the next refresh.
+        version = current_version(db)
+        shifts = db.query(models.VolunteerShift).all()
+        intervals = {"once": [], "weekly": []}
+        for shift in shifts:
+            kind, start, end = shift_interval(shift)
+            intervals[kind].append((shift.id, start, end, shift.volunteer_id))
+        with self._lock:
+            for kind, index in self._indexes.items():
+                index.rebuild(intervals[kind])
+            self._volunteers = {shift.id: shift.volunteer_id for shift in shifts}
+            self._scheduled = defaultdict(set)
+            for shift_id, volunteer_id in self._volunteers.items():
+                self._scheduled[volunteer_id].add(shift_id)
+            self._version = version
+            self._reloaded_at = time.monotonic()
+        return len(shifts)
+
+    def refresh(self, db):
+        """
+        Catch up with shifts created, changed or deleted by this or any other
+        process; reload in full every reload_interval seconds. Returns the
+        number of shifts loaded.
+        """
+        if self._version is None or time.monotonic() - self._reloaded_at >= self.reload_interval:
+            return self.rebuild(db)
+        version = current_version(db)
+        if version == self._version:
+            return 0
+        # The current shifts of every profile stamped since, including those left with none.
+        profile, shift = models.VolunteerProfile, models.VolunteerShift
+        rows = db.execute(
+            select(profile.id, shift)
+            .outerjoin(shift, shift.volunteer_id == profile.id)
+            .where(profile.change_seq > self._version, profile.change_seq <= version)
+        ).all()
+        shifts = [row for _, row in rows if row is not None]
+        with self._lock:
+            for volunteer_id in {volunteer_id for volunteer_id, _ in rows}:
+                for shift_id in list(self._scheduled.get(volunteer_id, ())):
+                    self._remove(shift_id)
+            for row in shifts:
+                self._add(row)
+            self._version = version
+        return len(shifts)
+
+    def is_scheduled(self, volunteer_id):
+        return volunteer_id in self._scheduled
+
+    def on_shift(self, start, end=None):
+        """
+        Ids of the volunteers with a shift covering the whole of [start, end),
+        or the instant `start` if end is None. Naive datetimes are UTC.
+        """
+        start, length, offset = _window(start, end)
+        at = _seconds(start)
+        with self._lock:
+            volunteers = set(self._indexes["once"].covering(at, at + length))
+            if length < WEEK_SECONDS:
+                weekly = self._indexes["weekly"]
+                # This week's occurrences, and last week's that run on into this one.
+                volunteers.update(weekly.covering(offset, offset + length))
+                volunteers.update(weekly.covering(offset + WEEK_SECONDS, offset + WEEK_SECONDS + length))
+        return volunteers
+
+    def filter(self, profiles, start=None, end=None):
+        """
+        The profiles available over [start, end) (default: now): volunteers
+        without shifts pass, others only while on shift. The availability
+        flag is the caller's filter.
+        """
+        if not self._scheduled:
+            return list(profiles)
+        on_shift = self.on_shift(start or datetime.utcnow(), end)
+        return [profile for profile in profiles if profile.id in on_shift or profile.id not in self._scheduled]
+
+
+# Kept up to date by the volunteer shift routes.
+shift_index = ShiftIndex()
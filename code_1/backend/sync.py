@@ -0,0 +1,178 @@
+# 1_code/sync.py
+
+"""
+Delta sync for offline-first clients.
+
+Every insert or update of an aid request or volunteer profile takes the next
+value of a single-row clock (sync_clock) and stamps it on the row as
+change_seq. The stamping happens in a before_flush hook, so every ORM write
+is covered without calls at each endpoint; a shift write stamps its
+volunteer's profile, since it changes when the volunteer is available. An
+archived request gets a fresh value on its aid_requests_archive row, stamped
+right after the archive batch commits (stamp_archived), which is how its
+deletion is reported. Taking the next value locks the clock row until
+commit, so values are handed out in commit order: a client that has seen
+value N has seen every change up to N. A read takes the clock value first
+and returns no row above it, so a change that commits between its per-table
+queries is left for the next read instead of being skipped.
+
+GET /sync?since=N returns the rows the caller can see whose change_seq is
+above N, at most `limit` at a time, oldest change first, plus the ids of
+requests archived or no longer visible to the caller. A row changed many
+times since N is sent once, in its current state. The response's `version`
+is the next `since`; with `has_more` the client asks again straight away.
+Each page is an index range scan on change_seq, so a reconnect costs what
+changed, not the size of the tables. since=0 (or a value ahead of the
+server's, e.g. after a restore) returns a full snapshot (`full`), and the
+client replaces its local copy.
+
+Rows written without this module loaded (other scripts, bulk loads) have no
+change_seq. backfill_change_seqs stamps them on startup; the
+add_sync_change_seqs migration stamps the rows that existed before it the
+same way.
+"""
+
+import heapq
+
+from sqlalchemy import event, func, or_, select, update
+from sqlalchemy.orm import Session
+
+import models
+from database import dialect_insert
+from metrics import time_stage
+
+SYNC_BATCH = 500
+SYNC_MAX_BATCH = 5000
+# Rows of sync_clock. Each stream has its own, so writers to one stream never
+# wait on another stream's clock lock.
+SYNC_CLOCK = 1
+ALERT_FEED_CLOCK = 2
+DONATION_LOG_CLOCK = 3
+# Row types stamped on flush.
+SYNCED_MODELS = (models.AidRequest, models.VolunteerProfile)
+
+
+def next_seqs(db, count=1, clock_id=SYNC_CLOCK):
+    """Advance a clock (the sync clock by default) by `count` and return the first of the values taken."""
+    clock = models.SyncClock.__table__
+    stmt = dialect_insert(db)(clock).values(id=clock_id, seq=count)
+    stmt = stmt.on_conflict_do_update(index_elements=["id"], set_={"seq": clock.c.seq + count})
+    return db.execute(stmt.returning(clock.c.seq)).scalar_one() - count + 1
+
+
+@event.listens_for(Session, "before_flush")
+def stamp_changes(session, flush_context, instances):
+    rows = [row for row in session.new if isinstance(row, SYNCED_MODELS)]
+    rows += [row for row in session.dirty if isinstance(row, SYNCED_MODELS) and session.is_modified(row)]
+    # A shift added, changed or deleted changes when its volunteer is available: stamp the profile.
+    shifts = [row for row in (*session.new, *session.dirty, *session.deleted) if isinstance(row, models.VolunteerShift)]
+    for volunteer_id in sorted({shift.volunteer_id for shift in shifts}):
+        profile = session.get(models.VolunteerProfile, volunteer_id)
+        if profile is not None and profile not in rows:
+            rows.append(profile)
+    if not rows:
+        return
+    first = next_seqs(session, len(rows))
+    for seq, row in enumerate(rows, first):
+        row.change_seq = seq
+
+
+def backfill_change_seqs(db, synced=(models.AidRequest, models.VolunteerProfile, models.AidRequestArchive)):
+    """Stamp every row of the `synced` models without a change_seq; returns the number stamped."""
+    stamped = 0
+    for model in synced:
+        # Lock the clock first, so a concurrent backfill can't stamp the same range.
+        next_seqs(db, 0)
+        low, high, count = db.execute(
+            select(func.min(model.id), func.max(model.id), func.count()).where(model.change_seq.is_(None))
+        ).one()
+        if not count:
+            continue
+        # Values follow the ids, so one UPDATE stamps them all.
+        first = next_seqs(db, high - low + 1)
+        db.execute(update(model).where(model.change_seq.is_(None))
+                   .values(change_seq=model.id + (first - low)).execution_options(synchronize_session=False))
+        stamped += count
+    db.commit()
+    return stamped
+
+
+def stamp_archived(db):
+    """
+    Stamp the archive rows moved since the last call. Runs in its own short
+    transaction after an archive batch, so the batch never holds the clock.
+    """
+    return backfill_change_seqs(db, (models.AidRequestArchive,))
+
+
+def current_version(db):
+    return db.execute(select(models.SyncClock.seq).where(models.SyncClock.id == SYNC_CLOCK)).scalar() or 0
+
+
+def read_changes(db, user, since=0, limit=SYNC_BATCH):
+    """
+    The changes since `since` that `user` can see: victims their own
+    requests, volunteers pending requests, the requests assigned to them and
+    their profile, NGOs and admins everything. Returns a dict with version,
+    full, has_more, aid_requests, deleted_aid_requests and volunteer_profiles.
+    """
+    version = current_version(db)
+    full = since <= 0 or since > version
+    if full:
+        since = 0
+    request, profile, archive = models.AidRequest, models.VolunteerProfile, models.AidRequestArchive
+    role = user.role
+    own_profile_id = None
+    if role == models.UserRole.VOLUNTEER:
+        own_profile_id = db.execute(select(profile.id).where(profile.user_id == user.id)).scalar()
+
+    def changed(model, *where):
+        # Only values up to the clock read above: every one of them has committed, while a
+        # larger one may still be in flight behind a value that a later query would see.
+        stmt = (select(model).where(model.change_seq > since, model.change_seq <= version, *where)
+                .order_by(model.change_seq).limit(limit + 1))
+        return db.execute(stmt).scalars().all()
+
+    def visible(row):
+        return row.status == "pending" or (own_profile_id is not None and row.assigned_volunteer_id == own_profile_id)
+
+    with time_stage("sync_read"):
+        if role == models.UserRole.VICTIM:
+            requests = changed(request, request.requester_id == user.id)
+        elif role == models.UserRole.VOLUNTEER and full:
+            requests = changed(request, or_(request.status == "pending",
+                                            request.assigned_volunteer_id == (own_profile_id or -1)))
+        else:
+            requests = changed(request)
+        if role in (models.UserRole.NGO, models.UserRole.ADMIN):
+            profiles = changed(profile)
+        elif own_profile_id is not None:
+            profiles = changed(profile, profile.id == own_profile_id)
+        else:
+            profiles = []
+        # Volunteers lose sight of requests when they are completed, before they are archived.
+        archived = []
+        if not full and role != models.UserRole.VOLUNTEER:
+            archived = changed(archive, archive.requester_id == user.id) if role == models.UserRole.VICTIM \
+                else changed(archive)
+
+    # The oldest `limit` changes across the three tables.
+    merged = heapq.merge(*[[(row.change_seq, kind, row) for row in rows]
+                           for kind, rows in (("request", requests), ("profile", profiles), ("archived", archived))])
+    page = [entry for _, entry in zip(range(limit + 1), merged)]
+    has_more = len(page) > limit
+    page = page[:limit]
+    result = {"aid_requests": [], "deleted_aid_requests": [], "volunteer_profiles": []}
+    for _, kind, row in page:
+        if kind == "profile":
+            result["volunteer_profiles"].append(row)
+        elif kind == "archived":
+            result["deleted_aid_requests"].append(row.id)
+        elif role == models.UserRole.VOLUNTEER and not visible(row):
+            if not full:
+                result["deleted_aid_requests"].append(row.id)
+        else:
+            result["aid_requests"].append(row)
+    if has_more:
+        version = page[-1][0]
+    return {"version": version, "full": full, "has_more": has_more, **result}
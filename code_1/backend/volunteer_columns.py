@@ -0,0 +1,277 @@
+# 1_code/volunteer_columns.py
+
+"""
+Columnar volunteer pool for the match path.
+
+A list of Firestore documents costs around a kilobyte per volunteer in dict,
+string and float objects, plus a feature matrix row. Every object is also
+tracked by the garbage collector. VolunteerColumns stores what matching
+reads as a handful of flat buffers, a few dozen bytes per volunteer:
+
+    latitude, longitude   float32
+    skill_masks           uint16 bitmask over KNOWN_SKILLS
+    availability_bits     one bit per volunteer (np.packbits)
+    ids                   concatenated UTF-8 ids with an int64 offsets array
+
+Matching scores these columns directly (rank_columns). Only the top-k rows
+become VolunteerMatch views. Nothing proportional to the pool is copied per
+request.
+
+A long-lived pool (volunteer_sync) keeps no documents; the matched ones are
+read by id, as with the shared pool and shards. A pool built per request
+from a full collection stream can keep them in a `documents` column of
+compact JSON bytes, so the matches need no second read. The long-lived
+pool keeps its rows in a VolunteerColumnsTable, which patches, appends and
+swap-removes rows as changes arrive and snapshots them with array copies.
+"""
+
+from array import array
+
+import numpy as np
+import orjson
+
+from matching_ai import (KNOWN_SKILLS, SKILL_BITS, SKILL_MASK_DTYPE, document_coordinates, rank_columns,
+                         skills_to_mask)
+from serialization import json_default
+
+_SKILL_SHIFTS = np.arange(len(KNOWN_SKILLS), dtype=SKILL_MASK_DTYPE)
+
+
+def encode_document(data):
+    """Compact JSON bytes of a document; keys sorted, so equal documents encode equally."""
+    return orjson.dumps(data, default=json_default,
+                        option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def document_row(data):
+    """(latitude, longitude, skill mask, available) of a volunteer document, as extract_features_volunteer reads them."""
+    lat, lon = document_coordinates(data)
+    available = str(data.get('availability', 'available')).lower() == 'available'
+    return lat, lon, skills_to_mask(data.get('skills', '')), available
+
+
+def feature_row(features):
+    """The same tuple from an extract_features_volunteer vector."""
+    mask = 0
+    for value, bit in zip(features[2:2 + len(KNOWN_SKILLS)], SKILL_BITS.values()):
+        if value > 0:
+            mask |= bit
+    return float(features[0]), float(features[1]), mask, bool(features[-1] > 0)
+
+
+class VolunteerColumnsBuilder:
+    """Appends volunteers into growable buffers; build() freezes them into VolunteerColumns."""
+
+    def __init__(self, keep_documents=False):
+        self.keep_documents = keep_documents
+        self._ids = bytearray()
+        self._id_offsets = array('q', [0])
+        self._documents = bytearray()
+        self._document_offsets = array('q', [0])
+        self._latitude = array('f')
+        self._longitude = array('f')
+        self._skill_masks = array('H')
+        self._available = bytearray()
+
+    def append(self, doc_id, document=None, row=None):
+        """
+        Add one volunteer: its Firestore document and/or its document_row /
+        feature_row tuple (computed from the document if omitted).
+        """
+        if row is None:
+            row = document_row(document)
+        lat, lon, mask, available = row
+        self._ids += str(doc_id).encode()
+        self._id_offsets.append(len(self._ids))
+        if self.keep_documents:
+            self._documents += encode_document(document)
+            self._document_offsets.append(len(self._documents))
+        self._latitude.append(lat)
+        self._longitude.append(lon)
+        self._skill_masks.append(mask)
+        self._available.append(1 if available else 0)
+
+    def build(self):
+        size = len(self._latitude)
+        return VolunteerColumns(
+            ids=bytes(self._ids),
+            id_offsets=np.frombuffer(self._id_offsets, dtype=np.int64),
+            documents=bytes(self._documents) if self.keep_documents else None,
+            document_offsets=np.frombuffer(self._document_offsets, dtype=np.int64) if self.keep_documents else None,
+            latitude=np.frombuffer(self._latitude, dtype=np.float32),
+            longitude=np.frombuffer(self._longitude, dtype=np.float32),
+            skill_masks=np.frombuffer(self._skill_masks, dtype=SKILL_MASK_DTYPE),
+            availability_bits=np.packbits(np.frombuffer(bytes(self._available), dtype=np.uint8)),
+            size=size,
+        )
+
+
+class VolunteerColumnsTable:
+    """
+    Mutable columns keyed by volunteer id, for a pool maintained by deltas.
+    A change patches its row in place, a new volunteer is appended, and a
+    removal moves the last row into the gap, so each costs O(1). snapshot()
+    freezes the rows into a VolunteerColumns with array copies; nothing runs
+    per row in Python.
+    """
+
+    def __init__(self, capacity=1024):
+        self._rows = {}
+        self._ids = []
+        self._id_lengths = np.empty(capacity, dtype=np.int64)
+        self._latitude = np.empty(capacity, dtype=np.float32)
+        self._longitude = np.empty(capacity, dtype=np.float32)
+        self._skill_masks = np.empty(capacity, dtype=SKILL_MASK_DTYPE)
+        self._available = np.empty(capacity, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _columns(self):
+        return (self._id_lengths, self._latitude, self._longitude, self._skill_masks, self._available)
+
+    def set(self, doc_id, row):
+        """Insert or overwrite a volunteer's document_row / feature_row tuple."""
+        index = self._rows.get(doc_id)
+        if index is None:
+            index = len(self._ids)
+            if index == len(self._latitude):
+                (self._id_lengths, self._latitude, self._longitude, self._skill_masks,
+                 self._available) = (np.resize(column, 2 * index) for column in self._columns())
+            encoded = str(doc_id).encode()
+            self._rows[doc_id] = index
+            self._ids.append(encoded)
+            self._id_lengths[index] = len(encoded)
+        lat, lon, mask, available = row
+        self._latitude[index] = lat
+        self._longitude[index] = lon
+        self._skill_masks[index] = mask
+        self._available[index] = 1 if available else 0
+
+    def remove(self, doc_id):
+        """Drop a volunteer; returns False if it was not there."""
+        index = self._rows.pop(doc_id, None)
+        if index is None:
+            return False
+        last = len(self._ids) - 1
+        moved = self._ids.pop()
+        if index != last:
+            for column in self._columns():
+                column[index] = column[last]
+            self._ids[index] = moved
+            self._rows[moved.decode()] = index
+        return True
+
+    def snapshot(self):
+        """An immutable VolunteerColumns of the current rows (without documents)."""
+        size = len(self._ids)
+        id_offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(self._id_lengths[:size], out=id_offsets[1:])
+        return VolunteerColumns(
+            ids=b"".join(self._ids),
+            id_offsets=id_offsets,
+            documents=None,
+            document_offsets=None,
+            latitude=self._latitude[:size].copy(),
+            longitude=self._longitude[:size].copy(),
+            skill_masks=self._skill_masks[:size].copy(),
+            availability_bits=np.packbits(self._available[:size]),
+            size=size,
+        )
+
+
+class VolunteerColumns:
+    """
+    Immutable columnar volunteer pool. Also a read-only sequence of volunteer
+    dicts, so code written for a list of documents keeps working: pool[i] is
+    row i's document with its `id`, or just {"id": ...} without documents.
+    """
+
+    def __init__(self, ids, id_offsets, documents, document_offsets, latitude, longitude, skill_masks,
+                 availability_bits, size):
+        self.ids = ids
+        self.id_offsets = id_offsets
+        self.documents = documents
+        self.document_offsets = document_offsets
+        self.latitude = latitude
+        self.longitude = longitude
+        self.skill_masks = skill_masks
+        self.availability_bits = availability_bits
+        self.size = size
+
+    @classmethod
+    def from_documents(cls, documents, keep_documents=True):
+        """Build from an iterable of (id, document dict); each dict can be dropped once appended."""
+        builder = VolunteerColumnsBuilder(keep_documents)
+        for doc_id, data in documents:
+            builder.append(doc_id, data)
+        return builder.build()
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, row):
+        row = int(row)
+        if not 0 <= row < self.size:
+            raise IndexError(row)
+        if self.documents is None:
+            return {"id": self.id(row)}
+        return dict(self.document(row), id=self.id(row))
+
+    def __iter__(self):
+        return (self[row] for row in range(self.size))
+
+    def id(self, row):
+        return self.ids[self.id_offsets[row]:self.id_offsets[row + 1]].decode()
+
+    def document(self, row):
+        """Row's stored document, without its id."""
+        return orjson.loads(self.documents[self.document_offsets[row]:self.document_offsets[row + 1]])
+
+    @property
+    def available(self):
+        return np.unpackbits(self.availability_bits, count=self.size).view(bool)
+
+    @property
+    def nbytes(self):
+        total = (len(self.ids) + self.id_offsets.nbytes + self.latitude.nbytes + self.longitude.nbytes
+                 + self.skill_masks.nbytes + self.availability_bits.nbytes)
+        if self.documents is not None:
+            total += len(self.documents) + self.document_offsets.nbytes
+        return total
+
+    def feature_matrix(self):
+        """The build_feature_matrix layout (for debugging, model fitting and shards)."""
+        X = np.empty((self.size, 3 + len(KNOWN_SKILLS)))
+        X[:, 0] = self.latitude
+        X[:, 1] = self.longitude
+        X[:, 2:2 + len(KNOWN_SKILLS)] = (self.skill_masks[:, None] >> _SKILL_SHIFTS) & 1
+        X[:, -1] = self.available
+        return X
+
+    def match(self, request_features, k=3):
+        """The k best volunteers for a request (composite score), as VolunteerMatch views, best first."""
+        if not self.size:
+            return []
+        _, distances, rows = rank_columns(request_features, self.latitude, self.longitude,
+                                          self.skill_masks, self.available, k)
+        return [VolunteerMatch(self, int(row), float(distance)) for row, distance in zip(rows, distances)]
+
+
+class VolunteerMatch:
+    """One matched volunteer: a row of a VolunteerColumns pool and its distance."""
+
+    __slots__ = ("pool", "row", "distance_km")
+
+    def __init__(self, pool, row, distance_km):
+        self.pool = pool
+        self.row = row
+        self.distance_km = distance_km
+
+    @property
+    def id(self):
+        return self.pool.id(self.row)
+
+    def to_dict(self):
+        """The volunteer (see VolunteerColumns.__getitem__) with `distance_km`, as get_best_matches returns it."""
+        return dict(self.pool[self.row], distance_km=round(self.distance_km, 2))
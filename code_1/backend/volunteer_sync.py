@@ -0,0 +1,215 @@
+# 1_code/volunteer_sync.py
+
+"""
+Live in-memory volunteer pool kept in sync with the Firestore `volunteers`
+collection through an on_snapshot change feed.
+
+The first snapshot of a subscription carries every document and serves as the
+bulk load; after that only changed documents arrive, and only those are
+re-featurized (geocoded). Every applied batch bumps the pool version. The
+pool keeps only digests of each document and its matching fields, and the
+matching features in a VolunteerColumnsTable that each batch patches in
+place. Readers get an immutable columnar view (volunteer_columns.VolunteerColumns),
+copied from the table at most once per version, so a match sees one
+consistent version while new changes are applied. The matched volunteers'
+documents are read by id.
+
+The Firestore client resumes a dropped stream by itself. If the watch
+terminates anyway, the synchronizer subscribes again and diffs the fresh
+snapshot against the pool: unchanged volunteers keep their features, and the
+version only moves if something actually changed. While no live watch is
+attached, staleness() grows, and callers can refuse reads older than their bound.
+"""
+
+import threading
+import time
+
+import hashlib
+
+from matching_ai import extract_features_volunteer
+from metrics import Counter, Gauge
+from volunteer_columns import VolunteerColumnsTable, encode_document, feature_row
+
+VOLUNTEER_SYNC_RECONNECT_INTERVAL = 5.0
+# Fields that feed extract_features_volunteer; other edits don't need re-featurizing.
+FEATURE_FIELDS = ("skills", "location", "availability", "lat", "lon", "geocoded_location")
+
+POOL_VERSION = Gauge("volunteer_pool_version", "Version of the change-feed synced volunteer pool.")
+POOL_SIZE = Gauge("volunteer_pool_size", "Volunteers in the change-feed synced pool.")
+SYNC_CHANGES = Counter("volunteer_sync_changes_total", "Volunteer changes applied from the feed, by type.", ["type"])
+SYNC_RESUBSCRIBES = Counter("volunteer_sync_resubscribes_total", "Times the volunteer watch was re-established.")
+
+
+class StalePoolError(Exception):
+    """The synced pool is older than the caller's staleness bound."""
+
+
+class PoolView:
+    """Immutable view of the pool at one version."""
+
+    def __init__(self, version, columns):
+        self.version = version
+        self.columns = columns
+        self._X = None
+
+    @property
+    def volunteers(self):
+        """The volunteer documents (with `id`), decoded on access."""
+        return self.columns
+
+    @property
+    def X(self):
+        """Feature matrix in build_feature_matrix layout; built on first use (debug matching)."""
+        if self._X is None:
+            self._X = self.columns.feature_matrix()
+        return self._X
+
+
+def _digest(data):
+    return hashlib.blake2b(encode_document(data), digest_size=8).digest()
+
+
+class VolunteerPool:
+    """Digests of volunteer documents and their feature rows, updated by deltas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # id -> (document digest, matching fields digest)
+        self._docs = {}
+        self._columns = VolunteerColumnsTable()
+        self._view = None
+        self.version = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def apply(self, upserts=None, removals=()):
+        """
+        Apply changed documents ({id: data}) and removed ids. Features are only
+        recomputed for documents whose skills, location (or enriched coordinates)
+        or availability changed.
+        Returns the pool version after the batch.
+        """
+        upserts = upserts or {}
+        with self._lock:
+            current = {doc_id: self._docs.get(doc_id) for doc_id in upserts}
+        changed = {}
+        for doc_id, data in upserts.items():
+            old = current[doc_id]
+            digests = (_digest(data), _digest([data.get(f) for f in FEATURE_FIELDS]))
+            if old == digests:
+                continue
+            same_features = old is not None and old[1] == digests[1]
+            # Geocode outside the lock; reads keep being served meanwhile.
+            changed[doc_id] = (digests, None if same_features else feature_row(extract_features_volunteer(data)))
+        with self._lock:
+            removed = [doc_id for doc_id in removals if self._docs.pop(doc_id, None) is not None]
+            for doc_id in removed:
+                self._columns.remove(doc_id)
+            for doc_id, (data, features) in changed.items():
+                self._docs[doc_id] = data
+                if features is not None:
+                    self._columns.set(doc_id, features)
+            if changed or removed:
+                self.version += 1
+                self._view = None
+            POOL_VERSION.set(self.version)
+            POOL_SIZE.set(len(self._docs))
+            return self.version
+
+    def replace(self, documents):
+        """Make the pool equal to `documents` ({id: data}) by applying only the differences."""
+        with self._lock:
+            gone = [doc_id for doc_id in self._docs if doc_id not in documents]
+        return self.apply(documents, gone)
+
+    def view(self):
+        """The current PoolView, copied from the columns at most once per version."""
+        with self._lock:
+            if self._view is None or self._view.version != self.version:
+                self._view = PoolView(self.version, self._columns.snapshot())
+            return self._view
+
+
+class VolunteerSynchronizer:
+    """Subscribes a VolunteerPool to a collection's on_snapshot feed and keeps it attached."""
+
+    def __init__(self, collection, pool=None, reconnect_interval=VOLUNTEER_SYNC_RECONNECT_INTERVAL):
+        self.collection = collection
+        self.pool = pool or VolunteerPool()
+        self.reconnect_interval = reconnect_interval
+        self.synced_at = None
+        self._watch = None
+        self._initial = False
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="volunteer-sync", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._watch is not None:
+            self._watch.unsubscribe()
+
+    def wait_ready(self, timeout=None):
+        """Block until the first snapshot has been applied."""
+        return self._ready.wait(timeout)
+
+    @property
+    def live(self):
+        return self._watch is not None and getattr(self._watch, "is_active", True) and not self._initial
+
+    def staleness(self):
+        """Seconds the pool may lag the collection: 0 while the watch is live and caught up."""
+        if self.synced_at is None:
+            return float("inf")
+        return 0.0 if self.live else time.monotonic() - self.synced_at
+
+    def read(self, max_staleness=None):
+        """The current PoolView; raises StalePoolError if it may be older than max_staleness seconds."""
+        if max_staleness is not None and self.staleness() > max_staleness:
+            raise StalePoolError(f"Volunteer pool is {self.staleness():.1f}s stale")
+        return self.pool.view()
+
+    def subscribe(self):
+        self._initial = True
+        self._watch = self.collection.on_snapshot(self._on_snapshot)
+
+    def _on_snapshot(self, docs, changes, read_time):
+        try:
+            if self._initial:
+                # First snapshot of a subscription: the full collection. Diff it in.
+                self.pool.replace({doc.id: doc.to_dict() for doc in docs})
+                SYNC_CHANGES.labels(type="resync").inc()
+                self._initial = False
+            else:
+                upserts, removals = {}, set()
+                for change in changes:
+                    SYNC_CHANGES.labels(type=change.type.name.lower()).inc()
+                    doc_id = change.document.id
+                    if change.type.name == "REMOVED":
+                        removals.add(doc_id)
+                        upserts.pop(doc_id, None)
+                    else:
+                        upserts[doc_id] = change.document.to_dict()
+                        removals.discard(doc_id)
+                self.pool.apply(upserts, removals)
+            self.synced_at = time.monotonic()
+            self._ready.set()
+        except Exception as e:
+            print(f"Error applying volunteer changes: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self._watch is None or not getattr(self._watch, "is_active", True):
+                if self._watch is not None:
+                    SYNC_RESUBSCRIBES.inc()
+                    print("Volunteer watch closed; resubscribing.")
+                try:
+                    self.subscribe()
+                except Exception as e:
+                    print(f"Error subscribing to volunteer changes: {e}")
+            self._stop.wait(self.reconnect_interval)
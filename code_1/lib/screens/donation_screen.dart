@@ -52,6 +52,7 @@ class _DonationScreenState extends State<DonationScreen> {
       setState(() {
         _donations.add(newDonation);
       });
+      submitDonation(newDonation);
 
       ScaffoldMessenger.of(context).showSnackBar(
         SnackBar(
@@ -1,10 +1,33 @@
+
+
 // fetching data in the try catch block
 // catches any errors 
 import 'dart:convert';
+import 'dart:math';
 import 'package:flutter/services.dart' show rootBundle;
+import 'package:http/http.dart' as http;
 import '../models/donation.dart';
 
-Future<List<Donation>> fetchDonations() async {
+const String _apiUrl = 'http://localhost:8001'; // Replace with actual API URL
+
+Future<List<Donation>> fetchDonations({String? token}) async {
+  // Donations recorded by the backend; the bundled JSON is an offline fallback.
+  try {
+    final response = await http.get(
+      Uri.parse('$_apiUrl/donations/?limit=1000'),
+      headers: {if (token != null) 'Authorization': 'Bearer $token'},
+    );
+    if (response.statusCode == 200) {
+      final data = jsonDecode(response.body);
+      return (data['donations'] as List).map((json) => Donation.fromJson(json)).toList();
+    }
+    // ignore: avoid_print
+    print("Donations API returned ${response.statusCode}, using bundled data");
+  } catch (e) {
+    // ignore: avoid_print
+    print("Donations API unavailable ($e), using bundled data");
+  }
+
   try {
     final String response = await rootBundle.loadString('assets/json_files/donations.json');
     final List<dynamic> data = jsonDecode(response);
@@ -16,3 +39,24 @@ Future<List<Donation>> fetchDonations() async {
   }
 }
 
+// Sends a donation to the backend. The idempotency key is generated once per
+// donation, so retrying after a dropped connection can't record it twice.
+Future<bool> submitDonation(Donation donation, {String? token, String? idempotencyKey}) async {
+  final key = idempotencyKey ??
+      '${DateTime.now().microsecondsSinceEpoch}-${Random().nextInt(1 << 32)}';
+  try {
+    final response = await http.post(
+      Uri.parse('$_apiUrl/donations/'),
+      headers: {
+        'Content-Type': 'application/json',
+        if (token != null) 'Authorization': 'Bearer $token',
+      },
+      body: jsonEncode([{...donation.toJson(), 'idempotency_key': key}]),
+    );
+    return response.statusCode == 201;
+  } catch (e) {
+    // ignore: avoid_print
+    print("Error submitting donation: $e");
+    return false;
+  }
+}
@@ -1,9 +1,44 @@
 import 'dart:convert';
 import 'package:flutter/services.dart';
+import 'package:http/http.dart' as http;
 import '../models/alert.dart';
 
+const String _apiUrl = 'http://localhost:8001'; // Replace with actual API URL
+
 class EmergencyAlertService {
-  static Future<List<Alert>> fetchEmergencyAlerts() async {
+  // Delivery id of the newest alert seen; the feed only returns newer ones.
+  static int _cursor = 0;
+  static final List<Alert> _received = [];
+
+  static Future<List<Alert>> fetchEmergencyAlerts({String? token}) async {
+    // Alerts delivered to this user by the backend; the bundled JSON is an offline fallback.
+    if (token != null) {
+      try {
+        final response = await http.get(
+          Uri.parse('$_apiUrl/alerts/feed?after=$_cursor'),
+          headers: {'Authorization': 'Bearer $token'},
+        );
+        if (response.statusCode == 200) {
+          final data = jsonDecode(response.body);
+          for (final item in data['alerts'] as List) {
+            final alert = item['alert'];
+            _received.insert(0, Alert(
+              alertTitle: alert['title'],
+              alertDescription: alert['description'],
+              alertDate: alert['created_at'],
+            ));
+          }
+          _cursor = data['next_cursor'];
+          return List.of(_received);
+        }
+        // ignore: avoid_print
+        print("Alert feed returned ${response.statusCode}, using bundled data");
+      } catch (e) {
+        // ignore: avoid_print
+        print("Alert feed unavailable ($e), using bundled data");
+      }
+    }
+
     try {
       // Load the local JSON data using rootBundle
       final String response = await rootBundle.loadString('assets/json_files/emergency_alerts.json');
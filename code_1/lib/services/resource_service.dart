@@ -1,15 +1,36 @@
+
 import 'dart:convert';
 import 'package:flutter/services.dart';
+import 'package:http/http.dart' as http;
 import '../models/resource.dart';
 
-Future<List<Resource>> fetchResources() async {
+const String _apiUrl = 'http://localhost:8001'; // Replace with actual API URL
+
+Future<List<Resource>> fetchResources({String? token}) async {
+  // Live inventory from the backend; the bundled JSON is an offline fallback.
+  try {
+    final response = await http.get(
+      Uri.parse('$_apiUrl/resources/inventory'),
+      headers: {if (token != null) 'Authorization': 'Bearer $token'},
+    );
+    if (response.statusCode == 200) {
+      final data = jsonDecode(response.body);
+      return (data as List).map((resource) => Resource.fromJson(resource)).toList();
+    }
+    // ignore: avoid_print
+    print("Inventory API returned ${response.statusCode}, using bundled data");
+  } catch (e) {
+    // ignore: avoid_print
+    print("Inventory API unavailable ($e), using bundled data");
+  }
+
   try {
     final String response = await rootBundle.loadString('assets/json_files/resources.json');
     final data = jsonDecode(response);
-    
+
     // ignore: avoid_print
     print("Loaded data: $data");  // Log the raw JSON data
-    
+
     return (data as List).map((resource) => Resource.fromJson(resource)).toList();
   } catch (e) {
     // ignore: avoid_print
@@ -17,8 +38,3 @@ Future<List<Resource>> fetchResources() async {
     rethrow;
   }
 }
-
-
-
-
-